@@ -10,6 +10,8 @@ from datetime import datetime
 from io import StringIO
 import logging
 
+from app.ingestion.csv_stream import ler_blocos
+
 logger = logging.getLogger(__name__)
 
 
@@ -40,28 +42,43 @@ class DataIngestionManager:
 
 
 class CSVIngester:
-    """Ingestor de dados CSV"""
+    """Ingestor de dados CSV (leitura em blocos, conversão vetorizada)"""
     
     REQUIRED_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
     
     async def ingest(self, file_path: str) -> Dict:
         """Ingere dados de arquivo CSV"""
         try:
-            df = pd.read_csv(file_path)
+            candles: List[Dict] = []
+            timestamps: List[np.ndarray] = []
             
-            # Validar colunas
-            missing_cols = [col for col in self.REQUIRED_COLUMNS if col not in df.columns]
-            if missing_cols:
-                return {
-                    'status': 'error',
-                    'message': f'Colunas faltantes: {missing_cols}'
-                }
+            for bloco in ler_blocos(file_path, obrigatorias=()):
+                # Validar colunas
+                missing_cols = [col for col in self.REQUIRED_COLUMNS
+                                if col not in bloco]
+                if missing_cols:
+                    return {
+                        'status': 'error',
+                        'message': f'Colunas faltantes: {missing_cols}'
+                    }
+                
+                # Validar e converter tipos
+                bloco = self._validate_data(bloco)
+                
+                # Converter para formato SMC
+                candles.extend(self._convert_to_candles(bloco))
+                timestamps.append(bloco['timestamp'])
             
-            # Validar e converter tipos
-            df = self._validate_data(df)
+            if timestamps:
+                ts = np.concatenate(timestamps)
+            else:
+                ts = np.zeros(0, dtype='datetime64[ns]')
             
-            # Converter para formato SMC
-            candles = self._convert_to_candles(df)
+            # Ordenar por timestamp (só reordena se o arquivo não vier ordenado)
+            if len(ts) > 1 and (ts[1:] < ts[:-1]).any():
+                ordem = np.argsort(ts, kind='stable')
+                candles = [candles[i] for i in ordem]
+                ts = ts[ordem]
             
             logger.info(f"CSV carregado com sucesso: {len(candles)} candles")
             
@@ -69,56 +86,52 @@ class CSVIngester:
                 'status': 'success',
                 'count': len(candles),
                 'data': candles,
-                'timeframe': self._detect_timeframe(df)
+                'timeframe': self._detect_timeframe(ts)
             }
         
         except Exception as e:
             logger.error(f"Erro ao ingerir CSV: {str(e)}")
             return {'status': 'error', 'message': str(e)}
     
-    def _validate_data(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Valida e converte tipos de dados"""
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        
+    def _validate_data(self, bloco: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Valida e converte tipos de dados (um bloco colunar)"""
         for col in ['open', 'high', 'low', 'close', 'volume']:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-            df[col] = df[col].fillna(0)
-        
-        # Remover linhas inválidas
-        df = df.dropna(subset=['close'])
-        
-        # Ordenar por timestamp
-        df = df.sort_values('timestamp')
-        
-        return df
+            bloco[col] = np.nan_to_num(bloco[col], nan=0.0)
+        return bloco
     
-    def _convert_to_candles(self, df: pd.DataFrame) -> List[Dict]:
-        """Converte DataFrame em candles SMC"""
-        candles = []
+    def _convert_to_candles(self, bloco: Dict[str, np.ndarray]) -> List[Dict]:
+        """Converte um bloco colunar em candles SMC"""
+        n = len(bloco['close'])
         
-        for _, row in df.iterrows():
-            candle = {
-                'timestamp': row['timestamp'].isoformat(),
-                'open': float(row['open']),
-                'high': float(row['high']),
-                'low': float(row['low']),
-                'close': float(row['close']),
-                'volume': int(row['volume']),
-                'trades': int(row.get('trades', 0)),
-                'aggression_buy': float(row.get('aggression_buy', 0)),
-                'aggression_sell': float(row.get('aggression_sell', 0))
-            }
-            candles.append(candle)
+        def coluna(nome, tipo=float):
+            valores = bloco.get(nome)
+            if valores is None:
+                return [tipo(0)] * n
+            valores = np.nan_to_num(valores, nan=0.0)
+            return (valores.astype(np.int64) if tipo is int else valores).tolist()
         
-        return candles
+        chaves = ('timestamp', 'open', 'high', 'low', 'close', 'volume',
+                  'trades', 'aggression_buy', 'aggression_sell')
+        ts = bloco['timestamp']
+        # Mesmo formato de Timestamp.isoformat() (segundos, ou us se houver fração)
+        unidade = 'us' if (ts.astype('datetime64[s]') != ts).any() else 's'
+        colunas = (
+            np.datetime_as_string(ts, unit=unidade).tolist(),
+            coluna('open'), coluna('high'), coluna('low'), coluna('close'),
+            coluna('volume', int), coluna('trades', int),
+            coluna('aggression_buy'), coluna('aggression_sell'),
+        )
+        return [dict(zip(chaves, linha)) for linha in zip(*colunas)]
     
-    def _detect_timeframe(self, df: pd.DataFrame) -> int:
-        """Detecta timeframe do DataFrame"""
-        if len(df) < 2:
+    def _detect_timeframe(self, timestamps: np.ndarray) -> int:
+        """Detecta timeframe (moda do intervalo entre barras, em minutos)"""
+        if len(timestamps) < 2:
             return 5
         
-        time_diffs = df['timestamp'].diff().dt.total_seconds() / 60
-        timeframe = int(time_diffs.mode()[0]) if len(time_diffs.mode()) > 0 else 5
+        segundos = np.diff(timestamps).astype('timedelta64[s]').astype(np.int64)
+        time_diffs = pd.Series(segundos / 60)
+        moda = time_diffs.mode()
+        timeframe = int(moda[0]) if len(moda) > 0 else 5
         
         return timeframe
 
@@ -0,0 +1,161 @@
+"""
+Cache de Resultados - Último SMCResult por engine com payload pronto
+A chave é a mesma do EngineRegistry, `(ATIVO, timeframe)`: timeframes do
+mesmo ativo (ou "win" e "WIN") não se sobrescrevem. Cada atribuição
+`cache[chave] = resultado` incrementa a versão da chave e invalida os
+payloads serializados dela. As rotas de leitura montam o ETag a partir
+da versão e respondem 304 sem tocar no resultado quando o cliente já
+tem a versão atual.
+"""
+import itertools
+import uuid
+import zlib
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from fastapi import Response
+
+from app.events.serializacao import (
+    resposta_json, resultado_para_dict, resultado_para_json,
+)
+
+_versoes = itertools.count(1)
+
+
+class CacheResultados(dict):
+    """
+    `dict` (ativo, timeframe) → último SMCResult, com versão e payloads
+    por chave.
+
+    Os payloads são guardados junto com a versão em que foram gerados;
+    um payload gerado a partir de um resultado que já foi substituído
+    (requisição concorrente com uma barra nova) é simplesmente descartado.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        # Distingue ETags entre reinícios do processo
+        self._epoca = uuid.uuid4().hex[:8]
+        self._versao: Dict[Hashable, int] = {}
+        self._payloads: Dict[Hashable, Tuple[int, Dict[Hashable, Any]]] = {}
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, chave: Hashable, resultado) -> None:
+        super().__setitem__(chave, resultado)
+        self._versao[chave] = next(_versoes)
+        self._payloads.pop(chave, None)
+
+    def __delitem__(self, chave: Hashable) -> None:
+        super().__delitem__(chave)
+        self._versao.pop(chave, None)
+        self._payloads.pop(chave, None)
+
+    def update(self, *args, **kwargs) -> None:
+        for chave, resultado in dict(*args, **kwargs).items():
+            self[chave] = resultado
+
+    def pop(self, chave: Hashable, *padrao):
+        self._versao.pop(chave, None)
+        self._payloads.pop(chave, None)
+        return super().pop(chave, *padrao)
+
+    def clear(self) -> None:
+        super().clear()
+        self._versao.clear()
+        self._payloads.clear()
+
+    # ============================================================
+    # VERSÃO / ETAG
+    # ============================================================
+
+    def versao(self, chave: Hashable) -> int:
+        """Versão do último resultado da chave (0 = sem resultado)."""
+        return self._versao.get(chave, 0)
+
+    def etag(self, chave: Hashable, variante: Hashable = None,
+             versao: Optional[int] = None) -> str:
+        """ETag da versão (default: a atual); `variante` separa endpoints/projeções."""
+        versao = self.versao(chave) if versao is None else versao
+        sufixo = ""
+        if variante is not None:
+            sufixo = f"-{zlib.crc32(repr(variante).encode()):08x}"
+        return f'"{self._epoca}-{versao}{sufixo}"'
+
+    # ============================================================
+    # PAYLOADS
+    # ============================================================
+
+    def obter(self, chave: Hashable, variante: Hashable) -> Optional[Any]:
+        """Payload em cache para a versão atual da chave (ou None)."""
+        entrada = self._payloads.get(chave)
+        if entrada is None or entrada[0] != self.versao(chave):
+            return None
+        return entrada[1].get(variante)
+
+    def guardar(self, chave: Hashable, variante: Hashable, payload: Any,
+                versao: int) -> Any:
+        """Guarda o payload se `versao` ainda for a atual da chave."""
+        if versao == self.versao(chave):
+            entrada = self._payloads.get(chave)
+            if entrada is None or entrada[0] != versao:
+                entrada = (versao, {})
+                self._payloads[chave] = entrada
+            entrada[1][variante] = payload
+        return payload
+
+    def como_dict(self, chave: Hashable) -> Optional[Dict[str, Any]]:
+        """Último resultado como dict (mesmo formato da API), em cache."""
+        versao = self.versao(chave)
+        dados = self.obter(chave, "dict")
+        if dados is None:
+            r = self.get(chave)
+            if r is None:
+                return None
+            dados = self.guardar(chave, "dict", resultado_para_dict(r), versao)
+        return dados
+
+
+# ============================================================
+# HTTP CONDICIONAL
+# ============================================================
+
+def etag_confere(if_none_match: Optional[str], etag: str) -> bool:
+    """`If-None-Match` (lista, `*` ou ETags fracos) contém `etag`?"""
+    if not if_none_match:
+        return False
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato == "*" or candidato.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def resposta_condicional(corpo: Optional[bytes], etag: str) -> Response:
+    """200 com o corpo e o ETag, ou 304 vazio (`corpo` None)."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if corpo is None:
+        return Response(status_code=304, headers=headers)
+    return resposta_json(corpo, headers=headers)
+
+
+def resposta_ultimo_sinal(cache: CacheResultados, chave: Tuple[str, int],
+                          campos: Optional[Tuple[str, ...]],
+                          if_none_match: Optional[str] = None) -> Response:
+    """
+    Último resultado de `chave` (ativo, timeframe) em bytes JSON (por
+    projeção), com ETag. O 304 sai só da versão, sem ler nem serializar o
+    resultado.
+    """
+    if chave not in cache:
+        return resposta_json({"mensagem": f"Sem dados para {chave[0]} ainda"})
+    variante = ("ultimo", campos)
+    # Versão lida antes do resultado: se uma barra nova entrar no meio, o
+    # corpo (mais novo) não é guardado e o próximo poll recebe 200 de novo
+    versao = cache.versao(chave)
+    etag = cache.etag(chave, campos, versao)
+    if etag_confere(if_none_match, etag):
+        return resposta_condicional(None, etag)
+    corpo = cache.obter(chave, variante)
+    if corpo is None:
+        corpo = resultado_para_json(cache[chave], campos)
+        corpo = cache.guardar(chave, variante, corpo, versao)
+    return resposta_condicional(corpo, etag)
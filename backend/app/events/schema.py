@@ -8,6 +8,8 @@ from datetime import datetime
 from enum import Enum
 import uuid
 
+from app.events.serializacao import evento_para_dict, evento_para_json
+
 
 class SignalDirection(str, Enum):
     BUY = "BUY"
@@ -94,7 +96,11 @@ class SignalEvent(BaseModel):
     
     def to_dict(self) -> dict:
         """Converte para dicionário para serialização"""
-        return self.model_dump()
+        return evento_para_dict(self)
+
+    def to_json(self) -> bytes:
+        """Serializa direto para bytes JSON"""
+        return evento_para_json(self)
     
     @classmethod
     def from_smc_result(cls, result, symbol: str = "WIN$", 
@@ -138,7 +144,10 @@ class MetricsEvent(BaseModel):
     sells: int = 0
     
     def to_dict(self) -> dict:
-        return self.model_dump()
+        return evento_para_dict(self)
+
+    def to_json(self) -> bytes:
+        return evento_para_json(self)
 
 
 class AlertEvent(BaseModel):
@@ -152,4 +161,7 @@ class AlertEvent(BaseModel):
     event_id: Optional[str] = None
     
     def to_dict(self) -> dict:
-        return self.model_dump()
+        return evento_para_dict(self)
+
+    def to_json(self) -> bytes:
+        return evento_para_json(self)
@@ -0,0 +1,212 @@
+"""
+Serialização Rápida - SMCResult e eventos direto para bytes JSON
+Plano de campos compilado uma vez (campo, escala, casas) e
+reaproveitado por projeção; o arredondamento faz parte do plano. Usa
+orjson quando instalado e cai para o `json` da stdlib caso contrário.
+"""
+import json
+from datetime import date, datetime, time
+from enum import Enum
+from functools import lru_cache
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import HTTPException, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _padrao(valor: Any) -> Any:
+    """
+    Escalares numpy, datas e Enums → tipos nativos (fallback sem orjson),
+    no mesmo formato do orjson: datas em ISO 8601 e Enums pelo valor.
+    """
+    if isinstance(valor, (datetime, date, time)):
+        return valor.isoformat()
+    if isinstance(valor, Enum):
+        return valor.value
+    if hasattr(valor, "item"):
+        return valor.item()
+    if hasattr(valor, "tolist"):
+        return valor.tolist()
+    return str(valor)
+
+
+def dumps(dados: Any) -> bytes:
+    """JSON compacto em bytes; aceita escalares/arrays numpy e Enums."""
+    if orjson is not None:
+        return orjson.dumps(dados, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(dados, ensure_ascii=False, separators=(",", ":"),
+                      default=_padrao).encode("utf-8")
+
+
+def resposta_json(dados: Any, status_code: int = 200,
+                  headers: Optional[Dict[str, str]] = None) -> Response:
+    """`Response` crua com o corpo já serializado (sem o encoder do FastAPI)."""
+    corpo = dados if isinstance(dados, bytes) else dumps(dados)
+    return Response(content=corpo, status_code=status_code, headers=headers,
+                    media_type="application/json")
+
+
+# ============================================================
+# SMCResult
+# ============================================================
+
+# (campo, escala, casas) — casas None = valor sem arredondamento
+CAMPOS_RESULTADO: Tuple[Tuple[str, float, Optional[int]], ...] = (
+    # Scores
+    ("score_final", 1, 1),
+    ("score_compra", 1, 1),
+    ("score_venda", 1, 1),
+    ("score_hfz", 100, 1),
+    ("score_fbi", 100, 1),
+    ("score_dtm", 100, 1),
+    ("score_sda", 100, 1),
+    ("score_mtv", 100, 1),
+    # Estado
+    ("estado_mercado", 1, None),
+    ("direcao", 1, None),
+    ("forca", 1, None),
+    ("qualidade_setup", 1, None),
+    ("risco_contextual", 1, None),
+    ("permissao_compra", 1, None),
+    ("permissao_venda", 1, None),
+    # HFZ
+    ("delta_normalizado", 1, 3),
+    ("hz_normalizado", 1, 3),
+    ("absorcao_normalizada", 1, 3),
+    ("imbalance_score", 1, 3),
+    ("exaustao_compra", 1, None),
+    ("exaustao_venda", 1, None),
+    # FBI
+    ("zona_proxima", 1, None),
+    ("preco_zona_proxima", 1, None),
+    ("tipo_zona_proxima", 1, None),
+    ("distancia_zona", 100, 2),
+    ("contato_zona", 1, None),
+    ("reacao_zona", 1, None),
+    # DTM
+    ("trap_flag", 1, None),
+    ("trap_intensity", 1, 2),
+    ("falha_continuidade", 1, None),
+    ("eficiencia_deslocamento", 1, 2),
+    # SDA
+    ("regime_mercado", 1, None),
+    ("direcao_regime", 1, None),
+    ("vol_normalizada", 1, 2),
+    ("prob_continuacao", 1, 2),
+    ("fase_movimento", 1, None),
+    # MTV
+    ("score_confluencia", 100, 1),
+    ("score_divergencia", 100, 1),
+    ("confluencia_camada", 1, None),
+    ("confluencia_forte", 1, None),
+    ("divergencia_confirmada", 1, None),
+    ("sessao_atual", 1, None),
+    ("direcao_tf_rapido", 1, None),
+    ("direcao_tf_medio", 1, None),
+    ("direcao_tf_lento", 1, None),
+    ("direcao_tf_diario", 1, None),
+    ("direcao_tf_semanal", 1, None),
+    ("renko_sugestao", 1, None),
+    ("renko_qualidade", 1, None),
+    ("nome_ativo", 1, None),
+    # Eventos
+    ("evento_score_alto", 1, None),
+    ("evento_trap", 1, None),
+    ("evento_confluencia", 1, None),
+    ("evento_divergencia", 1, None),
+    ("evento_contato_zona", 1, None),
+    # Bloqueios
+    ("bloqueio_score_baixo", 1, None),
+    ("bloqueio_trap", 1, None),
+    ("bloqueio_divergencia", 1, None),
+)
+
+CHAVES_RESULTADO = tuple(c[0] for c in CAMPOS_RESULTADO)
+
+
+@lru_cache(maxsize=256)
+def serializador_resultado(
+    campos: Optional[Tuple[str, ...]] = None,
+) -> Callable[[Any], Dict[str, Any]]:
+    """
+    Compila o conversor SMCResult → dict para uma projeção (None = todos
+    os campos, na ordem de `CAMPOS_RESULTADO`).
+
+    Os atributos são lidos de uma vez com `attrgetter` e só os campos com
+    `casas` passam por `round(valor * escala, casas)`, a mesma conta do
+    dict montado à mão antes: ints continuam ints e NaN/inf passam
+    intactos. As funções ficam em cache por projeção.
+    """
+    plano = CAMPOS_RESULTADO if campos is None else \
+        tuple(c for c in CAMPOS_RESULTADO if c[0] in set(campos))
+    chaves = tuple(c[0] for c in plano)
+    ler = attrgetter(*chaves)
+    arredondar = tuple((i, escala, casas)
+                       for i, (_, escala, casas) in enumerate(plano)
+                       if casas is not None)
+
+    if len(plano) == 1:
+        def ler_tupla(r, _ler=ler):
+            return (_ler(r),)
+    else:
+        ler_tupla = ler
+
+    def converter(r) -> Dict[str, Any]:
+        valores = list(ler_tupla(r))
+        for i, escala, casas in arredondar:
+            valores[i] = round(valores[i] * escala, casas)
+        return dict(zip(chaves, valores))
+
+    return converter
+
+
+def projecao(campos: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Interpreta `?campos=a,b,c` (vazio/None = todos). Campos desconhecidos
+    viram HTTP 400.
+    """
+    if not campos:
+        return None
+    nomes = tuple(dict.fromkeys(c.strip() for c in campos.split(",") if c.strip()))
+    desconhecidos = [c for c in nomes if c not in CHAVES_RESULTADO]
+    if desconhecidos:
+        raise HTTPException(400, f"Campos desconhecidos: {desconhecidos}")
+    return nomes or None
+
+
+def resultado_para_dict(r, campos: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """SMCResult → dict serializável (mesmas chaves e arredondamentos da API)."""
+    return serializador_resultado(None if campos is None else tuple(campos))(r)
+
+
+def resultado_para_json(r, campos: Optional[Iterable[str]] = None) -> bytes:
+    """SMCResult → bytes JSON."""
+    return dumps(resultado_para_dict(r, campos))
+
+
+# ============================================================
+# EVENTOS (pydantic)
+# ============================================================
+
+def evento_para_dict(evento) -> Dict[str, Any]:
+    """
+    Modelo de evento → dict sem passar pelo `model_dump`: os campos são
+    lidos direto do modelo; dicts aninhados são copiados para que o
+    payload não mude se o evento for alterado depois (ex.: `metadata` no
+    fechamento do sinal).
+    """
+    dados = dict(evento.__dict__)
+    for chave, valor in dados.items():
+        if isinstance(valor, dict):
+            dados[chave] = dict(valor)
+    return dados
+
+
+def evento_para_json(evento) -> bytes:
+    """Modelo de evento → bytes JSON."""
+    return dumps(evento.__dict__)
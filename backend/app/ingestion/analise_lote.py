@@ -0,0 +1,365 @@
+"""
+Análise em Lote - CSV inteiro pelo engine, sem uma requisição por candle
+O CSV é lido do store colunar e processado bloco a bloco, no próprio
+processo (`process_many`) ou no servidor em lotes por uma conexão
+keep-alive. Os resultados são gravados à medida que saem, em JSON, CSV
+e colunar.
+"""
+import csv
+import json
+import os
+import shutil
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .bar_store import abrir_ou_converter
+from .csv_stream import TAMANHO_BLOCO
+
+# Colunas de entrada repetidas na saída (lidas do store)
+CAMPOS_ENTRADA = ("open", "high", "low", "close", "volume", "trades")
+
+# Colunas enviadas ao servidor no modo HTTP
+CAMPOS_BARRA = ("open", "high", "low", "close", "volume", "volume_compra",
+                "volume_venda", "trades", "timestamp_hhmm")
+
+FORMATOS = ("json", "csv", "colunar")
+
+# Scores resumidos no relatório (quando presentes na tabela)
+SCORES = ("score_final", "score_hfz", "score_fbi", "score_dtm", "score_sda",
+          "score_mtv")
+
+Tabela = Dict[str, np.ndarray]
+
+
+def _texto(valor) -> str:
+    """Valor não numérico como texto (listas/dicts em JSON)."""
+    if isinstance(valor, (list, dict)):
+        return json.dumps(valor, ensure_ascii=False)
+    return str(valor)
+
+
+def linhas(colunas: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Tabela colunar → lista de registros (tipos Python)."""
+    nomes = list(colunas)
+    valores = [np.asarray(colunas[n]).tolist() for n in nomes]
+    return [dict(zip(nomes, linha)) for linha in zip(*valores)]
+
+
+# ============================================================
+# ESCRITORES INCREMENTAIS
+# ============================================================
+
+class EscritorJSON:
+    """Array JSON de registros, escrito bloco a bloco."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._arquivo = open(caminho, "w", encoding="utf-8")
+        self._arquivo.write("[")
+        self._primeiro = True
+
+    def escrever(self, colunas: Tabela):
+        partes = []
+        for registro in linhas(colunas):
+            partes.append(("\n  " if self._primeiro else ",\n  ")
+                          + json.dumps(registro, ensure_ascii=False))
+            self._primeiro = False
+        self._arquivo.write("".join(partes))
+
+    def fechar(self):
+        self._arquivo.write("\n]\n" if not self._primeiro else "]\n")
+        self._arquivo.close()
+
+
+class EscritorCSV:
+    """CSV com cabeçalho definido pelo primeiro bloco."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._arquivo = open(caminho, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._arquivo)
+        self._campos: Optional[List[str]] = None
+
+    def escrever(self, colunas: Tabela):
+        if self._campos is None:
+            self._campos = list(colunas)
+            self._writer.writerow(self._campos)
+        valores = []
+        for nome in self._campos:
+            coluna = np.asarray(colunas[nome])
+            valores.append(coluna.tolist() if coluna.dtype.kind in "biuf"
+                           else [_texto(v) for v in coluna])
+        self._writer.writerows(zip(*valores))
+
+    def fechar(self):
+        self._arquivo.close()
+
+
+class EscritorColunar:
+    """
+    Diretório com um `.bin` por coluna e um meta.json (como o BarStore).
+
+    Colunas numéricas/booleanas são gravadas com o próprio dtype; as demais
+    viram códigos `<i4` com a lista de categorias no meta. A escrita vai
+    para um diretório temporário renomeado no `fechar`.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._temporario = caminho + ".tmp"
+        shutil.rmtree(self._temporario, ignore_errors=True)
+        os.makedirs(self._temporario)
+        self.linhas = 0
+        self._arquivos: Dict[str, Any] = {}
+        self._dtypes: Dict[str, str] = {}
+        self._categorias: Dict[str, Dict[str, int]] = {}
+
+    def escrever(self, colunas: Tabela):
+        for nome, valores in colunas.items():
+            valores = np.asarray(valores)
+            if valores.dtype.kind == "b":
+                dados = valores
+            elif valores.dtype.kind in "iu":
+                dados = valores.astype("<i8")
+            elif valores.dtype.kind == "f":
+                dados = valores.astype("<f8")
+            else:
+                categorias = self._categorias.setdefault(nome, {})
+                dados = np.fromiter(
+                    (categorias.setdefault(_texto(v), len(categorias))
+                     for v in valores),
+                    dtype="<i4", count=len(valores))
+            if nome not in self._arquivos:
+                self._dtypes[nome] = dados.dtype.str
+                self._arquivos[nome] = open(
+                    os.path.join(self._temporario, f"{nome}.bin"), "wb")
+            dados = np.ascontiguousarray(dados, dtype=self._dtypes[nome])
+            dados.tofile(self._arquivos[nome])
+        if colunas:
+            self.linhas += len(next(iter(colunas.values())))
+
+    def fechar(self):
+        for arquivo in self._arquivos.values():
+            arquivo.close()
+        meta = {
+            "versao": 1,
+            "linhas": self.linhas,
+            "colunas": self._dtypes,
+            "categorias": {nome: list(c) for nome, c in self._categorias.items()},
+        }
+        with open(os.path.join(self._temporario, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        shutil.rmtree(self.caminho, ignore_errors=True)
+        os.replace(self._temporario, self.caminho)
+
+
+def ler_colunar(caminho: str) -> Dict[str, np.ndarray]:
+    """
+    Lê a saída de `EscritorColunar` (numéricas via memory-map, categorias
+    decodificadas).
+    """
+    with open(os.path.join(caminho, "meta.json")) as f:
+        meta = json.load(f)
+    n = meta["linhas"]
+    colunas = {}
+    for nome, dtype in meta["colunas"].items():
+        dados = np.memmap(os.path.join(caminho, f"{nome}.bin"), dtype=dtype, mode="r",
+                          shape=(n,)) if n else np.zeros(0, dtype=dtype)
+        if nome in meta["categorias"]:
+            dados = np.asarray(meta["categorias"][nome], dtype=object)[dados]
+        colunas[nome] = dados
+    return colunas
+
+
+_ESCRITORES = {
+    "json": (".json", EscritorJSON),
+    "csv": (".csv", EscritorCSV),
+    "colunar": (".cols", EscritorColunar),
+}
+
+
+# ============================================================
+# PROCESSADORES
+# ============================================================
+
+class ClienteHTTP:
+    """
+    Modo servidor: envia as barras em lotes para `/api/processar-barras`
+    por uma única sessão HTTP (keep-alive), sem pausas entre lotes.
+
+    O tamanho padrão cabe no limite do servidor com os módulos ligados;
+    se o servidor responder 413 (limite menor), o lote é dividido ao meio
+    e reenviado — o 413 sai antes de o engine tocar nas barras.
+    """
+
+    def __init__(self, base_url: str, ativo: str = "WIN",
+                 timeframe: Optional[int] = None, token: Optional[str] = None,
+                 tamanho_lote: int = 2_000, timeout: float = 60.0, sessao=None):
+        if sessao is None:
+            import requests
+            sessao = requests.Session()
+        self.sessao = sessao
+        self.url = base_url.rstrip("/") + "/api/processar-barras"
+        self.ativo = ativo
+        self.timeframe = timeframe
+        self.tamanho_lote = tamanho_lote
+        self.timeout = timeout
+        if token:
+            self.sessao.headers["Authorization"] = f"Bearer {token}"
+
+    def __call__(self, bloco: Tabela) -> Tabela:
+        n = len(bloco["close"])
+        partes = []
+        inicio = 0
+        while inicio < n:
+            fim = min(n, inicio + self.tamanho_lote)
+            resposta = self.sessao.post(self.url, timeout=self.timeout, json={
+                "ativo": self.ativo,
+                "timeframe": self.timeframe,
+                "retorno": "todos",
+                "colunas": {c: np.asarray(bloco[c][inicio:fim]).tolist()
+                            for c in CAMPOS_BARRA if c in bloco},
+            })
+            if resposta.status_code == 413 and fim - inicio > 1:
+                self.tamanho_lote = (fim - inicio) // 2
+                continue
+            resposta.raise_for_status()
+            resultados = resposta.json()["resultados"]
+            tabela = {nome: np.asarray(valores) for nome, valores in resultados.items()}
+            tabela["indice"] = tabela["indice"].astype(np.int64) + inicio
+            partes.append(tabela)
+            inicio = fim
+        partes = [p for p in partes if len(p["indice"])]
+        if not partes:
+            return {"indice": np.zeros(0, dtype=np.int64)}
+        return {nome: np.concatenate([p[nome] for p in partes]) for nome in partes[0]}
+
+    def fechar(self):
+        self.sessao.close()
+
+
+# ============================================================
+# ANÁLISE
+# ============================================================
+
+@dataclass
+class ResumoAnalise:
+    """Resumo de uma análise em lote."""
+    arquivo: str
+    barras: int = 0
+    resultados: int = 0
+    sinais_compra: int = 0
+    sinais_venda: int = 0
+    scores: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    duracao: float = 0.0
+    saidas: Dict[str, str] = field(default_factory=dict)
+
+    def acumular(self, tabela: Tabela):
+        self.resultados += len(tabela["indice"])
+        if not len(tabela["indice"]):
+            return
+        for nome, contador in (("permissao_compra", "sinais_compra"),
+                               ("permissao_venda", "sinais_venda")):
+            if nome in tabela:
+                setattr(self, contador, getattr(self, contador)
+                        + int(np.count_nonzero(tabela[nome])))
+        for nome in SCORES:
+            if nome not in tabela:
+                continue
+            valores = np.asarray(tabela[nome], dtype=np.float64)
+            s = self.scores.setdefault(
+                nome, {"min": np.inf, "max": -np.inf, "soma": 0.0})
+            s["min"] = min(s["min"], float(valores.min()))
+            s["max"] = max(s["max"], float(valores.max()))
+            s["soma"] += float(valores.sum())
+
+    def medias(self) -> Dict[str, Dict[str, float]]:
+        return {
+            nome: {"min": s["min"], "max": s["max"],
+                   "media": s["soma"] / self.resultados}
+            for nome, s in self.scores.items()
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        dados = asdict(self)
+        dados["scores"] = self.medias()
+        return dados
+
+
+def analisar_csv(caminho_csv: str, destino: str,
+                 parametros: Optional[Dict[str, Any]] = None,
+                 formatos: Iterable[str] = FORMATOS, tamanho_bloco: int = TAMANHO_BLOCO,
+                 processar: Optional[Callable[[Tabela], Tabela]] = None,
+                 ao_bloco: Optional[Callable[[int, int], None]] = None,
+                 nome_base: str = "results") -> ResumoAnalise:
+    """
+    Analisa um CSV inteiro e grava os resultados em `destino` (diretório),
+    como `<nome_base>.json`, `.csv` e `.cols`.
+
+    Por padrão o engine roda no próprio processo (`process_many`, um
+    engine novo com `parametros`); `processar` permite outro backend,
+    como `ClienteHTTP`. Cada linha da saída é uma barra pós-aquecimento:
+    timestamp, colunas de entrada e campos do resultado. A memória é
+    limitada pelo tamanho do bloco.
+
+    `ao_bloco(barras_processadas, total)` é chamado após cada bloco.
+    """
+    from core_engine import SMCCoreEngine
+
+    inicio = time.perf_counter()
+    if processar is None:
+        processar = SMCCoreEngine(**(parametros or {})).process_many
+    store = abrir_ou_converter(str(caminho_csv))
+    resumo = ResumoAnalise(arquivo=str(caminho_csv))
+
+    os.makedirs(destino, exist_ok=True)
+    escritores = []
+    for formato in formatos:
+        extensao, classe = _ESCRITORES[formato]
+        caminho = os.path.join(destino, nome_base + extensao)
+        escritores.append(classe(caminho))
+        resumo.saidas[formato] = caminho
+
+    try:
+        for bloco in store.blocos(tamanho_bloco):
+            ts = bloco.pop("timestamp")
+            tabela = processar(bloco)
+            indice = tabela["indice"]
+
+            saida = {"timestamp": np.datetime_as_string(
+                ts[indice].astype("datetime64[ns]"), unit="s")}
+            for nome in CAMPOS_ENTRADA:
+                saida[nome] = bloco[nome][indice]
+            saida.update((nome, coluna) for nome, coluna in tabela.items()
+                         if nome != "indice")
+            for escritor in escritores:
+                escritor.escrever(saida)
+
+            resumo.barras += len(bloco["close"])
+            resumo.acumular(tabela)
+            if ao_bloco:
+                ao_bloco(resumo.barras, len(store))
+    finally:
+        for escritor in escritores:
+            escritor.fechar()
+
+    resumo.duracao = time.perf_counter() - inicio
+    return resumo
+
+
+def escrever_resumo(resumo: ResumoAnalise, caminho: str):
+    """Relatório em texto da análise."""
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write("Analysis Summary\n")
+        f.write(f"{'=' * 80}\n")
+        f.write(f"File: {os.path.basename(resumo.arquivo)}\n")
+        f.write(f"Bars: {resumo.barras} ({resumo.resultados} analyzed)\n")
+        f.write(f"Signals: {resumo.sinais_compra} BUY / {resumo.sinais_venda} SELL\n")
+        f.write(f"Duration: {resumo.duracao:.2f}s\n\n")
+        f.write("Score Statistics:\n")
+        for nome, s in resumo.medias().items():
+            f.write(f"  {nome}: min {s['min']:.2f}  max {s['max']:.2f}  "
+                    f"avg {s['media']:.2f}\n")
@@ -0,0 +1,294 @@
+"""
+Backtest Paralelo - Arquivos, ativos e intervalos em um pool de processos
+Cada shard (arquivo × ativo × intervalo de datas) roda em um processo
+próprio, com engine e SignalManager isolados; as métricas de cada shard
+(`MetricsEvent`) são combinadas em um relatório único.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing as mp
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Shard:
+    """Unidade de trabalho: um arquivo, o ativo dos sinais e um intervalo opcional."""
+    caminho: str
+    simbolo: str
+    desde: Optional[str] = None  # ISO, inclusive
+    ate: Optional[str] = None  # ISO, inclusive
+
+    @property
+    def nome(self) -> str:
+        intervalo = "" if self.desde is None and self.ate is None else \
+            f" [{self.desde or '...'} → {self.ate or '...'}]"
+        return f"{self.simbolo} ({os.path.basename(self.caminho)}){intervalo}"
+
+
+@dataclass
+class ResultadoShard:
+    """Resultado de um shard (métricas do seu SignalManager isolado)."""
+    shard: Shard
+    barras: int = 0
+    metricas: Dict[str, Any] = field(default_factory=dict)
+    soma_pontos: float = 0.0
+    com_pontos: int = 0
+    duracao: float = 0.0
+    erro: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        dados = asdict(self)
+        dados["shard"]["nome"] = self.shard.nome
+        return dados
+
+
+# ============================================================
+# SHARDS
+# ============================================================
+
+def simbolo_do_arquivo(caminho: str) -> str:
+    """Ativo pelo nome do arquivo (ex.: `uploads/WINFUT_5m.csv` → `WINFUT`)."""
+    return os.path.splitext(os.path.basename(caminho))[0].split("_")[0].upper()
+
+
+def montar_shards(
+    arquivos: Iterable[str],
+    intervalos: Sequence[Tuple[Optional[str], Optional[str]]] = ((None, None),),
+    simbolos: Optional[Dict[str, str]] = None,
+) -> List[Shard]:
+    """
+    Produto arquivos × intervalos.
+
+    `simbolos` mapeia arquivo → ativo; sem entrada, o ativo vem do nome do
+    arquivo. Cada intervalo começa com o engine frio (sem aquecimento com
+    as barras anteriores), como um backtest independente.
+    """
+    simbolos = simbolos or {}
+    return [
+        Shard(caminho=str(arquivo),
+              simbolo=simbolos.get(str(arquivo)) or simbolo_do_arquivo(str(arquivo)),
+              desde=desde, ate=ate)
+        for arquivo in arquivos
+        for desde, ate in intervalos
+    ]
+
+
+# ============================================================
+# LADO DO WORKER
+# ============================================================
+
+def _iniciar_worker(prioridade: int):
+    """Initializer do pool: baixa a prioridade dos workers."""
+    if prioridade and hasattr(os, "nice"):
+        try:
+            os.nice(prioridade)
+        except OSError:
+            pass
+
+
+def executar_shard(shard: Shard, parametros: Dict[str, Any],
+                   tamanho_bloco: int = 50_000) -> ResultadoShard:
+    """
+    Roda um shard no processo atual: store colunar do arquivo, fatia do
+    intervalo, engine novo e SignalManager próprio (sem WebSocket).
+    """
+    import app.websocket  # noqa: F401  (ordem de import entre websocket e signals)
+    from app.ingestion.bar_store import abrir_ou_converter
+    from app.ingestion.replay_runner import ReplayRunner
+    from app.signals.manager import SignalManager
+    from core_engine import SMCCoreEngine
+
+    inicio = time.perf_counter()
+    store = abrir_ou_converter(shard.caminho)
+    if shard.desde is None and shard.ate is None:
+        colunas = store
+    else:
+        colunas = store.intervalo(shard.desde, shard.ate)
+
+    gerenciador = SignalManager(max_history=sys.maxsize, transmitir=False)
+    runner = ReplayRunner(SMCCoreEngine(**parametros), fast_forward=True,
+                          tamanho_bloco=tamanho_bloco, gerenciador=gerenciador,
+                          symbol=shard.simbolo, transmitir=False)
+    asyncio.run(runner.run(colunas=colunas))
+
+    pontos = [s.final_points for s in gerenciador.closed_signals
+              if s.final_points is not None]
+    metricas = gerenciador.get_metrics().to_dict()
+    metricas["abertos"] = len(gerenciador.open_signals)
+    return ResultadoShard(
+        shard=shard,
+        barras=runner.current_bar_index,
+        metricas=metricas,
+        soma_pontos=float(sum(pontos)),
+        com_pontos=len(pontos),
+        duracao=time.perf_counter() - inicio,
+    )
+
+
+# ============================================================
+# COMBINAÇÃO
+# ============================================================
+
+def combinar_metricas(resultados: Iterable[ResultadoShard]):
+    """
+    Combina as métricas dos shards em um `MetricsEvent`.
+
+    Contagens são somadas; assertividade e pontos médios são recalculados
+    sobre o total (pontos a partir das somas exatas de cada shard).
+    """
+    from app.events.schema import MetricsEvent
+
+    total = wins = buys = com_pontos = 0
+    soma_pontos = 0.0
+    for r in resultados:
+        if r.erro is not None:
+            continue
+        total += r.metricas.get("total", 0)
+        wins += r.metricas.get("wins", 0)
+        buys += r.metricas.get("buys", 0)
+        soma_pontos += r.soma_pontos
+        com_pontos += r.com_pontos
+
+    return MetricsEvent(
+        assertividade=round(wins / total * 100, 2) if total else 0.0,
+        pontos_medios=round(soma_pontos / com_pontos, 2) if com_pontos else 0.0,
+        total=total,
+        wins=wins,
+        losses=total - wins,
+        buys=buys,
+        sells=total - buys,
+    )
+
+
+@dataclass
+class RelatorioBacktest:
+    """Relatório combinado de um backtest paralelo."""
+    metricas: Dict[str, Any]
+    shards: List[ResultadoShard]
+    por_simbolo: Dict[str, Dict[str, Any]]
+    barras: int
+    duracao: float
+    falhas: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "metricas": self.metricas,
+            "por_simbolo": self.por_simbolo,
+            "barras": self.barras,
+            "duracao": round(self.duracao, 3),
+            "falhas": self.falhas,
+            "shards": [r.to_dict() for r in self.shards],
+        }
+
+
+def montar_relatorio(resultados: List[ResultadoShard],
+                     duracao: float) -> RelatorioBacktest:
+    por_simbolo: Dict[str, List[ResultadoShard]] = {}
+    for r in resultados:
+        por_simbolo.setdefault(r.shard.simbolo, []).append(r)
+    return RelatorioBacktest(
+        metricas=combinar_metricas(resultados).to_dict(),
+        shards=resultados,
+        por_simbolo={s: combinar_metricas(rs).to_dict()
+                     for s, rs in sorted(por_simbolo.items())},
+        barras=sum(r.barras for r in resultados),
+        duracao=duracao,
+        falhas=sum(1 for r in resultados if r.erro is not None),
+    )
+
+
+# ============================================================
+# ORQUESTRAÇÃO
+# ============================================================
+
+def executar_backtests(shards: Sequence[Shard],
+                       parametros: Optional[Dict[str, Any]] = None,
+                       max_workers: Optional[int] = None, prioridade: int = 0,
+                       tamanho_bloco: int = 50_000,
+                       ao_concluir: Optional[Callable[[ResultadoShard], None]] = None
+                       ) -> RelatorioBacktest:
+    """
+    Distribui os shards em um `ProcessPoolExecutor` (contexto spawn).
+
+    Os CSVs são convertidos para store colunar antes (uma vez por arquivo,
+    no processo atual), de modo que os workers só abrem memory-maps.
+    Um shard que falha entra no relatório com `erro` e não interrompe os
+    demais. `ao_concluir` é chamado a cada shard terminado.
+    """
+    from app.ingestion.bar_store import abrir_ou_converter
+
+    parametros = parametros or {}
+    inicio = time.perf_counter()
+    for caminho in dict.fromkeys(s.caminho for s in shards):
+        try:
+            abrir_ou_converter(caminho)
+        except Exception:
+            pass  # o erro é reportado pelo(s) shard(s) do arquivo
+
+    max_workers = max_workers or os.cpu_count() or 1
+    resultados: Dict[int, ResultadoShard] = {}
+    with ProcessPoolExecutor(max_workers=min(max_workers, max(len(shards), 1)),
+                             mp_context=mp.get_context("spawn"),
+                             initializer=_iniciar_worker,
+                             initargs=(prioridade,)) as pool:
+        futuros = {pool.submit(executar_shard, shard, parametros, tamanho_bloco): i
+                   for i, shard in enumerate(shards)}
+        for futuro in as_completed(futuros):
+            i = futuros[futuro]
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                logger.error(f"Shard {shards[i].nome} falhou: {e}")
+                resultado = ResultadoShard(shard=shards[i], erro=str(e))
+            resultados[i] = resultado
+            if ao_concluir:
+                ao_concluir(resultado)
+
+    return montar_relatorio([resultados[i] for i in range(len(shards))],
+                            time.perf_counter() - inicio)
+
+
+def main(argv: Optional[List[str]] = None):
+    """CLI: `python -m app.ingestion.backtest_paralelo uploads/*.csv --workers 8`"""
+    parser = argparse.ArgumentParser(description="Backtest paralelo de vários CSVs")
+    parser.add_argument("arquivos", nargs="+")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--desde", default=None)
+    parser.add_argument("--ate", default=None)
+    parser.add_argument("--tf", type=int, default=5, help="tf_base_minutos")
+    parser.add_argument("--modulos", action="store_true", help="usar_modulos")
+    parser.add_argument("--saida", default=None, help="arquivo JSON do relatório")
+    args = parser.parse_args(argv)
+
+    shards = montar_shards(args.arquivos, [(args.desde, args.ate)])
+
+    def ao_concluir(r: ResultadoShard):
+        estado = f"erro: {r.erro}" if r.erro else \
+            f"{r.barras} barras, {r.metricas['total']} sinais, {r.duracao:.1f}s"
+        print(f"  ✓ {r.shard.nome}: {estado}")
+
+    relatorio = executar_backtests(
+        shards, {"tf_base_minutos": args.tf, "usar_modulos": args.modulos},
+        max_workers=args.workers, ao_concluir=ao_concluir)
+
+    texto = json.dumps(relatorio.to_dict(), indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto)
+    else:
+        print(json.dumps(relatorio.metricas, indent=2, ensure_ascii=False))
+    print(f"{len(shards)} shards, {relatorio.barras} barras em "
+          f"{relatorio.duracao:.1f}s ({relatorio.falhas} falhas)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Bar Store - Barras em formato colunar binário
+Cada upload é convertido uma única vez em um diretório com uma coluna
+tipada por arquivo (.bin) e um meta.json versionado. A leitura usa
+memory-map (sem parse de texto, sem cópia).
+"""
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from core_engine import Bar, TabelaResultados
+from .csv_stream import TAMANHO_BLOCO, barras_de_colunas, colunas_engine, ler_blocos
+
+VERSAO_ESQUEMA = 1
+EXTENSAO = ".bars"
+
+# Colunas gravadas (mesmos nomes de `SMCCoreEngine.process_many`)
+COLUNAS = {
+    "open": "<f8",
+    "high": "<f8",
+    "low": "<f8",
+    "close": "<f8",
+    "volume": "<f8",
+    "volume_compra": "<f8",
+    "volume_venda": "<f8",
+    "trades": "<f8",
+    "timestamp_hhmm": "<i8",
+    "timestamp": "<i8",  # ns desde a epoch
+}
+
+
+def caminho_store(caminho_csv: str) -> str:
+    """Diretório do store associado a um CSV."""
+    return os.path.splitext(caminho_csv)[0] + EXTENSAO
+
+
+def converter_csv(caminho_csv: str, destino: Optional[str] = None,
+                  tamanho_bloco: int = TAMANHO_BLOCO) -> "BarStore":
+    """
+    Converte o CSV em store colunar, bloco a bloco (memória constante).
+
+    A escrita vai para um diretório temporário único (conversões
+    simultâneas não compartilham o temporário), renomeado no final, de
+    modo que um store incompleto nunca é aberto.
+    """
+    destino = destino or caminho_store(caminho_csv)
+    temporario = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(destino)),
+                                  prefix=os.path.basename(destino) + ".tmp-")
+
+    linhas = 0
+    ts_min = ts_max = None
+    ordenado = True
+    ultimo = None
+    try:
+        arquivos = {nome: open(os.path.join(temporario, f"{nome}.bin"), "wb")
+                    for nome in COLUNAS}
+        try:
+            for bloco in ler_blocos(caminho_csv, tamanho_bloco):
+                colunas = colunas_engine(bloco)
+                colunas["timestamp"] = bloco["timestamp"].astype(np.int64)
+                for nome, dtype in COLUNAS.items():
+                    coluna = np.ascontiguousarray(colunas[nome], dtype=dtype)
+                    coluna.tofile(arquivos[nome])
+
+                ts = colunas["timestamp"]
+                if len(ts):
+                    menor, maior = int(ts.min()), int(ts.max())
+                    ts_min = menor if ts_min is None else min(ts_min, menor)
+                    ts_max = maior if ts_max is None else max(ts_max, maior)
+                    if ultimo is not None and ts[0] < ultimo:
+                        ordenado = False
+                    if (ts[1:] < ts[:-1]).any():
+                        ordenado = False
+                    ultimo = ts[-1]
+                linhas += len(ts)
+        finally:
+            for arquivo in arquivos.values():
+                arquivo.close()
+
+        meta = {
+            "versao": VERSAO_ESQUEMA,
+            "linhas": linhas,
+            "colunas": COLUNAS,
+            "ts_min": ts_min,
+            "ts_max": ts_max,
+            "ordenado": ordenado,
+            "origem": _assinatura(caminho_csv),
+        }
+        with open(os.path.join(temporario, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        shutil.rmtree(destino, ignore_errors=True)
+        os.replace(temporario, destino)
+    except BaseException:
+        shutil.rmtree(temporario, ignore_errors=True)
+        raise
+    return BarStore(destino)
+
+
+def abrir_ou_converter(caminho_csv: str,
+                       tamanho_bloco: int = TAMANHO_BLOCO) -> "BarStore":
+    """
+    Abre o store do CSV; converte apenas se ele não existe, é de outra
+    versão de esquema ou o CSV mudou desde a conversão.
+    """
+    destino = caminho_store(caminho_csv)
+    try:
+        store = BarStore(destino)
+        if (not os.path.exists(caminho_csv)
+                or store.meta.get("origem") == _assinatura(caminho_csv)):
+            return store
+    except (OSError, ValueError, KeyError):
+        pass
+    return converter_csv(caminho_csv, destino, tamanho_bloco)
+
+
+def _assinatura(caminho: str) -> Dict[str, int]:
+    info = os.stat(caminho)
+    return {"tamanho": info.st_size, "mtime_ns": info.st_mtime_ns}
+
+
+class BarStore:
+    """
+    Store colunar aberto via memory-map.
+
+    `colunas` são arrays somente leitura sobre os arquivos; fatias e blocos
+    não copiam dados.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        with open(os.path.join(caminho, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("versao") != VERSAO_ESQUEMA:
+            raise ValueError(
+                f"Versão de esquema não suportada: {self.meta.get('versao')}"
+            )
+
+        self.linhas = int(self.meta["linhas"])
+        self.colunas: Dict[str, np.ndarray] = {}
+        for nome, dtype in self.meta["colunas"].items():
+            arquivo = os.path.join(caminho, f"{nome}.bin")
+            if self.linhas == 0:
+                self.colunas[nome] = np.zeros(0, dtype=dtype)
+            else:
+                self.colunas[nome] = np.memmap(arquivo, dtype=dtype, mode="r",
+                                               shape=(self.linhas,))
+
+    def __len__(self) -> int:
+        return self.linhas
+
+    def __getitem__(self, nome: str) -> np.ndarray:
+        return self.colunas[nome]
+
+    @property
+    def ts_min(self) -> Optional[np.datetime64]:
+        ts = self.meta["ts_min"]
+        return None if ts is None else np.datetime64(ts, "ns")
+
+    @property
+    def ts_max(self) -> Optional[np.datetime64]:
+        ts = self.meta["ts_max"]
+        return None if ts is None else np.datetime64(ts, "ns")
+
+    def fatia(self, inicio: int = 0,
+              fim: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Colunas das linhas [inicio, fim) (views)."""
+        return {nome: coluna[inicio:fim] for nome, coluna in self.colunas.items()}
+
+    def intervalo(self, desde=None, ate=None) -> Dict[str, np.ndarray]:
+        """Colunas entre dois instantes (inclusive); requer store ordenado."""
+        if not self.meta.get("ordenado", False):
+            raise ValueError("Store não ordenado por timestamp")
+        ts = self.colunas["timestamp"]
+        inicio = 0 if desde is None else int(np.searchsorted(
+            ts, np.datetime64(desde, "ns").astype(np.int64), side="left"))
+        fim = None if ate is None else int(np.searchsorted(
+            ts, np.datetime64(ate, "ns").astype(np.int64), side="right"))
+        return self.fatia(inicio, fim)
+
+    def blocos(self,
+               tamanho_bloco: int = TAMANHO_BLOCO) -> Iterator[Dict[str, np.ndarray]]:
+        """Colunas em blocos de até `tamanho_bloco` linhas."""
+        for inicio in range(0, self.linhas, tamanho_bloco):
+            yield self.fatia(inicio, inicio + tamanho_bloco)
+
+    def barras(self, tamanho_bloco: int = TAMANHO_BLOCO) -> Iterator[Bar]:
+        """Barras uma a uma (convertidas bloco a bloco)."""
+        for bloco in self.blocos(tamanho_bloco):
+            yield from barras_de_colunas(bloco)
+
+    def timestamps_iso(self, inicio: int = 0, fim: Optional[int] = None) -> List[str]:
+        """Timestamps como texto ISO (segundos)."""
+        ts = self.colunas["timestamp"][inicio:fim].astype("datetime64[ns]")
+        return np.datetime_as_string(ts, unit="s").tolist()
+
+    def processar(self, engine, tamanho_bloco: int = TAMANHO_BLOCO
+                  ) -> Iterator[Dict[str, np.ndarray]]:
+        """Alimenta o engine pelo caminho vetorizado, bloco a bloco."""
+        for bloco in self.blocos(tamanho_bloco):
+            # "timestamp" do store é o instante em ns; o engine usa HHMM
+            del bloco["timestamp"]
+            yield engine.process_many(bloco)
+
+    def resultados(self, engine,
+                   tamanho_bloco: int = TAMANHO_BLOCO) -> TabelaResultados:
+        """Resultados do engine sobre o store inteiro, numa tabela pré-alocada."""
+        resultados = TabelaResultados(capacidade=self.linhas)
+        for inicio, tabela in zip(range(0, self.linhas, tamanho_bloco),
+                                  self.processar(engine, tamanho_bloco)):
+            resultados.anexar(tabela, inicio)
+        return resultados
+
+    def info(self) -> Dict:
+        """Metadados para a API (timestamps em ISO)."""
+        def iso(ts):
+            return None if ts is None else str(ts.astype("datetime64[s]"))
+
+        return {
+            "linhas": self.linhas,
+            "versao": self.meta["versao"],
+            "ts_min": iso(self.ts_min),
+            "ts_max": iso(self.ts_max),
+            "ordenado": self.meta.get("ordenado", False),
+        }
@@ -1,21 +1,44 @@
-import pandas as pd
+import numpy as np
+
+from .csv_stream import ler_blocos, TAMANHO_BLOCO
 from .schemas import ProfitCSVRow
 
-def load_profit_csv(path: str):
-    df = pd.read_csv(path)
-    rows = []
-
-    for _, r in df.iterrows():
-        rows.append(
-            ProfitCSVRow(
-                timestamp=r["timestamp"],
-                open=r["open"],
-                high=r["high"],
-                low=r["low"],
-                close=r["close"],
-                volume=r["volume"],
-                delta=r["delta"],
-                trades=r["trades"]
+_CAMPOS = ("open", "high", "low", "close", "volume", "delta", "trades")
+
+
+def iter_profit_csv(path: str, tamanho_bloco: int = TAMANHO_BLOCO):
+    """
+    Linhas validadas do CSV do Profit, lidas em blocos.
+
+    A validação é vetorizada por bloco (mesmas regras de `ProfitCSVRow`),
+    e as linhas são construídas sem revalidar uma a uma.
+    """
+    inicio = 0
+    obrigatorias = ("timestamp",) + _CAMPOS
+    for bloco in ler_blocos(path, tamanho_bloco, obrigatorias=obrigatorias):
+        for nome in _CAMPOS:
+            invalidas = np.flatnonzero(np.isnan(bloco[nome]))
+            if len(invalidas):
+                raise ValueError(
+                    f"Linha {inicio + invalidas[0] + 2}: '{nome}' inválido"
+                )
+        trades = bloco["trades"]
+        fracionarias = np.flatnonzero(trades != np.floor(trades))
+        if len(fracionarias):
+            raise ValueError(
+                f"Linha {inicio + fracionarias[0] + 2}: 'trades' deve ser inteiro"
             )
-        )
-    return rows
+
+        colunas = [bloco["timestamp"].astype("datetime64[us]").tolist()]
+        colunas += [bloco[c].tolist() for c in _CAMPOS[:-1]]
+        colunas.append(trades.astype(np.int64).tolist())
+        for ts, o, h, l, c, v, d, t in zip(*colunas):
+            yield ProfitCSVRow.model_construct(
+                timestamp=ts, open=o, high=h, low=l, close=c,
+                volume=v, delta=d, trades=t
+            )
+        inicio += len(trades)
+
+
+def load_profit_csv(path: str):
+    return list(iter_profit_csv(path))
@@ -1,15 +1,24 @@
-import pandas as pd
-
-def parse_csv(path):
-    df = pd.read_csv(path)
-    for _, r in df.iterrows():
-        yield {
-            "ts": r["timestamp"],
-            "open": r["open"],
-            "high": r["high"],
-            "low": r["low"],
-            "close": r["close"],
-            "volume": r["volume"],
-            "delta": r["delta"],
-            "trades": r["trades"]
-        }
+import numpy as np
+
+from .csv_stream import ler_blocos, TAMANHO_BLOCO
+
+_CAMPOS = ("open", "high", "low", "close", "volume", "delta", "trades")
+
+
+def parse_csv(path, tamanho_bloco: int = TAMANHO_BLOCO):
+    """Linhas do CSV como dicts, lidas em blocos (memória constante)."""
+    for bloco in ler_blocos(path, tamanho_bloco, obrigatorias=("timestamp",) + _CAMPOS):
+        colunas = [bloco["timestamp"].astype("datetime64[us]").tolist()]
+        colunas += [bloco[c].tolist() for c in _CAMPOS[:-1]]
+        colunas.append(np.nan_to_num(bloco["trades"]).astype(np.int64).tolist())
+        for ts, o, h, l, c, v, d, t in zip(*colunas):
+            yield {
+                "ts": ts,
+                "open": o,
+                "high": h,
+                "low": l,
+                "close": c,
+                "volume": v,
+                "delta": d,
+                "trades": t
+            }
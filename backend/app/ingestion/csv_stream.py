@@ -0,0 +1,141 @@
+"""
+Ingestão de CSV em streaming
+Leitura em blocos de tamanho fixo, conversão vetorizada por coluna e
+entrega em lotes colunares (ou blocos de `Bar`) direto ao engine.
+A memória fica limitada ao bloco, independente do tamanho do arquivo.
+"""
+from typing import Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+from core_engine import Bar
+
+# Linhas por bloco (~10 MB de colunas float64)
+TAMANHO_BLOCO = 100_000
+
+OBRIGATORIAS = ("timestamp", "open", "high", "low", "close", "volume")
+NUMERICAS = ("open", "high", "low", "close", "volume", "delta", "trades",
+             "aggression_buy", "aggression_sell")
+_CONHECIDAS = frozenset(("timestamp",) + NUMERICAS)
+
+
+def ler_blocos(caminho, tamanho_bloco: int = TAMANHO_BLOCO,
+               obrigatorias=OBRIGATORIAS) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Lê o CSV em blocos de até `tamanho_bloco` linhas.
+
+    Cada bloco é um dict de arrays: "timestamp" (datetime64[ns]),
+    "timestamp_hhmm" (int64) e as colunas numéricas presentes em float64
+    (valores inválidos viram NaN). Colunas desconhecidas não são lidas.
+
+    Raises:
+        ValueError: coluna obrigatória ausente ou timestamp inválido
+    """
+    leitor = pd.read_csv(caminho, chunksize=tamanho_bloco,
+                         usecols=lambda c: c in _CONHECIDAS, dtype={"timestamp": str})
+    inicio = 0
+    with leitor:
+        for df in leitor:
+            faltando = [c for c in obrigatorias if c not in df.columns]
+            if faltando:
+                raise ValueError(f"Colunas faltantes: {faltando}")
+
+            bloco: Dict[str, np.ndarray] = {}
+            if "timestamp" in df.columns:
+                ts = pd.to_datetime(df["timestamp"]).to_numpy(dtype="datetime64[ns]")
+                sem_data = np.flatnonzero(np.isnat(ts))
+                if len(sem_data):
+                    raise ValueError(
+                        f"Linha {inicio + sem_data[0] + 2}: 'timestamp' inválido"
+                    )
+                bloco["timestamp"] = ts
+                bloco["timestamp_hhmm"] = hhmm(ts)
+            for nome in NUMERICAS:
+                if nome in df.columns:
+                    bloco[nome] = pd.to_numeric(df[nome], errors="coerce").to_numpy(
+                        dtype=np.float64, na_value=np.nan)
+            inicio += len(df)
+            yield bloco
+
+
+def hhmm(timestamps: np.ndarray) -> np.ndarray:
+    """Horário HHMM (int64) de um array datetime64."""
+    minutos = (timestamps - timestamps.astype("datetime64[D]")).astype("timedelta64[m]")
+    minutos = minutos.astype(np.int64)
+    return (minutos // 60) * 100 + minutos % 60
+
+
+def colunas_engine(bloco: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Converte um bloco lido em colunas de `SMCCoreEngine.process_many`.
+
+    NaN vira 0. O volume comprador/vendedor vem das colunas de agressão;
+    sem elas, do saldo (`delta` = compra - venda).
+    """
+    def coluna(nome):
+        valores = bloco.get(nome)
+        if valores is None:
+            return np.zeros(n)
+        return np.nan_to_num(valores, nan=0.0)
+
+    n = len(bloco["close"])
+    volume = coluna("volume")
+    if "aggression_buy" in bloco or "aggression_sell" in bloco:
+        compra, venda = coluna("aggression_buy"), coluna("aggression_sell")
+    elif "delta" in bloco:
+        delta = coluna("delta")
+        compra, venda = (volume + delta) / 2, (volume - delta) / 2
+    else:
+        compra = venda = np.zeros(n)
+
+    return {
+        "open": coluna("open"),
+        "high": coluna("high"),
+        "low": coluna("low"),
+        "close": coluna("close"),
+        "volume": volume,
+        "volume_compra": compra,
+        "volume_venda": venda,
+        "trades": coluna("trades"),
+        "timestamp_hhmm": bloco.get("timestamp_hhmm", np.zeros(n, dtype=np.int64)),
+    }
+
+
+def barras_de_colunas(c: Dict[str, np.ndarray]) -> List[Bar]:
+    """Bloco de `Bar` a partir de colunas no formato de `colunas_engine`."""
+    return list(map(
+        Bar,
+        c["open"].tolist(), c["high"].tolist(), c["low"].tolist(),
+        c["close"].tolist(), c["volume"].tolist(),
+        c["volume_compra"].tolist(), c["volume_venda"].tolist(),
+        c["trades"].astype(np.int64).tolist(),
+        [0.0] * len(c["close"]),
+        c["timestamp_hhmm"].tolist(),
+    ))
+
+
+def blocos_de_barras(caminho,
+                     tamanho_bloco: int = TAMANHO_BLOCO) -> Iterator[List[Bar]]:
+    """Blocos de `Bar` prontos para `engine.process`, um por bloco lido."""
+    for bloco in ler_blocos(caminho, tamanho_bloco):
+        yield barras_de_colunas(colunas_engine(bloco))
+
+
+def iter_barras(caminho, tamanho_bloco: int = TAMANHO_BLOCO) -> Iterator[Bar]:
+    """Barras do CSV, uma a uma, lidas em blocos."""
+    for barras in blocos_de_barras(caminho, tamanho_bloco):
+        yield from barras
+
+
+def processar_csv(engine, caminho, tamanho_bloco: int = TAMANHO_BLOCO
+                  ) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Alimenta o engine bloco a bloco pelo caminho vetorizado (`process_many`).
+
+    Yields:
+        A tabela de resultados de cada bloco (o estado do engine continua
+        entre blocos, como no streaming barra a barra)
+    """
+    for bloco in ler_blocos(caminho, tamanho_bloco):
+        yield engine.process_many(colunas_engine(bloco))
@@ -3,12 +3,22 @@ import os, uuid
 import asyncio
 from ..auth.dependencies import get_current_user
 from .replay_runner import ReplayRunner
+from .bar_store import BarStore, abrir_ou_converter, caminho_store
+from .upload_stream import receber_upload, UploadInvalido, UploadGrandeDemais
+from .upload_cache import CacheUploads
+from .jobs import Job, FilaCheia, fila_backtests
+from ..config import settings
 
 router = APIRouter()
 
 UPLOAD_DIR = "data/uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Uploads endereçados por conteúdo (file_id = SHA-256 do CSV)
+cache_uploads = CacheUploads(
+    UPLOAD_DIR, max_bytes=int(float(os.getenv("UPLOAD_CACHE_MB", "2048")) * 1024 * 1024)
+)
+
 @router.post("/upload")
 async def upload_csv(
     file: UploadFile = File(...),
@@ -17,29 +27,137 @@ async def upload_csv(
     if not file.filename.endswith(".csv"):
         raise HTTPException(400, "Arquivo inválido")
 
-    file_id = f"{uuid.uuid4()}.csv"
-    path = os.path.join(UPLOAD_DIR, file_id)
+    temporario = os.path.join(UPLOAD_DIR, f"recebendo-{uuid.uuid4()}.csv")
+
+    # Streaming: chunks gravados em disco, validados e hasheados na chegada
+    try:
+        recebido = await receber_upload(
+            file, temporario, max_bytes=settings.MAX_FILE_SIZE_MB * 1024 * 1024
+        )
+    except UploadGrandeDemais as e:
+        raise HTTPException(413, str(e))
+    except UploadInvalido as e:
+        raise HTTPException(400, f"CSV inválido: {e}")
+
+    # Conteúdo repetido reaproveita o store já convertido; novo é convertido
+    # uma única vez
+    try:
+        store, duplicado = await asyncio.to_thread(
+            cache_uploads.adotar, recebido.sha256, temporario
+        )
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(400, f"CSV inválido: {e}")
+
+    return {
+        "status": "duplicate" if duplicado else "uploaded",
+        "file_id": recebido.sha256,
+        "bytes": recebido.bytes,
+        "sha256": recebido.sha256,
+        "dados": store.info(),
+    }
+
+
+def _abrir_store(file_id: str) -> BarStore:
+    """Store do upload: cache por conteúdo ou arquivo legado em UPLOAD_DIR."""
+    store = cache_uploads.store(file_id) if cache_uploads.contem(file_id) else None
+    if store is not None:
+        return store
+    path = os.path.join(UPLOAD_DIR, os.path.basename(file_id))
+    if not os.path.exists(path) and not os.path.isdir(caminho_store(path)):
+        raise FileNotFoundError(file_id)
+    return abrir_ou_converter(path)
+
+
+def _guardar_resultado(job: Job):
+    """Resultados de jobs concluídos vão para o cache do upload."""
+    if cache_uploads.contem(job.file_id):
+        asyncio.get_running_loop().run_in_executor(
+            None, cache_uploads.salvar_resultado,
+            job.file_id, job.parametros, job.resultado
+        )
+
+
+fila_backtests.ao_concluir = _guardar_resultado
 
-    with open(path, "wb") as f:
-        f.write(await file.read())
 
-    # TODO: Integração com o replay runner
-    # Por enquanto, apenas retorna o resultado do upload
-    # run_replay(path, user.id)
+def _preparar_backtest(file_id: str, parametros: dict) -> tuple:
+    """(resultado em cache, caminho do store) — o store é criado se preciso."""
+    if cache_uploads.contem(file_id):
+        resumo = cache_uploads.resultado(file_id, parametros)
+        if resumo is not None:
+            return resumo, None
+    return None, _abrir_store(file_id).caminho
 
-    return {"status": "uploaded", "file_id": file_id, "path": path}
+
+def _job_do_usuario(job_id: str, user) -> Job:
+    job = fila_backtests.get(job_id)
+    if job is None or job.usuario != user.id:
+        raise HTTPException(404, "Job não encontrado")
+    return job
 
 
 @router.post("/backtest")
 async def run_backtest(
     file_id: str,
+    tf_base_minutos: int = settings.SMC_TF_BASE_MINUTOS,
+    modo_operacao: int = settings.SMC_MODO_OPERACAO,
+    tipo_ativo: int = settings.SMC_TIPO_ATIVO,
     user=Depends(get_current_user)
 ):
-    """Roda backtest com arquivo já carregado"""
-    path = os.path.join(UPLOAD_DIR, file_id)
-    
-    if not os.path.exists(path):
+    """
+    Enfileira um backtest do arquivo já carregado.
+
+    Resultado já calculado (mesmo conteúdo, engine e parâmetros) volta na
+    hora; senão retorna o `job_id`, com progresso na room "replay".
+    """
+    parametros = {
+        "tf_base_minutos": tf_base_minutos,
+        "modo_operacao": modo_operacao,
+        "tipo_ativo": tipo_ativo,
+        "usar_modulos": os.getenv("SMC_MODULOS", "false").lower() == "true",
+    }
+    try:
+        resumo, caminho = await asyncio.to_thread(
+            _preparar_backtest, file_id, parametros
+        )
+    except FileNotFoundError:
         raise HTTPException(404, "Arquivo não encontrado")
-    
-    # TODO: Integrar com ReplayRunner
-    return {"status": "processing", "file_id": file_id}
+    except (ValueError, OSError) as e:
+        raise HTTPException(400, f"Falha no backtest: {e}")
+
+    if resumo is not None:
+        return {"status": "completed", "file_id": file_id, "cache": True, **resumo}
+
+    try:
+        job = fila_backtests.submeter(file_id, caminho, parametros, usuario=user.id)
+    except FilaCheia as e:
+        raise HTTPException(429, str(e))
+    return {"status": job.status, "file_id": file_id, "job_id": job.job_id}
+
+
+@router.get("/backtest/jobs")
+async def list_backtests(user=Depends(get_current_user)):
+    """Backtests do usuário (ativos e histórico)"""
+    return [job.to_dict() for job in fila_backtests.listar(usuario=user.id)]
+
+
+@router.get("/backtest/{job_id}")
+async def get_backtest(job_id: str, user=Depends(get_current_user)):
+    """Status, progresso e resultado de um backtest"""
+    return _job_do_usuario(job_id, user).to_dict()
+
+
+@router.post("/backtest/{job_id}/{acao}")
+async def control_backtest(job_id: str, acao: str, user=Depends(get_current_user)):
+    """Controle do job: cancel, pause ou resume"""
+    job = _job_do_usuario(job_id, user)
+    acoes = {
+        "cancel": fila_backtests.cancelar,
+        "pause": fila_backtests.pausar,
+        "resume": fila_backtests.retomar,
+    }
+    if acao not in acoes:
+        raise HTTPException(400, "Ação inválida (cancel, pause, resume)")
+    if not acoes[acao](job_id):
+        raise HTTPException(409, f"Job em estado '{job.status}'")
+    return job.to_dict()
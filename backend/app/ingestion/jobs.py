@@ -0,0 +1,362 @@
+"""
+Fila de Backtests - Jobs em segundo plano
+Execução em pool de processos (CPU fora do event loop e do GIL do
+servidor), com id de job, progresso via room "replay", pausa,
+cancelamento e guarda dos resultados.
+"""
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Controle por slot (memória compartilhada com os workers)
+EXECUTAR, PAUSAR, CANCELAR = 0, 1, 2
+
+# Intervalo entre broadcasts de progresso (s)
+INTERVALO_PROGRESSO = 0.5
+
+
+# ============================================================
+# LADO DO WORKER
+# ============================================================
+_controle = None
+_progresso = None
+
+
+def _iniciar_worker(controle, progresso, prioridade: int):
+    """Initializer do pool: recebe a memória compartilhada e baixa a prioridade."""
+    global _controle, _progresso
+    _controle, _progresso = controle, progresso
+    if prioridade and hasattr(os, "nice"):
+        try:
+            os.nice(prioridade)
+        except OSError:
+            pass
+
+
+class BacktestCancelado(Exception):
+    """Job cancelado durante a execução."""
+
+
+def resumir_backtest(
+    store, parametros: Dict[str, Any], tamanho_bloco: int = 50_000,
+    a_cada_bloco: Optional[Callable[[int], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Roda o engine sobre um BarStore pelo caminho vetorizado e resume o resultado.
+
+    `a_cada_bloco(linhas_processadas)` é chamado entre blocos (progresso,
+    pausa e cancelamento).
+    """
+    from core_engine import SMCCoreEngine
+
+    engine = SMCCoreEngine(**parametros)
+    resultados = compras = vendas = processadas = 0
+    for tabela in store.processar(engine, tamanho_bloco):
+        resultados += len(tabela["indice"])
+        compras += int(np.count_nonzero(tabela["permissao_compra"]))
+        vendas += int(np.count_nonzero(tabela["permissao_venda"]))
+        processadas = min(len(store), processadas + tamanho_bloco)
+        if a_cada_bloco:
+            a_cada_bloco(processadas)
+    return {
+        "dados": store.info(),
+        "resultados": resultados,
+        "sinais_compra": compras,
+        "sinais_venda": vendas,
+    }
+
+
+def _executar(slot: int, caminho_store: str, parametros: Dict[str, Any],
+              tamanho_bloco: int) -> Dict[str, Any]:
+    """
+    Job no processo worker: lê o store via memory-map e obedece ao controle
+    do slot.
+    """
+    from app.ingestion.bar_store import BarStore
+
+    store = BarStore(caminho_store)
+    total = max(len(store), 1)
+
+    def a_cada_bloco(processadas: int):
+        _progresso[slot] = processadas / total
+        while _controle[slot] == PAUSAR:
+            time.sleep(0.1)
+        if _controle[slot] == CANCELAR:
+            raise BacktestCancelado()
+
+    a_cada_bloco(0)
+    return resumir_backtest(store, parametros, tamanho_bloco, a_cada_bloco)
+
+
+# ============================================================
+# LADO DO SERVIDOR
+# ============================================================
+@dataclass
+class Job:
+    """Estado de um backtest na fila."""
+    job_id: str
+    file_id: str
+    parametros: Dict[str, Any]
+    usuario: Optional[Any] = None
+    status: str = "queued"  # queued, running, paused, completed, cancelled, failed
+    progresso: float = 0.0
+    resultado: Optional[Dict[str, Any]] = None
+    erro: Optional[str] = None
+    criado_em: float = field(default_factory=time.time)
+    concluido_em: Optional[float] = None
+    slot: int = -1
+    caminho_store: Optional[str] = field(default=None, repr=False)
+    _future: Any = field(default=None, repr=False)
+
+    @property
+    def ativo(self) -> bool:
+        return self.status in ("queued", "running", "paused")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "file_id": self.file_id,
+            "parametros": self.parametros,
+            "status": self.status,
+            "progresso": round(self.progresso * 100, 1),
+            "resultado": self.resultado,
+            "erro": self.erro,
+            "criado_em": self.criado_em,
+            "concluido_em": self.concluido_em,
+        }
+
+
+class FilaCheia(Exception):
+    """Sem slots livres para novos jobs."""
+
+
+class FilaBacktests:
+    """
+    Fila de backtests sobre um `ProcessPoolExecutor`.
+
+    - `max_workers` processos (prioridade reduzida com `nice`), para que
+      backtests concorrentes não disputem CPU com o caminho ao vivo
+    - até `max_jobs` jobs ativos (na fila ou rodando); cada um ocupa um
+      slot de memória compartilhada com progresso e controle
+      (executar/pausar/cancelar), lido pelo worker entre blocos
+    - a fila de espera é própria: no pool entram só `max_workers` jobs por
+      vez, então pausar ou cancelar um job que ainda não começou só o tira
+      da fila, sem prender um worker
+    - jobs concluídos ficam no histórico (até `max_historico`) e os
+      resultados são entregues a `ao_concluir` (ex.: cache de uploads)
+    """
+
+    def __init__(self, max_workers: int = 1, max_jobs: int = 16,
+                 max_historico: int = 200, prioridade: int = 10,
+                 tamanho_bloco: int = 50_000):
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self.max_historico = max_historico
+        self.prioridade = prioridade
+        self.tamanho_bloco = tamanho_bloco
+        self.ao_concluir: Optional[Callable[[Job], None]] = None
+
+        self.jobs: Dict[str, Job] = {}
+        self._contexto = mp.get_context("spawn")
+        self._controle = self._contexto.Array("b", max_jobs, lock=False)
+        self._progresso = self._contexto.Array("d", max_jobs, lock=False)
+        self._slots_livres: List[int] = list(range(max_jobs))
+        # Jobs aguardando um worker (pausados na espera ficam fora)
+        self._pendentes: Deque[Job] = deque()
+        self._em_execucao = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._monitor: Optional[asyncio.Task] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=self._contexto,
+                initializer=_iniciar_worker,
+                initargs=(self._controle, self._progresso, self.prioridade),
+            )
+        return self._pool
+
+    # ============================================================
+    # SUBMISSÃO E CONTROLE
+    # ============================================================
+
+    def submeter(self, file_id: str, caminho_store: str, parametros: Dict[str, Any],
+                 usuario: Any = None) -> Job:
+        """Enfileira um backtest (deve ser chamado no event loop)."""
+        if not self._slots_livres:
+            raise FilaCheia(f"Limite de {self.max_jobs} backtests ativos")
+        slot = self._slots_livres.pop()
+        self._controle[slot] = EXECUTAR
+        self._progresso[slot] = -1.0  # ainda não iniciado
+
+        job = Job(job_id=uuid.uuid4().hex, file_id=file_id,
+                  parametros=parametros, usuario=usuario, slot=slot,
+                  caminho_store=caminho_store)
+        self.jobs[job.job_id] = job
+        self._podar_historico()
+        self._pendentes.append(job)
+        self._despachar()
+
+        if self._monitor is None or self._monitor.done():
+            self._monitor = asyncio.get_running_loop().create_task(self._monitorar())
+        return job
+
+    def _despachar(self):
+        """Manda jobs da fila de espera ao pool enquanto houver worker livre."""
+        loop = asyncio.get_running_loop()
+        while self._pendentes and self._em_execucao < self.max_workers:
+            job = self._pendentes.popleft()
+            future = self._executor().submit(_executar, job.slot, job.caminho_store,
+                                             job.parametros, self.tamanho_bloco)
+            job._future = future
+            self._em_execucao += 1
+            asyncio.wrap_future(future, loop=loop).add_done_callback(
+                lambda f, job=job: self._finalizar(job, f))
+
+    def _retirar(self, job: Job) -> bool:
+        """Tira da fila de espera um job que ainda não foi ao pool."""
+        if job._future is not None:
+            return False
+        if job in self._pendentes:
+            self._pendentes.remove(job)
+        return True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def listar(self, usuario: Any = None) -> List[Job]:
+        jobs = self.jobs.values()
+        if usuario is not None:
+            jobs = [j for j in jobs if j.usuario == usuario]
+        return sorted(jobs, key=lambda j: j.criado_em, reverse=True)
+
+    def cancelar(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or not job.ativo:
+            return False
+        if self._retirar(job):  # ainda na fila de espera
+            job.status = "cancelled"
+            self._liberar(job)
+            return True
+        if job._future.cancel():  # ainda na fila do pool
+            return True
+        self._controle[job.slot] = CANCELAR
+        return True
+
+    def pausar(self, job_id: str) -> bool:
+        """
+        Pausa um job. Na fila de espera ele só sai da fila (não ocupa
+        worker); rodando, o worker para no próximo bloco.
+        """
+        job = self.jobs.get(job_id)
+        if job is None or not job.ativo:
+            return False
+        if not self._retirar(job):
+            self._controle[job.slot] = PAUSAR
+        job.status = "paused"
+        return True
+
+    def retomar(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.status != "paused":
+            return False
+        if job._future is None:  # pausado antes de ir ao pool: volta à fila
+            job.status = "queued"
+            self._pendentes.append(job)
+            self._despachar()
+            return True
+        self._controle[job.slot] = EXECUTAR
+        job.status = "running" if self._progresso[job.slot] >= 0 else "queued"
+        return True
+
+    # ============================================================
+    # CICLO DE VIDA
+    # ============================================================
+
+    def _finalizar(self, job: Job, future: asyncio.Future):
+        self._em_execucao -= 1
+        if future.cancelled():
+            job.status = "cancelled"
+        elif isinstance(future.exception(), BacktestCancelado):
+            job.status = "cancelled"
+        elif future.exception() is not None:
+            job.status = "failed"
+            job.erro = str(future.exception())
+            logger.error(f"Backtest {job.job_id} falhou: {job.erro}")
+        else:
+            job.status = "completed"
+            job.progresso = 1.0
+            job.resultado = future.result()
+            if self.ao_concluir:
+                try:
+                    self.ao_concluir(job)
+                except Exception as e:
+                    logger.warning(f"Falha ao guardar resultado de {job.job_id}: {e}")
+        self._liberar(job)
+        self._despachar()
+
+    def _liberar(self, job: Job):
+        """Fecha o job já finalizado: devolve o slot e publica o status."""
+        job.concluido_em = time.time()
+        self._controle[job.slot] = EXECUTAR
+        self._slots_livres.append(job.slot)
+        job.slot = -1
+        asyncio.get_running_loop().create_task(self._broadcast(job))
+
+    async def _monitorar(self):
+        """Publica o progresso dos jobs ativos na room "replay" até a fila esvaziar."""
+        while any(j.ativo for j in self.jobs.values()):
+            for job in list(self.jobs.values()):
+                if not job.ativo or job.slot < 0:
+                    continue
+                progresso = self._progresso[job.slot]
+                if progresso < 0:
+                    continue
+                if job.status == "queued":
+                    job.status = "running"
+                if progresso != job.progresso:
+                    job.progresso = progresso
+                    await self._broadcast(job)
+            await asyncio.sleep(INTERVALO_PROGRESSO)
+
+    async def _broadcast(self, job: Job):
+        from app.websocket.manager import manager as ws_manager
+
+        dados = job.to_dict()
+        if job.ativo:
+            dados.pop("resultado")
+        await ws_manager.broadcast_replay({"type": f"backtest_{job.status}", **dados})
+
+    def _podar_historico(self):
+        concluidos = [j for j in self.jobs.values() if not j.ativo]
+        excesso = len(self.jobs) - self.max_historico
+        for job in sorted(concluidos, key=lambda j: j.criado_em)[:max(excesso, 0)]:
+            del self.jobs[job.job_id]
+
+    def encerrar(self):
+        """Cancela os jobs ativos e encerra o pool."""
+        self._pendentes.clear()
+        for job in list(self.jobs.values()):
+            if job.ativo:
+                self.cancelar(job.job_id)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+fila_backtests = FilaBacktests(
+    max_workers=int(os.getenv("BACKTEST_WORKERS", "1")),
+    max_jobs=int(os.getenv("BACKTEST_MAX_JOBS", "16")),
+)
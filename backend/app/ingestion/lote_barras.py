@@ -0,0 +1,205 @@
+"""
+Lote de Barras - Várias barras por requisição
+Corpo colunar (um array por campo) processado em ordem pelo engine do
+ativo, pelo caminho vetorizado. A resposta traz todos os resultados
+(colunar) ou só o último mais os eventos emitidos no lote.
+
+O processamento roda numa thread de trabalho (fora do event loop), sob
+uma trava por engine: dois lotes — ou um lote e uma barra avulsa — nunca
+se intercalam no mesmo engine. A trava só é liberada quando a thread
+termina, mesmo se a requisição for cancelada no meio.
+"""
+import asyncio
+import os
+import weakref
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+from pydantic import BaseModel, model_validator
+
+from core_engine import BARRAS_AQUECIMENTO, BarBuffer, SMCResult
+
+MAX_BARRAS_LOTE = int(os.getenv("MAX_BARRAS_LOTE", "10000"))
+# Com os módulos HFZ/FBI/DTM/SDA/MTV o custo por barra é bem maior
+MAX_BARRAS_LOTE_MODULOS = int(os.getenv("MAX_BARRAS_LOTE_MODULOS", "2000"))
+
+CAMPOS_OBRIGATORIOS = ("open", "high", "low", "close")
+CAMPOS_ACEITOS = set(BarBuffer.COLUNAS) | {"timestamp_hhmm"}
+
+# Flags do resultado reportadas como eventos no retorno "ultimo"
+EVENTOS = (
+    "permissao_compra", "permissao_venda", "evento_score_alto", "evento_trap",
+    "evento_confluencia", "evento_divergencia", "evento_contato_zona",
+)
+
+
+class BarrasInput(BaseModel):
+    """
+    N barras em formato colunar, ex.:
+    `{"ativo": "WIN", "colunas": {"open": [...], "high": [...], ...}}`.
+
+    Campos ausentes (exceto open/high/low/close) valem zero, como no
+    `process_many`; `tick_minimo` vale para todo o lote.
+    """
+    colunas: Dict[str, List[float]]
+    tick_minimo: float = 5.0
+    ativo: str = "WIN"
+    timeframe: Optional[int] = None  # minutos; default TF_BASE
+    retorno: Literal["todos", "ultimo"] = "ultimo"
+
+    @model_validator(mode="after")
+    def _validar_colunas(self):
+        faltando = [c for c in CAMPOS_OBRIGATORIOS if c not in self.colunas]
+        if faltando:
+            raise ValueError(f"Colunas faltantes: {faltando}")
+        desconhecidas = sorted(set(self.colunas) - CAMPOS_ACEITOS)
+        if desconhecidas:
+            raise ValueError(f"Colunas desconhecidas: {desconhecidas}")
+        tamanhos = {len(v) for v in self.colunas.values()}
+        if len(tamanhos) != 1:
+            raise ValueError("Todas as colunas precisam ter o mesmo tamanho")
+        n = tamanhos.pop()
+        if not 0 < n <= MAX_BARRAS_LOTE:
+            raise ValueError(f"Lote deve ter entre 1 e {MAX_BARRAS_LOTE} barras")
+        return self
+
+    @property
+    def n(self) -> int:
+        return len(self.colunas["close"])
+
+
+def processar_lote(engine, corpo: BarrasInput) -> Dict[str, np.ndarray]:
+    """
+    Passa as barras pelo engine em ordem (equivalente a `process` barra a
+    barra). Returns: tabela do `process_many` — uma linha por barra
+    pós-aquecimento, com `indice` = posição no lote.
+    """
+    colunas = {nome: np.asarray(valores, dtype=np.float64)
+               for nome, valores in corpo.colunas.items()}
+    colunas["tick_minimo"] = corpo.tick_minimo
+    return engine.process_many(colunas)
+
+
+def limite_lote(engine) -> int:
+    """Máximo de barras por lote para o engine (menor com módulos)."""
+    if engine.pipeline is not None:
+        return min(MAX_BARRAS_LOTE, MAX_BARRAS_LOTE_MODULOS)
+    return MAX_BARRAS_LOTE
+
+
+_travas: "weakref.WeakKeyDictionary[Any, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+
+def trava_engine(engine) -> asyncio.Lock:
+    """Trava (asyncio) do engine; serializa lotes e barras avulsas."""
+    trava = _travas.get(engine)
+    if trava is None:
+        trava = _travas[engine] = asyncio.Lock()
+    return trava
+
+
+def _valor(coluna: np.ndarray, linha: int) -> Any:
+    valor = coluna[linha]
+    return valor.item() if hasattr(valor, "item") else valor
+
+
+def eventos(tabela: Dict[str, np.ndarray]) -> List[Tuple[int, List[str]]]:
+    """(linha, flags ligadas) das linhas da tabela com algum evento."""
+    presentes = [nome for nome in EVENTOS if nome in tabela]
+    if not presentes:
+        return []
+    algum = np.logical_or.reduce([np.asarray(tabela[nome], dtype=bool)
+                                  for nome in presentes])
+    return [(linha, [nome for nome in presentes if tabela[nome][linha]])
+            for linha in np.flatnonzero(algum).tolist()]
+
+
+def resposta_lote(engine, corpo: BarrasInput, tabela: Dict[str, np.ndarray],
+                  para_dict: Callable[[SMCResult], Dict[str, Any]]
+                  ) -> Tuple[Optional[SMCResult], Dict[str, Any]]:
+    """
+    Monta a resposta do lote. Returns: (último resultado ou None, resposta).
+
+    - "todos": `resultados` colunar (`indice` + um array por campo de
+      `para_dict`)
+    - "ultimo": o último resultado e a lista de barras do lote com eventos;
+      nenhuma linha vira SMCResult (o último já é o `ultimo_resultado` do
+      engine) e os eventos saem direto da tabela
+    """
+    indices = tabela["indice"].tolist()
+    n = len(indices)
+    resposta: Dict[str, Any] = {
+        "ativo": corpo.ativo,
+        "barras": corpo.n,
+        "processadas": engine.contador_barras,
+        "aquecendo": not n,
+    }
+    if not n:
+        resposta["barras_restantes"] = max(
+            0, BARRAS_AQUECIMENTO - engine.contador_barras)
+
+    if corpo.retorno == "todos":
+        resultados = [engine.resultado_da_tabela(tabela, i) for i in range(n)]
+        linhas = [para_dict(r) for r in resultados]
+        colunas: Dict[str, List[Any]] = {"indice": indices}
+        for campo in (linhas[0] if linhas else {}):
+            colunas[campo] = [linha[campo] for linha in linhas]
+        resposta["resultados"] = colunas
+        return (resultados[-1] if resultados else None), resposta
+
+    ultimo = engine.ultimo_resultado if n else None
+    resposta["ultimo"] = para_dict(ultimo) if ultimo is not None else None
+    hhmm = corpo.colunas.get("timestamp_hhmm")
+    resposta["eventos"] = [
+        {
+            "indice": indices[linha],
+            "timestamp_hhmm": int(hhmm[indices[linha]]) if hhmm is not None else None,
+            "eventos": nomes,
+            "direcao": _valor(tabela["direcao"], linha),
+            "score_final": round(_valor(tabela["score_final"], linha), 1),
+        }
+        for linha, nomes in eventos(tabela)
+    ]
+    return ultimo, resposta
+
+
+async def _ate_terminar(tarefa: "asyncio.Future[Any]") -> Any:
+    """
+    Aguarda a tarefa; se quem aguarda for cancelado, continua esperando
+    até ela terminar (a thread não pode ser interrompida) e só então
+    repassa o cancelamento.
+    """
+    cancelado = False
+    while True:
+        try:
+            resultado = await asyncio.shield(tarefa)
+            break
+        except asyncio.CancelledError:
+            if tarefa.done():
+                raise
+            cancelado = True
+    if cancelado:
+        raise asyncio.CancelledError
+    return resultado
+
+
+async def executar_lote(engine, corpo: BarrasInput,
+                        para_dict: Callable[[SMCResult], Dict[str, Any]]
+                        ) -> Tuple[Optional[SMCResult], Dict[str, Any]]:
+    """
+    Processa o lote numa thread de trabalho, sob a trava do engine.
+    Returns: (último resultado ou None, resposta do lote).
+
+    Lotes acima de `limite_lote(engine)` viram HTTP 413.
+    """
+    limite = limite_lote(engine)
+    if corpo.n > limite:
+        raise HTTPException(413, f"Lote deve ter no máximo {limite} barras")
+
+    def trabalho():
+        return resposta_lote(engine, corpo, processar_lote(engine, corpo), para_dict)
+
+    async with trava_engine(engine):
+        tarefa = asyncio.ensure_future(asyncio.to_thread(trabalho))
+        return await _ate_terminar(tarefa)
@@ -3,165 +3,306 @@ Replay Runner - Backtest Unificado com o Motor SMC
 O mesmo motor roda tanto em tempo real quanto em replay/backtest
 """
 import asyncio
+import time
 from datetime import datetime
-from typing import Optional, List, Callable
-from app.ingestion.csv_parser import parse_csv
+from typing import Optional, List, Callable, Dict, Iterator, Union
+import numpy as np
+from app.ingestion.bar_store import BarStore, abrir_ou_converter
+from app.ingestion.csv_stream import barras_de_colunas
 from app.events.schema import SignalEvent, SignalSource, SignalMode
-from app.signals.manager import signal_manager
+from app.signals.manager import SignalManager, signal_manager
 from app.websocket.manager import manager as ws_manager
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Fonte colunar: BarStore ou dict de arrays (colunas de process_many)
+FonteColunar = Union[BarStore, Dict[str, np.ndarray]]
+_COLUNAS_BARRA = ("open", "volume", "volume_compra", "volume_venda", "trades",
+                  "timestamp_hhmm")
+
 
 class ReplayRunner:
     """
     Runner para Replay/Backtest usando o Motor SMC
-    
+
     Características:
     - Usa o MESMO motor SMC que o tempo real
     - Gera eventos no formato padronizado
     - Suporta replay via WebSocket
     - Calcula métricas em tempo real
+    - Modo `fast_forward`: sem pausas entre barras, progresso limitado
+      por tempo e, com fonte colunar, engine vetorizado bloco a bloco
     """
-    
-    def __init__(self, core_engine, speed: float = 1.0):
+
+    def __init__(self, core_engine, speed: float = 1.0, fast_forward: bool = False,
+                 intervalo_progresso: float = 0.5, tamanho_bloco: int = 20_000,
+                 gerenciador: Optional[SignalManager] = None, symbol: str = "WIN$",
+                 transmitir: bool = True):
         """
         Args:
             core_engine: Instância do SMCCoreEngine
             speed: Multiplicador de velocidade (1.0 = tempo real, 10.0 = 10x mais rápido)
+            fast_forward: Backtest o mais rápido possível (ignora `speed`)
+            intervalo_progresso: Segundos mínimos entre broadcasts de progresso
+            tamanho_bloco: Barras por bloco no caminho colunar
+            gerenciador: SignalManager dos sinais (padrão: o singleton global)
+            symbol: Ativo dos sinais gerados
+            transmitir: Publica início, progresso e conclusão via WebSocket
         """
         self.core_engine = core_engine
+        self.signal_manager = gerenciador or signal_manager
+        self.symbol = symbol
+        self.transmitir = transmitir
         self.speed = speed
+        self.fast_forward = fast_forward
+        self.intervalo_progresso = intervalo_progresso
+        self.tamanho_bloco = tamanho_bloco
         self.is_running = False
         self.is_paused = False
         self.current_bar_index = 0
         self.total_bars = 0
         self.bars: List = []
-        
+        self.fonte: Optional[FonteColunar] = None
+        self._ultimo_progresso = 0.0
+
         # Callbacks
         self.on_signal: Optional[Callable] = None
         self.on_bar: Optional[Callable] = None
         self.on_complete: Optional[Callable] = None
-    
+
     async def load_csv(self, csv_path: str) -> int:
         """
-        Carrega dados CSV para replay
-        
+        Carrega dados CSV para replay (via store colunar: o CSV só é
+        parseado na primeira vez; as barras são lidas sob demanda)
+
         Returns:
             Número de barras carregadas
         """
-        self.bars = parse_csv(csv_path)
-        self.total_bars = len(self.bars)
+        store = await asyncio.to_thread(abrir_ou_converter, csv_path)
+        return await self.load_columns(store)
+
+    async def load_columns(self, fonte: FonteColunar) -> int:
+        """
+        Carrega uma fonte colunar (BarStore ou dict de arrays)
+
+        Returns:
+            Número de barras carregadas
+        """
+        self.fonte = fonte
+        self.bars = (bar for bloco in self._blocos()
+                     for bar in barras_de_colunas(bloco))
+        self.total_bars = (len(fonte) if isinstance(fonte, BarStore)
+                           else len(fonte["close"]))
         self.current_bar_index = 0
-        
+
         logger.info(f"Loaded {self.total_bars} bars for replay")
-        
+
         # Broadcast de início de replay
-        await ws_manager.broadcast_replay({
+        await self._transmitir({
             "type": "replay_start",
             "total_bars": self.total_bars,
-            "speed": self.speed
+            "speed": "max" if self.fast_forward else self.speed
         })
-        
+
         return self.total_bars
-    
-    async def run(self, csv_path: str = None, bars: List = None):
+
+    async def run(self, csv_path: str = None, bars: List = None,
+                  colunas: FonteColunar = None):
         """
         Executa o replay/backtest
-        
+
         Args:
             csv_path: Caminho do arquivo CSV (opcional se bars for fornecido)
             bars: Lista de barras pré-carregadas (opcional)
+            colunas: Fonte colunar (BarStore ou dict de arrays, opcional)
         """
         self.is_running = True
-        
+        self._ultimo_progresso = 0.0
+
         # Carrega barras
         if csv_path:
             await self.load_csv(csv_path)
+        elif colunas is not None:
+            await self.load_columns(colunas)
         elif bars:
+            self.fonte = None
             self.bars = bars
             self.total_bars = len(bars)
             self.current_bar_index = 0
         else:
-            raise ValueError("Either csv_path or bars must be provided")
-        
-        # Loop principal de replay
+            raise ValueError("Either csv_path, colunas or bars must be provided")
+
+        if self.fast_forward and self.fonte is not None:
+            await self._run_colunar()
+        else:
+            await self._run_barras()
+
+        # Replay completo
+        self.is_running = False
+
+        # Broadcast de conclusão
+        metrics = self.signal_manager.get_metrics()
+        await self._transmitir({
+            "type": "replay_complete",
+            "metrics": metrics.to_dict(),
+            "total_bars": self.total_bars
+        })
+
+        # Callback de conclusão
+        if self.on_complete:
+            self.on_complete(self.signal_manager.get_metrics())
+
+        logger.info(f"Replay complete. Processed {self.current_bar_index} bars")
+
+    async def _run_barras(self):
+        """Barra a barra: ritmo de `speed`, ou sem pausas em fast_forward."""
         for bar in self.bars:
             if not self.is_running:
                 break
-            
+
             # Pausa se solicitado
             while self.is_paused and self.is_running:
                 await asyncio.sleep(0.1)
-            
+
             # Processa a barra no motor SMC
             result = self.core_engine.process(bar)
-            
+
             # Callback de barra processada
             if self.on_bar:
                 self.on_bar(bar, result)
-            
-            # Broadcast de progresso
-            if self.current_bar_index % 10 == 0:
-                await ws_manager.broadcast_replay({
-                    "type": "replay_progress",
-                    "current": self.current_bar_index,
-                    "total": self.total_bars,
-                    "progress": self.current_bar_index / self.total_bars * 100
-                })
-            
+
             # Se há sinal válido
-            if result and result.permissao_operar:
-                signal = self._create_signal_event(result, bar)
-                
-                # Abre o sinal
-                signal_manager.open_signal(signal)
-                
-                # Broadcast do novo sinal
-                await ws_manager.broadcast_signal(signal.to_dict())
-                
-                # Callback de sinal
-                if self.on_signal:
-                    self.on_signal(signal)
-            
+            if result and (result.permissao_compra or result.permissao_venda):
+                await self._abrir_sinal(result, bar.close, bar.timestamp_hhmm)
+
             # Verifica fechamento de sinais
-            if signal_manager.open_signals:
-                closed = signal_manager.check_and_close_by_price(bar.close)
-                for closed_signal in closed:
-                    await ws_manager.broadcast_signal(closed_signal.to_dict())
-            
-            # Controle de velocidade
-            base_delay = 0.05 / self.speed  # 50ms base
-            await asyncio.sleep(base_delay)
-            
+            if self.signal_manager.open_signals:
+                await self._fechar_sinais(bar.close)
+
             self.current_bar_index += 1
-        
-        # Replay completo
-        self.is_running = False
-        
-        # Broadcast de conclusão
-        metrics = signal_manager.get_metrics()
-        await ws_manager.broadcast_replay({
-            "type": "replay_complete",
-            "metrics": metrics.to_dict(),
-            "total_bars": self.total_bars
+
+            if self.fast_forward:
+                # Sem sleep: só cede o event loop junto com o progresso
+                await self._progresso(ceder=True)
+            else:
+                await self._progresso()
+                # Controle de velocidade
+                base_delay = 0.05 / self.speed  # 50ms base
+                await asyncio.sleep(base_delay)
+
+    async def _run_colunar(self):
+        """
+        Fast-forward sobre fonte colunar: o engine processa cada bloco pelo
+        caminho vetorizado (em thread, sem travar o event loop) e só as
+        barras com sinal ou com sinais abertos passam pelo laço Python.
+        """
+        for bloco in self._blocos():
+            if not self.is_running:
+                break
+            while self.is_paused and self.is_running:
+                await asyncio.sleep(0.1)
+
+            tabela = await asyncio.to_thread(self.core_engine.process_many, bloco)
+
+            n = len(bloco["close"])
+            linha_da_barra = np.full(n, -1, dtype=np.int64)
+            linha_da_barra[tabela["indice"]] = np.arange(len(tabela["indice"]))
+            com_sinal = np.zeros(n, dtype=bool)
+            com_sinal[tabela["indice"]] = (tabela["permissao_compra"]
+                                           | tabela["permissao_venda"])
+            closes = bloco["close"].tolist()
+            hhmm = bloco["timestamp_hhmm"]
+
+            # Sem sinais abertos, salta direto para o próximo sinal do bloco
+            sinais = np.flatnonzero(com_sinal)
+            i = 0
+            while i < n and self.is_running:
+                if not self.signal_manager.open_signals:
+                    k = int(np.searchsorted(sinais, i))
+                    if k == len(sinais):
+                        break
+                    i = int(sinais[k])
+                if com_sinal[i]:
+                    result = self.core_engine.resultado_da_tabela(
+                        tabela, int(linha_da_barra[i]))
+                    await self._abrir_sinal(result, closes[i], int(hhmm[i]))
+                if self.signal_manager.open_signals:
+                    await self._fechar_sinais(closes[i])
+                i += 1
+
+            self.current_bar_index += n
+            await self._progresso(ceder=True)
+
+    def _blocos(self) -> Iterator[Dict[str, np.ndarray]]:
+        """Blocos da fonte colunar no formato de `process_many`."""
+        fonte = self.fonte
+        if isinstance(fonte, BarStore):
+            blocos = fonte.blocos(self.tamanho_bloco)
+        else:
+            n = len(fonte["close"])
+            passo = self.tamanho_bloco
+            blocos = ({k: np.asarray(v)[i:i + passo] for k, v in fonte.items()}
+                      for i in range(0, n, passo))
+        for bloco in blocos:
+            for nome in _COLUNAS_BARRA:
+                if nome not in bloco:
+                    bloco[nome] = np.zeros(len(bloco["close"]))
+            # "timestamp" do store é o instante em ns; o engine usa HHMM
+            if "timestamp_hhmm" in bloco:
+                bloco.pop("timestamp", None)
+            yield bloco
+
+    async def _abrir_sinal(self, result, preco: float, hhmm: int):
+        signal = self._create_signal_event(result, preco, hhmm)
+
+        # Abre o sinal
+        self.signal_manager.open_signal(signal)
+
+        # Broadcast do novo sinal (em fast_forward o signal_manager já notifica)
+        if self.transmitir and not self.fast_forward:
+            await ws_manager.broadcast_signal(signal.to_dict())
+
+        # Callback de sinal
+        if self.on_signal:
+            self.on_signal(signal)
+
+    async def _fechar_sinais(self, preco: float):
+        closed = self.signal_manager.check_and_close_by_price(preco)
+        if self.transmitir and not self.fast_forward:
+            for closed_signal in closed:
+                await ws_manager.broadcast_signal(closed_signal.to_dict())
+
+    async def _progresso(self, ceder: bool = False):
+        """Broadcast de progresso, no máximo a cada `intervalo_progresso` segundos."""
+        agora = time.monotonic()
+        if agora - self._ultimo_progresso < self.intervalo_progresso:
+            return
+        self._ultimo_progresso = agora
+        await self._transmitir({
+            "type": "replay_progress",
+            "current": self.current_bar_index,
+            "total": self.total_bars,
+            "progress": (self.current_bar_index / self.total_bars * 100
+                         if self.total_bars else 0)
         })
-        
-        # Callback de conclusão
-        if self.on_complete:
-            self.on_complete(signal_manager.get_metrics())
-        
-        logger.info(f"Replay complete. Processed {self.total_bars} bars")
-    
-    def _create_signal_event(self, result, bar) -> SignalEvent:
+        if ceder:
+            await asyncio.sleep(0)
+
+    async def _transmitir(self, dados: dict):
+        if self.transmitir:
+            await ws_manager.broadcast_replay(dados)
+
+    def _create_signal_event(self, result, preco: float,
+                             hhmm: int = None) -> SignalEvent:
         """Cria um SignalEvent a partir do resultado do SMC"""
         from app.events.schema import SignalDirection
-        
-        direction = SignalDirection.BUY if result.direcao == 1 else SignalDirection.SELL
-        
+
+        direction = (SignalDirection.BUY if result.permissao_compra
+                     else SignalDirection.SELL)
+
         return SignalEvent(
-            symbol="WIN$",  # Você pode parametrizar
+            symbol=self.symbol,
             direction=direction,
             scores={
                 "hfz": result.score_hfz,
@@ -173,39 +314,45 @@ class ReplayRunner:
             score_final=result.score_final,
             source=SignalSource.CSV,
             mode=SignalMode.REPLAY,
-            entry_price=bar.close,
+            entry_price=preco,
             metadata={
-                "bar_timestamp": str(bar.timestamp_hhmm) if hasattr(bar, 'timestamp_hhmm') else None,
+                "bar_timestamp": str(hhmm) if hhmm is not None else None,
                 "quality": result.qualidade_setup,
                 "risk": result.risco_contextual
             }
         )
-    
+
     def pause(self):
         """Pausa o replay"""
         self.is_paused = True
         logger.info("Replay paused")
-    
+
     def resume(self):
         """Retoma o replay"""
         self.is_paused = False
         logger.info("Replay resumed")
-    
+
     def stop(self):
         """Para o replay"""
         self.is_running = False
         logger.info("Replay stopped")
-    
+
     def set_speed(self, speed: float):
-        """Ajusta a velocidade do replay"""
+        """Ajusta a velocidade do replay (modo com ritmo)"""
         self.speed = max(0.1, min(100.0, speed))
         logger.info(f"Replay speed set to {self.speed}x")
-    
+
+    def set_fast_forward(self, ativo: bool = True):
+        """Liga/desliga o modo o mais rápido possível"""
+        self.fast_forward = ativo
+        logger.info(f"Replay fast-forward {'on' if ativo else 'off'}")
+
     def get_progress(self) -> dict:
         """Retorna o progresso atual do replay"""
         return {
             "running": self.is_running,
             "paused": self.is_paused,
+            "fast_forward": self.fast_forward,
             "current": self.current_bar_index,
             "total": self.total_bars,
             "progress": (self.current_bar_index / self.total_bars * 100) if self.total_bars > 0 else 0
@@ -213,18 +360,18 @@ class ReplayRunner:
 
 
 # Função de conveniência para rodar backtest
-async def run_backtest(csv_path: str, core_engine, speed: float = 10.0) -> dict:
+async def run_backtest(csv_path: str, core_engine, speed: float = None) -> dict:
     """
     Executa um backtest completo
-    
+
     Args:
         csv_path: Caminho do CSV do Profit
         core_engine: Instância do SMCCoreEngine
-        speed: Velocidade do replay (default 10x)
-    
+        speed: Velocidade do replay (None = o mais rápido possível)
+
     Returns:
         Métricas do backtest
     """
-    runner = ReplayRunner(core_engine, speed=speed)
+    runner = ReplayRunner(core_engine, speed=speed or 1.0, fast_forward=speed is None)
     await runner.run(csv_path=csv_path)
     return signal_manager.get_metrics().to_dict()
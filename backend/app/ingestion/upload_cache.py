@@ -0,0 +1,244 @@
+"""
+Cache de uploads endereçado por conteúdo
+Cada CSV é guardado sob o SHA-256 do seu conteúdo, junto com o store
+colunar e os resultados de backtest por (versão do engine, parâmetros).
+O diretório tem tamanho máximo, com despejo LRU.
+"""
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import weakref
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from .bar_store import BarStore, VERSAO_ESQUEMA, abrir_ou_converter, caminho_store
+
+logger = logging.getLogger(__name__)
+
+_CSV = "dados.csv"
+_RESULTADOS = "resultados"
+_USO = ".uso"
+
+
+@lru_cache(maxsize=1)
+def assinatura_engine() -> str:
+    """
+    Hash do código do engine (core_engine.py e app/modules/*.py).
+
+    Qualquer alteração no código do motor muda a assinatura e invalida os
+    resultados em cache.
+    """
+    import core_engine
+    import app.modules
+
+    arquivos = [core_engine.__file__]
+    for pasta in app.modules.__path__:
+        arquivos += sorted(glob.glob(os.path.join(pasta, "*.py")))
+    h = hashlib.sha256()
+    for arquivo in arquivos:
+        with open(arquivo, "rb") as f:
+            h.update(os.path.basename(arquivo).encode())
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def chave_resultado(parametros: Dict[str, Any]) -> str:
+    """Chave de um resultado: versão do engine, esquema do store e parâmetros."""
+    texto = json.dumps({
+        "engine": assinatura_engine(),
+        "esquema": VERSAO_ESQUEMA,
+        "parametros": parametros,
+    }, sort_keys=True)
+    return hashlib.sha256(texto.encode()).hexdigest()[:32]
+
+
+def _valido(sha256: str) -> bool:
+    return len(sha256) == 64 and all(c in "0123456789abcdef" for c in sha256)
+
+
+class CacheUploads:
+    """
+    Uploads deduplicados por conteúdo.
+
+    Layout: `<diretorio>/<sha256>/` com `dados.csv`, `dados.bars/` e
+    `resultados/<chave>.json`. O mtime de `.uso` marca o último acesso
+    (ordem LRU); ao passar de `max_bytes`, as entradas menos usadas saem.
+    """
+
+    def __init__(self, diretorio: str, max_bytes: int = 2 * 1024 ** 3):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Um lock por sha256: uploads idênticos simultâneos são adotados em série
+        self._locks_sha: "weakref.WeakValueDictionary[str, threading.Lock]" = \
+            weakref.WeakValueDictionary()
+        self._lock_registro = threading.Lock()
+        self._ocupados: set = set()
+        os.makedirs(diretorio, exist_ok=True)
+
+    # ============================================================
+    # UPLOADS
+    # ============================================================
+
+    def _entrada(self, sha256: str) -> str:
+        if not _valido(sha256):
+            raise ValueError(f"Hash inválido: {sha256!r}")
+        return os.path.join(self.diretorio, sha256)
+
+    def caminho_csv(self, sha256: str) -> str:
+        return os.path.join(self._entrada(sha256), _CSV)
+
+    def contem(self, sha256: str) -> bool:
+        return (_valido(sha256)
+                and os.path.isdir(caminho_store(self.caminho_csv(sha256))))
+
+    def _lock_de(self, sha256: str) -> threading.Lock:
+        with self._lock_registro:
+            lock = self._locks_sha.get(sha256)
+            if lock is None:
+                lock = threading.Lock()
+                self._locks_sha[sha256] = lock
+            return lock
+
+    def adotar(self, sha256: str, temporario: str) -> Tuple[BarStore, bool]:
+        """
+        Registra um upload recebido em `temporario`.
+
+        Se o conteúdo já está em cache, o temporário é descartado e nada é
+        reconvertido. Uploads idênticos simultâneos passam um de cada vez
+        (o primeiro converte, os demais reaproveitam); numa falha só é
+        removido o que esta chamada criou. Returns: (store, ja_existia)
+        """
+        entrada = self._entrada(sha256)
+        caminho = self.caminho_csv(sha256)
+        with self._lock_de(sha256):
+            self._ocupados.add(sha256)
+            try:
+                existia = self.contem(sha256)
+                criou_entrada = movido = False
+                try:
+                    if existia:
+                        os.remove(temporario)
+                    else:
+                        criou_entrada = not os.path.isdir(entrada)
+                        os.makedirs(entrada, exist_ok=True)
+                        os.replace(temporario, caminho)
+                        movido = True
+                    store = abrir_ou_converter(caminho)
+                except Exception:
+                    if criou_entrada:
+                        shutil.rmtree(entrada, ignore_errors=True)
+                    elif movido:
+                        os.remove(caminho)
+                    elif not existia and os.path.exists(temporario):
+                        os.remove(temporario)
+                    raise
+                self.tocar(sha256)
+            finally:
+                self._ocupados.discard(sha256)
+        self.despejar(proteger=sha256)
+        return store, existia
+
+    def store(self, sha256: str) -> Optional[BarStore]:
+        """Store colunar do upload (None se não está em cache)."""
+        if not self.contem(sha256):
+            return None
+        self.tocar(sha256)
+        return abrir_ou_converter(self.caminho_csv(sha256))
+
+    # ============================================================
+    # RESULTADOS
+    # ============================================================
+
+    def resultado(self, sha256: str,
+                  parametros: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Resultado em cache para o upload e os parâmetros (None se ausente)."""
+        if not self.contem(sha256):
+            return None
+        caminho = os.path.join(self._entrada(sha256), _RESULTADOS,
+                               chave_resultado(parametros) + ".json")
+        try:
+            with open(caminho) as f:
+                registro = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self.tocar(sha256)
+        return registro["resultado"]
+
+    def salvar_resultado(self, sha256: str, parametros: Dict[str, Any],
+                         resultado: Dict[str, Any]):
+        """Grava o resultado; resultados de outras versões do engine são removidos."""
+        pasta = os.path.join(self._entrada(sha256), _RESULTADOS)
+        os.makedirs(pasta, exist_ok=True)
+        versao = assinatura_engine()
+        for antigo in glob.glob(os.path.join(pasta, "*.json")):
+            try:
+                with open(antigo) as f:
+                    if json.load(f).get("engine") != versao:
+                        os.remove(antigo)
+            except (OSError, ValueError):
+                os.remove(antigo)
+
+        caminho = os.path.join(pasta, chave_resultado(parametros) + ".json")
+        temporario = caminho + ".tmp"
+        with open(temporario, "w") as f:
+            json.dump({"engine": versao, "parametros": parametros,
+                       "resultado": resultado}, f)
+        os.replace(temporario, caminho)
+        self.tocar(sha256)
+        self.despejar(proteger=sha256)
+
+    # ============================================================
+    # LRU
+    # ============================================================
+
+    def tocar(self, sha256: str):
+        marca = os.path.join(self._entrada(sha256), _USO)
+        with open(marca, "a"):
+            pass
+        os.utime(marca)
+
+    def _entradas(self) -> List[Tuple[float, int, str]]:
+        """(último uso, bytes, sha256) de cada entrada."""
+        entradas = []
+        for nome in os.listdir(self.diretorio):
+            pasta = os.path.join(self.diretorio, nome)
+            if not (_valido(nome) and os.path.isdir(pasta)):
+                continue
+            tamanho = 0
+            for raiz, _, arquivos in os.walk(pasta):
+                for arquivo in arquivos:
+                    try:
+                        tamanho += os.path.getsize(os.path.join(raiz, arquivo))
+                    except OSError:
+                        pass
+            try:
+                uso = os.path.getmtime(os.path.join(pasta, _USO))
+            except OSError:
+                uso = 0.0
+            entradas.append((uso, tamanho, nome))
+        return entradas
+
+    def tamanho_bytes(self) -> int:
+        return sum(tamanho for _, tamanho, _ in self._entradas())
+
+    def despejar(self, proteger: Optional[str] = None) -> int:
+        """Remove as entradas menos usadas até caber em `max_bytes`."""
+        with self._lock:
+            entradas = sorted(self._entradas())
+            total = sum(tamanho for _, tamanho, _ in entradas)
+            removidas = 0
+            for _, tamanho, nome in entradas:
+                if total <= self.max_bytes:
+                    break
+                if nome == proteger or nome in self._ocupados:
+                    continue
+                shutil.rmtree(os.path.join(self.diretorio, nome), ignore_errors=True)
+                total -= tamanho
+                removidas += 1
+                logger.info(f"Upload despejado do cache: {nome[:12]}")
+            return removidas
@@ -0,0 +1,164 @@
+"""
+Upload em streaming
+Lê o UploadFile em chunks, grava em disco de forma assíncrona, valida o
+cabeçalho e as linhas à medida que chegam, aplica o limite de tamanho e
+calcula o hash do conteúdo, sem nunca manter o arquivo inteiro em memória.
+"""
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+import aiofiles
+import numpy as np
+
+from .csv_stream import NUMERICAS, OBRIGATORIAS
+
+TAMANHO_CHUNK = 1024 * 1024
+
+
+class UploadInvalido(ValueError):
+    """Conteúdo rejeitado durante o upload."""
+
+
+class UploadGrandeDemais(UploadInvalido):
+    """Upload excedeu o tamanho máximo."""
+
+
+@dataclass
+class ResultadoUpload:
+    """Resumo de um upload recebido."""
+    caminho: str
+    bytes: int
+    sha256: str
+    linhas: int
+    colunas: List[str]
+
+
+class ValidadorCSV:
+    """
+    Validação incremental do CSV.
+
+    O cabeçalho precisa conter as colunas obrigatórias; cada linha precisa
+    ter o mesmo número de campos do cabeçalho, e as colunas numéricas
+    conhecidas precisam ser números (ou vazias). A linha incompleta no fim
+    de um chunk fica pendente até o próximo.
+    """
+
+    def __init__(self, obrigatorias=OBRIGATORIAS):
+        self.obrigatorias = tuple(obrigatorias)
+        self.colunas: Optional[List[str]] = None
+        self.linhas = 0
+        self._pendente = b""
+        self._numericas: List[int] = []
+
+    def alimentar(self, dados: bytes):
+        dados = self._pendente + dados
+        fim = dados.rfind(b"\n")
+        if fim < 0:
+            self._pendente = dados
+            return
+        self._pendente = dados[fim + 1:]
+        self._validar(dados[:fim].split(b"\n"))
+
+    def finalizar(self):
+        """Valida a última linha (sem quebra final) e exige ao menos o cabeçalho."""
+        if self._pendente.strip():
+            self._validar([self._pendente])
+        self._pendente = b""
+        if self.colunas is None:
+            raise UploadInvalido("Arquivo vazio")
+
+    def _validar(self, linhas: List[bytes]):
+        linhas = [linha.rstrip(b"\r") for linha in linhas]
+        linhas = [linha for linha in linhas if linha]
+        if self.colunas is None and linhas:
+            self._cabecalho(linhas.pop(0))
+        if not linhas:
+            return
+
+        n = len(self.colunas)
+        campos = [linha.split(b",") for linha in linhas]
+        for k, linha in enumerate(campos):
+            if len(linha) != n:
+                raise UploadInvalido(
+                    f"Linha {self.linhas + k + 2}: {len(linha)} campos, esperado {n}")
+
+        for i in self._numericas:
+            valores = [linha[i].strip() for linha in campos]
+            try:
+                np.array([v for v in valores if v]).astype(np.float64)
+            except ValueError:
+                k = next(k for k, v in enumerate(valores) if v and not _numero(v))
+                raise UploadInvalido(
+                    f"Linha {self.linhas + k + 2}: '{self.colunas[i]}' não numérico")
+        self.linhas += len(linhas)
+
+    def _cabecalho(self, linha: bytes):
+        try:
+            texto = linha.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise UploadInvalido("Cabeçalho não é texto UTF-8")
+        self.colunas = [c.strip() for c in texto.split(",")]
+        faltando = [c for c in self.obrigatorias if c not in self.colunas]
+        if faltando:
+            raise UploadInvalido(f"Colunas faltantes: {faltando}")
+        self._numericas = [i for i, c in enumerate(self.colunas) if c in NUMERICAS]
+
+
+def _numero(valor: bytes) -> bool:
+    try:
+        float(valor)
+        return True
+    except ValueError:
+        return False
+
+
+async def receber_upload(arquivo, destino: str, max_bytes: int,
+                         validador: Optional[ValidadorCSV] = None,
+                         tamanho_chunk: int = TAMANHO_CHUNK) -> ResultadoUpload:
+    """
+    Grava o upload em `destino` chunk a chunk.
+
+    Hash e validação de cada chunk rodam em thread (o event loop só
+    coordena leitura e escrita). Em qualquer erro o arquivo parcial é
+    removido.
+
+    Raises:
+        UploadGrandeDemais: mais de `max_bytes` recebidos
+        UploadInvalido: cabeçalho ou linha inválida
+    """
+    validador = validador or ValidadorCSV()
+    hash_ = hashlib.sha256()
+    total = 0
+
+    def processar(dados: bytes):
+        hash_.update(dados)
+        validador.alimentar(dados)
+
+    try:
+        async with aiofiles.open(destino, "wb") as saida:
+            while True:
+                dados = await arquivo.read(tamanho_chunk)
+                if not dados:
+                    break
+                total += len(dados)
+                if total > max_bytes:
+                    raise UploadGrandeDemais(
+                        f"Arquivo excede {max_bytes // (1024 * 1024)} MB")
+                await asyncio.to_thread(processar, dados)
+                await saida.write(dados)
+        validador.finalizar()
+    except BaseException:
+        if os.path.exists(destino):
+            os.remove(destino)
+        raise
+
+    return ResultadoUpload(
+        caminho=destino,
+        bytes=total,
+        sha256=hash_.hexdigest(),
+        linhas=validador.linhas,
+        colunas=validador.colunas,
+    )
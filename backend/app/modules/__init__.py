@@ -4,6 +4,9 @@ from .fbi import FBIModule, FBIResult
 from .dtm import DTMModule, DTMResult
 from .sda import SDAModule, SDAResult
 from .mtv import MTVModule, MTVResult
+from .rolling import RollingWindow, BarHistory
+from .mapa_zonas import MapaZonas
+from .pipeline import SMCPipeline
 
 __all__ = [
     'HFZModule', 'HFZResult',
@@ -11,4 +14,7 @@ __all__ = [
     'DTMModule', 'DTMResult',
     'SDAModule', 'SDAResult',
     'MTVModule', 'MTVResult',
+    'RollingWindow', 'BarHistory',
+    'MapaZonas',
+    'SMCPipeline',
 ]
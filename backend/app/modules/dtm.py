@@ -2,12 +2,15 @@
 Módulo DTM - Validação e Detecção de Armadilhas
 Identifica false breakouts, eficiência de movimento, renovação de volume
 """
-import numpy as np
-from typing import Tuple
+from typing import Dict, Tuple, Optional
 from dataclasses import dataclass
 
+import numpy as np
+
+from .rolling import RollingWindow, BarHistory, soma_movel, defasado
 
-@dataclass
+
+@dataclass(slots=True)
 class DTMResult:
     """Resultado da análise DTM"""
     trap_flag: bool
@@ -23,7 +26,13 @@ class DTMResult:
 class DTMModule:
     """Módulo de validação e detecção de armadilhas"""
     
-    def __init__(self):
+    def __init__(self, historico: Optional[BarHistory] = None):
+        """
+        Args:
+            historico: Histórico compartilhado (pipeline). Quando informado,
+                as séries de preço/volume são lidas dele e não são gravadas
+                por este módulo.
+        """
         self.threshold_trap_volume = 1.8
         self.min_barras_trap = 3
         self.janela_continuidade = 5
@@ -40,34 +49,48 @@ class DTMModule:
         self.peso_renovacao = 0.10
         
         self.contador_trap = 0
-        self.hist_close = np.zeros(100)
-        self.hist_high = np.zeros(100)
-        self.hist_low = np.zeros(100)
-        self.hist_volume = np.zeros(100)
-        self.hist_hz = np.zeros(100)
+        self._historico_compartilhado = historico is not None
+        self.historico = historico if historico is not None else BarHistory(100)
+        self.hist_close = self.historico.serie("close")
+        self.hist_high = self.historico.serie("high")
+        self.hist_low = self.historico.serie("low")
+        self.hist_volume = self.historico.serie("volume", janelas=(20,))
+        # Séries derivadas de close[i] vs close[i+1] e do range da barra
+        self.hist_sobe = self.historico.serie(
+            "sobe", janelas=(self.janela_continuidade,))
+        self.hist_desce = self.historico.serie(
+            "desce", janelas=(self.janela_continuidade,))
+        self.hist_desloc = self.historico.serie(
+            "desloc", janelas=(self.janela_eficiencia - 1,))
+        self.hist_range = self.historico.serie(
+            "range", janelas=(self.janela_eficiencia,))
+        self.hist_hz = RollingWindow(100, janelas=(self.periodo_renovacao // 2,
+                                                   self.periodo_renovacao))
     
     def update_history(self, close: float, high: float, low: float, 
                       volume: float, hz: float):
         """Atualiza histórico"""
-        self.hist_close = np.roll(self.hist_close, 1)
-        self.hist_close[0] = close
-        
-        self.hist_high = np.roll(self.hist_high, 1)
-        self.hist_high[0] = high
-        
-        self.hist_low = np.roll(self.hist_low, 1)
-        self.hist_low[0] = low
-        
-        self.hist_volume = np.roll(self.hist_volume, 1)
-        self.hist_volume[0] = volume
-        
-        self.hist_hz = np.roll(self.hist_hz, 1)
-        self.hist_hz[0] = hz
+        if not self._historico_compartilhado:
+            self.historico.push(close=close, high=high, low=low, volume=volume)
+        self.hist_hz.push(hz)
+    
+    def estado(self) -> dict:
+        """Estado para snapshot (histórico compartilhado fica com o pipeline)."""
+        estado = {"hist_hz": self.hist_hz.estado(), "contador_trap": self.contador_trap}
+        if not self._historico_compartilhado:
+            estado["historico"] = self.historico.estado()
+        return estado
+    
+    def restaurar(self, estado: dict):
+        self.hist_hz.restaurar(estado["hist_hz"])
+        self.contador_trap = int(estado["contador_trap"])
+        if "historico" in estado and not self._historico_compartilhado:
+            self.historico.restaurar(estado["historico"])
     
     def _detect_trap(self, volume: float, high: float, low: float, 
                     open_: float, close: float, hz: float) -> Tuple[bool, float, int]:
         """Detecta armadilhas (false breakouts)"""
-        media_volume = np.mean(self.hist_volume[:20])
+        media_volume = self.hist_volume.media(20)
         if media_volume <= 0:
             media_volume = 1
         
@@ -97,15 +120,13 @@ class DTMModule:
                            tentativa_baixa: bool) -> bool:
         """Verifica se há falha na continuidade do movimento"""
         if tentativa_alta:
-            closes_altos = sum(1 for i in range(self.janela_continuidade)
-                             if self.hist_close[i] > self.hist_close[i+1])
+            closes_altos = self.hist_sobe.soma(self.janela_continuidade)
             
             if closes_altos < (self.janela_continuidade * self.threshold_falha_cont):
                 return True
         
         elif tentativa_baixa:
-            closes_baixos = sum(1 for i in range(self.janela_continuidade)
-                              if self.hist_close[i] < self.hist_close[i+1])
+            closes_baixos = self.hist_desce.soma(self.janela_continuidade)
             
             if closes_baixos < (self.janela_continuidade * self.threshold_falha_cont):
                 return True
@@ -114,12 +135,8 @@ class DTMModule:
     
     def _calculate_eficiencia(self) -> float:
         """Calcula eficiência de deslocamento"""
-        range_total = np.sum(self.hist_high[:self.janela_eficiencia] - 
-                            self.hist_low[:self.janela_eficiencia])
-        
-        deslocamento = 0
-        for i in range(self.janela_eficiencia - 1):
-            deslocamento += abs(self.hist_close[i] - self.hist_close[i+1])
+        range_total = self.hist_range.soma(self.janela_eficiencia)
+        deslocamento = self.hist_desloc.soma(self.janela_eficiencia - 1)
         
         if range_total > 0:
             return deslocamento / range_total
@@ -127,8 +144,10 @@ class DTMModule:
     
     def _check_renovacao(self) -> bool:
         """Verifica se há renovação real de volume"""
-        primeira_metade = np.mean(self.hist_hz[:self.periodo_renovacao // 2])
-        segunda_metade = np.mean(self.hist_hz[self.periodo_renovacao // 2:self.periodo_renovacao])
+        metade = self.periodo_renovacao // 2
+        primeira_metade = self.hist_hz.media(metade)
+        segunda_metade = (self.hist_hz.soma(self.periodo_renovacao) -
+                          self.hist_hz.soma(metade)) / (self.periodo_renovacao - metade)
         
         if segunda_metade > 0:
             return segunda_metade > (primeira_metade * self.threshold_renovacao_real)
@@ -208,3 +227,96 @@ class DTMModule:
             renovacao_real=renovacao_real,
             score_dtm=score_dtm
         )
+    
+    def analyze_series(self, volume, high, low, open_, close, hz,
+                       tentativa_alta, tentativa_baixa) -> Dict[str, np.ndarray]:
+        """
+        Análise DTM vetorizada sobre séries completas (backtest)
+        
+        Equivale a, partindo de um módulo recém-criado, chamar
+        `update_history` e depois `analyze` a cada barra. Não altera o
+        estado do módulo (inclusive `contador_trap`).
+        
+        Args:
+            volume, high, low, open_, close, hz, tentativa_alta, tentativa_baixa:
+                Arrays com os argumentos de `analyze` barra a barra
+            
+        Returns:
+            Dict campo do DTMResult -> array
+        """
+        volume = np.asarray(volume, dtype=np.float64)
+        high = np.asarray(high, dtype=np.float64)
+        low = np.asarray(low, dtype=np.float64)
+        open_ = np.asarray(open_, dtype=np.float64)
+        close = np.asarray(close, dtype=np.float64)
+        hz = np.asarray(hz, dtype=np.float64)
+        tentativa_alta = np.asarray(tentativa_alta, dtype=bool)
+        tentativa_baixa = np.asarray(tentativa_baixa, dtype=bool)
+        
+        # Armadilhas
+        media_volume = soma_movel(volume, 20) / 20
+        media_volume = np.where(media_volume <= 0, 1, media_volume)
+        range_barra = high - low
+        base = (volume > media_volume * self.threshold_trap_volume) & (hz < 0.6)
+        bull = (base & (close > open_) & (high > defasado(high))
+                & (close < (high - (range_barra * 0.7))))
+        bear = (~bull & base & (close < open_) & (low < defasado(low))
+                & (close > (low + (range_barra * 0.7))))
+        trap_bruto = bull | bear
+        
+        # Uma armadilha segue sinalizada por `min_barras_trap` barras (intensidade 0)
+        recentes = soma_movel(defasado(trap_bruto.astype(np.float64)),
+                              self.min_barras_trap)
+        trap_flag = trap_bruto | (recentes > 0)
+        trap_intensity = np.where(trap_bruto, 0.7, 0.0)
+        trap_type = np.where(bull, 1, np.where(bear, -1, 0))
+        
+        # Continuidade
+        close_anterior = defasado(close)
+        sobe = (close > close_anterior).astype(np.float64)
+        desce = (close < close_anterior).astype(np.float64)
+        minimo_closes = self.janela_continuidade * self.threshold_falha_cont
+        falha_continuidade = np.where(
+            tentativa_alta,
+            soma_movel(sobe, self.janela_continuidade) < minimo_closes,
+            tentativa_baixa
+            & (soma_movel(desce, self.janela_continuidade) < minimo_closes)
+        )
+        score_continuidade = np.where(falha_continuidade, 0.3,
+                                      1 - self.threshold_falha_cont)
+        
+        # Eficiência
+        range_total = soma_movel(range_barra, self.janela_eficiencia)
+        deslocamento = soma_movel(np.abs(close - close_anterior),
+                                  self.janela_eficiencia - 1)
+        eficiencia = np.divide(deslocamento, range_total,
+                               out=np.zeros_like(close), where=range_total > 0)
+        
+        # Renovação
+        metade = self.periodo_renovacao // 2
+        soma_metade = soma_movel(hz, metade)
+        primeira_metade = soma_metade / metade
+        segunda_metade = ((soma_movel(hz, self.periodo_renovacao) - soma_metade)
+                          / (self.periodo_renovacao - metade))
+        renovacao_real = (segunda_metade > 0) & (
+            segunda_metade > (primeira_metade * self.threshold_renovacao_real))
+        
+        # Score DTM
+        score_dtm = np.where(trap_flag, (1 - trap_intensity) * self.peso_trap,
+                             1 * self.peso_trap)
+        score_dtm += score_continuidade * self.peso_continuidade
+        score_dtm += np.where(eficiencia > self.threshold_eficiencia_baixa,
+                              eficiencia * self.peso_eficiencia, 0.0)
+        score_dtm += np.where(renovacao_real, 1 * self.peso_renovacao, 0.0)
+        score_dtm = np.minimum(1.0, score_dtm)
+        
+        return {
+            "trap_flag": trap_flag,
+            "trap_intensity": trap_intensity,
+            "trap_type": trap_type,
+            "falha_continuidade": falha_continuidade,
+            "score_continuidade": score_continuidade,
+            "eficiencia_deslocamento": eficiencia,
+            "renovacao_real": renovacao_real,
+            "score_dtm": score_dtm,
+        }
@@ -2,12 +2,18 @@
 Módulo FBI - Contexto Espacial e Zonas Institucionais
 Análise de support/resistance e reações em zonas críticas
 """
-import numpy as np
-from typing import List, Tuple
+import heapq
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterator, List, Tuple, Optional
 from dataclasses import dataclass
 
+import numpy as np
+
+from .rolling import BarHistory
+from .mapa_zonas import MapaZonas
+
 
-@dataclass
+@dataclass(slots=True)
 class Zone:
     """Representa uma zona de preço"""
     price: float
@@ -16,9 +22,87 @@ class Zone:
     zone_type: int  # 1=Suporte, 3=Resistência
     strength: float
     active: bool
+    barra: int = 0  # barra do último toque (pivô)
+
+
+class IndiceZonas:
+    """
+    Zonas ativas ordenadas por preço, uma lista por tipo (bisect).
+
+    Inserção/remoção em O(log n) + deslocamento da lista e consulta da
+    zona mais próxima em O(log n). Zonas rompidas saem por prefixo
+    (resistências abaixo do preço) ou sufixo (suportes acima).
+    """
+
+    def __init__(self):
+        self._precos: Dict[int, List[float]] = {1: [], 3: []}
+        self._zonas: Dict[int, List[Zone]] = {1: [], 3: []}
+
+    def inserir(self, zone: Zone):
+        precos = self._precos[zone.zone_type]
+        i = bisect_right(precos, zone.price)
+        precos.insert(i, zone.price)
+        self._zonas[zone.zone_type].insert(i, zone)
+
+    def remover(self, zone: Zone) -> bool:
+        precos = self._precos[zone.zone_type]
+        zonas = self._zonas[zone.zone_type]
+        i = bisect_left(precos, zone.price)
+        while i < len(precos) and precos[i] == zone.price:
+            if zonas[i] is zone:
+                del precos[i]
+                del zonas[i]
+                return True
+            i += 1
+        return False
+
+    def proxima(self, preco: float, min_toques: int = 0) -> Optional[Zone]:
+        """Zona mais próxima de `preco` (de qualquer tipo) com `min_toques` toques."""
+        melhor, menor = None, float('inf')
+        for tipo, precos in self._precos.items():
+            zonas = self._zonas[tipo]
+            i = bisect_left(precos, preco)
+            # Abaixo e acima do ponto de inserção, pulando zonas com poucos toques
+            for j, passo in ((i - 1, -1), (i, 1)):
+                while 0 <= j < len(zonas):
+                    if zonas[j].touches >= min_toques:
+                        distancia = abs(preco - precos[j])
+                        if distancia < menor:
+                            melhor, menor = zonas[j], distancia
+                        break
+                    j += passo
+        return melhor
 
+    def romper(self, close: float, margem: float) -> List[Zone]:
+        """Remove e retorna as zonas rompidas pelo fechamento além de `margem`."""
+        rompidas = []
+        limite = bisect_left(self._precos[3], close / (1 + margem))
+        if limite:
+            rompidas.extend(self._zonas[3][:limite])
+            del self._precos[3][:limite]
+            del self._zonas[3][:limite]
+        if margem < 1:
+            inicio = bisect_right(self._precos[1], close / (1 - margem))
+            if inicio < len(self._precos[1]):
+                rompidas.extend(self._zonas[1][inicio:])
+                del self._precos[1][inicio:]
+                del self._zonas[1][inicio:]
+        return rompidas
 
-@dataclass
+    def limpar(self):
+        for tipo in self._precos:
+            self._precos[tipo].clear()
+            self._zonas[tipo].clear()
+
+    def __len__(self) -> int:
+        return len(self._precos[1]) + len(self._precos[3])
+
+    def __iter__(self) -> Iterator[Zone]:
+        """Zonas em ordem crescente de preço."""
+        return iter(sorted(self._zonas[1] + self._zonas[3], key=lambda z: z.price))
+
+
+@dataclass(slots=True)
 class FBIResult:
     """Resultado da análise FBI"""
     zona_proxima: bool
@@ -34,8 +118,17 @@ class FBIResult:
 class FBIModule:
     """Módulo de análise de contexto espacial e zonas"""
     
-    def __init__(self):
-        self.periodo_liquidez = 30
+    def __init__(self, historico: Optional[BarHistory] = None,
+                 mapa: Optional[MapaZonas] = None):
+        """
+        Args:
+            historico: Histórico compartilhado (pipeline). Quando informado,
+                high/low/volume são lidos dele e não são gravados por este
+                módulo.
+            mapa: Mapa de zonas de longo prazo (ex.: restaurado de disco)
+        """
+        self.periodo_liquidez = 30  # barras sem novo toque até a zona expirar
+        self.periodo_volume = 30  # média de volume para a força da zona
         self.threshold_liquidez_alta = 1.8
         self.min_toques = 1
         self.distancia_merge = 0.003
@@ -50,107 +143,202 @@ class FBIModule:
         self.peso_tipo = 0.20
         self.peso_reacao = 0.10
         
-        self.zones: List[Zone] = []
-        self.hist_high = np.zeros(100)
-        self.hist_low = np.zeros(100)
-        self.hist_volume = np.zeros(100)
+        # Zonas persistentes entre barras, indexadas por preço
+        self.indice = IndiceZonas()
+        self._expiracao: List[Tuple[int, int, Zone]] = []  # heap (barra, seq, zona)
+        self._seq = 0
+        self.barras = 0
+        # Níveis de sessões anteriores e de timeframes maiores
+        if mapa is None:
+            mapa = MapaZonas(distancia_merge=self.distancia_merge)
+        self.mapa = mapa
+        self._historico_compartilhado = historico is not None
+        self.historico = historico if historico is not None else BarHistory(100)
+        self.hist_high = self.historico.serie("high")
+        self.hist_low = self.historico.serie("low")
+        self.hist_volume = self.historico.serie(
+            "volume", janelas=(self.periodo_volume,))
+    
+    @property
+    def zones(self) -> List[Zone]:
+        """Zonas ativas em ordem crescente de preço."""
+        return list(self.indice)
     
     def update_history(self, high: float, low: float, volume: float):
         """Atualiza histórico de preços e volume"""
-        self.hist_high = np.roll(self.hist_high, 1)
-        self.hist_high[0] = high
+        if not self._historico_compartilhado:
+            self.historico.push(high=high, low=low, volume=volume)
+    
+    def _identify_zones(self, close: float):
+        """
+        Atualiza as zonas com a barra recém-gravada no histórico
+        
+        - Expira zonas sem toque há mais de `periodo_liquidez` barras
+        - Registra o pivô da barra anterior (topo → resistência, fundo →
+          suporte), fundindo-o à zona a menos de `distancia_merge`
+        - Desativa zonas rompidas pelo fechamento além de `distancia_merge`
+        - Alimenta o mapa de zonas de longo prazo
+        """
+        self.barras += 1
+        barra = self.barras
+        self._expirar(barra - self.periodo_liquidez)
+        self.mapa.push(self.hist_high[0], self.hist_low[0], self.hist_volume[0])
         
-        self.hist_low = np.roll(self.hist_low, 1)
-        self.hist_low[0] = low
+        if barra >= 3:
+            media_volume = self.hist_volume.media(self.periodo_volume)
+            if media_volume <= 0:
+                media_volume = 1
+            hist_high = self.hist_high.recentes(3)
+            hist_low = self.hist_low.recentes(3)
+            volume = self.hist_volume[1]
+            
+            # Topo (resistência)
+            if hist_high[1] >= hist_high[0] and hist_high[1] >= hist_high[2]:
+                self._registrar_pivo(float(hist_high[1]), 3, volume, media_volume,
+                                     barra - 1)
+            
+            # Fundo (suporte)
+            if hist_low[1] <= hist_low[0] and hist_low[1] <= hist_low[2]:
+                self._registrar_pivo(float(hist_low[1]), 1, volume, media_volume,
+                                     barra - 1)
         
-        self.hist_volume = np.roll(self.hist_volume, 1)
-        self.hist_volume[0] = volume
+        for zone in self.indice.romper(close, self.distancia_merge):
+            zone.active = False
     
-    def _identify_zones(self):
-        """Identifica zonas de preço (suporte/resistência)"""
-        if len(self.hist_high) < self.periodo_liquidez:
+    def _registrar_pivo(self, preco: float, tipo: int, volume: float,
+                        media_volume: float, barra: int):
+        """Funde o pivô à zona existente mais próxima ou cria uma nova zona."""
+        if preco <= 0:
             return
         
-        self.zones = []
-        media_volume = np.mean(self.hist_volume[:self.periodo_liquidez])
-        if media_volume <= 0:
-            media_volume = 1
-        
-        # Identificar topos e fundos
-        for i in range(1, self.periodo_liquidez - 1):
-            # Topos (resistência)
-            if (self.hist_high[i] >= self.hist_high[i-1] and 
-                self.hist_high[i] >= self.hist_high[i+1] and 
-                len(self.zones) < self.max_zonas):
-                
-                # Verificar se já existe zona próxima
-                zone_exists = False
-                for zone in self.zones:
-                    if abs(self.hist_high[i] - zone.price) < \
-                       self.hist_high[i] * self.distancia_merge:
-                        zone.touches += 1
-                        zone_exists = True
-                        break
-                
-                if not zone_exists:
-                    strength = min(1.0, self.hist_volume[i] / media_volume)
-                    new_zone = Zone(
-                        price=self.hist_high[i],
-                        volume=self.hist_volume[i],
-                        touches=1,
-                        zone_type=3,  # Resistência
-                        strength=strength,
-                        active=True
-                    )
-                    self.zones.append(new_zone)
-            
-            # Fundos (suporte)
-            if (self.hist_low[i] <= self.hist_low[i-1] and 
-                self.hist_low[i] <= self.hist_low[i+1] and 
-                len(self.zones) < self.max_zonas):
-                
-                zone_exists = False
-                for zone in self.zones:
-                    if abs(self.hist_low[i] - zone.price) < \
-                       self.hist_low[i] * self.distancia_merge:
-                        zone.touches += 1
-                        zone_exists = True
-                        break
-                
-                if not zone_exists:
-                    strength = min(1.0, self.hist_volume[i] / media_volume)
-                    new_zone = Zone(
-                        price=self.hist_low[i],
-                        volume=self.hist_volume[i],
-                        touches=1,
-                        zone_type=1,  # Suporte
-                        strength=strength,
-                        active=True
-                    )
-                    self.zones.append(new_zone)
+        zone = self.indice.proxima(preco)
+        if zone is not None and abs(preco - zone.price) < preco * self.distancia_merge:
+            zone.touches += 1
+            zone.barra = barra
+            self._agendar_expiracao(zone)
+            return
+        
+        while len(self.indice) >= self.max_zonas:
+            if not self._remover_mais_antiga():
+                break
+        
+        zone = Zone(
+            price=preco,
+            volume=volume,
+            touches=1,
+            zone_type=tipo,
+            strength=min(1.0, volume / media_volume),
+            active=True,
+            barra=barra
+        )
+        self.indice.inserir(zone)
+        self._agendar_expiracao(zone)
+    
+    def _agendar_expiracao(self, zone: Zone):
+        self._seq += 1
+        heapq.heappush(self._expiracao, (zone.barra, self._seq, zone))
+    
+    def _remover_mais_antiga(self, limite: Optional[int] = None) -> bool:
+        """
+        Remove a zona com toque mais antigo (opcionalmente só se anterior a
+        `limite`).
+        """
+        heap = self._expiracao
+        while heap:
+            barra, _, zone = heap[0]
+            if limite is not None and barra >= limite:
+                return False
+            heapq.heappop(heap)
+            # Entradas antigas de zonas retocadas ou já removidas são descartadas
+            if zone.active and zone.barra == barra:
+                self.indice.remover(zone)
+                zone.active = False
+                return True
+        return False
+    
+    def _expirar(self, limite: int):
+        while self._remover_mais_antiga(limite):
+            pass
     
-    def _find_nearest_zone(self, current_price: float) -> Tuple[bool, float, int, float, float]:
-        """Encontra a zona mais próxima"""
-        nearest_zone = None
-        min_distance = float('inf')
-        
-        for zone in self.zones:
-            if zone.active and zone.touches >= self.min_toques:
-                distance = abs(current_price - zone.price)
-                if distance < min_distance:
-                    min_distance = distance
-                    nearest_zone = zone
-        
-        if nearest_zone is None:
+    def estado(self) -> dict:
+        """
+        Estado para snapshot: zonas ativas, mapa de longo prazo e histórico
+        próprio.
+        """
+        zonas = list(self.indice)
+        estado = {
+            "zonas": {
+                "price": np.array([z.price for z in zonas], dtype=np.float64),
+                "volume": np.array([z.volume for z in zonas], dtype=np.float64),
+                "touches": np.array([z.touches for z in zonas], dtype=np.int64),
+                "zone_type": np.array([z.zone_type for z in zonas], dtype=np.int64),
+                "strength": np.array([z.strength for z in zonas], dtype=np.float64),
+                "barra": np.array([z.barra for z in zonas], dtype=np.int64),
+            },
+            "barras": self.barras,
+            "mapa": self.mapa.estado(),
+        }
+        if not self._historico_compartilhado:
+            estado["historico"] = self.historico.estado()
+        return estado
+    
+    def restaurar(self, estado: dict):
+        if not self.mapa.restaurar(estado["mapa"]):
+            raise ValueError("Mapa de zonas incompatível")
+        self.indice = IndiceZonas()
+        self._expiracao = []
+        self._seq = 0
+        self.barras = int(estado["barras"])
+        z = estado["zonas"]
+        for i in range(len(z["price"])):
+            zone = Zone(
+                price=float(z["price"][i]),
+                volume=float(z["volume"][i]),
+                touches=int(z["touches"][i]),
+                zone_type=int(z["zone_type"][i]),
+                strength=float(z["strength"][i]),
+                active=True,
+                barra=int(z["barra"][i])
+            )
+            self.indice.inserir(zone)
+            self._agendar_expiracao(zone)
+        if "historico" in estado and not self._historico_compartilhado:
+            self.historico.restaurar(estado["historico"])
+    
+    def adotar_zonas(self, origem: "FBIModule"):
+        """Assume o mapa de zonas de outro módulo (ex.: processado em lote)."""
+        self.indice = origem.indice
+        self._expiracao = origem._expiracao
+        self._seq = origem._seq
+        self.barras = origem.barras
+        self.mapa = origem.mapa
+    
+    def _find_nearest_zone(
+        self, current_price: float
+    ) -> Tuple[bool, float, int, float, float]:
+        """Encontra a zona ativa mais próxima (recente ou do mapa de longo prazo)"""
+        nearest_zone = self.indice.proxima(current_price, self.min_toques)
+        if nearest_zone is not None:
+            preco = nearest_zone.price
+            tipo, forca = nearest_zone.zone_type, nearest_zone.strength
+        
+        i = self.mapa.proxima(current_price)
+        if i >= 0 and self.mapa.toques[i] >= self.min_toques and (
+                nearest_zone is None or
+                abs(current_price - self.mapa.preco[i]) < abs(current_price - preco)):
+            preco = float(self.mapa.preco[i])
+            tipo = int(self.mapa.tipo[i])
+            forca = float(self.mapa.forca[i])
+        elif nearest_zone is None:
             return False, 0, 0, 0, 0
         
+        min_distance = abs(current_price - preco)
         if current_price > 0:
             distancia_normalizada = min_distance / current_price
         else:
             distancia_normalizada = 0
         
-        return True, nearest_zone.price, nearest_zone.zone_type, \
-               nearest_zone.strength, distancia_normalizada
+        return True, preco, tipo, forca, distancia_normalizada
     
     def analyze(self, current_price: float, high: float, low: float, 
                open_: float, close: float, volume: float) -> FBIResult:
@@ -168,7 +356,7 @@ class FBIModule:
         Returns:
             FBIResult com análise de zonas
         """
-        self._identify_zones()
+        self._identify_zones(close)
         
         zona_proxima, preco_zona, tipo_zona, forca_zona, distancia_norm = \
             self._find_nearest_zone(current_price)
@@ -2,12 +2,15 @@
 Módulo HFZ - Microestrutura e Fluxo
 Análise de delta, frequência, absorção e imbalance
 """
-import numpy as np
-from typing import Dict, List, Tuple
+from typing import Dict, Tuple, Optional
 from dataclasses import dataclass
 
+import numpy as np
+
+from .rolling import RollingWindow, BarHistory, soma_movel, desvio_movel, defasado
 
-@dataclass
+
+@dataclass(slots=True)
 class HFZResult:
     """Resultado da análise HFZ"""
     delta_normalizado: float
@@ -28,7 +31,12 @@ class HFZResult:
 class HFZModule:
     """Módulo de análise de microestrutura e fluxo"""
     
-    def __init__(self):
+    def __init__(self, historico: Optional[BarHistory] = None):
+        """
+        Args:
+            historico: Histórico compartilhado (pipeline). Quando informado,
+                o volume é lido dele e não é gravado por este módulo.
+        """
         # Parâmetros HFZ
         self.periodo_delta = 20
         self.suavizacao_delta = 5
@@ -49,25 +57,46 @@ class HFZModule:
         self.peso_pressao = 0.10
         
         # Histórico
-        self.hist_delta = np.zeros(100)
-        self.hist_hz = np.zeros(100)
-        self.hist_volume = np.zeros(100)
+        self._historico_compartilhado = historico is not None
+        self.historico = historico if historico is not None else BarHistory(100)
+        self.hist_volume = self.historico.serie("volume", janelas=(20,))
+        self.hist_delta = RollingWindow(100, janelas=(self.periodo_delta,))
+        self.hist_hz = RollingWindow(100)
+        # Partes positiva/negativa do delta (pressão)
+        self.hist_delta_pos = RollingWindow(100, janelas=(self.janela_pressao,))
+        self.hist_delta_neg = RollingWindow(100, janelas=(self.janela_pressao,))
         
     def update_history(self, delta: float, hz: float, volume: float):
         """Atualiza histórico com novos valores"""
-        self.hist_delta = np.roll(self.hist_delta, 1)
-        self.hist_delta[0] = delta
-        
-        self.hist_hz = np.roll(self.hist_hz, 1)
-        self.hist_hz[0] = hz
-        
-        self.hist_volume = np.roll(self.hist_volume, 1)
-        self.hist_volume[0] = volume
+        self.hist_delta.push(delta)
+        self.hist_delta_pos.push(delta if delta > 0 else 0.0)
+        self.hist_delta_neg.push(-delta if delta < 0 else 0.0)
+        self.hist_hz.push(hz)
+        if not self._historico_compartilhado:
+            self.historico.push(volume=volume)
+    
+    def estado(self) -> dict:
+        """Estado para snapshot (histórico compartilhado fica com o pipeline)."""
+        estado = {
+            "hist_delta": self.hist_delta.estado(),
+            "hist_delta_pos": self.hist_delta_pos.estado(),
+            "hist_delta_neg": self.hist_delta_neg.estado(),
+            "hist_hz": self.hist_hz.estado(),
+        }
+        if not self._historico_compartilhado:
+            estado["historico"] = self.historico.estado()
+        return estado
+    
+    def restaurar(self, estado: dict):
+        for nome in ("hist_delta", "hist_delta_pos", "hist_delta_neg", "hist_hz"):
+            getattr(self, nome).restaurar(estado[nome])
+        if "historico" in estado and not self._historico_compartilhado:
+            self.historico.restaurar(estado["historico"])
     
     def _normalize_delta(self, delta_suavizado: float) -> float:
         """Normaliza o delta usando média e desvio padrão"""
-        media = np.mean(self.hist_delta[:self.periodo_delta])
-        desvio = np.std(self.hist_delta[:self.periodo_delta])
+        media = self.hist_delta.media(self.periodo_delta)
+        desvio = self.hist_delta.desvio(self.periodo_delta)
         
         if desvio > 0:
             return (delta_suavizado - media) / desvio
@@ -92,7 +121,7 @@ class HFZModule:
     def _calculate_absorcao(self, volume_compra: float, volume_venda: float,
                            range_barra: float, atr: float) -> Tuple[float, float, float]:
         """Calcula absorção de compra e venda"""
-        media_volume = np.mean(self.hist_volume[:20])
+        media_volume = self.hist_volume.media(20)
         if media_volume <= 0:
             media_volume = 1
             
@@ -119,7 +148,7 @@ class HFZModule:
         else:
             imbalance_book = 0
         
-        media_volume = np.mean(self.hist_volume[:20])
+        media_volume = self.hist_volume.media(20)
         if media_volume > 0:
             imbalance_fluxo = delta / media_volume
         else:
@@ -174,8 +203,8 @@ class HFZModule:
         imbalance = self._calculate_imbalance(volume_compra, volume_venda, delta_bruto)
         
         # Pressão
-        hist_pos = np.sum(self.hist_delta[:self.janela_pressao][self.hist_delta[:self.janela_pressao] > 0])
-        hist_neg = np.sum(-self.hist_delta[:self.janela_pressao][self.hist_delta[:self.janela_pressao] < 0])
+        hist_pos = self.hist_delta_pos.soma(self.janela_pressao)
+        hist_neg = self.hist_delta_neg.soma(self.janela_pressao)
         
         pressao_compra = hist_pos / self.janela_pressao if self.janela_pressao > 0 else 0
         pressao_venda = hist_neg / self.janela_pressao if self.janela_pressao > 0 else 0
@@ -188,7 +217,7 @@ class HFZModule:
                          (pressao_venda > pressao_compra * 1.5)
         
         # Exaustão
-        media_volume = np.mean(self.hist_volume[:20])
+        media_volume = self.hist_volume.media(20)
         exaustao_compra = (abs_compra > self.threshold_absorcao) and \
                          (volume_compra > media_volume * 1.8) and (close < open_)
         exaustao_venda = (abs_venda > self.threshold_absorcao) and \
@@ -250,6 +279,140 @@ class HFZModule:
             exaustao_venda=exaustao_venda
         )
     
+    def analyze_series(self, volume_compra, volume_venda, trades, high, low,
+                       open_, close, atr, tick_minimo, volume) -> Dict[str, np.ndarray]:
+        """
+        Análise HFZ vetorizada sobre séries completas (backtest)
+        
+        Equivale a, partindo de um módulo recém-criado, gravar o volume de
+        cada barra no histórico, chamar `analyze` e em seguida
+        `update_history` (ordem do SMCPipeline). Não altera o estado do
+        módulo.
+        
+        Args:
+            volume_compra, volume_venda, trades, high, low, open_, close, atr:
+                Arrays com os argumentos de `analyze` barra a barra
+            tick_minimo: Tamanho mínimo do tick (escalar ou array)
+            volume: Volume total das barras (histórico de volume)
+            
+        Returns:
+            Dict campo do HFZResult -> array
+        """
+        vc = np.asarray(volume_compra, dtype=np.float64)
+        vv = np.asarray(volume_venda, dtype=np.float64)
+        high = np.asarray(high, dtype=np.float64)
+        low = np.asarray(low, dtype=np.float64)
+        tick = np.broadcast_to(np.asarray(tick_minimo, dtype=np.float64), vc.shape)
+        atr = np.asarray(atr, dtype=np.float64)
+        atr = np.where(atr <= 0, tick, atr)
+        
+        # Delta normalizado contra o histórico anterior à barra
+        delta = vc - vv
+        delta_anterior = defasado(delta)
+        media = soma_movel(delta_anterior, self.periodo_delta) / self.periodo_delta
+        desvio = desvio_movel(delta_anterior, self.periodo_delta)
+        delta_normalizado = np.divide(delta - media, desvio,
+                                      out=np.zeros_like(delta), where=desvio > 0)
+        
+        # Hz
+        hz_frequencia = np.asarray(trades, dtype=np.float64) / 60
+        hz_normalizado = np.where(
+            hz_frequencia < self.threshold_hz_baixo, 0.2,
+            np.where(hz_frequencia > self.threshold_hz_alto, 1.0,
+                     (hz_frequencia - self.threshold_hz_baixo) /
+                     (self.threshold_hz_alto - self.threshold_hz_baixo))
+        )
+        
+        # Absorção
+        range_barra = high - low
+        range_barra = np.where(range_barra < tick, tick, range_barra)
+        media_volume = soma_movel(volume, 20) / 20
+        media_volume_abs = np.where(media_volume <= 0, 1, media_volume)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fator_range = range_barra / atr
+            abs_compra = np.where(range_barra > 0,
+                                  (vc / media_volume_abs) / fator_range, 0)
+            abs_venda = np.where(range_barra > 0,
+                                 (vv / media_volume_abs) / fator_range, 0)
+        abs_normalizada = np.where(
+            abs_compra > abs_venda,
+            np.minimum(1.0, abs_compra / self.threshold_absorcao),
+            np.minimum(1.0, abs_venda / self.threshold_absorcao)
+        )
+        
+        # Imbalance
+        total_volume = vc + vv
+        imbalance_book = np.divide(vc - vv, total_volume,
+                                   out=np.zeros_like(vc), where=total_volume > 0)
+        imbalance_fluxo = np.divide(delta, media_volume,
+                                    out=np.zeros_like(vc), where=media_volume > 0)
+        imbalance = np.clip((imbalance_book + imbalance_fluxo) * 0.5, -1, 1)
+        
+        # Pressão (histórico anterior à barra)
+        pressao_compra = soma_movel(defasado(np.where(delta > 0, delta, 0.0)),
+                                    self.janela_pressao) / self.janela_pressao
+        pressao_venda = soma_movel(defasado(np.where(delta < 0, -delta, 0.0)),
+                                   self.janela_pressao) / self.janela_pressao
+        pressao_liquida = pressao_compra - pressao_venda
+        
+        tentativa_alta = (delta_normalizado > 0.5) & (hz_normalizado > 0.6) & \
+                         (pressao_compra > pressao_venda * 1.5)
+        tentativa_baixa = (delta_normalizado < -0.5) & (hz_normalizado > 0.6) & \
+                          (pressao_venda > pressao_compra * 1.5)
+        
+        open_ = np.asarray(open_, dtype=np.float64)
+        close = np.asarray(close, dtype=np.float64)
+        exaustao_compra = (abs_compra > self.threshold_absorcao) & \
+                          (vc > media_volume * 1.8) & (close < open_)
+        exaustao_venda = (abs_venda > self.threshold_absorcao) & \
+                         (vv > media_volume * 1.8) & (close > open_)
+        
+        # Scores
+        pressao_total = pressao_compra + pressao_venda + 1
+        score_compra = np.where(delta_normalizado > 0,
+                                delta_normalizado * self.peso_delta, 0.0)
+        score_compra += hz_normalizado * self.peso_hz
+        score_compra += np.where(abs_compra < self.threshold_absorcao,
+                                 (1 - abs_normalizada) * self.peso_absorcao, 0.0)
+        score_compra += np.where(imbalance > 0, imbalance * self.peso_imbalance, 0.0)
+        score_compra += np.where(pressao_liquida > 0,
+                                 (pressao_compra / pressao_total) * self.peso_pressao,
+                                 0.0)
+        score_compra = np.minimum(1.0, score_compra)
+        
+        score_venda = np.where(delta_normalizado < 0,
+                               (-delta_normalizado) * self.peso_delta, 0.0)
+        score_venda += hz_normalizado * self.peso_hz
+        score_venda += np.where(abs_venda < self.threshold_absorcao,
+                                (1 - abs_normalizada) * self.peso_absorcao, 0.0)
+        score_venda += np.where(imbalance < 0,
+                                (-imbalance) * self.peso_imbalance, 0.0)
+        score_venda += np.where(pressao_liquida < 0,
+                                (pressao_venda / pressao_total) * self.peso_pressao,
+                                0.0)
+        score_venda = np.minimum(1.0, score_venda)
+        
+        qualidade_fluxo = np.select(
+            [hz_normalizado > 0.8, hz_normalizado > 0.6, hz_normalizado > 0.4],
+            [10, 7, 5], default=2
+        )
+        
+        return {
+            "delta_normalizado": delta_normalizado,
+            "hz_normalizado": hz_normalizado,
+            "absorcao_normalizada": abs_normalizada,
+            "imbalance_score": imbalance,
+            "pressao_liquida": pressao_liquida,
+            "score_hfz": score_compra - score_venda,
+            "score_compra": score_compra,
+            "score_venda": score_venda,
+            "qualidade_fluxo": qualidade_fluxo,
+            "tentativa_cont_alta": tentativa_alta,
+            "tentativa_cont_baixa": tentativa_baixa,
+            "exaustao_compra": exaustao_compra,
+            "exaustao_venda": exaustao_venda,
+        }
+    
     def _suavizar_exponencial(self, valor: float, alpha: float = None) -> float:
         """Suavização exponencial simples"""
         if alpha is None:
@@ -0,0 +1,198 @@
+"""
+Mapa de Zonas - Níveis institucionais de longo prazo do FBI
+Zonas multi-timeframe em arrays de tamanho fixo, com decaimento,
+despejo e snapshot em disco
+"""
+import os
+from typing import Dict, Iterable
+
+import numpy as np
+
+
+class MapaZonas:
+    """
+    Mapa persistente de zonas de preço em vários timeframes.
+
+    As barras base são agregadas em barras maiores (`escalas`, em número de
+    barras base: com TF de 5 min, 12 = 1h, 48 = 4h, 288 = diário). A cada
+    barra agregada completa, o pivô da anterior (topo ou fundo) é fundido à
+    zona ativa mais próxima a menos de `distancia_merge` ou vira uma nova
+    zona.
+
+    Tudo vive em arrays de `capacidade` posições:
+    - a força de cada zona decai por barra base (`decaimento`); abaixo de
+      `forca_minima` a zona é desativada
+    - com o mapa cheio, a zona mais fraca é substituída
+    - `salvar`/`carregar` gravam o estado completo (.npz), para que um
+      engine reiniciado retome os níveis das sessões anteriores
+    """
+
+    VERSAO = 1
+
+    def __init__(self, capacidade: int = 256, escalas: Iterable[int] = (12, 48, 288),
+                 decaimento: float = 0.9995, forca_minima: float = 0.05,
+                 distancia_merge: float = 0.003):
+        self.capacidade = capacidade
+        self.escalas = np.array(sorted(escalas), dtype=np.int64)
+        self.decaimento = decaimento
+        self.forca_minima = forca_minima
+        self.distancia_merge = distancia_merge
+
+        # Zonas
+        self.preco = np.zeros(capacidade, dtype=np.float64)
+        self.tipo = np.zeros(capacidade, dtype=np.int8)  # 1=Suporte, 3=Resistência
+        self.escala = np.zeros(capacidade, dtype=np.int64)
+        self.toques = np.zeros(capacidade, dtype=np.int64)
+        self.forca = np.zeros(capacidade, dtype=np.float64)
+        self.barra = np.zeros(capacidade, dtype=np.int64)
+        self.ativa = np.zeros(capacidade, dtype=bool)
+
+        # Agregação por escala: barra em formação e as 3 últimas completas
+        k = len(self.escalas)
+        self.agg_high = np.full(k, -np.inf)
+        self.agg_low = np.full(k, np.inf)
+        self.agg_volume = np.zeros(k)
+        self.agg_n = np.zeros(k, dtype=np.int64)
+        self.ult_high = np.zeros((k, 3))
+        self.ult_low = np.zeros((k, 3))
+        self.ult_volume = np.zeros((k, 3))
+        self.completas = np.zeros(k, dtype=np.int64)
+        self.media_volume = np.zeros(k)
+
+        self.barras = 0
+
+    # ============================================================
+    # ATUALIZAÇÃO
+    # ============================================================
+
+    def push(self, high: float, low: float, volume: float):
+        """Agrega uma barra base e registra os pivôs das escalas que fecharam."""
+        self.barras += 1
+
+        if self.ativa.any():
+            self.forca *= self.decaimento
+            self.ativa &= self.forca >= self.forca_minima
+
+        self.agg_high = np.maximum(self.agg_high, high)
+        self.agg_low = np.minimum(self.agg_low, low)
+        self.agg_volume += volume
+        self.agg_n += 1
+
+        for k in np.nonzero(self.agg_n >= self.escalas)[0]:
+            self._fechar_agregada(k)
+
+    def _fechar_agregada(self, k: int):
+        # Últimas 3 barras agregadas, mais recente na posição 0
+        self.ult_high[k] = (self.agg_high[k], self.ult_high[k, 0], self.ult_high[k, 1])
+        self.ult_low[k] = (self.agg_low[k], self.ult_low[k, 0], self.ult_low[k, 1])
+        self.ult_volume[k] = (self.agg_volume[k], self.ult_volume[k, 0],
+                              self.ult_volume[k, 1])
+        self.completas[k] += 1
+
+        # Média exponencial do volume agregado (normaliza a força)
+        alpha = 2.0 / (20 + 1)
+        if self.completas[k] == 1:
+            self.media_volume[k] = self.agg_volume[k]
+        else:
+            self.media_volume[k] += alpha * (self.agg_volume[k] - self.media_volume[k])
+
+        self.agg_high[k] = -np.inf
+        self.agg_low[k] = np.inf
+        self.agg_volume[k] = 0.0
+        self.agg_n[k] = 0
+
+        if self.completas[k] < 3:
+            return
+
+        h, l, v = self.ult_high[k], self.ult_low[k], self.ult_volume[k]
+        media = self.media_volume[k] if self.media_volume[k] > 0 else 1.0
+        forca = min(1.0, v[1] / media)
+        escala = int(self.escalas[k])
+        if h[1] >= h[0] and h[1] >= h[2]:
+            self.registrar(float(h[1]), 3, escala, forca)
+        if l[1] <= l[0] and l[1] <= l[2]:
+            self.registrar(float(l[1]), 1, escala, forca)
+
+    def registrar(self, preco: float, tipo: int, escala: int, forca: float):
+        """Funde o pivô à zona ativa mais próxima ou ocupa uma posição nova."""
+        if preco <= 0:
+            return
+
+        i = self.proxima(preco)
+        if i >= 0 and abs(preco - self.preco[i]) < preco * self.distancia_merge:
+            self.toques[i] += 1
+            self.forca[i] = max(self.forca[i], forca)
+            self.escala[i] = max(self.escala[i], escala)
+            self.barra[i] = self.barras
+            return
+
+        livres = np.flatnonzero(~self.ativa)
+        i = int(livres[0]) if len(livres) else int(np.argmin(self.forca))
+        self.preco[i] = preco
+        self.tipo[i] = tipo
+        self.escala[i] = escala
+        self.toques[i] = 1
+        self.forca[i] = forca
+        self.barra[i] = self.barras
+        self.ativa[i] = True
+
+    # ============================================================
+    # CONSULTA
+    # ============================================================
+
+    def proxima(self, preco: float) -> int:
+        """Posição da zona ativa mais próxima de `preco` (-1 se não houver)."""
+        if not self.ativa.any():
+            return -1
+        distancias = np.where(self.ativa, np.abs(self.preco - preco), np.inf)
+        return int(np.argmin(distancias))
+
+    def __len__(self) -> int:
+        return int(self.ativa.sum())
+
+    # ============================================================
+    # SNAPSHOT
+    # ============================================================
+
+    _CAMPOS = ("preco", "tipo", "escala", "toques", "forca", "barra", "ativa",
+               "agg_high", "agg_low", "agg_volume", "agg_n", "ult_high", "ult_low",
+               "ult_volume", "completas", "media_volume")
+
+    def estado(self) -> Dict[str, np.ndarray]:
+        """Estado completo em arrays (para snapshot)."""
+        estado = {nome: getattr(self, nome) for nome in self._CAMPOS}
+        estado["escalas"] = self.escalas
+        estado["meta"] = np.array([self.VERSAO, self.capacidade, self.barras],
+                                  dtype=np.int64)
+        return estado
+
+    def restaurar(self, estado: Dict[str, np.ndarray]) -> bool:
+        """Restaura um estado compatível (mesma versão, capacidade e escalas)."""
+        versao, capacidade, barras = (int(x) for x in estado["meta"])
+        if (versao != self.VERSAO or capacidade != self.capacidade or
+                not np.array_equal(estado["escalas"], self.escalas)):
+            return False
+        for nome in self._CAMPOS:
+            setattr(self, nome, np.array(estado[nome], dtype=getattr(self, nome).dtype))
+        self.barras = barras
+        return True
+
+    def salvar(self, caminho: str):
+        """Grava o mapa em disco (escrita atômica)."""
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        temporario = caminho + ".tmp"
+        with open(temporario, "wb") as f:
+            np.savez(f, **self.estado())
+        os.replace(temporario, caminho)
+
+    def carregar(self, caminho: str) -> bool:
+        """Carrega o mapa de `caminho`; retorna False se ausente ou incompatível."""
+        if not os.path.exists(caminho):
+            return False
+        try:
+            with np.load(caminho) as dados:
+                return self.restaurar({nome: dados[nome] for nome in dados.files})
+        except (OSError, ValueError, KeyError):
+            return False
@@ -2,12 +2,16 @@
 Módulo MTV - Confluência Multi-Timeframe V2.2+V2.3
 Análise de alinhamento entre 5 timeframes com calibração por ativo e regime
 """
+from typing import Tuple, Optional, Dict
+from dataclasses import dataclass, field
+
 import numpy as np
-from typing import Tuple
-from dataclasses import dataclass
+
+from .rolling import BarHistory, soma_movel
+from .reamostrador import Reamostrador, chaves_em_lote, medias_em_lote
 
 
-@dataclass
+@dataclass(slots=True)
 class MTVResult:
     """Resultado da análise MTV"""
     score_confluencia: float
@@ -22,12 +26,18 @@ class MTVResult:
     renko_qualidade: int
     nome_ativo: str
     sessao_atual: int
+    direcoes: Dict[str, int] = field(default_factory=dict)  # por TF: 1, -1, 0
 
 
 class MTVModule:
     """Módulo de confluência multi-timeframe"""
     
-    def __init__(self):
+    def __init__(self, historico: Optional[BarHistory] = None):
+        """
+        Args:
+            historico: Histórico compartilhado (pipeline). Quando informado,
+                as séries são lidas dele e não são gravadas por este módulo.
+        """
         # Parâmetros de TF
         self.periodo_atr = 14
         self.threshold_confluencia = 0.75
@@ -105,37 +115,59 @@ class MTVModule:
             'fora': (0, 0, 0.70)
         }
         
-        # Histórico
-        self.hist_close = np.zeros(100)
-        self.hist_high = np.zeros(100)
-        self.hist_low = np.zeros(100)
-        self.hist_tr = np.zeros(100)
-        self.hist_volume = np.zeros(100)
+        # Histórico base (TF rápido e ATR do Renko)
+        self._historico_compartilhado = historico is not None
+        self.historico = historico if historico is not None else BarHistory(100)
+        self.hist_open = self.historico.serie("open")
+        self.hist_close = self.historico.serie("close")
+        self.hist_high = self.historico.serie("high")
+        self.hist_low = self.historico.serie("low")
+        self.hist_tr = self.historico.serie("true_range", janelas=(self.periodo_atr,))
+        self.hist_volume = self.historico.serie("volume")
+        
+        # Barras reais de 60m/240m/diário/semanal (médio/lento/diário/semanal)
+        self.barras_direcao = 3
+        self.reamostrador = Reamostrador(barras_direcao=self.barras_direcao,
+                                         periodo_atr=self.periodo_atr)
     
     def update_history(self, close: float, high: float, low: float,
-                      true_range: float, volume: float):
+                       true_range: float, volume: float,
+                       open_: Optional[float] = None):
         """Atualiza histórico"""
-        self.hist_close = np.roll(self.hist_close, 1)
-        self.hist_close[0] = close
-        
-        self.hist_high = np.roll(self.hist_high, 1)
-        self.hist_high[0] = high
-        
-        self.hist_low = np.roll(self.hist_low, 1)
-        self.hist_low[0] = low
-        
-        self.hist_tr = np.roll(self.hist_tr, 1)
-        self.hist_tr[0] = true_range
-        
-        self.hist_volume = np.roll(self.hist_volume, 1)
-        self.hist_volume[0] = volume
+        if not self._historico_compartilhado:
+            self.historico.push(close=close, high=high, low=low, volume=volume,
+                                true_range=true_range,
+                                open_=open_ if open_ is not None else close)
+    
+    def alimentar_reamostrador(self, open_, high, low, close, volume, hora,
+                               tf_base: int = 5):
+        """
+        Passa um bloco de barras (arrays) só pelo reamostrador, sem análise.
+        Usado quando o pipeline reprocessa apenas a cauda de um bloco: as
+        barras anteriores à cauda ainda formam as barras dos TFs maiores.
+        """
+        for i in range(len(close)):
+            self.reamostrador.push(open_[i], high[i], low[i], close[i],
+                                   volume[i], int(hora[i]), tf_base)
+    
+    def estado(self) -> dict:
+        """Estado para snapshot (histórico compartilhado fica com o pipeline)."""
+        estado = {"reamostrador": self.reamostrador.estado()}
+        if not self._historico_compartilhado:
+            estado["historico"] = self.historico.estado()
+        return estado
+    
+    def restaurar(self, estado: dict):
+        self.reamostrador.restaurar(estado["reamostrador"])
+        if "historico" in estado and not self._historico_compartilhado:
+            self.historico.restaurar(estado["historico"])
     
     def _calculate_atr(self, bars: int) -> float:
         """Calcula ATR (Average True Range) para período"""
         if bars <= 0 or bars > len(self.hist_tr):
             bars = len(self.hist_tr)
         
-        atr = np.mean(self.hist_tr[:bars])
+        atr = self.hist_tr.media(bars)
         return max(0.001, atr)
     
     def _calculate_direction_force(self, bars_period: int, atr_val: float,
@@ -144,11 +176,16 @@ class MTVModule:
         if bars_period <= 1 or bars_period > 99:
             return 0, 0
         
-        close_atual = np.mean(self.hist_close[:bars_period])
-        close_anterior = np.mean(self.hist_close[bars_period:bars_period*2])
-        
-        diferenca = close_atual - close_anterior
+        fim = min(bars_period * 2, len(self.hist_close))
+        close_atual = self.hist_close.media(bars_period)
+        close_anterior = (self.hist_close.soma(fim) -
+                          self.hist_close.soma(bars_period)) / (fim - bars_period)
         
+        return self._classificar(close_atual - close_anterior, atr_val, zona_morta)
+    
+    def _classificar(self, diferenca: float, atr_val: float,
+                     zona_morta: float) -> Tuple[int, float]:
+        """Direção e força a partir da diferença entre médias"""
         if diferenca > zona_morta:
             direcao = 1
             forca = min(1.0, diferenca / atr_val)
@@ -306,6 +343,9 @@ class MTVModule:
         """
         Executa análise completa MTV com 5 TFs
         
+        Deve ser chamado uma vez por barra, após gravá-la no histórico: a
+        barra alimenta o reamostrador dos TFs maiores.
+        
         Args:
             regime: Regime do SDA (1=Tendência, 2=Lateral, 3=Transição)
             hora: Hora em formato HHMM
@@ -324,30 +364,30 @@ class MTVModule:
         else:
             pesos = self.peso_sem_vento
         
-        # Calcular ATRs por TF
-        atr_rapido = self._calculate_atr(14)
-        atr_medio = self._calculate_atr(12)  # 60min = 12 barras de 5min
-        atr_lento = self._calculate_atr(6)   # 240min = 48 barras, usar cap
-        atr_diario = self._calculate_atr(4)  # ~288 barras, usar cap
-        atr_semanal = self._calculate_atr(2) # ~1440 barras, usar cap
+        self.reamostrador.push(
+            self.hist_open[0], self.hist_high[0], self.hist_low[0],
+            self.hist_close[0], self.hist_volume[0], hora, tf_base
+        )
         
-        # Calcular direções e forças
+        # TF rápido: barras base
+        atr_rapido = self._calculate_atr(self.periodo_atr)
         direcoes = {}
         forcas = {}
+        direcoes['rapido'], forcas['rapido'] = self._calculate_direction_force(
+            1, atr_rapido, atr_rapido * self.zona_morta_pct.get('rapido', 0.15)
+        )
         
-        for tf_name, bars, atr in [
-            ('rapido', 1, atr_rapido),
-            ('medio', 12, atr_medio),
-            ('lento', 48, atr_lento),
-            ('diario', 288, atr_diario),
-            ('semanal', 1440, atr_semanal)
-        ]:
+        # TFs maiores: barras reamostradas
+        for tf_name, barras in self.reamostrador.barras.items():
+            medias = barras.medias()
+            if medias is None:
+                direcoes[tf_name], forcas[tf_name] = 0, 0
+                continue
+            atr = barras.atr()
             zona_morta = atr * self.zona_morta_pct.get(tf_name, 0.15)
-            dir_, forca = self._calculate_direction_force(
-                min(bars, 99), atr, zona_morta
+            direcoes[tf_name], forcas[tf_name] = self._classificar(
+                medias[0] - medias[1], atr, zona_morta
             )
-            direcoes[tf_name] = dir_
-            forcas[tf_name] = forca
         
         # Detectar confluência/divergência
         conf, div, tipo_conf = self._detect_convergence(direcoes, forcas, pesos)
@@ -405,5 +445,148 @@ class MTVModule:
             renko_sugestao=renko_sug,
             renko_qualidade=renko_qual,
             nome_ativo=f"Ativo {tipo_ativo}",
-            sessao_atual=sessao
+            sessao_atual=sessao,
+            direcoes=direcoes
         )
+    
+    def analyze_series(self, open_, high, low, close, true_range, regime, hora,
+                       tipo_ativo: int = 1, tf_base: int = 5,
+                       peso_ancora_ativo: float = 0.5) -> Dict[str, np.ndarray]:
+        """
+        Análise MTV vetorizada sobre séries completas (backtest)
+        
+        Equivale a, partindo de um módulo recém-criado, gravar cada barra no
+        histórico e chamar `analyze`. Não altera o estado do módulo.
+        
+        Args:
+            open_, high, low, close, true_range: Arrays das barras base
+            regime: Array de regimes do SDA
+            hora: Array de horários HHMM
+            tipo_ativo, tf_base, peso_ancora_ativo: Como em `analyze`
+            
+        Returns:
+            Dict campo do MTVResult -> array (`direcoes` é um dict TF -> array)
+        """
+        close = np.asarray(close, dtype=np.float64)
+        regime = np.asarray(regime)
+        hora = np.asarray(hora)
+        n = len(close)
+        
+        # Pesos dinâmicos por regime
+        pesos = {
+            tf: np.where(regime == 1, self.peso_tendencia[tf],
+                         np.where(regime == 2, self.peso_lateralizacao[tf],
+                                  self.peso_sem_vento[tf]))
+            for tf in self.peso_sem_vento
+        }
+        
+        atr_rapido = np.maximum(
+            0.001, soma_movel(true_range, self.periodo_atr) / self.periodo_atr)
+        direcoes = {'rapido': np.zeros(n, dtype=np.int64)}
+        forcas = {'rapido': np.zeros(n)}
+        for tf_name, minutos in self.reamostrador.timeframes.items():
+            chaves = chaves_em_lote(hora, tf_base, minutos)
+            atual, anterior, atr, valida = medias_em_lote(
+                chaves, open_, high, low, close, self.barras_direcao, self.periodo_atr
+            )
+            diferenca = atual - anterior
+            zona_morta = atr * self.zona_morta_pct.get(tf_name, 0.15)
+            direcao = np.where(diferenca > zona_morta, 1,
+                               np.where(diferenca < -zona_morta, -1, 0))
+            forca = np.where(direcao != 0,
+                             np.minimum(1.0, np.abs(diferenca) / atr), 0.0)
+            fraca = (forca < self.threshold_forca_min) | ~valida
+            direcoes[tf_name] = np.where(fraca, 0, direcao)
+            forcas[tf_name] = np.where(fraca, 0.0, forca)
+        
+        # Confluência/divergência (mesmos 10 pares de `_detect_convergence`)
+        pares = [
+            ('semanal', 'diario', 1.0), ('semanal', 'lento', 0.6),
+            ('semanal', 'medio', 0.4), ('semanal', 'rapido', 0.2),
+            ('diario', 'lento', 1.0), ('diario', 'medio', 0.6),
+            ('diario', 'rapido', 0.3), ('lento', 'medio', 1.0),
+            ('lento', 'rapido', 0.5), ('medio', 'rapido', 1.0),
+        ]
+        score_align = np.zeros(n)
+        peso_efetivo = np.zeros(n)
+        for tf1, tf2, fator in pares:
+            peso = pesos[tf1] if fator == 1.0 else pesos[tf1] * fator
+            ativo = (direcoes[tf1] != 0) & (direcoes[tf2] != 0)
+            peso_par = np.where(ativo, peso * ((forcas[tf1] + forcas[tf2]) * 0.5), 0.0)
+            score_align += np.where(direcoes[tf1] == direcoes[tf2],
+                                    peso_par, -peso_par)
+            peso_efetivo += peso_par
+        score_alinhamento = np.divide(score_align, peso_efetivo,
+                                      out=np.zeros(n), where=peso_efetivo > 0)
+        conf = np.where(score_alinhamento > 0, score_alinhamento, 0.0)
+        div = np.where(score_alinhamento > 0, 0.0, -score_alinhamento)
+        
+        d_semanal, d_diario = direcoes['semanal'], direcoes['diario']
+        d_lento, d_medio = direcoes['lento'], direcoes['medio']
+        d_rapido = direcoes['rapido']
+        tipo_conf = np.where(
+            conf >= self.threshold_confluencia,
+            np.where((d_diario == 1) & (d_semanal >= 0), 1,
+                     np.where((d_diario == -1) & (d_semanal <= 0), -1, 0)),
+            0
+        )
+        
+        # Sessão de mercado
+        sessao = np.select(
+            [(hora >= 830) & (hora < 930), (hora >= 930) & (hora < 1200),
+             (hora >= 1200) & (hora < 1430), (hora >= 1430) & (hora < 1700)],
+            [1, 2, 3, 4], default=0
+        )
+        multiplicador = np.array([
+            self.sessoes[nome][2]
+            for nome in ('fora', 'pre', 'principal', 'tarde', 'fechamento')
+        ])
+        conf = conf * multiplicador[sessao]
+        
+        # Renko
+        fator_ajuste = np.where(
+            conf >= self.threshold_confluencia, 0.8,
+            np.where(div >= self.threshold_divergencia_forte, 1.2, 1.0)
+        )
+        renko_atr = atr_rapido * fator_ajuste * self.renko_escala_tf.get(tf_base, 1.0)
+        sigla = {1: 'WIN', 2: 'WDO', 3: 'NASDAQ', 4: 'ES'}.get(tipo_ativo)
+        perfil = self.ativo_perfis.get(sigla)
+        if perfil:
+            ancora = np.where(regime == 1, perfil['tend'],
+                              np.where(regime == 2, perfil['lat'], perfil['trans']))
+            renko_sugestao = ((renko_atr * (1 - peso_ancora_ativo))
+                              + (ancora * peso_ancora_ativo))
+            renko_sugestao = np.clip(renko_sugestao, perfil['min'], perfil['max'])
+        else:
+            renko_sugestao = renko_atr
+        renko_qualidade = np.where(
+            (conf > self.threshold_confluencia) & (regime != 2), 3,
+            np.where((conf > 0.5) | (regime == 1), 2, 1)
+        )
+        
+        # Confluência por camada
+        conf_estrutural = (d_semanal != 0) & (d_diario != 0) & (d_semanal == d_diario)
+        conf_tendencia = conf_estrutural & (d_lento != 0) & (d_lento == d_semanal)
+        conf_total = conf_tendencia & (d_medio != 0) & (d_rapido != 0) & \
+            (d_medio == d_semanal) & (d_rapido == d_semanal)
+        camada = np.select([conf_total, conf_tendencia, conf_estrutural], [3, 2, 1],
+                           default=0)
+        
+        div_confirmada = (div >= self.threshold_divergencia_forte) & conf_estrutural & \
+            (d_rapido != 0) & (d_rapido != d_semanal)
+        
+        return {
+            "score_confluencia": conf,
+            "score_divergencia": div,
+            "tipo_confluencia": tipo_conf,
+            "tipo_divergencia": np.where(div_confirmada, 1, -1),
+            "confluencia_forte": conf >= self.threshold_confluencia,
+            "divergencia_forte": div >= self.threshold_divergencia_forte,
+            "divergencia_confirmada": div_confirmada,
+            "confluencia_camada": camada,
+            "renko_sugestao": renko_sugestao,
+            "renko_qualidade": renko_qualidade,
+            "nome_ativo": np.full(n, f"Ativo {tipo_ativo}", dtype=object),
+            "sessao_atual": sessao,
+            "direcoes": direcoes,
+        }
@@ -0,0 +1,429 @@
+"""
+Pipeline SMC - Execução fundida dos módulos sobre um histórico compartilhado
+Ordem de dependência: HFZ → DTM → SDA → FBI → MTV
+"""
+from dataclasses import fields
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .rolling import BarHistory, soma_movel
+from .hfz import HFZModule, HFZResult
+from .fbi import FBIModule, FBIResult
+from .dtm import DTMModule, DTMResult
+from .sda import SDAModule, SDAResult
+from .mtv import MTVModule, MTVResult
+
+
+# Rótulos usados no SMCResult
+REGIMES = {1: "tendencia", 2: "lateral", 3: "transicao"}
+DIRECOES = {1: "alta", -1: "baixa", 0: "neutro"}
+FASES = {1: "iniciacao", 2: "continuacao", 3: "exaustao"}
+SESSOES = {0: "fora", 1: "pre", 2: "principal", 3: "tarde", 4: "fechamento"}
+TIPOS_ZONA = {1: "suporte", 3: "resistencia"}
+REACOES_ZONA = {
+    3: {1: "rejeicao", 0: "rompimento", -1: "falsa_continuacao"},
+    1: {1: "continuacao", 0: "quebra", -1: "falso_suporte"},
+}
+CAMADAS = ["estrutural", "tendencia", "total"]
+
+
+class SMCPipeline:
+    """
+    Orquestrador dos cinco módulos SMC.
+
+    Mantém um único `BarHistory`: cada barra é gravada uma vez e os módulos
+    leem views somente leitura dele. Apenas as séries próprias de cada
+    módulo (delta/hz do HFZ, hz do DTM, volatilidade do SDA) continuam
+    privadas. Saídas de um módulo alimentam o seguinte:
+
+    - HFZ `tentativa_cont_alta/baixa` e `hz_normalizado` → DTM
+    - SDA `regime_mercado` → MTV
+    """
+
+    def __init__(self, tipo_ativo: int = 1, tf_base: int = 5,
+                 peso_ancora_ativo: float = 0.5, capacidade: int = 100):
+        self.tipo_ativo = tipo_ativo
+        self.tf_base = tf_base
+        self.peso_ancora_ativo = peso_ancora_ativo
+        self.capacidade = capacidade
+        self._construir()
+
+    def _construir(self):
+        self.historico = BarHistory(self.capacidade)
+        self.hfz = HFZModule(self.historico)
+        self.dtm = DTMModule(self.historico)
+        self.sda = SDAModule(self.historico)
+        self.fbi = FBIModule(self.historico)
+        self.mtv = MTVModule(self.historico)
+        self.hist_atr = self.historico.serie(
+            "true_range", janelas=(self.hfz.periodo_atr,))
+
+        self.ultimo: Optional[tuple] = None
+
+    def process(self, bar) -> tuple:
+        """
+        Grava a barra no histórico e roda os módulos em ordem.
+
+        Args:
+            bar: Objeto com os campos de `core_engine.Bar`
+
+        Returns:
+            Tupla (HFZResult, DTMResult, SDAResult, FBIResult, MTVResult)
+        """
+        volume = bar.volume
+        self.historico.push(close=bar.close, high=bar.high, low=bar.low,
+                            volume=volume, true_range=bar.true_range, open_=bar.open)
+
+        # HFZ analisa contra o histórico de fluxo anterior e depois o atualiza
+        atr = self.hist_atr.media(self.hfz.periodo_atr)
+        hfz = self.hfz.analyze(
+            bar.volume_compra, bar.volume_venda, bar.trades,
+            bar.high, bar.low, bar.open, bar.close, atr, bar.tick_minimo
+        )
+        self.hfz.update_history(bar.volume_compra - bar.volume_venda,
+                                hfz.hz_normalizado, volume)
+
+        self.dtm.update_history(bar.close, bar.high, bar.low, volume,
+                                hfz.hz_normalizado)
+        dtm = self.dtm.analyze(
+            volume, bar.high, bar.low, bar.open, bar.close, hfz.hz_normalizado,
+            hfz.tentativa_cont_alta, hfz.tentativa_cont_baixa
+        )
+
+        self.sda.update_history(bar.close, bar.high, bar.low, volume, bar.true_range)
+        sda = self.sda.analyze(bar.close, bar.high, bar.low, volume, bar.true_range)
+
+        fbi = self.fbi.analyze(bar.close, bar.high, bar.low, bar.open, bar.close,
+                               volume)
+
+        mtv = self.mtv.analyze(
+            sda.regime_mercado, int(bar.timestamp_hhmm), self.tipo_ativo,
+            self.tf_base, self.peso_ancora_ativo
+        )
+
+        self.ultimo = (hfz, dtm, sda, fbi, mtv)
+        return self.ultimo
+
+    def analyze_series(self, colunas) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        Roda os módulos sobre séries completas (backtest).
+
+        HFZ, DTM, SDA e MTV usam `analyze_series` (vetorizado); o FBI, cujas
+        zonas dependem da varredura de topos/fundos, roda barra a barra num
+        módulo próprio. O resultado equivale a processar as barras em ordem
+        num pipeline recém-criado; o estado deste pipeline não é alterado.
+
+        Args:
+            colunas: Dict (ou DataFrame) com open, high, low, close, volume,
+                volume_compra, volume_venda, trades, true_range,
+                timestamp_hhmm e, opcionalmente, tick_minimo
+
+        Returns:
+            Dict módulo ("hfz", "dtm", "sda", "fbi", "mtv") -> dict de arrays
+        """
+        return self._analyze_series(_colunas_float(colunas))[0]
+
+    def _analyze_series(self, c: Dict[str, np.ndarray]):
+        n = len(c["close"])
+
+        atr = soma_movel(c["true_range"], self.hfz.periodo_atr) / self.hfz.periodo_atr
+        hfz = self.hfz.analyze_series(
+            c["volume_compra"], c["volume_venda"], c["trades"], c["high"], c["low"],
+            c["open"], c["close"], atr, c["tick_minimo"], c["volume"]
+        )
+        dtm = self.dtm.analyze_series(
+            c["volume"], c["high"], c["low"], c["open"], c["close"],
+            hfz["hz_normalizado"], hfz["tentativa_cont_alta"],
+            hfz["tentativa_cont_baixa"]
+        )
+        sda = self.sda.analyze_series(c["close"], c["high"], c["low"], c["volume"],
+                                      c["true_range"])
+
+        fbi_modulo = FBIModule()
+        resultados_fbi = []
+        for i in range(n):
+            fbi_modulo.update_history(c["high"][i], c["low"][i], c["volume"][i])
+            resultados_fbi.append(fbi_modulo.analyze(
+                c["close"][i], c["high"][i], c["low"][i], c["open"][i],
+                c["close"][i], c["volume"][i]
+            ))
+        fbi = empilhar(resultados_fbi, FBIResult)
+
+        mtv = self.mtv.analyze_series(
+            c["open"], c["high"], c["low"], c["close"], c["true_range"],
+            sda["regime_mercado"], c["timestamp_hhmm"],
+            self.tipo_ativo, self.tf_base, self.peso_ancora_ativo
+        )
+        return {"hfz": hfz, "dtm": dtm, "sda": sda, "fbi": fbi, "mtv": mtv}, fbi_modulo
+
+    def process_series(self, colunas) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        Processa um bloco de barras e deixa o pipeline pronto para continuar
+        em streaming.
+
+        Com o pipeline recém-criado usa `analyze_series` e depois reprocessa
+        apenas a cauda do bloco para reconstruir os históricos (o estado dos
+        módulos é função das últimas `capacidade` + `periodo_vol` barras, fora
+        o reamostrador do MTV, que recebe o bloco inteiro) e adota o mapa de
+        zonas do FBI do lote. Com histórico prévio processa
+        barra a barra.
+        """
+        c = _colunas_float(colunas)
+        n = len(c["close"])
+        barras = (
+            SimpleNamespace(**{nome: c[nome][i] for nome in _COLUNAS_BARRA})
+            for i in range(n)
+        )
+
+        if self.historico.series["close"]._t > 0:
+            resultados = [self.process(bar) for bar in barras]
+            return {
+                nome: empilhar([r[k] for r in resultados], cls)
+                for k, (nome, cls) in enumerate(_MODULOS)
+            }
+
+        series, fbi_lote = self._analyze_series(c)
+        cauda = max(0, n - (self.capacidade + self.sda.periodo_vol))
+        # O reamostrador do MTV depende de todo o bloco, não só da cauda
+        self.mtv.alimentar_reamostrador(
+            *(c[nome][:cauda] for nome in ("open", "high", "low", "close", "volume",
+                                           "timestamp_hhmm")),
+            tf_base=self.tf_base,
+        )
+        for i, bar in enumerate(barras):
+            if i >= cauda:
+                self.process(bar)
+        self.fbi.adotar_zonas(fbi_lote)
+        return series
+
+    def preencher(self, resultado, bar=None):
+        """Copia a saída da última barra processada para um SMCResult."""
+        if self.ultimo is None:
+            return resultado
+        hfz, dtm, sda, fbi, mtv = self.ultimo
+        preencher_resultado(resultado, hfz, dtm, sda, fbi, mtv,
+                            preco=bar.close if bar is not None else None)
+        return resultado
+
+    def reset(self):
+        """Reinicia histórico e estado dos módulos."""
+        self._construir()
+
+    def estado(self) -> dict:
+        """Estado completo (histórico compartilhado + estado próprio de cada módulo)."""
+        return {
+            "historico": self.historico.estado(),
+            "hfz": self.hfz.estado(),
+            "dtm": self.dtm.estado(),
+            "sda": self.sda.estado(),
+            "fbi": self.fbi.estado(),
+            "mtv": self.mtv.estado(),
+        }
+
+    def restaurar(self, estado: dict):
+        self.historico.restaurar(estado["historico"])
+        for nome in ("hfz", "dtm", "sda", "fbi", "mtv"):
+            getattr(self, nome).restaurar(estado[nome])
+        self.ultimo = None
+
+    @property
+    def nbytes(self) -> int:
+        """Memória dos históricos (compartilhado + séries próprias dos módulos)."""
+        proprias = (self.hfz.hist_delta, self.hfz.hist_delta_pos,
+                    self.hfz.hist_delta_neg, self.hfz.hist_hz, self.dtm.hist_hz,
+                    self.sda.hist_vol_sda)
+        return self.historico.nbytes + sum(s._dados.nbytes for s in proprias)
+
+
+_MODULOS = (("hfz", HFZResult), ("dtm", DTMResult), ("sda", SDAResult),
+            ("fbi", FBIResult), ("mtv", MTVResult))
+_COLUNAS_BARRA = ("open", "high", "low", "close", "volume", "volume_compra",
+                  "volume_venda", "trades", "true_range", "timestamp_hhmm",
+                  "tick_minimo")
+
+
+def _colunas_float(colunas) -> Dict[str, np.ndarray]:
+    """Normaliza as colunas de entrada (ausentes viram zero, tick padrão 5.0)."""
+    n = len(colunas["close"])
+    c = {}
+    for nome in _COLUNAS_BARRA:
+        if nome in colunas:
+            c[nome] = np.asarray(colunas[nome], dtype=np.float64)
+        elif nome == "timestamp_hhmm" and "timestamp" in colunas:
+            c[nome] = np.asarray(colunas["timestamp"], dtype=np.float64)
+        elif nome == "tick_minimo":
+            c[nome] = np.full(n, 5.0)
+        else:
+            c[nome] = np.zeros(n)
+    c["trades"] = c["trades"].astype(np.int64)
+    c["timestamp_hhmm"] = c["timestamp_hhmm"].astype(np.int64)
+    return c
+
+
+def empilhar(resultados: List, cls) -> Dict[str, np.ndarray]:
+    """Converte uma lista de resultados (dataclass) em dict campo -> array."""
+    colunas = {}
+    for campo in fields(cls):
+        valores = [getattr(r, campo.name) for r in resultados]
+        if valores and isinstance(valores[0], dict):
+            colunas[campo.name] = {
+                chave: np.array([v[chave] for v in valores]) for chave in valores[0]
+            }
+        elif valores and isinstance(valores[0], str):
+            coluna = np.empty(len(valores), dtype=object)
+            coluna[:] = valores
+            colunas[campo.name] = coluna
+        else:
+            colunas[campo.name] = np.array(valores)
+    return colunas
+
+
+def tabela_resultado(series: Dict[str, Dict[str, np.ndarray]],
+                     preco: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """Versão em colunas de `preencher_resultado` (campos do SMCResult -> array)."""
+    hfz, dtm, sda, fbi, mtv = (series[nome] for nome, _ in _MODULOS)
+    n = len(hfz["score_hfz"])
+
+    def rotulos(mapa: Dict, codigos, padrao: str) -> np.ndarray:
+        coluna = np.full(n, padrao, dtype=object)
+        for codigo, rotulo in mapa.items():
+            coluna[np.asarray(codigos) == codigo] = rotulo
+        return coluna
+
+    t = {
+        "score_hfz": hfz["score_hfz"],
+        "delta_normalizado": hfz["delta_normalizado"],
+        "hz_normalizado": hfz["hz_normalizado"],
+        "absorcao_normalizada": hfz["absorcao_normalizada"],
+        "imbalance_score": hfz["imbalance_score"],
+        "exaustao_compra": hfz["exaustao_compra"],
+        "exaustao_venda": hfz["exaustao_venda"],
+    }
+
+    # FBI (campos de zona só mudam do padrão quando há zona próxima)
+    zona = np.asarray(fbi["zona_proxima"], dtype=bool)
+    contato = np.asarray(fbi["contato_zona"], dtype=bool)
+    t["score_fbi"] = fbi["score_fbi"]
+    t["zona_proxima"] = np.full(n, "", dtype=object)
+    if preco is not None:
+        acima = fbi["preco_zona"] >= preco
+        t["zona_proxima"][zona & acima] = "acima"
+        t["zona_proxima"][zona & ~acima] = "abaixo"
+    t["preco_zona_proxima"] = np.where(zona, fbi["preco_zona"], 0)
+    t["tipo_zona_proxima"] = rotulos(TIPOS_ZONA, fbi["tipo_zona"], "")
+    t["tipo_zona_proxima"][~zona] = ""
+    t["distancia_zona"] = fbi["distancia_normalizada"]
+    t["contato_zona"] = contato
+    t["reacao_zona"] = np.full(n, "", dtype=object)
+    for tipo, reacoes in REACOES_ZONA.items():
+        for codigo, rotulo in reacoes.items():
+            t["reacao_zona"][contato & (fbi["tipo_zona"] == tipo) &
+                             (fbi["reacao_zona"] == codigo)] = rotulo
+
+    # DTM
+    t["score_dtm"] = dtm["score_dtm"]
+    t["trap_flag"] = dtm["trap_flag"]
+    t["trap_intensity"] = dtm["trap_intensity"]
+    t["falha_continuidade"] = dtm["falha_continuidade"]
+    t["eficiencia_deslocamento"] = dtm["eficiencia_deslocamento"]
+
+    # SDA
+    t["score_sda"] = sda["score_sda"]
+    t["regime_mercado"] = rotulos(REGIMES, sda["regime_mercado"], "lateral")
+    t["direcao_regime"] = rotulos(DIRECOES, sda["direcao_regime"], "neutro")
+    t["vol_normalizada"] = sda["vol_normalizada"]
+    t["prob_continuacao"] = sda["prob_continuacao"]
+    t["fase_movimento"] = rotulos(FASES, sda["fase_movimento"], "")
+
+    # MTV
+    t["score_mtv"] = mtv["score_confluencia"]
+    t["score_confluencia"] = mtv["score_confluencia"]
+    t["score_divergencia"] = mtv["score_divergencia"]
+    camadas = np.empty(n, dtype=object)
+    camadas[:] = [CAMADAS[:k] for k in np.asarray(mtv["confluencia_camada"]).tolist()]
+    t["confluencia_camada"] = camadas
+    t["confluencia_forte"] = mtv["confluencia_forte"]
+    t["divergencia_confirmada"] = mtv["divergencia_confirmada"]
+    t["sessao_atual"] = rotulos(SESSOES, mtv["sessao_atual"], "")
+    for tf in ("rapido", "medio", "lento", "diario", "semanal"):
+        t[f"direcao_tf_{tf}"] = rotulos(DIRECOES, mtv["direcoes"][tf], "neutro")
+    renko = np.empty(n, dtype=object)
+    renko[:] = [f"{v:.1f}" for v in np.asarray(mtv["renko_sugestao"]).tolist()]
+    t["renko_sugestao"] = renko
+    t["renko_qualidade"] = mtv["renko_qualidade"]
+
+    # Eventos e bloqueios dos módulos
+    t["evento_trap"] = dtm["trap_flag"]
+    t["evento_confluencia"] = mtv["confluencia_forte"]
+    t["evento_divergencia"] = mtv["divergencia_confirmada"]
+    t["evento_contato_zona"] = contato
+    t["bloqueio_trap"] = dtm["trap_flag"]
+    t["bloqueio_divergencia"] = mtv["divergencia_confirmada"]
+    return t
+
+
+def preencher_resultado(resultado, hfz: HFZResult, dtm: DTMResult, sda: SDAResult,
+                        fbi: FBIResult, mtv: MTVResult, preco: Optional[float] = None):
+    """Preenche os campos dos módulos de um SMCResult."""
+    r = resultado
+
+    # HFZ
+    r.score_hfz = hfz.score_hfz
+    r.delta_normalizado = hfz.delta_normalizado
+    r.hz_normalizado = hfz.hz_normalizado
+    r.absorcao_normalizada = hfz.absorcao_normalizada
+    r.imbalance_score = hfz.imbalance_score
+    r.exaustao_compra = hfz.exaustao_compra
+    r.exaustao_venda = hfz.exaustao_venda
+
+    # FBI
+    r.score_fbi = fbi.score_fbi
+    if fbi.zona_proxima:
+        if preco is not None:
+            r.zona_proxima = "acima" if fbi.preco_zona >= preco else "abaixo"
+        r.preco_zona_proxima = fbi.preco_zona
+        r.tipo_zona_proxima = TIPOS_ZONA.get(fbi.tipo_zona, "")
+    r.distancia_zona = fbi.distancia_normalizada
+    r.contato_zona = fbi.contato_zona
+    if fbi.contato_zona:
+        r.reacao_zona = REACOES_ZONA.get(fbi.tipo_zona, {}).get(fbi.reacao_zona, "")
+
+    # DTM
+    r.score_dtm = dtm.score_dtm
+    r.trap_flag = dtm.trap_flag
+    r.trap_intensity = dtm.trap_intensity
+    r.falha_continuidade = dtm.falha_continuidade
+    r.eficiencia_deslocamento = dtm.eficiencia_deslocamento
+
+    # SDA
+    r.score_sda = sda.score_sda
+    r.regime_mercado = REGIMES.get(sda.regime_mercado, "lateral")
+    r.direcao_regime = DIRECOES.get(sda.direcao_regime, "neutro")
+    r.vol_normalizada = sda.vol_normalizada
+    r.prob_continuacao = sda.prob_continuacao
+    r.fase_movimento = FASES.get(sda.fase_movimento, "")
+
+    # MTV
+    r.score_mtv = mtv.score_confluencia
+    r.score_confluencia = mtv.score_confluencia
+    r.score_divergencia = mtv.score_divergencia
+    r.confluencia_camada = CAMADAS[:mtv.confluencia_camada]
+    r.confluencia_forte = mtv.confluencia_forte
+    r.divergencia_confirmada = mtv.divergencia_confirmada
+    r.sessao_atual = SESSOES.get(mtv.sessao_atual, "")
+    for tf in ("rapido", "medio", "lento", "diario", "semanal"):
+        setattr(r, f"direcao_tf_{tf}", DIRECOES.get(mtv.direcoes.get(tf, 0), "neutro"))
+    r.renko_sugestao = f"{mtv.renko_sugestao:.1f}"
+    r.renko_qualidade = mtv.renko_qualidade
+
+    # Eventos e bloqueios dos módulos
+    r.evento_trap = dtm.trap_flag
+    r.evento_confluencia = mtv.confluencia_forte
+    r.evento_divergencia = mtv.divergencia_confirmada
+    r.evento_contato_zona = fbi.contato_zona
+    r.bloqueio_trap = dtm.trap_flag
+    r.bloqueio_divergencia = mtv.divergencia_confirmada
+
+    return r
@@ -0,0 +1,256 @@
+"""
+Reamostrador - Barras OHLC de timeframes maiores a partir do fluxo base
+Atualização O(1) por barra, sem guardar as barras base
+"""
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .rolling import RollingWindow, soma_movel
+
+# Timeframes do MTV em minutos (semanal = 5 pregões)
+TIMEFRAMES = {
+    'medio': 60,
+    'lento': 240,
+    'diario': 1440,
+    'semanal': 5 * 1440,
+}
+
+
+def _minuto_do_dia(hhmm: int) -> int:
+    return (hhmm // 100) * 60 + hhmm % 100
+
+
+def _chave(minuto: int, dia: int, minutos: int) -> int:
+    """Identificador da barra do TF: muda quando uma nova barra começa."""
+    if minutos < 1440:
+        por_dia = -(-1440 // minutos)
+        return dia * por_dia + minuto // minutos
+    return dia // (minutos // 1440)
+
+
+@dataclass(slots=True)
+class _BarraEmFormacao:
+    open: float = 0.0
+    high: float = 0.0
+    low: float = 0.0
+    close: float = 0.0
+    volume: float = 0.0
+
+
+class BarrasTF:
+    """
+    Barras de um timeframe maior: a barra em formação e o histórico das
+    completas (close e true range) em `RollingWindow`s pequenos.
+
+    Direção e força comparam a média dos últimos `barras_direcao` closes
+    (incluindo o da barra em formação) com a dos `barras_direcao`
+    anteriores; o ATR é a média do TR das últimas `periodo_atr` barras
+    completas.
+    """
+
+    def __init__(self, minutos: int, barras_direcao: int = 3, periodo_atr: int = 14,
+                 capacidade: int = 32):
+        self.minutos = minutos
+        self.barras_direcao = barras_direcao
+        self.periodo_atr = periodo_atr
+        n = barras_direcao
+        self.closes = RollingWindow(capacidade, janelas=(n - 1, 2 * n - 1))
+        self.true_ranges = RollingWindow(capacidade, janelas=(periodo_atr,))
+        self.atual = _BarraEmFormacao()
+        self.chave: Optional[int] = None
+        self.completas = 0
+        self._close_anterior: Optional[float] = None
+
+    def push(self, chave: int, open_: float, high: float, low: float,
+             close: float, volume: float):
+        """Incorpora uma barra base; fecha a barra do TF quando a chave muda."""
+        barra = self.atual
+        if chave != self.chave:
+            if self.chave is not None:
+                self._fechar()
+            self.chave = chave
+            barra.open, barra.high, barra.low = open_, high, low
+            barra.volume = 0.0
+        else:
+            if high > barra.high:
+                barra.high = high
+            if low < barra.low:
+                barra.low = low
+        barra.close = close
+        barra.volume += volume
+
+    def _fechar(self):
+        barra = self.atual
+        if self._close_anterior is None:
+            true_range = barra.high - barra.low
+        else:
+            true_range = max(barra.high, self._close_anterior) - \
+                         min(barra.low, self._close_anterior)
+        self.closes.push(barra.close)
+        self.true_ranges.push(true_range)
+        self._close_anterior = barra.close
+        self.completas += 1
+
+    def estado(self) -> dict:
+        barra = self.atual
+        return {
+            "atual": np.array([barra.open, barra.high, barra.low, barra.close,
+                               barra.volume]),
+            "chave": self.chave,
+            "completas": self.completas,
+            "close_anterior": self._close_anterior,
+            "closes": self.closes.estado(),
+            "true_ranges": self.true_ranges.estado(),
+        }
+
+    def restaurar(self, estado: dict):
+        self.atual = _BarraEmFormacao(*(float(v) for v in estado["atual"]))
+        self.chave = None if estado["chave"] is None else int(estado["chave"])
+        self.completas = int(estado["completas"])
+        anterior = estado["close_anterior"]
+        self._close_anterior = None if anterior is None else float(anterior)
+        self.closes.restaurar(estado["closes"])
+        self.true_ranges.restaurar(estado["true_ranges"])
+
+    def atr(self) -> float:
+        """ATR das barras completas (0.001 sem histórico)."""
+        n = min(self.completas, self.periodo_atr)
+        if n == 0:
+            return 0.001
+        return max(0.001, self.true_ranges.soma(self.periodo_atr) / n)
+
+    def medias(self) -> Optional[Tuple[float, float]]:
+        """
+        (média recente, média anterior) dos closes, ou None sem barras
+        suficientes.
+        """
+        n = self.barras_direcao
+        if self.completas < 2 * n - 1:
+            return None
+        recentes = self.closes.soma(n - 1)
+        atual = (recentes + self.atual.close) / n
+        anterior = (self.closes.soma(2 * n - 1) - recentes) / n
+        return atual, anterior
+
+
+class Reamostrador:
+    """
+    Mantém as barras de 60m/240m/diário/semanal a partir das barras base.
+
+    O relógio vem do horário HHMM da barra; um horário menor que o
+    anterior abre um novo pregão. Barras sem horário (HHMM <= 0) avançam
+    um relógio sintético de `tf_base` minutos.
+    """
+
+    def __init__(self, timeframes: Optional[Dict[str, int]] = None, **kwargs):
+        self.timeframes = dict(timeframes or TIMEFRAMES)
+        self.barras = {nome: BarrasTF(minutos, **kwargs)
+                       for nome, minutos in self.timeframes.items()}
+        self.dia = 0
+        self._minuto: Optional[int] = None
+
+    def estado(self) -> dict:
+        estado = {nome: barras.estado() for nome, barras in self.barras.items()}
+        estado.update({"dia": self.dia, "minuto": self._minuto})
+        return estado
+
+    def restaurar(self, estado: dict):
+        for nome, barras in self.barras.items():
+            barras.restaurar(estado[nome])
+        self.dia = int(estado["dia"])
+        self._minuto = None if estado["minuto"] is None else int(estado["minuto"])
+
+    def push(self, open_: float, high: float, low: float, close: float,
+             volume: float, hhmm: int, tf_base: int = 5):
+        if hhmm > 0:
+            minuto = _minuto_do_dia(int(hhmm))
+        else:
+            anterior = -tf_base if self._minuto is None else self._minuto
+            minuto = (anterior + tf_base) % 1440
+        if self._minuto is not None and minuto < self._minuto:
+            self.dia += 1
+        self._minuto = minuto
+
+        for barras in self.barras.values():
+            barras.push(_chave(minuto, self.dia, barras.minutos),
+                        open_, high, low, close, volume)
+
+
+# ============================================================
+# EM LOTE (séries completas)
+# ============================================================
+
+def chaves_em_lote(hhmm, tf_base: int, minutos: int) -> np.ndarray:
+    """Chave da barra do TF para cada barra base (mesma regra do `Reamostrador`)."""
+    hhmm = np.asarray(hhmm, dtype=np.int64)
+    n = len(hhmm)
+    real = hhmm > 0
+    indices = np.arange(n)
+
+    # Barras sem horário: relógio sintético a partir do último horário real
+    ultimo_real = np.maximum.accumulate(np.where(real, indices, -1)) if n else indices
+    minuto_real = (hhmm // 100) * 60 + hhmm % 100
+    base = np.where(ultimo_real >= 0, minuto_real[np.maximum(ultimo_real, 0)], -tf_base)
+    minuto = np.where(real, minuto_real,
+                      (base + (indices - ultimo_real) * tf_base) % 1440)
+
+    dia = np.zeros(n, dtype=np.int64)
+    if n > 1:
+        dia[1:] = np.cumsum(minuto[1:] < minuto[:-1])
+
+    if minutos < 1440:
+        por_dia = -(-1440 // minutos)
+        return dia * por_dia + minuto // minutos
+    return dia // (minutos // 1440)
+
+
+def medias_em_lote(chaves: np.ndarray, open_, high, low, close,
+                   barras_direcao: int = 3, periodo_atr: int = 14):
+    """
+    Versão vetorizada de `BarrasTF.medias()`/`atr()` para cada barra base.
+
+    Returns:
+        (atual, anterior, atr, valida): arrays por barra base; `valida`
+        indica barras com histórico suficiente do TF
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n_base = len(close)
+    if n_base == 0:
+        vazio = np.zeros(0)
+        return vazio, vazio, vazio, np.zeros(0, dtype=bool)
+
+    novo = np.ones(n_base, dtype=bool)
+    novo[1:] = chaves[1:] != chaves[:-1]
+    inicios = np.flatnonzero(novo)
+    segmento = np.cumsum(novo) - 1  # barras do TF completas antes desta barra base
+
+    # Agregados de cada barra do TF (a última pode estar em formação, mas só
+    # é lida por barras base de segmentos posteriores)
+    fins = np.append(inicios[1:], n_base) - 1
+    tf_high = np.maximum.reduceat(high, inicios)
+    tf_low = np.minimum.reduceat(low, inicios)
+    tf_close = close[fins]
+    close_anterior = np.concatenate(([np.nan], tf_close[:-1]))
+    true_range = np.where(
+        np.isnan(close_anterior), tf_high - tf_low,
+        np.fmax(tf_high, close_anterior) - np.fmin(tf_low, close_anterior)
+    )
+
+    n = barras_direcao
+    soma_recentes = soma_movel(tf_close, n - 1)
+    soma_todas = soma_movel(tf_close, 2 * n - 1)
+    soma_tr = soma_movel(true_range, periodo_atr)
+
+    s = segmento
+    ultima = np.maximum(s - 1, 0)
+    recentes = soma_recentes[ultima]
+    atual = (recentes + close) / n
+    anterior = (soma_todas[ultima] - recentes) / n
+    barras_atr = np.maximum(np.minimum(s, periodo_atr), 1)
+    atr = np.where(s > 0, np.maximum(0.001, soma_tr[ultima] / barras_atr), 0.001)
+    valida = s >= 2 * n - 1
+    return atual, anterior, atr, valida
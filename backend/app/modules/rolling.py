@@ -0,0 +1,347 @@
+"""
+Janela Deslizante - Estatísticas incrementais compartilhadas pelos módulos SMC
+Push O(1) com soma, variância, mínimo e máximo por janela configurada
+"""
+import numpy as np
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+
+class RollingWindow:
+    """
+    Histórico de tamanho fixo com estatísticas incrementais.
+
+    Substitui o padrão `np.roll` + `np.mean/np.std` sobre fatias: cada
+    `push` grava o valor in place e atualiza, para cada janela registrada,
+    soma e M2 (variância de Welford) em O(1) e as filas monotônicas de
+    mínimo/máximo em O(1) amortizado.
+
+    Indexação segue a convenção dos módulos: `hist[0]` é o valor mais
+    recente, `hist[1]` o anterior, etc. O histórico começa preenchido com
+    `valor_inicial` (zeros), como os antigos arrays `np.zeros(100)`.
+    """
+
+    def __init__(self, capacidade: int = 100, janelas: Iterable[int] = (),
+                 valor_inicial: float = 0.0):
+        self.capacidade = capacidade
+        # Cada valor é gravado em i e i + capacidade: as últimas N posições
+        # ficam sempre contíguas (views sem cópia)
+        self._dados = np.full(2 * capacidade, valor_inicial, dtype=np.float64)
+        self._pos = capacidade - 1
+        self._t = 0  # total de pushes (os valores iniciais ocupam t < 0)
+        self._valor_inicial = float(valor_inicial)
+
+        self._janelas = sorted(set(int(w) for w in janelas if 0 < w <= capacidade))
+        self._soma: Dict[int, float] = {}
+        self._m2: Dict[int, float] = {}
+        self._min: Dict[int, deque] = {}
+        self._max: Dict[int, deque] = {}
+        self._reiniciar_estatisticas()
+
+    def _reiniciar_estatisticas(self):
+        v0 = self._valor_inicial
+        for w in self._janelas:
+            self._soma[w] = v0 * w
+            self._m2[w] = 0.0
+            # Um único registro representa todo o preenchimento inicial
+            self._min[w] = deque([(self._t - 1, v0)])
+            self._max[w] = deque([(self._t - 1, v0)])
+
+    def adicionar_janela(self, w: int):
+        """Registra uma janela a mais, inicializada a partir do histórico atual."""
+        w = int(w)
+        if w in self._soma or not 0 < w <= self.capacidade:
+            return
+        self._recalcular_janela(w)
+        self._janelas = sorted(self._janelas + [w])
+
+    def _recalcular_janela(self, w: int):
+        """
+        Recalcula soma, M2 e filas de mínimo/máximo da janela `w` a partir
+        dos dados.
+        """
+        janela = self.cronologico(w)
+        self._soma[w] = float(janela.sum())
+        self._m2[w] = float(((janela - janela.mean()) ** 2).sum())
+        fila_min, fila_max = deque(), deque()
+        for k, valor in enumerate(janela):
+            t = self._t - w + k
+            while fila_min and fila_min[-1][1] >= valor:
+                fila_min.pop()
+            fila_min.append((t, float(valor)))
+            while fila_max and fila_max[-1][1] <= valor:
+                fila_max.pop()
+            fila_max.append((t, float(valor)))
+        self._min[w] = fila_min
+        self._max[w] = fila_max
+
+    def push(self, valor: float):
+        """Adiciona um valor (descarta o mais antigo)."""
+        valor = float(valor)
+        cap = self.capacidade
+        t = self._t
+
+        for w in self._janelas:
+            saindo = float(self._dados[self._pos + cap - w + 1])
+            n = float(w)
+            media_ant = self._soma[w] / n
+            self._soma[w] += valor - saindo
+            media = self._soma[w] / n
+            self._m2[w] += (valor - saindo) * (valor - media + saindo - media_ant)
+
+            fila_min = self._min[w]
+            while fila_min and fila_min[-1][1] >= valor:
+                fila_min.pop()
+            fila_min.append((t, valor))
+            if fila_min[0][0] <= t - w:
+                fila_min.popleft()
+
+            fila_max = self._max[w]
+            while fila_max and fila_max[-1][1] <= valor:
+                fila_max.pop()
+            fila_max.append((t, valor))
+            if fila_max[0][0] <= t - w:
+                fila_max.popleft()
+
+        pos = (self._pos + 1) % cap
+        self._dados[pos] = valor
+        self._dados[pos + cap] = valor
+        self._pos = pos
+        self._t = t + 1
+
+        # Ressincroniza somas a cada volta completa para conter o erro acumulado
+        if self._t % cap == 0:
+            for w in self._janelas:
+                janela = self.recentes(w)
+                self._soma[w] = float(janela.sum())
+                self._m2[w] = float(((janela - janela.mean()) ** 2).sum())
+
+    def recentes(self, n: int = None) -> np.ndarray:
+        """
+        View (sem cópia, somente leitura) dos `n` valores mais recentes, do
+        mais novo ao mais antigo.
+        """
+        if n is None or n > self.capacidade:
+            n = self.capacidade
+        fim = self._pos + self.capacidade
+        view = self._dados[fim:fim - n:-1]
+        view.flags.writeable = False
+        return view
+
+    def cronologico(self, n: int = None) -> np.ndarray:
+        """
+        View (sem cópia, somente leitura) dos `n` valores mais recentes, do
+        mais antigo ao mais novo.
+        """
+        if n is None or n > self.capacidade:
+            n = self.capacidade
+        fim = self._pos + self.capacidade + 1
+        view = self._dados[fim - n:fim]
+        view.flags.writeable = False
+        return view
+
+    def soma(self, w: int) -> float:
+        """Soma dos `w` valores mais recentes."""
+        if w in self._soma:
+            return self._soma[w]
+        return float(self.recentes(w).sum())
+
+    def media(self, w: int) -> float:
+        """Média dos `w` valores mais recentes."""
+        return self.soma(w) / w
+
+    def desvio(self, w: int) -> float:
+        """Desvio padrão populacional (ddof=0, como np.std) da janela `w`."""
+        if w not in self._m2:
+            return float(np.std(self.recentes(w)))
+        var = self._m2[w] / w
+        media = self._soma[w] / w
+        # Resíduo numérico de janelas constantes é tratado como zero
+        if var <= 1e-13 * (media * media + 1e-12):
+            return 0.0
+        return float(np.sqrt(var))
+
+    def minimo(self, w: int) -> float:
+        """Mínimo dos `w` valores mais recentes."""
+        if w in self._min:
+            return self._min[w][0][1]
+        return float(self.recentes(w).min())
+
+    def maximo(self, w: int) -> float:
+        """Máximo dos `w` valores mais recentes."""
+        if w in self._max:
+            return self._max[w][0][1]
+        return float(self.recentes(w).max())
+
+    def reset(self):
+        """Volta ao histórico inicial sem realocar."""
+        self._dados.fill(self._valor_inicial)
+        self._pos = self.capacidade - 1
+        self._t = 0
+        self._reiniciar_estatisticas()
+
+    def estado(self) -> dict:
+        """
+        Estado para snapshot. Somas e M2 vão junto (continuação idêntica);
+        as filas de mínimo/máximo são recalculadas na restauração.
+        """
+        return {
+            "dados": self._dados, "pos": self._pos, "t": self._t,
+            "soma": np.array([self._soma[w] for w in self._janelas]),
+            "m2": np.array([self._m2[w] for w in self._janelas]),
+        }
+
+    def restaurar(self, estado: dict):
+        dados = np.asarray(estado["dados"], dtype=np.float64)
+        if dados.shape != self._dados.shape:
+            raise ValueError(
+                f"Capacidade incompatível: {len(dados) // 2} != {self.capacidade}"
+            )
+        self._dados[:] = dados
+        self._pos = int(estado["pos"])
+        self._t = int(estado["t"])
+        for w in self._janelas:
+            self._recalcular_janela(w)
+        soma, m2 = estado.get("soma"), estado.get("m2")
+        if soma is not None and len(soma) == len(self._janelas):
+            for k, w in enumerate(self._janelas):
+                self._soma[w] = float(soma[k])
+                self._m2[w] = float(m2[k])
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.recentes()[i]
+        if i < 0 or i >= self.capacidade:
+            raise IndexError(i)
+        return float(self._dados[self._pos + self.capacidade - i])
+
+    def __len__(self) -> int:
+        return self.capacidade
+
+
+class BarHistory:
+    """
+    Histórico de barras compartilhado entre os módulos SMC.
+
+    Cada módulo pede as séries de que precisa via `serie()` (registrando
+    suas janelas); `push()` grava a barra uma única vez em todas as séries
+    existentes. Além das colunas da barra há séries derivadas, calculadas
+    no push:
+
+    - sobe / desce: 1.0 se close[i] > / < close[i+1]
+    - desloc: |close[i] - close[i+1]|
+    - range: high - low
+    """
+
+    BASE = ("open", "close", "high", "low", "volume", "true_range")
+    DERIVADAS = ("sobe", "desce", "desloc", "range")
+
+    def __init__(self, capacidade: int = 100):
+        self.capacidade = capacidade
+        self.series: Dict[str, RollingWindow] = {}
+
+    def serie(self, nome: str, janelas: Iterable[int] = ()) -> RollingWindow:
+        """Retorna (criando se preciso) a série `nome` com as janelas pedidas."""
+        if nome not in self.BASE and nome not in self.DERIVADAS:
+            raise KeyError(f"Série desconhecida: {nome}")
+        serie = self.series.get(nome)
+        if serie is None:
+            if nome in ("sobe", "desce", "desloc"):
+                self.serie("close")
+            serie = RollingWindow(self.capacidade)
+            self.series[nome] = serie
+        for w in janelas:
+            serie.adicionar_janela(w)
+        return serie
+
+    def push(self, close: Optional[float] = None, high: Optional[float] = None,
+             low: Optional[float] = None, volume: Optional[float] = None,
+             true_range: Optional[float] = None, open_: Optional[float] = None):
+        """Grava uma barra; campos None são ignorados."""
+        series = self.series
+
+        if close is not None and "close" in series:
+            close_anterior = series["close"][0]
+            if "sobe" in series:
+                series["sobe"].push(1.0 if close > close_anterior else 0.0)
+            if "desce" in series:
+                series["desce"].push(1.0 if close < close_anterior else 0.0)
+            if "desloc" in series:
+                series["desloc"].push(abs(close - close_anterior))
+        if "range" in series and high is not None and low is not None:
+            series["range"].push(high - low)
+
+        for nome, valor in (("open", open_), ("close", close), ("high", high),
+                            ("low", low), ("volume", volume),
+                            ("true_range", true_range)):
+            if valor is not None and nome in series:
+                series[nome].push(valor)
+
+    def reset(self):
+        for serie in self.series.values():
+            serie.reset()
+
+    def estado(self) -> dict:
+        return {nome: serie.estado() for nome, serie in self.series.items()}
+
+    def restaurar(self, estado: dict):
+        for nome, serie in estado.items():
+            self.serie(nome).restaurar(serie)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(s._dados.nbytes for s in self.series.values())
+
+
+# ============================================================
+# JANELAS EM LOTE (séries completas)
+# ============================================================
+# Versões vetorizadas das estatísticas acima para `analyze_series`: o valor
+# na posição i corresponde à janela terminada na barra i, com o mesmo
+# preenchimento inicial (`valor_inicial`) do RollingWindow.
+
+_BLOCO_JANELAS = 65536
+
+
+def _janelas(valores: np.ndarray, w: int, valor_inicial: float = 0.0) -> np.ndarray:
+    valores = np.asarray(valores, dtype=np.float64)
+    estendido = np.concatenate((np.full(w - 1, valor_inicial), valores))
+    return np.lib.stride_tricks.sliding_window_view(estendido, w)
+
+
+def soma_movel(valores, w: int, valor_inicial: float = 0.0) -> np.ndarray:
+    """Soma das janelas de `w` valores terminadas em cada posição."""
+    janelas = _janelas(valores, w, valor_inicial)
+    somas = np.empty(len(janelas), dtype=np.float64)
+    for ini in range(0, len(janelas), _BLOCO_JANELAS):
+        somas[ini:ini + _BLOCO_JANELAS] = janelas[ini:ini + _BLOCO_JANELAS].sum(axis=1)
+    return somas
+
+
+def media_movel(valores, w: int, valor_inicial: float = 0.0) -> np.ndarray:
+    """Média das janelas de `w` valores terminadas em cada posição."""
+    return soma_movel(valores, w, valor_inicial) / w
+
+
+def desvio_movel(valores, w: int, valor_inicial: float = 0.0) -> np.ndarray:
+    """
+    Desvio padrão populacional das janelas (mesmo corte de resíduo de
+    `RollingWindow.desvio`).
+    """
+    janelas = _janelas(valores, w, valor_inicial)
+    desvios = np.empty(len(janelas), dtype=np.float64)
+    for ini in range(0, len(janelas), _BLOCO_JANELAS):
+        bloco = janelas[ini:ini + _BLOCO_JANELAS]
+        media = bloco.sum(axis=1) / w
+        var = ((bloco - media[:, None]) ** 2).sum(axis=1) / w
+        var[var <= 1e-13 * (media * media + 1e-12)] = 0.0
+        desvios[ini:ini + _BLOCO_JANELAS] = np.sqrt(var)
+    return desvios
+
+
+def defasado(valores, k: int = 1, valor_inicial: float = 0.0) -> np.ndarray:
+    """Série deslocada `k` barras para trás (equivale a `hist[k]` no streaming)."""
+    valores = np.asarray(valores, dtype=np.float64)
+    if k >= len(valores):
+        return np.full(len(valores), valor_inicial)
+    return np.concatenate((np.full(k, valor_inicial), valores[:len(valores) - k]))
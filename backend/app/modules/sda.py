@@ -2,12 +2,15 @@
 Módulo SDA - Regime e Estrutura de Mercado
 Análise de tendência, volatilidade, continuação e exaustão
 """
-import numpy as np
-from typing import Tuple
+from typing import Dict, Tuple, Optional
 from dataclasses import dataclass
 
+import numpy as np
+
+from .rolling import RollingWindow, BarHistory, soma_movel, desvio_movel, defasado
+
 
-@dataclass
+@dataclass(slots=True)
 class SDAResult:
     """Resultado da análise SDA"""
     regime_mercado: int  # 1=Tendência, 2=Lateral, 3=Transição
@@ -25,7 +28,13 @@ class SDAResult:
 class SDAModule:
     """Módulo de análise de regime e estrutura"""
     
-    def __init__(self):
+    def __init__(self, historico: Optional[BarHistory] = None):
+        """
+        Args:
+            historico: Histórico compartilhado (pipeline). Quando informado,
+                as séries de preço/volume/TR são lidas dele e não são
+                gravadas por este módulo.
+        """
         self.periodo_regime = 30
         self.threshold_tendencia = 0.6
         self.threshold_lateral = 0.3
@@ -42,46 +51,53 @@ class SDAModule:
         self.peso_continuacao = 0.25
         self.peso_deslocamento = 0.20
         
-        self.hist_close = np.zeros(100)
-        self.hist_high = np.zeros(100)
-        self.hist_low = np.zeros(100)
-        self.hist_volume = np.zeros(100)
-        self.hist_tr = np.zeros(100)  # True Range
-        self.hist_vol_sda = np.zeros(100)
+        self._historico_compartilhado = historico is not None
+        self.historico = historico if historico is not None else BarHistory(100)
+        self.hist_close = self.historico.serie("close")
+        self.hist_high = self.historico.serie("high")
+        self.hist_low = self.historico.serie("low")
+        self.hist_volume = self.historico.serie(
+            "volume", janelas=(self.periodo_continuacao,))
+        self.hist_tr = self.historico.serie("true_range", janelas=(self.periodo_vol,))
+        # Séries derivadas de close[i] vs close[i+1] e do range da barra
+        self.hist_sobe = self.historico.serie(
+            "sobe", janelas=(self.periodo_regime, self.periodo_continuacao))
+        self.hist_desce = self.historico.serie(
+            "desce", janelas=(self.periodo_continuacao,))
+        self.hist_desloc = self.historico.serie(
+            "desloc", janelas=(self.janela_deslocamento - 1,))
+        self.hist_range = self.historico.serie("range", janelas=(self.periodo_regime,))
+        self.hist_vol_sda = RollingWindow(100, janelas=(self.janela_normalizacao_vol,))
     
     def update_history(self, close: float, high: float, low: float, 
                       volume: float, true_range: float):
         """Atualiza histórico"""
-        self.hist_close = np.roll(self.hist_close, 1)
-        self.hist_close[0] = close
-        
-        self.hist_high = np.roll(self.hist_high, 1)
-        self.hist_high[0] = high
-        
-        self.hist_low = np.roll(self.hist_low, 1)
-        self.hist_low[0] = low
-        
-        self.hist_volume = np.roll(self.hist_volume, 1)
-        self.hist_volume[0] = volume
-        
-        self.hist_tr = np.roll(self.hist_tr, 1)
-        self.hist_tr[0] = true_range
-        
-        vol_atual = np.mean(self.hist_tr[:self.periodo_vol])
-        self.hist_vol_sda = np.roll(self.hist_vol_sda, 1)
-        self.hist_vol_sda[0] = vol_atual
+        if not self._historico_compartilhado:
+            self.historico.push(close=close, high=high, low=low, volume=volume,
+                                true_range=true_range)
+        self.hist_vol_sda.push(self.hist_tr.media(self.periodo_vol))
+    
+    def estado(self) -> dict:
+        """Estado para snapshot (histórico compartilhado fica com o pipeline)."""
+        estado = {"hist_vol_sda": self.hist_vol_sda.estado()}
+        if not self._historico_compartilhado:
+            estado["historico"] = self.historico.estado()
+        return estado
+    
+    def restaurar(self, estado: dict):
+        self.hist_vol_sda.restaurar(estado["hist_vol_sda"])
+        if "historico" in estado and not self._historico_compartilhado:
+            self.historico.restaurar(estado["historico"])
     
     def _identify_regime(self) -> Tuple[int, int, float]:
         """Identifica regime de mercado"""
         # Calcular eficiência de movimento
-        closes_altos = sum(1 for i in range(self.periodo_regime)
-                          if self.hist_close[i] > self.hist_close[i+1])
+        closes_altos = self.hist_sobe.soma(self.periodo_regime)
         
         eficiencia_direcional = closes_altos / self.periodo_regime
         
         # Calcular amplitude vs deslocamento
-        amplitude_total = np.sum(self.hist_high[:self.periodo_regime] - 
-                               self.hist_low[:self.periodo_regime])
+        amplitude_total = self.hist_range.soma(self.periodo_regime)
         
         deslocamento_liquido = abs(self.hist_close[0] - self.hist_close[self.periodo_regime])
         
@@ -118,11 +134,11 @@ class SDAModule:
     
     def _analyze_volatility(self) -> Tuple[float, float]:
         """Analisa volatilidade normalizada"""
-        vol_atual = np.mean(self.hist_tr[:self.periodo_vol])
+        vol_atual = self.hist_tr.media(self.periodo_vol)
         
         # Normalizar volatilidade
-        media_vol = np.mean(self.hist_vol_sda[:self.janela_normalizacao_vol])
-        desvio_vol = np.std(self.hist_vol_sda[:self.janela_normalizacao_vol])
+        media_vol = self.hist_vol_sda.media(self.janela_normalizacao_vol)
+        desvio_vol = self.hist_vol_sda.desvio(self.janela_normalizacao_vol)
         
         if desvio_vol > 0:
             vol_normalizada = (vol_atual - media_vol) / desvio_vol
@@ -134,20 +150,18 @@ class SDAModule:
     def _analyze_continuacao(self, direcao_regime: int) -> Tuple[float, float, int]:
         """Analisa probabilidade de continuação"""
         if direcao_regime == 1:  # Tendência alta
-            closes_altos = sum(1 for i in range(self.periodo_continuacao)
-                             if self.hist_close[i] > self.hist_close[i+1])
+            closes_altos = self.hist_sobe.soma(self.periodo_continuacao)
             prob_continuacao = closes_altos / self.periodo_continuacao
         
         elif direcao_regime == -1:  # Tendência baixa
-            closes_baixos = sum(1 for i in range(self.periodo_continuacao)
-                              if self.hist_close[i] < self.hist_close[i+1])
+            closes_baixos = self.hist_desce.soma(self.periodo_continuacao)
             prob_continuacao = closes_baixos / self.periodo_continuacao
         
         else:
             prob_continuacao = 0.5
         
         # Probabilidade de exaustão
-        media_volume = np.mean(self.hist_volume[:self.periodo_continuacao])
+        media_volume = self.hist_volume.media(self.periodo_continuacao)
         volume_atual = self.hist_volume[0]
         
         if (volume_atual > media_volume * self.threshold_exaustao and
@@ -191,8 +205,7 @@ class SDAModule:
         prob_continuacao, prob_exaustao, fase = self._analyze_continuacao(direcao)
         
         # Deslocamento médio
-        dist_media_desl = np.mean([abs(self.hist_close[i] - self.hist_close[i+1])
-                                   for i in range(self.janela_deslocamento - 1)])
+        dist_media_desl = self.hist_desloc.media(self.janela_deslocamento - 1)
         
         # Score SDA
         score_sda = 0.0
@@ -229,3 +242,101 @@ class SDAModule:
             score_sda=score_sda,
             score_continuacao=prob_continuacao
         )
+    
+    def analyze_series(self, close, high, low, volume,
+                       true_range) -> Dict[str, np.ndarray]:
+        """
+        Análise SDA vetorizada sobre séries completas (backtest)
+        
+        Equivale a, partindo de um módulo recém-criado, chamar
+        `update_history` e depois `analyze` a cada barra. Não altera o
+        estado do módulo.
+        
+        Args:
+            close, high, low, volume, true_range: Arrays das barras
+            
+        Returns:
+            Dict campo do SDAResult -> array
+        """
+        close = np.asarray(close, dtype=np.float64)
+        high = np.asarray(high, dtype=np.float64)
+        low = np.asarray(low, dtype=np.float64)
+        volume = np.asarray(volume, dtype=np.float64)
+        
+        close_anterior = defasado(close)
+        sobe = (close > close_anterior).astype(np.float64)
+        desce = (close < close_anterior).astype(np.float64)
+        
+        # Regime
+        eficiencia_direcional = (soma_movel(sobe, self.periodo_regime)
+                                 / self.periodo_regime)
+        amplitude_total = soma_movel(high - low, self.periodo_regime)
+        deslocamento_liquido = np.abs(close - defasado(close, self.periodo_regime))
+        eficiencia_movimento = np.divide(deslocamento_liquido, amplitude_total,
+                                         out=np.zeros_like(close),
+                                         where=amplitude_total > 0)
+        
+        tendencia = eficiencia_movimento > self.threshold_tendencia
+        lateral = ~tendencia & (eficiencia_movimento < self.threshold_lateral)
+        regime = np.where(tendencia, 1, np.where(lateral, 2, 3))
+        direcao = np.where(
+            tendencia,
+            np.where(eficiencia_direcional > 0.6, 1,
+                     np.where(eficiencia_direcional < 0.4, -1, 0)),
+            0
+        )
+        score_regime = np.where(tendencia, eficiencia_movimento,
+                                np.where(lateral, 1 - eficiencia_movimento, 0.5))
+        
+        # Volatilidade (o histórico normalizador recebe a média do TR já com
+        # a barra)
+        vol_atual = soma_movel(true_range, self.periodo_vol) / self.periodo_vol
+        media_vol = (soma_movel(vol_atual, self.janela_normalizacao_vol)
+                     / self.janela_normalizacao_vol)
+        desvio_vol = desvio_movel(vol_atual, self.janela_normalizacao_vol)
+        vol_normalizada = np.divide(vol_atual - media_vol, desvio_vol,
+                                    out=np.zeros_like(close), where=desvio_vol > 0)
+        
+        # Continuação
+        periodo = self.periodo_continuacao
+        prob_continuacao = np.where(
+            direcao == 1, soma_movel(sobe, periodo) / periodo,
+            np.where(direcao == -1, soma_movel(desce, periodo) / periodo, 0.5)
+        )
+        media_volume = soma_movel(volume, periodo) / periodo
+        prob_exaustao = np.where(
+            (volume > media_volume * self.threshold_exaustao)
+            & (prob_continuacao < 0.4),
+            0.8, 1 - prob_continuacao
+        )
+        fase = np.where(prob_continuacao > 0.7, 2,
+                        np.where(prob_exaustao > 0.6, 3, 1))
+        
+        dist_media_desl = soma_movel(np.abs(close - close_anterior),
+                                     self.janela_deslocamento - 1)
+        dist_media_desl /= self.janela_deslocamento - 1
+        
+        # Score SDA
+        vol_score = np.where(vol_normalizada < 0, 0,
+                             np.where(vol_normalizada > 2, 1.0, vol_normalizada / 2))
+        score_sda = score_regime * self.peso_regime
+        score_sda += vol_score * self.peso_vol
+        score_sda += prob_continuacao * self.peso_continuacao
+        with np.errstate(divide='ignore', invalid='ignore'):
+            desl_pct = np.minimum(1.0, dist_media_desl / (close * 0.01))
+        score_sda += np.where((dist_media_desl > 0) & (close > 0),
+                              desl_pct * self.peso_deslocamento, 0.0)
+        score_sda = np.minimum(1.0, score_sda)
+        
+        return {
+            "regime_mercado": regime,
+            "direcao_regime": direcao,
+            "score_regime": score_regime,
+            "vol_atual": vol_atual,
+            "vol_normalizada": vol_normalizada,
+            "prob_continuacao": prob_continuacao,
+            "prob_exaustao": prob_exaustao,
+            "fase_movimento": fase,
+            "score_sda": score_sda,
+            "score_continuacao": prob_continuacao,
+        }
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends, Header
 from pydantic import BaseModel
+from typing import Optional
 from datetime import datetime, timezone
 
 from core_engine import SMCCoreEngine, Bar
 from alert_engine import AlertEngine
+from app.ingestion.lote_barras import BarrasInput, executar_lote, trava_engine
+from app.events.cache_resultados import resposta_ultimo_sinal
+from app.events.serializacao import (
+    projecao, resposta_json, resultado_para_json, serializador_resultado,
+)
 
 router = APIRouter()
 
@@ -14,7 +20,8 @@ def get_globals():
     import os
     sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     import main
-    return main.smc_engine, main.alert_engine, main.ultimo_resultado, main._resultado_para_dict, main.get_user_com_plano
+    return (main.engine_registry, main.alert_engine, main.ultimo_resultado,
+            main._resultado_para_dict, main.get_user_com_plano)
 
 
 class BarInput(BaseModel):
@@ -30,15 +37,18 @@ class BarInput(BaseModel):
     timestamp_hhmm: int
     tick_minimo: float = 5.0
     ativo: str = "WIN"
+    timeframe: Optional[int] = None
 
 
 @router.post("/processar-barra")
 async def processar_barra(
     bar_input: BarInput,
     background_tasks: BackgroundTasks,
+    campos: Optional[str] = None,
     user=Depends(lambda: None)  # placeholder - implement user auth
 ):
-    smc_engine, alert_engine, ultimo_resultado, _resultado_para_dict, _ = get_globals()
+    campos = projecao(campos)
+    engine_registry, alert_engine, ultimo_resultado, _, _ = get_globals()
     
     bar = Bar(
         open=bar_input.open, high=bar_input.high,
@@ -49,7 +59,9 @@ async def processar_barra(
         tick_minimo=bar_input.tick_minimo
     )
 
-    resultado = smc_engine.process(bar)
+    smc_engine = await engine_registry.obter(bar_input.ativo, bar_input.timeframe)
+    async with trava_engine(smc_engine):
+        resultado = smc_engine.process(bar)
 
     if resultado is None:
         return {
@@ -58,17 +70,42 @@ async def processar_barra(
             "mensagem": "Engine em aquecimento (60 barras necessárias)"
         }
 
-    ultimo_resultado[bar_input.ativo] = resultado
-    background_tasks.add_task(alert_engine.processar, resultado)
-    return _resultado_para_dict(resultado)
+    chave = engine_registry.chave(bar_input.ativo, bar_input.timeframe)
+    ultimo_resultado[chave] = resultado
+    background_tasks.add_task(alert_engine.processar,
+                              ultimo_resultado.como_dict(chave))
+    return resposta_json(resultado_para_json(resultado, campos))
+
+
+@router.post("/processar-barras")
+async def processar_barras(
+    corpo: BarrasInput,
+    background_tasks: BackgroundTasks,
+    campos: Optional[str] = None,
+    user=Depends(lambda: None)  # placeholder - implement user auth
+):
+    para_dict = serializador_resultado(projecao(campos))
+    engine_registry, alert_engine, ultimo_resultado, _, _ = get_globals()
+
+    smc_engine = await engine_registry.obter(corpo.ativo, corpo.timeframe)
+    ultimo, resposta = await executar_lote(smc_engine, corpo, para_dict)
+
+    if ultimo is not None:
+        chave = engine_registry.chave(corpo.ativo, corpo.timeframe)
+        ultimo_resultado[chave] = ultimo
+        background_tasks.add_task(alert_engine.processar,
+                                  ultimo_resultado.como_dict(chave))
+    return resposta_json(resposta)
 
 
 @router.get("/ultimo-sinal/{ativo}")
-def ultimo_sinal(ativo: str = "WIN", user=Depends(lambda: None)):
-    _, _, ultimo_resultado, _, _ = get_globals()
-    r = ultimo_resultado.get(ativo)
-    if not r:
-        return {"mensagem": f"Sem dados para {ativo} ainda"}
-    return _resultado_para_dict(r)
+def ultimo_sinal(ativo: str = "WIN", timeframe: Optional[int] = None,
+                 campos: Optional[str] = None,
+                 if_none_match: Optional[str] = Header(None),
+                 user=Depends(lambda: None)):
+    campos = projecao(campos)
+    engine_registry, _, ultimo_resultado, _, _ = get_globals()
+    chave = engine_registry.chave(ativo, timeframe)
+    return resposta_ultimo_sinal(ultimo_resultado, chave, campos, if_none_match)
 
 
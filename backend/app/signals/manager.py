@@ -19,7 +19,12 @@ class SignalManager:
     - Persistir histórico
     """
     
-    def __init__(self):
+    def __init__(self, max_history: int = 1000, transmitir: bool = True):
+        """
+        Args:
+            max_history: Limite de sinais fechados no histórico
+            transmitir: Emite os eventos via WebSocket (False em backtests isolados)
+        """
         # Sinais abertos (em andamento)
         self.open_signals: Dict[str, SignalEvent] = {}
         
@@ -27,7 +32,8 @@ class SignalManager:
         self.closed_signals: List[SignalEvent] = []
         
         # Limite de sinais no histórico
-        self.max_history = 1000
+        self.max_history = max_history
+        self.transmitir = transmitir
     
     def open_signal(self, event: SignalEvent) -> SignalEvent:
         """Abre um novo sinal"""
@@ -35,14 +41,14 @@ class SignalManager:
         self.open_signals[event.event_id] = event
         
         # Broadcast do novo sinal
+        if not self.transmitir:
+            return event
         import asyncio
         try:
             loop = asyncio.get_event_loop()
             if loop.is_running():
-                asyncio.create_task(ws_manager.broadcast({
-                    "type": "signal_new",
-                    "data": event.to_dict()
-                }))
+                asyncio.create_task(
+                    ws_manager.broadcast_signal(event.to_dict(), "signal_new"))
         except:
             pass
         
@@ -88,14 +94,14 @@ class SignalManager:
             self.closed_signals = self.closed_signals[-self.max_history:]
         
         # Broadcast do sinal fechado
+        if not self.transmitir:
+            return signal
         import asyncio
         try:
             loop = asyncio.get_event_loop()
             if loop.is_running():
-                asyncio.create_task(ws_manager.broadcast({
-                    "type": "signal_closed",
-                    "data": signal.to_dict()
-                }))
+                asyncio.create_task(
+                    ws_manager.broadcast_signal(signal.to_dict(), "signal_closed"))
                 # Também emite métricas atualizadas
                 asyncio.create_task(self._broadcast_metrics())
         except:
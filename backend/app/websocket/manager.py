@@ -1,13 +1,60 @@
 """
 WebSocket Connection Manager - Gerenciamento de Conexões em Tempo Real
 """
-from typing import List, Dict, Any, Optional
+from itertools import chain
+from typing import List, Dict, Any, FrozenSet, Iterable, Optional, Set, Tuple
 from fastapi import WebSocket
+from app.events.serializacao import dumps
+import asyncio
 import json
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+# Mensagens pendentes por cliente antes de ele ser considerado atrasado
+TAMANHO_FILA_WS = int(os.getenv("WS_TAMANHO_FILA", "256"))
+
+# Código de fechamento para clientes derrubados por atraso ("Try Again Later")
+CODIGO_ATRASADO = 1013
+
+
+def normalizar_simbolo(simbolo: str) -> str:
+    """
+    Forma canônica do símbolo para roteamento: sem espaços, maiúsculo e
+    sem o sufixo de série contínua ("win", "WIN$" e "WIN$N" → "WIN").
+    Aplicada tanto aos filtros dos clientes quanto aos eventos.
+    """
+    return simbolo.strip().upper().partition("$")[0]
+
+
+class ClienteWS:
+    """
+    Conexão com fila de envio própria e limitada.
+
+    Um task por cliente consome a fila e envia os frames, de modo que um
+    cliente lento não segura o broadcast para os demais.
+    """
+
+    def __init__(self, websocket: WebSocket, tamanho_fila: int = TAMANHO_FILA_WS):
+        self.websocket = websocket
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=tamanho_fila)
+        self.tarefa: Optional[asyncio.Task] = None
+        self.salas: Set[str] = set()
+        # room → (símbolos ou None = todos, score mínimo)
+        self.filtros: Dict[str, Tuple[Optional[FrozenSet[str]], float]] = {}
+        self.enviadas = 0
+        self.atrasado = False
+
+    def enfileirar(self, texto: str) -> bool:
+        """Coloca o frame na fila; False se a fila estiver cheia."""
+        try:
+            self.fila.put_nowait(texto)
+            return True
+        except asyncio.QueueFull:
+            self.atrasado = True
+            return False
+
 
 class ConnectionManager:
     """
@@ -19,30 +66,60 @@ class ConnectionManager:
     - Suporte a rooms/channels
     - Mensagens personalizadas
     - Reconexão automática
+    - Broadcast serializado uma vez e enviado em paralelo (fila por cliente)
+    - Inscrição por (room, símbolos, score mínimo) com índice símbolo → clientes
     """
     
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(self, tamanho_fila: int = TAMANHO_FILA_WS):
+        # Registro websocket → cliente (pertinência e remoção em O(1))
+        self.active_connections: Dict[WebSocket, ClienteWS] = {}
+        self.tamanho_fila = tamanho_fila
         
         # Rooms para broadcasts específicos
-        self.rooms: Dict[str, List[WebSocket]] = {
-            "signals": [],
-            "metrics": [],
-            "alerts": [],
-            "replay": []
+        self.rooms: Dict[str, Dict[WebSocket, ClienteWS]] = {
+            "signals": {},
+            "metrics": {},
+            "alerts": {},
+            "replay": {}
+        }
+        
+        # Índice de roteamento por room: símbolo → clientes que o filtram,
+        # e clientes sem filtro de símbolo (recebem todos)
+        self.por_simbolo: Dict[str, Dict[str, Dict[WebSocket, ClienteWS]]] = {
+            room: {} for room in self.rooms
+        }
+        self.sem_filtro: Dict[str, Dict[WebSocket, ClienteWS]] = {
+            room: {} for room in self.rooms
         }
         
-        # Contador de mensagens
+        # Contador de mensagens (total e por room)
         self.message_count = 0
+        self.room_message_count: Dict[str, int] = {room: 0 for room in self.rooms}
+        # Clientes derrubados por não acompanharem o broadcast
+        self.derrubados = 0
     
-    async def connect(self, websocket: WebSocket, room: Optional[str] = None):
-        """Aceita nova conexão WebSocket"""
+    async def connect(self, websocket: WebSocket, room: Optional[str] = None,
+                      symbols: Optional[Iterable[str]] = None, min_score: float = 0.0):
+        """
+        Aceita nova conexão WebSocket
+        
+        Se o websocket já estiver conectado, apenas o inscreve na room
+        (sem novo accept). `symbols`/`min_score` filtram a room (ver
+        `subscribe`).
+        """
+        if websocket in self.active_connections:
+            if room:
+                self.subscribe(websocket, room, symbols, min_score)
+            return
+        
         await websocket.accept()
-        self.active_connections.append(websocket)
+        cliente = ClienteWS(websocket, self.tamanho_fila)
+        cliente.tarefa = asyncio.create_task(self._enviar(cliente))
+        self.active_connections[websocket] = cliente
         
         # Adiciona à room se especificado
-        if room and room in self.rooms:
-            self.rooms[room].append(websocket)
+        if room:
+            self.subscribe(websocket, room, symbols, min_score)
         
         logger.info(f"WebSocket connected. Total: {len(self.active_connections)}")
         
@@ -54,76 +131,213 @@ class ConnectionManager:
         }, websocket)
     
     def disconnect(self, websocket: WebSocket, room: Optional[str] = None):
-        """Remove conexão WebSocket"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        """
+        Remove conexão WebSocket (de todas as rooms em que está inscrita)
         
-        # Remove da room específica
-        if room and room in self.rooms and websocket in self.rooms[room]:
-            self.rooms[room].remove(websocket)
+        Para sair de uma room mantendo a conexão, use `unsubscribe`.
+        """
+        cliente = self.active_connections.pop(websocket, None)
+        if cliente is None:
+            return
+        if cliente.tarefa is not None and cliente.tarefa is not asyncio.current_task():
+            cliente.tarefa.cancel()
         
-        # Remove de todas as rooms
-        for room_name, connections in self.rooms.items():
-            if websocket in connections:
-                connections.remove(websocket)
+        for room_name in cliente.salas:
+            self.rooms[room_name].pop(websocket, None)
+            self._desindexar(cliente, room_name)
+        cliente.salas.clear()
         
         logger.info(f"WebSocket disconnected. Total: {len(self.active_connections)}")
     
-    async def send_personal_message(self, message: dict, websocket: WebSocket):
-        """Envia mensagem para um cliente específico"""
+    def subscribe(self, websocket: WebSocket, room: str,
+                  symbols: Optional[Iterable[str]] = None,
+                  min_score: float = 0.0) -> bool:
+        """
+        Inscreve uma conexão ativa em uma room. False se a room não existe.
+        
+        Args:
+            symbols: Só recebe eventos desses símbolos (None/vazio = todos),
+                comparados após `normalizar_simbolo`; eventos sem símbolo
+                (ex.: métricas gerais) vão para todos
+            min_score: Só recebe eventos com score >= min_score
+        
+        Reinscrever na mesma room substitui o filtro anterior.
+        """
+        cliente = self.active_connections.get(websocket)
+        if cliente is None or room not in self.rooms:
+            return False
+        if room in cliente.salas:
+            self._desindexar(cliente, room)
+        simbolos = frozenset(filter(None, map(normalizar_simbolo, symbols or ())))
+        simbolos = simbolos or None
+        cliente.filtros[room] = (simbolos, float(min_score or 0.0))
+        self.rooms[room][websocket] = cliente
+        cliente.salas.add(room)
+        if simbolos is None:
+            self.sem_filtro[room][websocket] = cliente
+        else:
+            indice = self.por_simbolo[room]
+            for simbolo in simbolos:
+                indice.setdefault(simbolo, {})[websocket] = cliente
+        return True
+    
+    def unsubscribe(self, websocket: WebSocket, room: str) -> bool:
+        """Remove a conexão de uma room, mantendo-a conectada."""
+        cliente = self.active_connections.get(websocket)
+        if cliente is None or room not in cliente.salas:
+            return False
+        del self.rooms[room][websocket]
+        self._desindexar(cliente, room)
+        cliente.salas.discard(room)
+        return True
+    
+    def _desindexar(self, cliente: ClienteWS, room: str):
+        """Tira o cliente do índice de símbolos da room."""
+        simbolos, _ = cliente.filtros.pop(room, (None, 0.0))
+        if simbolos is None:
+            self.sem_filtro[room].pop(cliente.websocket, None)
+            return
+        indice = self.por_simbolo[room]
+        for simbolo in simbolos:
+            inscritos = indice.get(simbolo)
+            if inscritos is not None:
+                inscritos.pop(cliente.websocket, None)
+                if not inscritos:
+                    del indice[simbolo]
+    
+    def get_rooms(self, websocket: WebSocket) -> List[str]:
+        """Rooms em que a conexão está inscrita."""
+        cliente = self.active_connections.get(websocket)
+        return sorted(cliente.salas) if cliente else []
+    
+    def get_subscriptions(self, websocket: WebSocket) -> Dict[str, Dict[str, Any]]:
+        """Filtros por room da conexão (`symbols` None = todos)."""
+        cliente = self.active_connections.get(websocket)
+        if cliente is None:
+            return {}
+        return {
+            room: {"symbols": sorted(simbolos) if simbolos is not None else None,
+                   "min_score": score}
+            for room, (simbolos, score) in sorted(cliente.filtros.items())
+        }
+    
+    def _destinos(self, room: Optional[str], symbol: Optional[str],
+                  score: Optional[float]) -> List[ClienteWS]:
+        """
+        Clientes que devem receber um evento: membros da room sem filtro de
+        símbolo + inscritos no símbolo (pelo índice), depois o score mínimo.
+        """
+        if not room:
+            return list(self.active_connections.values())
+        membros = self.rooms.get(room)
+        if not membros:
+            return []
+        if symbol is None:
+            candidatos = membros.values()
+        else:
+            inscritos = self.por_simbolo[room].get(normalizar_simbolo(symbol))
+            candidatos = self.sem_filtro[room].values() if inscritos is None else \
+                chain(self.sem_filtro[room].values(), inscritos.values())
+        if score is None:
+            return list(candidatos)
+        return [c for c in candidatos if c.filtros[room][1] <= score]
+    
+    async def _enviar(self, cliente: ClienteWS):
+        """Task de envio de um cliente: consome a fila até a conexão cair."""
         try:
-            await websocket.send_json(message)
-            self.message_count += 1
+            while True:
+                texto = await cliente.fila.get()
+                await cliente.websocket.send_text(texto)
+                cliente.enviadas += 1
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            logger.error(f"Error sending personal message: {e}")
-            self.disconnect(websocket)
+            logger.error(f"Error sending to client: {e}")
+            self.disconnect(cliente.websocket)
+    
+    def _derrubar(self, websocket: WebSocket):
+        """Remove um cliente atrasado e fecha a conexão em background."""
+        self.derrubados += 1
+        self.disconnect(websocket)
+        logger.warning("WebSocket client dropped: send queue full")
+
+        async def fechar():
+            try:
+                await websocket.close(code=CODIGO_ATRASADO)
+            except Exception:
+                pass
+        asyncio.create_task(fechar())
+    
+    def _enfileirar(self, texto: str, clientes: Iterable[ClienteWS]) -> int:
+        """Entrega o frame às filas dos clientes; derruba quem está com a fila cheia."""
+        atrasados = []
+        enviados = 0
+        for cliente in clientes:
+            if cliente.enfileirar(texto):
+                enviados += 1
+            else:
+                atrasados.append(cliente.websocket)
+        for connection in atrasados:
+            self._derrubar(connection)
+        return enviados
     
-    async def broadcast(self, message: dict, room: Optional[str] = None):
+    async def send_personal_message(self, message: dict, websocket: WebSocket):
+        """Envia mensagem para um cliente específico"""
+        cliente = self.active_connections.get(websocket)
+        if cliente is None:
+            return
+        self.message_count += 1
+        self._enfileirar(dumps(message).decode("utf-8"), (cliente,))
+    
+    async def broadcast(self, message: dict, room: Optional[str] = None,
+                        symbol: Optional[str] = None, score: Optional[float] = None):
         """
         Envia mensagem para todos os clientes conectados
         
+        A mensagem é serializada uma única vez (e só se houver destinatário);
+        o frame vai para a fila de cada cliente e é enviado pelo task dele,
+        em paralelo.
+        
         Args:
             message: Dicionário com a mensagem
             room: Room específica (opcional) - se None, envia para todos
+            symbol: Símbolo do evento, para os filtros da room (opcional)
+            score: Score do evento, para o score mínimo dos filtros (opcional)
         """
         self.message_count += 1
+        if room in self.room_message_count:
+            self.room_message_count[room] += 1
         
         # Determina quais conexões usar
-        targets = self.rooms.get(room, []) if room else self.active_connections
+        targets = self._destinos(room, symbol, score)
         
         if not targets:
             return
         
-        disconnected = []
-        sent_count = 0
-        
-        for connection in targets:
-            try:
-                await connection.send_json(message)
-                sent_count += 1
-            except Exception as e:
-                logger.error(f"Error broadcasting: {e}")
-                disconnected.append(connection)
+        texto = dumps(message).decode("utf-8")
+        enviados = self._enfileirar(texto, targets)
         
-        # Remove clientes desconectados
-        for connection in disconnected:
-            self.disconnect(connection)
-        
-        logger.debug(f"Broadcast sent to {sent_count}/{len(targets)} clients")
+        logger.debug(f"Broadcast queued for {enviados}/{len(targets)} clients")
     
-    async def broadcast_signal(self, signal_data: dict):
-        """Envia evento de sinal - formato padronizado"""
-        await self.broadcast({
-            "type": "signal",
-            "data": signal_data
-        }, room="signals")
+    async def broadcast_signal(self, signal_data: dict, message_type: str = "signal"):
+        """
+        Envia evento de sinal - formato padronizado
+
+        Vai só para a room "signals", como sempre: membros sem filtro
+        recebem todos os sinais; os filtrados, os do símbolo (normalizado,
+        "WIN$" casa com "WIN") com score_final >= min_score.
+        """
+        await self.broadcast(
+            {"type": message_type, "data": signal_data}, room="signals",
+            symbol=signal_data.get("symbol"), score=signal_data.get("score_final"),
+        )
     
-    async def broadcast_metrics(self, metrics_data: dict):
-        """Envia métricas - formato padronizado"""
+    async def broadcast_metrics(self, metrics_data: dict, symbol: Optional[str] = None):
+        """Envia métricas - formato padronizado (`symbol` para métricas de um ativo)"""
         await self.broadcast({
             "type": "metrics",
             "data": metrics_data
-        }, room="metrics")
+        }, room="metrics", symbol=symbol)
     
     async def broadcast_alert(self, alert_data: dict):
         """Envia alerta - formato padronizado"""
@@ -145,7 +359,21 @@ class ConnectionManager:
     
     def get_room_count(self, room: str) -> int:
         """Retorna número de clientes em uma room específica"""
-        return len(self.rooms.get(room, []))
+        return len(self.rooms.get(room, {}))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Conexões, clientes e mensagens por room"""
+        return {
+            "connections": len(self.active_connections),
+            "messages": self.message_count,
+            "dropped": self.derrubados,
+            "rooms": {
+                room: {"clients": len(clientes),
+                       "messages": self.room_message_count[room],
+                       "symbols": len(self.por_simbolo[room])}
+                for room, clientes in self.rooms.items()
+            },
+        }
 
 
 # Singleton instance
@@ -5,9 +5,10 @@ from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
 from app.websocket.manager import manager
 from app.auth.jwt import decode_token
 from app.signals.manager import signal_manager
-from typing import Optional
+from typing import List, Optional, Tuple
 import json
 import logging
+import math
 
 logger = logging.getLogger(__name__)
 
@@ -33,8 +34,47 @@ async def authenticate_websocket(token: Optional[str]) -> bool:
         return True  # Allow for demo
 
 
+def _simbolos(symbols: Optional[str]) -> Optional[List[str]]:
+    """`?symbols=WIN,WDO` → lista (None = todos)"""
+    return [s.strip() for s in symbols.split(",") if s.strip()] if symbols else None
+
+
+def _lista_de_textos(valor, campo: str) -> List[str]:
+    if not isinstance(valor, list) or not all(isinstance(v, str) for v in valor):
+        raise ValueError(f"'{campo}' must be a list of strings")
+    return valor
+
+
+def _inscricao(message: dict) -> Tuple[List[str], Optional[List[str]], float]:
+    """
+    Valida um comando subscribe/unsubscribe.
+    Returns: (rooms, symbols ou None, min_score); ValueError se inválido.
+    """
+    if "rooms" in message:
+        rooms = _lista_de_textos(message["rooms"], "rooms")
+    else:
+        room = message.get("room")
+        if not isinstance(room, str):
+            raise ValueError("'room' must be a string")
+        rooms = [room]
+
+    symbols = message.get("symbols")
+    if symbols is not None:
+        symbols = _lista_de_textos(symbols, "symbols")
+
+    min_score = message.get("min_score")
+    if min_score is None:
+        min_score = 0.0
+    elif isinstance(min_score, bool) or not isinstance(min_score, (int, float)) \
+            or not math.isfinite(min_score):
+        raise ValueError("'min_score' must be a number")
+    return rooms, symbols, float(min_score)
+
+
 @router.websocket("/ws/realtime")
-async def websocket_realtime(websocket: WebSocket, token: Optional[str] = Query(None)):
+async def websocket_realtime(websocket: WebSocket, token: Optional[str] = Query(None),
+                             symbols: Optional[str] = Query(None),
+                             min_score: float = Query(0.0)):
     """
     WebSocket endpoint principal para tempo real
     
@@ -43,6 +83,10 @@ async def websocket_realtime(websocket: WebSocket, token: Optional[str] = Query(
     - metrics: Broadcast de métricas
     - alerts: Broadcast de alertas
     - replay: Dados do replay
+    
+    Começa em "signals" (filtrada por `?symbols=WIN,WDO&min_score=70`);
+    `subscribe`/`unsubscribe` (room ou rooms, com `symbols` e `min_score`
+    opcionais) alteram as inscrições sem reconectar.
     """
     # Autentica
     if not await authenticate_websocket(token):
@@ -50,18 +94,19 @@ async def websocket_realtime(websocket: WebSocket, token: Optional[str] = Query(
         return
     
     # Aceita conexão
-    await manager.connect(websocket, room="signals")
+    await manager.connect(websocket, room="signals", symbols=_simbolos(symbols),
+                          min_score=min_score)
     
     try:
         # Envia estado atual
-        await websocket.send_json({
+        await manager.send_personal_message({
             "type": "system",
             "data": {
                 "message": "Connected to SMC Real-Time",
                 "open_signals": len(signal_manager.get_open_signals()),
                 "closed_signals": len(signal_manager.closed_signals)
             }
-        })
+        }, websocket)
         
         # Mantém conexão ativa
         while True:
@@ -69,21 +114,45 @@ async def websocket_realtime(websocket: WebSocket, token: Optional[str] = Query(
             
             try:
                 message = json.loads(data)
+                if not isinstance(message, dict):
+                    await manager.send_personal_message(
+                        {"type": "error", "message": "Expected a JSON object"},
+                        websocket,
+                    )
+                    continue
                 
                 # Processa comandos do cliente
                 if message.get("type") == "ping":
-                    await websocket.send_json({"type": "pong"})
+                    await manager.send_personal_message({"type": "pong"}, websocket)
                 elif message.get("type") == "get_metrics":
                     metrics = signal_manager.get_metrics()
-                    await websocket.send_json(metrics.to_dict())
-                elif message.get("type") == "subscribe":
-                    room = message.get("room")
-                    if room:
-                        manager.disconnect(websocket)
-                        await manager.connect(websocket, room=room)
+                    await manager.send_personal_message(metrics.to_dict(), websocket)
+                elif message.get("type") in ("subscribe", "unsubscribe"):
+                    # {"type": "subscribe", "room": "signals",
+                    #  "symbols": ["WIN"], "min_score": 70} ou "rooms": [...]
+                    try:
+                        rooms, simbolos, score_minimo = _inscricao(message)
+                    except ValueError as e:
+                        await manager.send_personal_message(
+                            {"type": "error", "message": str(e)}, websocket
+                        )
+                        continue
+                    for room in rooms:
+                        if not room:
+                            continue
+                        if message["type"] == "subscribe":
+                            manager.subscribe(websocket, room, simbolos, score_minimo)
+                        else:
+                            manager.unsubscribe(websocket, room)
+                    await manager.send_personal_message({
+                        "type": "subscriptions",
+                        "rooms": manager.get_rooms(websocket),
+                        "filters": manager.get_subscriptions(websocket)
+                    }, websocket)
                         
             except json.JSONDecodeError:
-                await websocket.send_json({"type": "error", "message": "Invalid JSON"})
+                await manager.send_personal_message(
+                    {"type": "error", "message": "Invalid JSON"}, websocket)
                 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -93,20 +162,23 @@ async def websocket_realtime(websocket: WebSocket, token: Optional[str] = Query(
 
 
 @router.websocket("/ws/signals")
-async def websocket_signals(websocket: WebSocket, token: Optional[str] = Query(None)):
+async def websocket_signals(websocket: WebSocket, token: Optional[str] = Query(None),
+                            symbols: Optional[str] = Query(None),
+                            min_score: float = Query(0.0)):
     """
-    WebSocket endpoint específico para sinais
+    WebSocket endpoint específico para sinais (`?symbols=` e `?min_score=` opcionais)
     """
     if not await authenticate_websocket(token):
         await websocket.close(code=1008)
         return
     
-    await manager.connect(websocket, room="signals")
+    await manager.connect(websocket, room="signals", symbols=_simbolos(symbols),
+                          min_score=min_score)
     
     try:
         while True:
             data = await websocket.receive_text()
-            await websocket.send_json({"type": "ack"})
+            await manager.send_personal_message({"type": "ack"}, websocket)
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
@@ -125,7 +197,7 @@ async def websocket_metrics(websocket: WebSocket, token: Optional[str] = Query(N
     try:
         # Envia métricas iniciais
         metrics = signal_manager.get_metrics()
-        await websocket.send_json(metrics.to_dict())
+        await manager.send_personal_message(metrics.to_dict(), websocket)
         
         while True:
             data = await websocket.receive_text()
@@ -133,7 +205,7 @@ async def websocket_metrics(websocket: WebSocket, token: Optional[str] = Query(N
             # Permite request de métricas
             if data == "refresh":
                 metrics = signal_manager.get_metrics()
-                await websocket.send_json(metrics.to_dict())
+                await manager.send_personal_message(metrics.to_dict(), websocket)
                 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -153,6 +225,7 @@ async def websocket_replay(websocket: WebSocket, token: Optional[str] = Query(No
     try:
         while True:
             data = await websocket.receive_text()
-            await websocket.send_json({"type": "ack", "room": "replay"})
+            await manager.send_personal_message(
+                {"type": "ack", "room": "replay"}, websocket)
     except WebSocketDisconnect:
         manager.disconnect(websocket)
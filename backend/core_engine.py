@@ -4,17 +4,41 @@ Analise de mercados financeiros usando conceitos de smart money
 """
 import os
 import logging
-from dataclasses import dataclass, field
+import threading
+from dataclasses import dataclass, field, fields
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 
+import numpy as np
+
 logger = logging.getLogger("smc.core_engine")
 
+# Barras necessarias antes do primeiro resultado
+BARRAS_AQUECIMENTO = 60
+
+# Campos do SMCResult preenchidos pelo pipeline de modulos (app.modules)
+CAMPOS_MODULOS = (
+    "score_hfz", "delta_normalizado", "hz_normalizado", "absorcao_normalizada",
+    "imbalance_score", "exaustao_compra", "exaustao_venda",
+    "score_fbi", "zona_proxima", "preco_zona_proxima", "tipo_zona_proxima",
+    "distancia_zona", "contato_zona", "reacao_zona",
+    "score_dtm", "trap_flag", "trap_intensity", "falha_continuidade",
+    "eficiencia_deslocamento",
+    "score_sda", "regime_mercado", "direcao_regime", "vol_normalizada",
+    "prob_continuacao", "fase_movimento",
+    "score_mtv", "score_confluencia", "score_divergencia", "confluencia_camada",
+    "confluencia_forte", "divergencia_confirmada", "sessao_atual",
+    "direcao_tf_rapido", "direcao_tf_medio", "direcao_tf_lento",
+    "direcao_tf_diario", "direcao_tf_semanal", "renko_sugestao", "renko_qualidade",
+    "evento_trap", "evento_confluencia", "evento_divergencia",
+    "evento_contato_zona", "bloqueio_trap", "bloqueio_divergencia",
+)
+
 
 # ============================================================
 # DATA CLASSES
 # ============================================================
-@dataclass
+@dataclass(slots=True)
 class Bar:
     """Representa um candle/barra de preco."""
     open: float
@@ -30,7 +54,7 @@ class Bar:
     tick_minimo: float = 5.0
 
 
-@dataclass
+@dataclass(slots=True)
 class SMCResult:
     """Resultado da analise SMC."""
     # Scores
@@ -114,6 +138,262 @@ class SMCResult:
     bloqueio_divergencia: bool = False
 
 
+# ============================================================
+# BAR BUFFER (ring buffer colunar)
+# ============================================================
+class BarBuffer:
+    """
+    Ring buffer colunar pre-alocado para o historico de barras.
+
+    Cada coluna e gravada duas vezes (posicao i e i + capacidade), de modo
+    que as ultimas N barras estao sempre contiguas na memoria. Assim
+    `janela()` devolve uma view NumPy sem copia, em ordem cronologica
+    (mais antiga primeiro), e cada `push()` custa O(1) sem realocacao.
+    """
+
+    COLUNAS = (
+        "open", "high", "low", "close", "volume", "volume_compra",
+        "volume_venda", "trades", "true_range", "timestamp",
+    )
+    _INDICE = {nome: i for i, nome in enumerate(COLUNAS)}
+
+    def __init__(self, capacidade: int = 500):
+        if capacidade <= 0:
+            raise ValueError("capacidade deve ser positiva")
+        self.capacidade = capacidade
+        self._dados = np.zeros((len(self.COLUNAS), 2 * capacidade), dtype=np.float64)
+        self._pos = -1  # indice da ultima barra gravada
+        self._tamanho = 0
+
+    def push(self, bar: Bar):
+        """Grava uma barra in place (sobrescreve a mais antiga quando cheio)."""
+        pos = (self._pos + 1) % self.capacidade
+        dados = self._dados
+        for linha, valor in enumerate((
+            bar.open, bar.high, bar.low, bar.close, bar.volume,
+            bar.volume_compra, bar.volume_venda, bar.trades,
+            bar.true_range, bar.timestamp_hhmm,
+        )):
+            dados[linha, pos] = valor
+            dados[linha, pos + self.capacidade] = valor
+        self._pos = pos
+        if self._tamanho < self.capacidade:
+            self._tamanho += 1
+
+    def push_many(self, bloco: np.ndarray):
+        """
+        Grava um bloco de barras de uma vez.
+
+        Args:
+            bloco: Array (len(COLUNAS), N) em ordem cronologica
+        """
+        n = bloco.shape[1]
+        if n == 0:
+            return
+        if n > self.capacidade:
+            bloco = bloco[:, -self.capacidade:]
+            n = self.capacidade
+        posicoes = (self._pos + 1 + np.arange(n)) % self.capacidade
+        self._dados[:, posicoes] = bloco
+        self._dados[:, posicoes + self.capacidade] = bloco
+        self._pos = int(posicoes[-1])
+        self._tamanho = min(self.capacidade, self._tamanho + n)
+
+    def janela(self, coluna: str, n: Optional[int] = None) -> np.ndarray:
+        """View contigua (sem copia) das ultimas `n` barras de uma coluna."""
+        if n is None or n > self._tamanho:
+            n = self._tamanho
+        fim = self._pos + self.capacidade + 1
+        return self._dados[self._INDICE[coluna], fim - n:fim]
+
+    def ultimo(self, coluna: str) -> float:
+        """Valor da coluna na barra mais recente."""
+        return float(self._dados[self._INDICE[coluna], self._pos])
+
+    def clear(self):
+        """Esvazia o buffer sem realocar."""
+        self._dados.fill(0)
+        self._pos = -1
+        self._tamanho = 0
+
+    def estado(self) -> Dict[str, Any]:
+        """Estado para snapshot."""
+        return {"dados": self._dados, "pos": self._pos, "tamanho": self._tamanho}
+
+    def restaurar(self, estado: Dict[str, Any]):
+        dados = np.asarray(estado["dados"], dtype=np.float64)
+        if dados.shape != self._dados.shape:
+            raise ValueError("Capacidade do buffer incompativel com o snapshot")
+        self._dados[:] = dados
+        self._pos = int(estado["pos"])
+        self._tamanho = int(estado["tamanho"])
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria ocupada pelo buffer."""
+        return self._dados.nbytes
+
+    def __len__(self) -> int:
+        return self._tamanho
+
+
+# ============================================================
+# TABELA DE RESULTADOS (struct-of-arrays)
+# ============================================================
+# dtype da coluna por tipo do campo do SMCResult (ausente = categorico)
+_DTYPES = {bool: "?", int: "<i4", float: "<f8"}
+
+_PADRAO_RESULTADO = SMCResult()
+PADROES_RESULTADO = {f.name: getattr(_PADRAO_RESULTADO, f.name)
+                     for f in fields(SMCResult)}
+ESQUEMA_RESULTADO = {f.name: _DTYPES.get(f.type) for f in fields(SMCResult)}
+
+
+class TabelaResultados:
+    """
+    Resultados de muitas barras em colunas NumPy tipadas pre-alocadas.
+
+    Cada campo do SMCResult vira uma coluna (float64, int32 ou bool);
+    campos de texto/lista guardam um codigo int16 e a lista de categorias.
+    `indice` e a posicao da barra na entrada. Em vez de um objeto por
+    barra, o custo fica em poucas dezenas de bytes por linha para as
+    colunas do engine base.
+
+    Sem `campos`, as colunas sao as da primeira tabela anexada (ou todas,
+    se o primeiro registro vier de `anexar_resultado`).
+    """
+
+    def __init__(self, capacidade: int = 1024, campos: Optional[List[str]] = None):
+        self._capacidade = max(int(capacidade), 1)
+        self._n = 0
+        self.indice = np.zeros(self._capacidade, dtype=np.int64)
+        self.campos: Optional[tuple] = None
+        self._colunas: Dict[str, np.ndarray] = {}
+        self._categorias: Dict[str, List[Any]] = {}
+        self._codigos: Dict[str, Dict[Any, int]] = {}
+        if campos is not None:
+            self._definir_campos(campos)
+
+    def _definir_campos(self, campos):
+        desconhecidos = [c for c in campos if c not in ESQUEMA_RESULTADO]
+        if desconhecidos:
+            raise ValueError(f"Campos desconhecidos: {desconhecidos}")
+        self.campos = tuple(campos)
+        for campo in self.campos:
+            dtype = ESQUEMA_RESULTADO[campo] or "<i2"
+            self._colunas[campo] = np.zeros(self._capacidade, dtype=dtype)
+            if ESQUEMA_RESULTADO[campo] is None:
+                self._categorias[campo] = []
+                self._codigos[campo] = {}
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def capacidade(self) -> int:
+        return self._capacidade
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria das colunas alocadas."""
+        return self.indice.nbytes + sum(c.nbytes for c in self._colunas.values())
+
+    def _garantir(self, extra: int):
+        necessario = self._n + extra
+        if necessario <= self._capacidade:
+            return
+        capacidade = max(necessario, 2 * self._capacidade)
+        for nome, coluna in [("indice", self.indice)] + list(self._colunas.items()):
+            nova = np.zeros(capacidade, dtype=coluna.dtype)
+            nova[:self._n] = coluna[:self._n]
+            if nome == "indice":
+                self.indice = nova
+            else:
+                self._colunas[nome] = nova
+        self._capacidade = capacidade
+
+    def _codigo(self, campo: str, valor) -> int:
+        if isinstance(valor, np.generic):
+            valor = valor.item()
+        chave = tuple(valor) if isinstance(valor, list) else valor
+        codigos = self._codigos[campo]
+        codigo = codigos.get(chave)
+        if codigo is None:
+            codigo = codigos[chave] = len(codigos)
+            if codigo > np.iinfo(np.int16).max:
+                raise ValueError(f"Categorias demais em {campo}")
+            self._categorias[campo].append(valor)
+        return codigo
+
+    def anexar(self, tabela: Dict[str, np.ndarray], deslocamento: int = 0):
+        """Anexa uma tabela de `process_many` (indices somados a `deslocamento`)."""
+        if self.campos is None:
+            self._definir_campos([c for c in tabela if c != "indice"])
+        n = len(tabela["indice"])
+        self._garantir(n)
+        fatia = slice(self._n, self._n + n)
+        self.indice[fatia] = np.asarray(tabela["indice"]) + deslocamento
+        for campo in self.campos:
+            coluna = self._colunas[campo]
+            if campo not in tabela:
+                padrao = PADROES_RESULTADO[campo]
+                if not ESQUEMA_RESULTADO[campo]:
+                    padrao = self._codigo(campo, padrao)
+                coluna[fatia] = padrao
+            elif ESQUEMA_RESULTADO[campo]:
+                coluna[fatia] = tabela[campo]
+            else:
+                coluna[fatia] = [self._codigo(campo, v) for v in tabela[campo]]
+        self._n += n
+
+    def anexar_resultado(self, indice: int, resultado: SMCResult):
+        """Anexa um SMCResult do caminho streaming."""
+        if self.campos is None:
+            self._definir_campos(list(ESQUEMA_RESULTADO))
+        self._garantir(1)
+        i = self._n
+        self.indice[i] = indice
+        for campo in self.campos:
+            valor = getattr(resultado, campo)
+            if ESQUEMA_RESULTADO[campo]:
+                self._colunas[campo][i] = valor
+            else:
+                self._colunas[campo][i] = self._codigo(campo, valor)
+        self._n += 1
+
+    def coluna(self, campo: str) -> np.ndarray:
+        """Coluna das linhas preenchidas (view; categoricos decodificados)."""
+        if campo == "indice":
+            return self.indice[:self._n]
+        dados = self._colunas[campo][:self._n]
+        if ESQUEMA_RESULTADO[campo] is None:
+            categorias = np.empty(len(self._categorias[campo]), dtype=object)
+            categorias[:] = self._categorias[campo]
+            return categorias[dados]
+        return dados
+
+    __getitem__ = coluna
+
+    def colunas(self) -> Dict[str, np.ndarray]:
+        """Todas as colunas, no formato da tabela de `process_many`."""
+        return {"indice": self.coluna("indice"),
+                **{campo: self.coluna(campo) for campo in self.campos or ()}}
+
+    def resultado(self, linha: int, nome_ativo: str = "") -> SMCResult:
+        """Reconstroi o SMCResult de uma linha."""
+        resultado = SMCResult(nome_ativo=nome_ativo)
+        for campo in self.campos or ():
+            codigo = self._colunas[campo][linha]
+            if ESQUEMA_RESULTADO[campo] is None:
+                valor = self._categorias[campo][codigo]
+                if isinstance(valor, (list, tuple)):
+                    valor = list(valor)
+                setattr(resultado, campo, valor)
+            else:
+                setattr(resultado, campo, codigo.item())
+        return resultado
+
+
 # ============================================================
 # SMC CORE ENGINE
 # ============================================================
@@ -122,41 +402,223 @@ class SMCCoreEngine:
         self,
         tf_base_minutos: int = 5,
         modo_operacao: int = 2,
-        tipo_ativo: int = 1
+        tipo_ativo: int = 1,
+        usar_modulos: bool = False
     ):
         self.tf_base_minutos = tf_base_minutos
         self.modo_operacao = modo_operacao
         self.tipo_ativo = tipo_ativo
         
-        self.barras: List[Bar] = []
+        self.barras = BarBuffer(capacidade=500)
         self.contador_barras = 0
         self.ultimo_resultado: Optional[SMCResult] = None
+        # Serializa mutacoes (process/process_many/restaurar) e leituras do
+        # estado completo (snapshots), que podem vir de threads diferentes
+        self.trava = threading.RLock()
+        
+        # Modulos HFZ/DTM/SDA/FBI/MTV sobre um historico compartilhado
+        self.pipeline = None
+        if usar_modulos:
+            from app.modules.pipeline import SMCPipeline
+            self.pipeline = SMCPipeline(tipo_ativo=tipo_ativo, tf_base=tf_base_minutos)
         
         logger.info(f"SMCCoreEngine inicializado (TF: {tf_base_minutos}m, modo: {modo_operacao})")
 
     def process(self, bar: Bar) -> Optional[SMCResult]:
         """Processa uma barra e retorna analise SMC."""
-        self.barras.append(bar)
+        with self.trava:
+            return self._process(bar)
+
+    def _process(self, bar: Bar) -> Optional[SMCResult]:
+        self.barras.push(bar)
         self.contador_barras += 1
         
+        # Modulos acompanham todas as barras, inclusive o aquecimento
+        if self.pipeline is not None:
+            self.pipeline.process(bar)
+        
         # Warmup - precisa de barras suficientes
-        if len(self.barras) < 60:
+        if len(self.barras) < BARRAS_AQUECIMENTO:
             return None
         
-        # Limita tamanho do buffer
-        if len(self.barras) > 500:
-            self.barras = self.barras[-500:]
-        
         # Executa analise SMC
         resultado = self._analisar()
+        if self.pipeline is not None:
+            self.pipeline.preencher(resultado, bar)
         self.ultimo_resultado = resultado
         
         return resultado
 
+    def process_many(self, colunas) -> Dict[str, np.ndarray]:
+        """
+        Processa uma sessao inteira de barras de forma vetorizada.
+
+        Equivalente a chamar `process()` barra a barra: o estado do engine
+        (buffer, contador e ultimo resultado) avanca da mesma forma. Os
+        campos do core sao identicos bit a bit ao SMCResult do caminho
+        streaming para a mesma barra. Com `usar_modulos=True`, os campos de
+        CAMPOS_MODULOS saem de somas vetorizadas e os floats batem com as
+        somas incrementais do streaming apenas a menos de arredondamento
+        (erro relativo da ordem de 1e-12).
+
+        Args:
+            colunas: Dict de arrays ou DataFrame com as colunas de
+                BarBuffer.COLUNAS (high, low e close obrigatorias;
+                "timestamp_hhmm" aceito como alias de "timestamp";
+                "tick_minimo" opcional, escalar ou array, repassado aos modulos)
+
+        Returns:
+            Tabela colunar (dict de arrays NumPy) com uma linha por barra
+            pos-aquecimento; "indice" aponta a linha de entrada.
+        """
+        with self.trava:
+            return self._process_many(colunas)
+
+    def _process_many(self, colunas) -> Dict[str, np.ndarray]:
+        bloco = self._colunas_para_bloco(colunas)
+        n = bloco.shape[1]
+
+        # Prefixo com o historico ja no buffer (janelas cruzam a fronteira)
+        n_hist = min(len(self.barras), 19)
+        if n_hist:
+            hist = np.stack([self.barras.janela(c, n_hist) for c in BarBuffer.COLUNAS])
+            dados = np.concatenate([hist, bloco], axis=1)
+        else:
+            dados = bloco
+
+        # Posicao de cada barra nova na contagem total do engine
+        contagem = self.contador_barras + 1 + np.arange(n)
+        validas = contagem >= BARRAS_AQUECIMENTO
+        # indices (em `dados`) das barras que geram resultado
+        pos = np.nonzero(validas)[0] + n_hist
+
+        high = dados[BarBuffer._INDICE["high"]]
+        low = dados[BarBuffer._INDICE["low"]]
+        close = dados[BarBuffer._INDICE["close"]]
+
+        # Estado: primeiro vs ultimo high/low da janela de 20
+        h_ult, h_pri = high[pos], high[pos - 19]
+        l_ult, l_pri = low[pos], low[pos - 19]
+        estado = np.where(
+            (h_ult > h_pri) & (l_ult > l_pri), "alta",
+            np.where((h_ult < h_pri) & (l_ult < l_pri), "baixa", "lateral")
+        )
+
+        # Direcao: ultimo close vs media de 10
+        media10 = self._media_janelas(close, pos, 10)
+        c_ult = close[pos]
+        direcao = np.where(
+            c_ult > media10 * 1.001, "COMPRA",
+            np.where(c_ult < media10 * 0.999, "VENDA", "neutro")
+        )
+
+        # Scores: ultimo close vs media de 20
+        media20 = self._media_janelas(close, pos, 20)
+        acima = c_ult > media20
+        score_compra = np.where(acima, 60, 40)
+        score_venda = np.where(acima, 40, 60)
+        score_final = (score_compra + score_venda) / 2
+
+        qualidade = np.full(len(pos), 3)
+        setup_ok = (score_final >= 60) & (qualidade >= 3)
+
+        tabela = {
+            "indice": pos - n_hist,
+            "estado_mercado": estado,
+            "direcao": direcao,
+            "qualidade_setup": qualidade,
+            "score_final": score_final,
+            "score_compra": score_compra.astype(np.float64),
+            "score_venda": score_venda.astype(np.float64),
+            "permissao_compra": setup_ok & (direcao == "COMPRA"),
+            "permissao_venda": setup_ok & (direcao == "VENDA"),
+            "bloqueio_score_baixo": score_final < 55,
+        }
+
+        if self.pipeline is not None:
+            tick_minimo = colunas["tick_minimo"] if "tick_minimo" in colunas else None
+            tabela.update(self._modulos_em_lote(bloco, validas, tick_minimo))
+        
+        # Avanca o estado como no caminho streaming
+        self.barras.push_many(bloco)
+        self.contador_barras += n
+        if len(pos):
+            self.ultimo_resultado = self.resultado_da_tabela(tabela, len(pos) - 1)
+
+        return tabela
+
+    def process_blocos(self, blocos, capacidade: int = 1024) -> TabelaResultados:
+        """
+        Processa varios blocos em sequencia (`process_many`) e acumula os
+        resultados numa TabelaResultados; `indice` conta desde o primeiro
+        bloco. A trava e tomada por bloco: um snapshot no meio ve o estado
+        ao fim de um bloco, nunca de um bloco pela metade.
+        """
+        resultados = TabelaResultados(capacidade)
+        deslocamento = 0
+        for colunas in blocos:
+            resultados.anexar(self.process_many(colunas), deslocamento)
+            deslocamento += len(colunas["close"])
+        return resultados
+
+    def resultado_da_tabela(self, tabela: Dict[str, np.ndarray],
+                            linha: int) -> SMCResult:
+        """Reconstroi o SMCResult de uma linha da tabela de process_many."""
+        resultado = SMCResult(nome_ativo=getattr(self, 'ativo', 'WIN'))
+        for campo, coluna in tabela.items():
+            if campo != "indice":
+                valor = coluna[linha]
+                setattr(resultado, campo,
+                        valor.item() if hasattr(valor, "item") else valor)
+        return resultado
+
+    def _modulos_em_lote(self, bloco: np.ndarray, validas: np.ndarray,
+                         tick_minimo=None) -> Dict[str, np.ndarray]:
+        """Roda o pipeline de modulos sobre o bloco e monta suas colunas."""
+        from app.modules.pipeline import tabela_resultado
+
+        colunas = {nome: bloco[i] for i, nome in enumerate(BarBuffer.COLUNAS)}
+        if tick_minimo is not None:
+            colunas["tick_minimo"] = np.broadcast_to(
+                np.asarray(tick_minimo, dtype=np.float64), bloco.shape[1])
+        series = self.pipeline.process_series(colunas)
+        tabela = tabela_resultado(series, preco=colunas["close"])
+        return {campo: tabela[campo][validas] for campo in CAMPOS_MODULOS}
+
+    def _colunas_para_bloco(self, colunas) -> np.ndarray:
+        """Converte dict de arrays/DataFrame em bloco (len(COLUNAS), N)."""
+        n = len(colunas["close"])
+        bloco = np.zeros((len(BarBuffer.COLUNAS), n), dtype=np.float64)
+        for i, nome in enumerate(BarBuffer.COLUNAS):
+            if nome in colunas:
+                bloco[i] = np.asarray(colunas[nome], dtype=np.float64)
+            elif nome == "timestamp" and "timestamp_hhmm" in colunas:
+                bloco[i] = np.asarray(colunas["timestamp_hhmm"], dtype=np.float64)
+            elif nome in ("high", "low"):
+                raise ValueError(f"Coluna obrigatoria ausente: {nome}")
+        return bloco
+
+    @staticmethod
+    def _media_janelas(valores: np.ndarray, pos: np.ndarray, n: int) -> np.ndarray:
+        """Media das janelas de `n` barras terminadas em cada posicao de `pos`.
+
+        `pos` e um intervalo continuo. Cada janela e somada como linha
+        contigua (mesma reducao do caminho streaming), em blocos para
+        limitar a memoria, garantindo resultados identicos bit a bit.
+        """
+        somas = np.zeros(len(pos), dtype=np.float64)
+        if len(pos) == 0:
+            return somas
+        janelas = np.lib.stride_tricks.sliding_window_view(valores, n)
+        janelas = janelas[pos[0] - (n - 1):pos[-1] - (n - 1) + 1]
+        for ini in range(0, len(janelas), 65536):
+            bloco = np.ascontiguousarray(janelas[ini:ini + 65536])
+            somas[ini:ini + 65536] = bloco.sum(axis=1)
+        return somas / n
+
     def _analisar(self) -> SMCResult:
         """Executa a analise completa SMC."""
         barras = self.barras
-        ultima = barras[-1]
         
         # Calculo basico de scores
         resultado = SMCResult(
@@ -174,14 +636,13 @@ class SMCCoreEngine:
         
         return resultado
 
-    def _detectar_estado(self, barras: List[Bar]) -> str:
+    def _detectar_estado(self, barras: BarBuffer) -> str:
         """Detecta estado do mercado."""
         if len(barras) < 20:
             return "lateral"
         
-        ultimos = barras[-20:]
-        highs = [b.high for b in ultimos]
-        lows = [b.low for b in ultimos]
+        highs = barras.janela("high", 20)
+        lows = barras.janela("low", 20)
         
         # Simplificado: detecta se ha tendencia
         primeiro_high = highs[0]
@@ -196,15 +657,14 @@ class SMCCoreEngine:
         
         return "lateral"
 
-    def _detectar_direcao(self, barras: List[Bar]) -> str:
+    def _detectar_direcao(self, barras: BarBuffer) -> str:
         """Detecta direcao predominante."""
         if len(barras) < 10:
             return "neutro"
         
-        ultimas = barras[-10:]
-        closes = [b.close for b in ultimas]
+        closes = barras.janela("close", 10)
         
-        media = sum(closes) / len(closes)
+        media = closes.sum() / 10
         ultimo_close = closes[-1]
         
         if ultimo_close > media * 1.001:
@@ -214,15 +674,15 @@ class SMCCoreEngine:
         
         return "neutro"
 
-    def _calcular_scores(self, barras: List[Bar], resultado: SMCResult) -> SMCResult:
+    def _calcular_scores(self, barras: BarBuffer, resultado: SMCResult) -> SMCResult:
         """Calcula scores dos modulos SMC."""
         # Scores simulados baseados em indicadores simples
         
-        ultima = barras[-1]
-        media20 = sum([b.close for b in barras[-20:]]) / 20
+        closes = barras.janela("close", 20)
+        media20 = closes.sum() / 20
         
         # Score baseado em posicao relativa
-        if ultima.close > media20:
+        if closes[-1] > media20:
             resultado.score_compra = 60
             resultado.score_venda = 40
         else:
@@ -258,16 +718,65 @@ class SMCCoreEngine:
 
     def reset(self):
         """Reseta o engine."""
-        self.barras = []
-        self.contador_barras = 0
-        self.ultimo_resultado = None
+        with self.trava:
+            self.barras.clear()
+            if self.pipeline is not None:
+                self.pipeline.reset()
+            self.contador_barras = 0
+            self.ultimo_resultado = None
         logger.info("SMCCoreEngine resetado")
 
+    def configuracao(self) -> Dict[str, Any]:
+        """Parametros que um snapshot precisa ter iguais para ser restaurado."""
+        return {
+            "tf_base_minutos": self.tf_base_minutos,
+            "modo_operacao": self.modo_operacao,
+            "tipo_ativo": self.tipo_ativo,
+            "capacidade": self.barras.capacidade,
+            "usar_modulos": self.pipeline is not None,
+        }
+
+    def estado(self) -> Dict[str, Any]:
+        """
+        Estado completo: buffer de barras, contador e estado dos modulos.
+        Os arrays podem ser views do estado vivo: quem os copia depois deve
+        segurar `trava` (ver `engine_snapshot.serializar`).
+        """
+        estado = {
+            "barras": self.barras.estado(),
+            "contador_barras": self.contador_barras,
+        }
+        if self.pipeline is not None:
+            estado["pipeline"] = self.pipeline.estado()
+        return estado
+
+    def restaurar(self, estado: Dict[str, Any]):
+        """Restaura um estado de `estado()`; em caso de erro o engine e resetado."""
+        with self.trava:
+            try:
+                self.barras.restaurar(estado["barras"])
+                self.contador_barras = int(estado["contador_barras"])
+                if self.pipeline is not None:
+                    self.pipeline.restaurar(estado["pipeline"])
+            except (KeyError, ValueError):
+                self.reset()
+                raise
+            self.ultimo_resultado = None
+
+    def memoria_bytes(self) -> int:
+        """Memoria ocupada pelos historicos do engine e dos modulos."""
+        total = self.barras.nbytes
+        if self.pipeline is not None:
+            total += self.pipeline.nbytes
+        return total
+
     def get_stats(self) -> Dict[str, Any]:
         """Retorna estatisticas do engine."""
         return {
             "barras_processadas": self.contador_barras,
             "barras_buffer": len(self.barras),
+            "memoria_bytes": self.memoria_bytes(),
+            "modulos": self.pipeline is not None,
             "ultimo_resultado": self.ultimo_resultado is not None
         }
 
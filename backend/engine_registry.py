@@ -0,0 +1,307 @@
+"""
+Engine Registry - Um SMCCoreEngine por (ativo, timeframe)
+Criacao sob demanda, despejo LRU por ociosidade e orcamento de memoria
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Tuple, List
+
+from core_engine import SMCCoreEngine
+import engine_snapshot
+
+logger = logging.getLogger("smc.engine_registry")
+
+# Mapeamento ativo -> tipo_ativo usado pela calibracao (ver MTVModule.ativo_perfis)
+TIPOS_ATIVO = {
+    "WIN": 1,
+    "WDO": 2,
+    "NASDAQ": 3,
+    "NQ": 3,
+    "ES": 4,
+}
+
+
+@dataclass
+class EngineEntry:
+    """Engine registrado e seus metadados de uso."""
+    engine: SMCCoreEngine
+    ativo: str
+    timeframe: int
+    criado_em: float
+    ultimo_uso: float
+    acessos: int = 0
+
+
+class EngineRegistry:
+    """
+    Registro de engines por (ativo, timeframe).
+
+    - Cria o engine na primeira barra recebida para a chave
+    - Mantem ordem LRU (mais recente no fim)
+    - Despeja engines ociosos ha mais de `max_ocioso_segundos`
+    - Despeja os menos usados quando `max_engines` ou `memoria_max_mb`
+      sao excedidos
+    - Com `diretorio_estado`, restaura o snapshot do engine ao cria-lo e o
+      grava ao despejar/encerrar (`salvar_estados`)
+
+    Nenhum I/O acontece sob o lock: a restauracao roda antes de registrar
+    o engine e o snapshot de um engine despejado e gravado por uma thread
+    dedicada (restaurar a mesma chave espera essa gravacao terminar).
+    Handlers async usam `obter`, que leva a criacao para uma thread.
+    """
+
+    def __init__(
+        self,
+        tf_base_minutos: int = 5,
+        modo_operacao: int = 2,
+        tipo_ativo: int = 1,
+        max_engines: int = 64,
+        memoria_max_mb: float = 256.0,
+        max_ocioso_segundos: float = 6 * 3600,
+        usar_modulos: bool = False,
+        diretorio_estado: Optional[str] = None,
+    ):
+        self.tf_base_minutos = tf_base_minutos
+        self.modo_operacao = modo_operacao
+        self.tipo_ativo = tipo_ativo
+        self.usar_modulos = usar_modulos
+        self.diretorio_estado = diretorio_estado
+        self.max_engines = max_engines
+        self.memoria_max_bytes = int(memoria_max_mb * 1024 * 1024)
+        self.max_ocioso_segundos = max_ocioso_segundos
+
+        self._engines: "OrderedDict[Tuple[str, int], EngineEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._gravador: Optional[ThreadPoolExecutor] = None
+        self._gravacoes: Dict[Tuple[str, int], Future] = {}
+        self.total_despejados = 0
+
+        logger.info(
+            f"EngineRegistry inicializado (max: {max_engines} engines, "
+            f"{memoria_max_mb:.0f} MB)"
+        )
+
+    def chave(self, ativo: str, timeframe: Optional[int] = None) -> Tuple[str, int]:
+        """Chave normalizada do engine: (ATIVO, timeframe)."""
+        return ativo.upper(), int(timeframe or self.tf_base_minutos)
+
+    def _tipo_ativo(self, ativo: str) -> int:
+        for prefixo, tipo in TIPOS_ATIVO.items():
+            if ativo.startswith(prefixo):
+                return tipo
+        return self.tipo_ativo
+
+    def _tocar(self, chave: Tuple[str, int], agora: float) -> Optional[SMCCoreEngine]:
+        """Engine ja registrado, marcado como usado (lock ja adquirido)."""
+        entry = self._engines.get(chave)
+        if entry is None:
+            return None
+        self._engines.move_to_end(chave)
+        entry.ultimo_uso = agora
+        entry.acessos += 1
+        return entry.engine
+
+    def get(self, ativo: str, timeframe: Optional[int] = None) -> SMCCoreEngine:
+        """Retorna o engine do ativo/timeframe, criando-o se necessario."""
+        chave = self.chave(ativo, timeframe)
+
+        with self._lock:
+            engine = self._tocar(chave, time.monotonic())
+        if engine is not None:
+            return engine
+
+        # Criacao e restauracao do snapshot fora do lock
+        engine = SMCCoreEngine(
+            tf_base_minutos=chave[1],
+            modo_operacao=self.modo_operacao,
+            tipo_ativo=self._tipo_ativo(chave[0]),
+            usar_modulos=self.usar_modulos,
+        )
+        engine.ativo = chave[0]
+        self._carregar_estado(chave, engine)
+
+        with self._lock:
+            agora = time.monotonic()
+            existente = self._tocar(chave, agora)
+            if existente is not None:
+                # Outra chamada criou o engine enquanto este era restaurado
+                return existente
+            self._engines[chave] = EngineEntry(
+                engine=engine,
+                ativo=chave[0],
+                timeframe=chave[1],
+                criado_em=agora,
+                ultimo_uso=agora,
+                acessos=1,
+            )
+            self._despejar(agora, proteger=chave)
+            return engine
+
+    async def obter(self, ativo: str, timeframe: Optional[int] = None) -> SMCCoreEngine:
+        """`get` para handlers async: criar/restaurar um engine roda em thread."""
+        chave = self.chave(ativo, timeframe)
+        with self._lock:
+            engine = self._tocar(chave, time.monotonic())
+        if engine is not None:
+            return engine
+        return await asyncio.to_thread(self.get, ativo, timeframe)
+
+    def _caminho_estado(self, chave: Tuple[str, int]) -> str:
+        return os.path.join(self.diretorio_estado, f"{chave[0]}_{chave[1]}m.smc")
+
+    def _carregar_estado(self, chave: Tuple[str, int], engine: SMCCoreEngine):
+        if not self.diretorio_estado:
+            return
+        gravacao = self._gravacoes.get(chave)
+        if gravacao is not None:
+            gravacao.result()
+        if engine_snapshot.carregar(engine, self._caminho_estado(chave)):
+            logger.info(
+                f"Estado restaurado: {chave[0]} {chave[1]}m "
+                f"({engine.contador_barras} barras)"
+            )
+
+    def _agendar_gravacao(self, chave: Tuple[str, int], engine: SMCCoreEngine):
+        """
+        Agenda serializacao e gravacao do engine despejado na thread
+        dedicada (lock ja adquirido). A serializacao espera a trava do
+        engine, entao um lote ainda em andamento nele termina antes.
+        """
+        if not self.diretorio_estado:
+            return
+        if self._gravador is None:
+            self._gravador = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="engine-snapshot"
+            )
+        self._gravacoes = {c: g for c, g in self._gravacoes.items() if not g.done()}
+        self._gravacoes[chave] = self._gravador.submit(
+            self._gravar_estado, self._caminho_estado(chave), engine
+        )
+
+    @staticmethod
+    def _gravar_estado(caminho: str, engine: SMCCoreEngine) -> int:
+        dados = engine_snapshot.serializar(engine)
+        return engine_snapshot.gravar_varios([(caminho, dados)])
+
+    def aguardar_gravacoes(self):
+        """Espera as gravacoes de snapshots de engines despejados."""
+        for gravacao in list(self._gravacoes.values()):
+            gravacao.result()
+
+    def serializar_estados(self) -> List[Tuple[str, bytes]]:
+        """
+        Serializa todos os engines registrados. Retorna pares (caminho,
+        dados) para gravar depois.
+
+        Cada engine e copiado sob a propria trava (`engine.trava`), fora do
+        lock do registro: um lote rodando numa thread termina antes da
+        copia dele, sem segurar `get` dos demais engines. Pode bloquear;
+        em handlers async, chame numa thread.
+        """
+        if not self.diretorio_estado:
+            return []
+        with self._lock:
+            engines = [(self._caminho_estado(chave), entry.engine)
+                       for chave, entry in self._engines.items()]
+        return [(caminho, engine_snapshot.serializar(engine))
+                for caminho, engine in engines]
+
+    def salvar_estados(self) -> int:
+        """Grava o snapshot de todos os engines. Retorna quantos foram salvos."""
+        self.aguardar_gravacoes()
+        return engine_snapshot.gravar_varios(self.serializar_estados())
+
+    def peek(self, ativo: str,
+             timeframe: Optional[int] = None) -> Optional[SMCCoreEngine]:
+        """Retorna o engine existente sem criar nem alterar a ordem LRU."""
+        with self._lock:
+            entry = self._engines.get(self.chave(ativo, timeframe))
+        return entry.engine if entry else None
+
+    def remove(self, ativo: str, timeframe: Optional[int] = None) -> bool:
+        """Remove explicitamente um engine."""
+        with self._lock:
+            return self._engines.pop(self.chave(ativo, timeframe), None) is not None
+
+    def memoria_bytes(self) -> int:
+        """Memoria estimada ocupada pelos buffers de todos os engines."""
+        with self._lock:
+            return self._memoria_bytes()
+
+    def _memoria_bytes(self) -> int:
+        return sum(e.engine.memoria_bytes() for e in self._engines.values())
+
+    def despejar_ociosos(self) -> int:
+        """Despeja engines ociosos e aplica os limites. Retorna quantos sairam."""
+        with self._lock:
+            return self._despejar(time.monotonic())
+
+    def _despejar(self, agora: float,
+                  proteger: Optional[Tuple[str, int]] = None) -> int:
+        """Aplica ociosidade, max_engines e orcamento de memoria (lock ja adquirido)."""
+        removidos: List[Tuple[str, int]] = []
+
+        for chave, entry in self._engines.items():
+            if chave == proteger:
+                continue
+            if agora - entry.ultimo_uso > self.max_ocioso_segundos:
+                removidos.append(chave)
+        for chave in removidos:
+            self._agendar_gravacao(chave, self._engines.pop(chave).engine)
+
+        memoria = self._memoria_bytes()
+        while len(self._engines) > 1 and (
+            len(self._engines) > self.max_engines or memoria > self.memoria_max_bytes
+        ):
+            chave = next(iter(self._engines))
+            if chave == proteger:
+                break
+            entry = self._engines.pop(chave)
+            self._agendar_gravacao(chave, entry.engine)
+            memoria -= entry.engine.memoria_bytes()
+            removidos.append(chave)
+
+        for ativo, timeframe in removidos:
+            logger.info(f"Engine despejado: {ativo} {timeframe}m")
+        self.total_despejados += len(removidos)
+        return len(removidos)
+
+    def total_barras(self) -> int:
+        """Total de barras processadas pelos engines ativos."""
+        with self._lock:
+            return sum(e.engine.contador_barras for e in self._engines.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estatisticas do registro e de cada engine."""
+        agora = time.monotonic()
+        engines = []
+        for entry in list(self._engines.values()):
+            stats = entry.engine.get_stats()
+            stats.update({
+                "ativo": entry.ativo,
+                "timeframe": entry.timeframe,
+                "acessos": entry.acessos,
+                "ocioso_segundos": round(agora - entry.ultimo_uso, 1),
+                "idade_segundos": round(agora - entry.criado_em, 1),
+            })
+            engines.append(stats)
+        return {
+            "total_engines": len(engines),
+            "max_engines": self.max_engines,
+            "memoria_bytes": self.memoria_bytes(),
+            "memoria_max_bytes": self.memoria_max_bytes,
+            "total_despejados": self.total_despejados,
+            "engines": engines,
+        }
+
+    def __len__(self) -> int:
+        return len(self._engines)
+
+    def __contains__(self, chave: Tuple[str, int]) -> bool:
+        return self.chave(*chave) in self._engines
@@ -0,0 +1,205 @@
+"""
+Engine Snapshot - Estado completo do SMCCoreEngine em disco
+Formato binario versionado, lido de volta via memory-map
+"""
+import io
+import json
+import logging
+import os
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from core_engine import SMCCoreEngine
+
+logger = logging.getLogger("smc.engine_snapshot")
+
+# ============================================================
+# FORMATO
+# ============================================================
+# [MAGIC 8 bytes][versao uint32][tamanho do cabecalho uint32]
+# [cabecalho JSON utf-8][padding ate ALINHAMENTO]
+# [arrays brutos, cada um alinhado em ALINHAMENTO]
+#
+# O cabecalho traz a configuracao do engine, os escalares (chaves
+# "a/b/c" achatadas) e, para cada array, dtype/shape/offset relativo ao
+# inicio da area de dados.
+
+MAGIC = b"SMCSNAP\0"
+VERSAO = 1
+ALINHAMENTO = 64
+_PREFIXO = struct.Struct("<8sII")
+
+
+def _alinhar(n: int) -> int:
+    return -(-n // ALINHAMENTO) * ALINHAMENTO
+
+
+def _achatar(arvore: Dict[str, Any], prefixo: str = "") -> Iterable[Tuple[str, Any]]:
+    for chave, valor in arvore.items():
+        nome = f"{prefixo}{chave}"
+        if isinstance(valor, dict):
+            yield from _achatar(valor, nome + "/")
+        else:
+            yield nome, valor
+
+
+def _desachatar(itens: Iterable[Tuple[str, Any]]) -> Dict[str, Any]:
+    arvore: Dict[str, Any] = {}
+    for nome, valor in itens:
+        *caminho, folha = nome.split("/")
+        no = arvore
+        for parte in caminho:
+            no = no.setdefault(parte, {})
+        no[folha] = valor
+    return arvore
+
+
+# ============================================================
+# ESCRITA
+# ============================================================
+def serializar(engine: SMCCoreEngine) -> bytes:
+    """
+    Serializa o estado completo do engine (copia consistente no momento da
+    chamada): o estado e copiado sob `engine.trava`, entao um lote rodando
+    em outra thread nunca e capturado pela metade.
+    """
+    escalares: Dict[str, Any] = {}
+    arrays: Dict[str, Dict[str, Any]] = {}
+    blocos: List[bytes] = []
+    offset = 0
+
+    with engine.trava:
+        for nome, valor in _achatar(engine.estado()):
+            if isinstance(valor, np.ndarray):
+                dados = np.ascontiguousarray(valor).tobytes()
+                arrays[nome] = {
+                    "dtype": valor.dtype.str,
+                    "shape": list(valor.shape),
+                    "offset": offset,
+                }
+                preenchido = _alinhar(len(dados))
+                blocos.append(dados + b"\0" * (preenchido - len(dados)))
+                offset += preenchido
+            elif isinstance(valor, np.generic):
+                escalares[nome] = valor.item()
+            else:
+                escalares[nome] = valor
+        configuracao = engine.configuracao()
+
+    cabecalho = json.dumps({
+        "engine": configuracao,
+        "ativo": getattr(engine, "ativo", None),
+        "escalares": escalares,
+        "arrays": arrays,
+    }).encode("utf-8")
+
+    inicio = _alinhar(_PREFIXO.size + len(cabecalho))
+    saida = io.BytesIO()
+    saida.write(_PREFIXO.pack(MAGIC, VERSAO, len(cabecalho)))
+    saida.write(cabecalho)
+    saida.write(b"\0" * (inicio - _PREFIXO.size - len(cabecalho)))
+    for bloco in blocos:
+        saida.write(bloco)
+    return saida.getvalue()
+
+
+def gravar(caminho: str, dados: bytes):
+    """Grava um snapshot serializado (escrita atomica)."""
+    diretorio = os.path.dirname(caminho)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+    temporario = caminho + ".tmp"
+    with open(temporario, "wb") as f:
+        f.write(dados)
+    os.replace(temporario, caminho)
+
+
+def gravar_varios(pendentes: Iterable[Tuple[str, bytes]]) -> int:
+    """Grava uma lista (caminho, dados); retorna quantos foram gravados."""
+    gravados = 0
+    for caminho, dados in pendentes:
+        try:
+            gravar(caminho, dados)
+            gravados += 1
+        except OSError as e:
+            logger.warning(f"Falha ao gravar snapshot {caminho}: {e}")
+    return gravados
+
+
+def salvar(engine: SMCCoreEngine, caminho: str):
+    """Serializa e grava o estado do engine."""
+    gravar(caminho, serializar(engine))
+
+
+# ============================================================
+# LEITURA
+# ============================================================
+def ler(caminho: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Le um snapshot via memory-map.
+
+    Returns:
+        (cabecalho, estado): os arrays do estado sao views sobre o mapa do
+        arquivo (somente leitura), sem copia
+    """
+    mapa = np.memmap(caminho, dtype=np.uint8, mode="r")
+    if len(mapa) < _PREFIXO.size:
+        raise ValueError("Snapshot truncado")
+    magic, versao, tamanho = _PREFIXO.unpack(bytes(mapa[:_PREFIXO.size]))
+    if magic != MAGIC:
+        raise ValueError("Arquivo nao e um snapshot SMC")
+    if versao != VERSAO:
+        raise ValueError(f"Versao de snapshot nao suportada: {versao}")
+
+    fim_cabecalho = _PREFIXO.size + tamanho
+    cabecalho = json.loads(bytes(mapa[_PREFIXO.size:fim_cabecalho]).decode("utf-8"))
+    inicio = _alinhar(fim_cabecalho)
+
+    itens: List[Tuple[str, Any]] = list(cabecalho["escalares"].items())
+    for nome, info in cabecalho["arrays"].items():
+        dtype = np.dtype(info["dtype"])
+        shape = tuple(info["shape"])
+        tamanho_array = int(np.prod(shape)) * dtype.itemsize
+        offset = inicio + info["offset"]
+        if offset + tamanho_array > len(mapa):
+            raise ValueError(f"Snapshot truncado em {nome}")
+        itens.append((nome, np.ndarray(shape, dtype=dtype, buffer=mapa, offset=offset)))
+    return cabecalho, _desachatar(itens)
+
+
+def carregar(engine: SMCCoreEngine, caminho: str) -> bool:
+    """
+    Restaura o engine a partir de `caminho`.
+
+    Retorna False (engine intacto ou resetado) se o arquivo nao existe, esta
+    corrompido ou foi gerado com outra configuracao.
+    """
+    if not os.path.exists(caminho):
+        return False
+    try:
+        cabecalho, estado = ler(caminho)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Snapshot ignorado ({caminho}): {e}")
+        return False
+
+    if cabecalho["engine"] != engine.configuracao():
+        logger.warning(
+            f"Snapshot ignorado ({caminho}): configuracao diferente do engine"
+        )
+        return False
+    try:
+        engine.restaurar(estado)
+    except (KeyError, ValueError) as e:
+        logger.warning(f"Snapshot ignorado ({caminho}): {e}")
+        return False
+    return True
+
+
+def info(caminho: str) -> Optional[Dict[str, Any]]:
+    """Cabecalho do snapshot (sem restaurar), ou None se ilegivel."""
+    try:
+        return ler(caminho)[0]
+    except (OSError, ValueError, KeyError):
+        return None
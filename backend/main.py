@@ -24,6 +24,7 @@ from datetime import datetime, timezone
 from fastapi import FastAPI, Depends, HTTPException, Header, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from typing import Optional
 
 # new structure imports
 from app.auth.router import router as auth_router
@@ -41,7 +42,17 @@ from ai_engine import AIEngine, AIConfig
 from auth_engine import AuthEngine, AuthConfig
 from payment_engine import PaymentEngine, PaymentConfig
 from payment_engine import PLANOS
-from core_engine import SMCCoreEngine, Bar
+from core_engine import Bar
+from engine_registry import EngineRegistry
+from engine_snapshot import gravar_varios
+from app.ingestion.lote_barras import BarrasInput, executar_lote, trava_engine
+from app.events.cache_resultados import (
+    CacheResultados, etag_confere, resposta_condicional, resposta_ultimo_sinal,
+)
+from app.events.serializacao import (
+    dumps, projecao, resposta_json, resultado_para_dict, resultado_para_json,
+    serializador_resultado,
+)
 
 # ============================================================
 # LOGGING
@@ -55,32 +66,53 @@ logger = logging.getLogger("smc.main")
 # ============================================================
 # INSTÂNCIAS GLOBAIS (inicializadas no startup)
 # ============================================================
-smc_engine: SMCCoreEngine = None
+engine_registry: EngineRegistry = None
 alert_engine: AlertEngine = None
 ai_engine: AIEngine = None
 auth_engine: AuthEngine = None
 payment_engine: PaymentEngine = None
 
-# Guarda o último resultado processado (por ativo)
-ultimo_resultado = {}
+# Guarda o último resultado processado (por ativo), com payloads em cache
+ultimo_resultado = CacheResultados()
 
 
 # ============================================================
 # STARTUP / SHUTDOWN
 # ============================================================
+async def _snapshots_periodicos(intervalo: float):
+    """
+    Serializa e grava os engines numa thread; cada engine é copiado sob a
+    própria trava, depois de qualquer lote que esteja rodando nele.
+    """
+    if intervalo <= 0:
+        return
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            await asyncio.to_thread(
+                lambda: gravar_varios(engine_registry.serializar_estados()))
+        except Exception as e:
+            logger.warning(f"Falha no snapshot periódico: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global smc_engine, alert_engine, ai_engine, auth_engine, payment_engine
+    global engine_registry, alert_engine, ai_engine, auth_engine, payment_engine
 
     logger.info("🚀 Iniciando SMC SaaS Backend...")
     # record start time for health checks
     app.state.start_time = datetime.now(timezone.utc)
 
-    # Core Engine (WIN, 5min, modo profissional)
-    smc_engine = SMCCoreEngine(
+    # Core Engines (um por ativo/timeframe, criados sob demanda)
+    engine_registry = EngineRegistry(
         tf_base_minutos=int(os.getenv("TF_BASE", "5")),
         modo_operacao=int(os.getenv("MODO_OPERACAO", "2")),
         tipo_ativo=int(os.getenv("TIPO_ATIVO", "1")),
+        max_engines=int(os.getenv("MAX_ENGINES", "64")),
+        memoria_max_mb=float(os.getenv("ENGINE_MEMORIA_MB", "256")),
+        max_ocioso_segundos=float(os.getenv("ENGINE_OCIOSO_SEGUNDOS", "21600")),
+        usar_modulos=os.getenv("SMC_MODULOS", "false").lower() == "true",
+        diretorio_estado=os.getenv("ESTADO_DIR", "data/estado"),
     )
 
     # Alert Engine
@@ -197,8 +229,22 @@ async def lifespan(app: FastAPI):
     # expose for router helpers
     app.state.payment_engine = payment_engine
 
+    # Snapshots periódicos do estado dos engines
+    snapshot_task = asyncio.create_task(
+        _snapshots_periodicos(float(os.getenv("SNAPSHOT_INTERVALO", "300")))
+    )
+
     logger.info("✅ Todos os módulos inicializados")
     yield
+
+    snapshot_task.cancel()
+    # Encerra o pool de backtests em segundo plano
+    from app.ingestion.jobs import fila_backtests
+    fila_backtests.encerrar()
+    # Preserva o estado dos engines para o próximo start (sem warmup)
+    salvos = engine_registry.salvar_estados()
+    if salvos:
+        logger.info(f"💾 Snapshots de engines salvos: {salvos}")
     logger.info("👋 Backend encerrado")
 
 
@@ -297,6 +343,7 @@ class BarInput(BaseModel):
     timestamp_hhmm: int
     tick_minimo: float = 5.0
     ativo: str = "WIN"
+    timeframe: Optional[int] = None  # minutos; default TF_BASE
 
 class RegisterBody(BaseModel):
     email: str
@@ -310,6 +357,7 @@ class LoginBody(BaseModel):
 class ChatBody(BaseModel):
     pergunta: str
     ativo: str = "WIN"
+    timeframe: Optional[int] = None  # minutos; default TF_BASE
 
 class PlanoBody(BaseModel):
     plano: str  # "mensal", "semestral", "anual"
@@ -332,7 +380,8 @@ def root():
 def api_status():
     return {
         "engine": "online",
-        "barras_processadas": smc_engine.contador_barras if smc_engine else 0,
+        "barras_processadas": engine_registry.total_barras() if engine_registry else 0,
+        "engines_ativos": len(engine_registry) if engine_registry else 0,
         "alertas_enviados": alert_engine.get_stats()["total_enviados"] if alert_engine else 0,
         "ai_consultas": ai_engine.get_stats()["total_consultas"] if ai_engine else 0,
         "timestamp": datetime.now(tz=timezone.utc).isoformat()
@@ -378,9 +427,15 @@ def login(body: LoginBody):
 async def processar_barra(
     bar_input: BarInput,
     background_tasks: BackgroundTasks,
+    campos: Optional[str] = None,
     user=Depends(get_user_com_plano)
 ):
-    """Processa uma barra e retorna o resultado SMC completo."""
+    """
+    Processa uma barra e retorna o resultado SMC completo.
+
+    `?campos=score_final,direcao` limita a resposta aos campos pedidos.
+    """
+    campos = projecao(campos)
     bar = Bar(
         open=bar_input.open, high=bar_input.high,
         low=bar_input.low, close=bar_input.close,
@@ -390,7 +445,9 @@ async def processar_barra(
         tick_minimo=bar_input.tick_minimo
     )
 
-    resultado = smc_engine.process(bar)
+    smc_engine = await engine_registry.obter(bar_input.ativo, bar_input.timeframe)
+    async with trava_engine(smc_engine):
+        resultado = smc_engine.process(bar)
 
     if resultado is None:
         return {
@@ -400,21 +457,65 @@ async def processar_barra(
         }
 
     # Salva último resultado para consultas
-    ultimo_resultado[bar_input.ativo] = resultado
+    chave = engine_registry.chave(bar_input.ativo, bar_input.timeframe)
+    ultimo_resultado[chave] = resultado
 
     # Dispara alertas em background
-    background_tasks.add_task(alert_engine.processar, resultado)
+    background_tasks.add_task(alert_engine.processar,
+                              ultimo_resultado.como_dict(chave))
+
+    return resposta_json(resultado_para_json(resultado, campos))
+
+
+@app.post("/api/processar-barras")
+async def processar_barras(
+    corpo: BarrasInput,
+    background_tasks: BackgroundTasks,
+    campos: Optional[str] = None,
+    user=Depends(get_user_com_plano)
+):
+    """
+    Processa N barras em ordem (corpo colunar) numa única requisição.
+
+    `retorno="todos"` devolve todos os resultados em formato colunar;
+    `retorno="ultimo"` devolve o último resultado e os eventos do lote.
+    Alertas são avaliados apenas sobre o último resultado; `?campos=`
+    projeta os campos de cada resultado.
+    """
+    para_dict = serializador_resultado(projecao(campos))
+    smc_engine = await engine_registry.obter(corpo.ativo, corpo.timeframe)
+    ultimo, resposta = await executar_lote(smc_engine, corpo, para_dict)
 
-    return _resultado_para_dict(resultado)
+    if ultimo is not None:
+        chave = engine_registry.chave(corpo.ativo, corpo.timeframe)
+        ultimo_resultado[chave] = ultimo
+        background_tasks.add_task(alert_engine.processar,
+                                  ultimo_resultado.como_dict(chave))
+
+    return resposta_json(resposta)
 
 
 @app.get("/api/ultimo-sinal/{ativo}")
-def ultimo_sinal(ativo: str = "WIN", user=Depends(get_user_com_plano)):
-    """Retorna o último resultado processado para o ativo."""
-    r = ultimo_resultado.get(ativo)
-    if not r:
-        return {"mensagem": f"Sem dados para {ativo} ainda"}
-    return _resultado_para_dict(r)
+def ultimo_sinal(ativo: str = "WIN", timeframe: Optional[int] = None,
+                 campos: Optional[str] = None,
+                 if_none_match: Optional[str] = Header(None),
+                 user=Depends(get_user_com_plano)):
+    """
+    Retorna o último resultado processado para o ativo (`?campos=` opcional).
+
+    `?timeframe=` escolhe o engine (default TF_BASE); o ativo é
+    normalizado como no registry ("win" = "WIN"). Responde com ETag;
+    `If-None-Match` com a versão atual devolve 304.
+    """
+    campos = projecao(campos)
+    chave = engine_registry.chave(ativo, timeframe)
+    return resposta_ultimo_sinal(ultimo_resultado, chave, campos, if_none_match)
+
+
+@app.get("/api/engines")
+def engines_stats(user=Depends(get_current_user)):
+    """Estatísticas dos engines ativos (um por ativo/timeframe)."""
+    return engine_registry.get_stats()
 
 @app.get("/api/alertas/log")
 def log_alertas(user=Depends(get_current_user)):
@@ -428,29 +529,50 @@ def stats_alertas(user=Depends(get_current_user)):
 # ============================================================
 # ROTAS AI
 # ============================================================
-@app.get("/api/ai/interpretar/{ativo}")
-async def ai_interpretar(ativo: str = "WIN", user=Depends(get_user_com_plano)):
-    r = ultimo_resultado.get(ativo)
-    if not r:
+async def _resposta_ai(ativo: str, timeframe: Optional[int], campo: str, gerar,
+                       if_none_match: Optional[str]):
+    """
+    Resposta da IA sobre o último resultado, em cache por versão do engine:
+    polls sem barra nova recebem 304 (ou os bytes já prontos) sem chamar a IA.
+    """
+    chave = engine_registry.chave(ativo, timeframe)
+    ativo = chave[0]
+    if chave not in ultimo_resultado:
         raise HTTPException(404, f"Sem dados para {ativo}")
-    texto = await ai_engine.interpretar(r, ativo)
-    return {"interpretacao": texto, "ativo": ativo}
+    versao = ultimo_resultado.versao(chave)
+    etag = ultimo_resultado.etag(chave, campo, versao)
+    if etag_confere(if_none_match, etag):
+        return resposta_condicional(None, etag)
+    corpo = ultimo_resultado.obter(chave, campo)
+    if corpo is None:
+        texto = await gerar(ultimo_resultado.como_dict(chave), ativo)
+        # Se uma barra nova chegou durante a chamada, o payload não é guardado
+        corpo = dumps({campo: texto, "ativo": ativo})
+        corpo = ultimo_resultado.guardar(chave, campo, corpo, versao)
+    return resposta_condicional(corpo, etag)
+
+
+@app.get("/api/ai/interpretar/{ativo}")
+async def ai_interpretar(ativo: str = "WIN", timeframe: Optional[int] = None,
+                         if_none_match: Optional[str] = Header(None),
+                         user=Depends(get_user_com_plano)):
+    return await _resposta_ai(ativo, timeframe, "interpretacao",
+                              ai_engine.interpretar, if_none_match)
 
 @app.post("/api/ai/chat")
 async def ai_chat(body: ChatBody, user=Depends(get_user_com_plano)):
-    r = ultimo_resultado.get(body.ativo)
+    r = ultimo_resultado.como_dict(engine_registry.chave(body.ativo, body.timeframe))
     if not r:
         raise HTTPException(404, f"Sem dados para {body.ativo}")
     resposta = await ai_engine.chat(body.pergunta, r, body.ativo)
     return {"resposta": resposta, "ativo": body.ativo}
 
 @app.get("/api/ai/relatorio/{ativo}")
-async def ai_relatorio(ativo: str = "WIN", user=Depends(get_user_com_plano)):
-    r = ultimo_resultado.get(ativo)
-    if not r:
-        raise HTTPException(404, f"Sem dados para {ativo}")
-    relatorio = await ai_engine.relatorio(r, ativo)
-    return {"relatorio": relatorio, "ativo": ativo}
+async def ai_relatorio(ativo: str = "WIN", timeframe: Optional[int] = None,
+                       if_none_match: Optional[str] = Header(None),
+                       user=Depends(get_user_com_plano)):
+    return await _resposta_ai(ativo, timeframe, "relatorio", ai_engine.relatorio,
+                              if_none_match)
 
 @app.delete("/api/ai/chat/historico")
 def limpar_chat(user=Depends(get_current_user)):
@@ -524,76 +646,8 @@ async def webhook_mercadopago(request: Request):
 # ============================================================
 # HELPER — converte SMCResult para dict serializável
 # ============================================================
-def _resultado_para_dict(r) -> dict:
-    return {
-        # Scores
-        "score_final": round(r.score_final, 1),
-        "score_compra": round(r.score_compra, 1),
-        "score_venda": round(r.score_venda, 1),
-        "score_hfz": round(r.score_hfz * 100, 1),
-        "score_fbi": round(r.score_fbi * 100, 1),
-        "score_dtm": round(r.score_dtm * 100, 1),
-        "score_sda": round(r.score_sda * 100, 1),
-        "score_mtv": round(r.score_mtv * 100, 1),
-        # Estado
-        "estado_mercado": r.estado_mercado,
-        "direcao": r.direcao,
-        "forca": r.forca,
-        "qualidade_setup": r.qualidade_setup,
-        "risco_contextual": r.risco_contextual,
-        "permissao_compra": r.permissao_compra,
-        "permissao_venda": r.permissao_venda,
-        # HFZ
-        "delta_normalizado": round(r.delta_normalizado, 3),
-        "hz_normalizado": round(r.hz_normalizado, 3),
-        "absorcao_normalizada": round(r.absorcao_normalizada, 3),
-        "imbalance_score": round(r.imbalance_score, 3),
-        "exaustao_compra": r.exaustao_compra,
-        "exaustao_venda": r.exaustao_venda,
-        # FBI
-        "zona_proxima": r.zona_proxima,
-        "preco_zona_proxima": r.preco_zona_proxima,
-        "tipo_zona_proxima": r.tipo_zona_proxima,
-        "distancia_zona": round(r.distancia_zona * 100, 2),
-        "contato_zona": r.contato_zona,
-        "reacao_zona": r.reacao_zona,
-        # DTM
-        "trap_flag": r.trap_flag,
-        "trap_intensity": round(r.trap_intensity, 2),
-        "falha_continuidade": r.falha_continuidade,
-        "eficiencia_deslocamento": round(r.eficiencia_deslocamento, 2),
-        # SDA
-        "regime_mercado": r.regime_mercado,
-        "direcao_regime": r.direcao_regime,
-        "vol_normalizada": round(r.vol_normalizada, 2),
-        "prob_continuacao": round(r.prob_continuacao, 2),
-        "fase_movimento": r.fase_movimento,
-        # MTV
-        "score_confluencia": round(r.score_confluencia * 100, 1),
-        "score_divergencia": round(r.score_divergencia * 100, 1),
-        "confluencia_camada": r.confluencia_camada,
-        "confluencia_forte": r.confluencia_forte,
-        "divergencia_confirmada": r.divergencia_confirmada,
-        "sessao_atual": r.sessao_atual,
-        "direcao_tf_rapido": r.direcao_tf_rapido,
-        "direcao_tf_medio": r.direcao_tf_medio,
-        "direcao_tf_lento": r.direcao_tf_lento,
-        "direcao_tf_diario": r.direcao_tf_diario,
-        "direcao_tf_semanal": r.direcao_tf_semanal,
-        "renko_sugestao": r.renko_sugestao,
-        "renko_qualidade": r.renko_qualidade,
-        "nome_ativo": r.nome_ativo,
-        # Eventos
-        "evento_score_alto": r.evento_score_alto,
-        "evento_trap": r.evento_trap,
-        "evento_confluencia": r.evento_confluencia,
-        "evento_divergencia": r.evento_divergencia,
-        "evento_contato_zona": r.evento_contato_zona,
-        # Bloqueios
-        "bloqueio_score_baixo": r.bloqueio_score_baixo,
-        "bloqueio_trap": r.bloqueio_trap,
-        "bloqueio_divergencia": r.bloqueio_divergencia,
-    }
+def _resultado_para_dict(r, campos=None) -> dict:
+    return resultado_para_dict(r, campos)
 
 
 # ============================================================
@@ -4,13 +4,14 @@ Tests the API with example_data.csv and exports results for Profit validation
 """
 
 import os
-import json
 import time
-import csv
 from pathlib import Path
-from typing import Dict, List
 import sys
 
+import numpy as np
+
+from app.ingestion.analise_lote import ClienteHTTP, analisar_csv, ler_colunar
+
 # For API requests
 try:
     import requests
@@ -71,147 +72,46 @@ def upload_csv():
         print(f"✗ Upload error: {e}")
         return None
 
-def analyze_single_candle(candle_data: Dict):
-    """Analyze a single candle"""
-    try:
-        response = requests.post(
-            f"{API_BASE_URL}/analyze/candle",
-            json=candle_data,
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            print(f"✗ Analysis failed with status {response.status_code}")
-            return None
-    except Exception as e:
-        print(f"✗ Analysis error: {e}")
-        return None
 
-def analyze_csv_file():
-    """Analyze all candles from CSV and collect results"""
-    print(f"\n📊 Analyzing candles from CSV...")
+def analyze_csv_file(http: bool = False):
+    """
+    Analyze all candles from CSV; results are streamed to JSON, CSV and
+    columnar files
+    """
+    print("\n📊 Analyzing candles from CSV...")
     
     if not EXAMPLE_CSV.exists():
         print(f"✗ CSV file not found: {EXAMPLE_CSV}")
-        return []
-    
-    results = []
-    
-    try:
-        with open(EXAMPLE_CSV, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for idx, row in enumerate(reader, 1):
-                # Convert string values to appropriate types
-                candle = {
-                    'timestamp': row['timestamp'],
-                    'open': float(row['open']),
-                    'high': float(row['high']),
-                    'low': float(row['low']),
-                    'close': float(row['close']),
-                    'volume': int(row['volume']),
-                    'trades': int(row['trades']),
-                }
-                
-                print(f"  Processing candle {idx}...", end='\r')
-                
-                result = analyze_single_candle(candle)
-                if result:
-                    result['input'] = candle
-                    results.append(result)
-                
-                # Small delay to avoid overwhelming the API
-                time.sleep(0.1)
-        
-        print(f"✓ Analyzed {len(results)} candles          ")
-        return results
-    
-    except Exception as e:
-        print(f"✗ Error reading CSV: {e}")
-        return []
-
-def export_results_to_json(results: List[Dict]):
-    """Export results to JSON format"""
-    if not results:
-        print("✗ No results to export")
         return None
     
-    output_file = RESULTS_DIR / "smc_analysis_results.json"
-    
+    # In-process engine by default; with http=True, batched requests over one
+    # connection
+    cliente = ClienteHTTP(API_BASE_URL) if http else None
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2, ensure_ascii=False)
-        print(f"✓ Results exported to: {output_file}")
-        return output_file
+        resumo = analisar_csv(EXAMPLE_CSV, str(RESULTS_DIR), processar=cliente,
+                              nome_base="smc_analysis_results")
     except Exception as e:
-        print(f"✗ Export error: {e}")
+        print(f"✗ Error analyzing CSV: {e}")
         return None
+    finally:
+        if cliente is not None:
+            cliente.fechar()
+    
+    print(f"✓ Analyzed {resumo.resultados} candles ({resumo.barras} rows) "
+          f"in {resumo.duracao:.2f}s")
+    for formato, caminho in resumo.saidas.items():
+        print(f"✓ Results exported to {formato.upper()}: {caminho}")
+    return resumo
 
-def export_results_to_csv(results: List[Dict]):
-    """Export results to CSV for comparison with Profit"""
-    if not results:
-        print("✗ No results to export")
-        return None
-    
-    output_file = RESULTS_DIR / "smc_analysis_results.csv"
-    
-    try:
-        # Extract data for comparison
-        rows = []
-        for result in results:
-            input_data = result.get('input', {})
-            
-            row = {
-                'timestamp': input_data.get('timestamp'),
-                'open': input_data.get('open'),
-                'high': input_data.get('high'),
-                'low': input_data.get('low'),
-                'close': input_data.get('close'),
-                'volume': input_data.get('volume'),
-                'trades': input_data.get('trades'),
-                # SMC Indicator Scores
-                'hfz_score': result.get('hfz_score'),
-                'fbi_score': result.get('fbi_score'),
-                'dtm_score': result.get('dtm_score'),
-                'sda_score': result.get('sda_score'),
-                'mtv_score': result.get('mtv_score'),
-                # Analysis results
-                'type': result.get('type'),
-                'price': result.get('price'),
-                'score': result.get('score'),
-                'composite_signal': result.get('type'),  # 'type' field is the signal
-                'confidence': result.get('confluence_score'),
-                'regime': result.get('regime'),
-                'confluence_level': result.get('confluence_level'),
-                'session': result.get('session'),
-                'alert': result.get('alert'),
-            }
-            rows.append(row)
-        
-        # Write CSV
-        if rows:
-            fieldnames = rows[0].keys()
-            with open(output_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(rows)
-            
-            print(f"✓ Results exported to CSV: {output_file}")
-            return output_file
-        
-    except Exception as e:
-        print(f"✗ CSV export error: {e}")
-    
-    return None
 
-def generate_validation_report(results: List[Dict]):
+def generate_validation_report(resumo):
     """Generate a validation report for comparison with Profit"""
-    if not results:
+    if not resumo or not resumo.resultados:
         print("✗ No results for report")
         return None
     
     report_file = RESULTS_DIR / "validation_report.txt"
+    resultados = ler_colunar(resumo.saidas["colunar"])
     
     try:
         with open(report_file, 'w', encoding='utf-8') as f:
@@ -220,62 +120,35 @@ def generate_validation_report(results: List[Dict]):
             f.write("=" * 80 + "\n\n")
             
             f.write(f"Analysis Date: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"Total Candles Analyzed: {len(results)}\n")
-            f.write(f"API Base URL: {API_BASE_URL}\n\n")
+            f.write(f"Total Candles Analyzed: {resumo.resultados}\n\n")
             
             # Summary statistics
             f.write("SUMMARY STATISTICS\n")
             f.write("-" * 80 + "\n")
+            total_sinais = resumo.sinais_compra + resumo.sinais_venda
+            f.write(f"Composite Signals Generated: {total_sinais}\n")
+            f.write(f"  BUY Signals: {resumo.sinais_compra}\n")
+            f.write(f"  SELL Signals: {resumo.sinais_venda}\n")
             
-            signals = [r.get('composite_signal') for r in results if r.get('composite_signal')]
-            regimes = [r.get('regime') for r in results if r.get('regime')]
-            traps = [r.get('trap_detected') for r in results if r.get('trap_detected') is not None]
-            
-            if signals:
-                f.write(f"Composite Signals Generated: {len(signals)}\n")
-                f.write(f"  BUY Signals: {sum(1 for s in signals if s == 'BUY')}\n")
-                f.write(f"  SELL Signals: {sum(1 for s in signals if s == 'SELL')}\n")
-                f.write(f"  HOLD Signals: {sum(1 for s in signals if s == 'HOLD')}\n")
-            
-            if regimes:
-                f.write(f"\nRegime Detection:\n")
-                regime_counts = {}
-                for regime in regimes:
-                    regime_counts[regime] = regime_counts.get(regime, 0) + 1
-                for regime, count in regime_counts.items():
-                    f.write(f"  {regime}: {count}\n")
+            for coluna, titulo in (("estado_mercado", "Market State"),
+                                   ("regime_mercado", "Regime Detection")):
+                if coluna in resultados:
+                    f.write(f"\n{titulo}:\n")
+                    valores, contagens = np.unique(resultados[coluna].astype(str),
+                                                   return_counts=True)
+                    for valor, count in zip(valores, contagens):
+                        f.write(f"  {valor}: {count}\n")
             
-            if traps:
-                trap_count = sum(1 for t in traps if t)
-                f.write(f"\nTrap Detection:\n")
+            if "trap_flag" in resultados:
+                trap_count = int(np.count_nonzero(resultados["trap_flag"]))
+                f.write("\nTrap Detection:\n")
                 f.write(f"  Traps Detected: {trap_count}\n")
-                f.write(f"  Clean Candles: {len(traps) - trap_count}\n")
+                f.write(f"  Clean Candles: {resumo.resultados - trap_count}\n")
             
-            # Detailed results
-            f.write(f"\n\nDETAILED RESULTS\n")
-            f.write("=" * 80 + "\n")
-            
-            for idx, result in enumerate(results, 1):
-                f.write(f"\nCandle #{idx}\n")
-                f.write("-" * 80 + "\n")
-                
-                input_data = result.get('input', {})
-                f.write(f"Timestamp: {input_data.get('timestamp')}\n")
-                f.write(f"OHLCV: {input_data.get('open')} | {input_data.get('high')} | {input_data.get('low')} | {input_data.get('close')} | {input_data.get('volume')}\n\n")
-                
-                # Individual indicator scores
-                f.write("Indicator Scores:\n")
-                for indicator in ['hfz', 'fbi', 'dtm', 'sda', 'mtv']:
-                    ind_data = result.get(indicator, {})
-                    score = ind_data.get('score', 'N/A')
-                    signal = ind_data.get('signal', 'N/A')
-                    f.write(f"  {indicator.upper()}: Score={score}, Signal={signal}\n")
-                
-                # Composite result
-                f.write(f"\nComposite Signal: {result.get('composite_signal', 'N/A')}\n")
-                f.write(f"Confidence: {result.get('confidence', 'N/A')}\n")
-                f.write(f"Regime: {result.get('regime', 'N/A')}\n")
-                f.write(f"Trap Detected: {result.get('trap_detected', 'N/A')}\n")
+            f.write("\nScore Statistics:\n")
+            for nome, stats in resumo.medias().items():
+                f.write(f"  {nome}: min {stats['min']:.2f}  max {stats['max']:.2f}  "
+                        f"avg {stats['media']:.2f}\n")
             
             # Comparison instructions
             f.write(f"\n\n{'=' * 80}\n")
@@ -304,51 +177,36 @@ def main():
     print("SMC WEB APP - ANALYSIS & VALIDATION TEST")
     print("=" * 80)
     
-    # Step 1: Verify API
-    if not check_api_health():
-        print("\n⚠️  API is not running. Start it with:")
-        print("   docker-compose up -d")
-        sys.exit(1)
-    
-    # Step 2: Create results directory
+    # Step 1: Create results directory
     ensure_results_dir()
     
-    # Step 3: Upload CSV
-    upload_result = upload_csv()
-    if not upload_result:
-        print("Failed to upload CSV. Exiting.")
-        sys.exit(1)
-    
-    # Allow time for processing
-    time.sleep(2)
-    
-    # Step 4: Analyze candles
+    # Step 2: Analyze candles (in-process engine, no API needed)
     print("\n" + "-" * 80)
-    results = analyze_csv_file()
+    resumo = analyze_csv_file()
     
-    if not results:
+    if not resumo or not resumo.resultados:
         print("No results generated. Exiting.")
         sys.exit(1)
     
-    # Step 5: Export results
-    print("\n" + "-" * 80)
-    print(f"\n💾 Exporting results...")
+    report_file = generate_validation_report(resumo)
     
-    json_file = export_results_to_json(results)
-    csv_file = export_results_to_csv(results)
-    report_file = generate_validation_report(results)
+    # Step 3: Upload CSV (only when the API is running)
+    print("\n" + "-" * 80)
+    if check_api_health():
+        upload_csv()
+    else:
+        print("⚠️  API is not running; skipping upload test (docker-compose up -d)")
     
-    # Step 6: Summary
+    # Step 4: Summary
     print("\n" + "=" * 80)
     print("✅ ANALYSIS COMPLETE")
     print("=" * 80)
     print(f"\n📁 Output Files Created:\n")
-    if json_file:
-        print(f"  1. JSON Results: {json_file}")
-    if csv_file:
-        print(f"  2. CSV Results:  {csv_file}")
+    print(f"  1. JSON Results: {resumo.saidas['json']}")
+    print(f"  2. CSV Results:  {resumo.saidas['csv']}")
+    print(f"  3. Columnar:     {resumo.saidas['colunar']}")
     if report_file:
-        print(f"  3. Report:       {report_file}")
+        print(f"  4. Report:       {report_file}")
     
     print(f"\n📝 Next Steps:")
     print(f"  1. Export same data from Profit platform")
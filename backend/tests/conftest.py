@@ -0,0 +1,49 @@
+import sys, os
+# ensure backend directory is on path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import pandas as pd
+
+from core_engine import Bar
+
+
+def random_columns(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 120000 + np.cumsum(rng.normal(0, 35, n))
+    return {
+        "open": close + rng.normal(0, 10, n),
+        "high": close + rng.uniform(0, 40, n),
+        "low": close - rng.uniform(0, 40, n),
+        "close": close,
+        "volume": rng.integers(100, 5000, n).astype(float),
+        "timestamp_hhmm": 900 + np.arange(n) % 800,
+    }
+
+
+def columns_to_bars(cols, ini=0, fim=None):
+    fim = len(cols["close"]) if fim is None else fim
+    return [
+        Bar(open=cols["open"][i], high=cols["high"][i], low=cols["low"][i],
+            close=cols["close"][i], volume=cols["volume"][i],
+            timestamp_hhmm=int(cols["timestamp_hhmm"][i]))
+        for i in range(ini, fim)
+    ]
+
+
+def write_profit_csv(path, n=250, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 120000 + np.cumsum(rng.normal(0, 30, n)).round()
+    df = pd.DataFrame({
+        "timestamp": pd.date_range("2024-03-01 09:00", periods=n, freq="5min"),
+        "open": close - 5,
+        "high": close + rng.integers(0, 40, n),
+        "low": close - rng.integers(0, 40, n),
+        "close": close,
+        "volume": rng.integers(100, 5000, n),
+        "delta": rng.integers(-50, 50, n),
+        "trades": rng.integers(10, 500, n),
+        "ignorada": "x",
+    })
+    df.to_csv(path, index=False)
+    return df
@@ -0,0 +1,121 @@
+import sys, os
+# ensure backend directory is on path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import csv
+import json
+
+import numpy as np
+
+from core_engine import SMCCoreEngine
+from app.ingestion import bar_store
+from app.ingestion.analise_lote import ClienteHTTP, analisar_csv, ler_colunar
+from conftest import write_profit_csv
+
+
+def esperado(caminho):
+    store = bar_store.abrir_ou_converter(str(caminho))
+    colunas = store.fatia()
+    del colunas["timestamp"]
+    return store, SMCCoreEngine(usar_modulos=True).process_many(colunas)
+
+
+def test_in_process_analysis_streams_all_formats(tmp_path):
+    caminho = tmp_path / "profit.csv"
+    write_profit_csv(caminho, n=500)
+    store, tabela = esperado(caminho)
+    blocos = []
+
+    resumo = analisar_csv(caminho, str(tmp_path / "saida"), {"usar_modulos": True},
+                          tamanho_bloco=128,
+                          ao_bloco=lambda feitas, total: blocos.append(feitas))
+
+    assert blocos == [128, 256, 384, 500]
+    assert resumo.barras == 500 and resumo.resultados == len(tabela["indice"]) == 441
+    assert resumo.medias()["score_final"]["media"] == tabela["score_final"].mean()
+
+    registros = json.load(open(resumo.saidas["json"]))
+    assert len(registros) == 441
+    assert registros[0]["timestamp"] == store.timestamps_iso(59, 60)[0]
+    assert registros[0]["close"] == store["close"][59]
+    assert registros[-1]["sessao_atual"] == tabela["sessao_atual"][-1]
+
+    with open(resumo.saidas["csv"]) as f:
+        linhas = list(csv.DictReader(f))
+    assert len(linhas) == 441
+    assert float(linhas[100]["score_compra"]) == tabela["score_compra"][100]
+
+    colunas = ler_colunar(resumo.saidas["colunar"])
+    assert np.array_equal(colunas["close"], store["close"][tabela["indice"]])
+    assert np.array_equal(colunas["score_fbi"], tabela["score_fbi"])
+    assert list(colunas["regime_mercado"]) == list(tabela["regime_mercado"])
+
+
+class SessaoFake:
+    """Servidor de lote em processo: um engine por sessão, como o registry."""
+
+    def __init__(self, limite=None):
+        self.headers = {}
+        self.lotes = []
+        self.limite = limite
+        self.engine = SMCCoreEngine()
+
+    def post(self, url, json=None, timeout=None):
+        self.lotes.append(len(json["colunas"]["close"]))
+        if self.limite is not None and self.lotes[-1] > self.limite:
+            return RespostaFake({"detail": "Lote grande demais"}, 413)
+        colunas = {k: np.asarray(v) for k, v in json["colunas"].items()}
+        tabela = self.engine.process_many(colunas)
+        return RespostaFake({"resultados": {k: v.tolist() for k, v in tabela.items()}})
+
+    def close(self):
+        pass
+
+
+class RespostaFake:
+    def __init__(self, dados, status_code=200):
+        self.dados = dados
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self.dados
+
+
+def test_http_mode_sends_batches_over_one_session(tmp_path):
+    caminho = tmp_path / "profit.csv"
+    write_profit_csv(caminho, n=300)
+    _, tabela = esperado(caminho)
+    sessao = SessaoFake()
+    cliente = ClienteHTTP("http://api/", token="abc", tamanho_lote=70, sessao=sessao)
+
+    resumo = analisar_csv(caminho, str(tmp_path / "saida"), processar=cliente,
+                          formatos=("colunar",), tamanho_bloco=200)
+
+    assert cliente.url == "http://api/api/processar-barras"
+    assert sessao.headers["Authorization"] == "Bearer abc"
+    assert sessao.lotes == [70, 70, 60, 70, 30]
+    colunas = ler_colunar(resumo.saidas["colunar"])
+    assert resumo.resultados == 241
+    assert np.array_equal(colunas["score_final"], tabela["score_final"])
+
+
+def test_http_mode_splits_batches_the_server_rejects(tmp_path):
+    caminho = tmp_path / "profit.csv"
+    write_profit_csv(caminho, n=300)
+    _, tabela = esperado(caminho)
+    sessao = SessaoFake(limite=60)
+    cliente = ClienteHTTP("http://api/", tamanho_lote=200, sessao=sessao)
+
+    resumo = analisar_csv(caminho, str(tmp_path / "saida"), processar=cliente,
+                          formatos=("colunar",), tamanho_bloco=300)
+
+    # 200 e 100 recusados; depois segue com 50 por requisição
+    assert sessao.lotes == [200, 100, 50, 50, 50, 50, 50, 50]
+    assert cliente.tamanho_lote == 50
+    colunas = ler_colunar(resumo.saidas["colunar"])
+    assert resumo.resultados == 241
+    assert np.array_equal(colunas["score_final"], tabela["score_final"])
@@ -0,0 +1,123 @@
+import sys, os
+# ensure backend directory is on path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+
+from app.ingestion import bar_store
+from app.ingestion.jobs import FilaBacktests, resumir_backtest
+from conftest import write_profit_csv
+
+PARAMETROS = {"tf_base_minutos": 5, "modo_operacao": 2, "tipo_ativo": 1,
+              "usar_modulos": False}
+
+
+async def aguardar(job, timeout=60.0):
+    limite = asyncio.get_running_loop().time() + timeout
+    while job.ativo and asyncio.get_running_loop().time() < limite:
+        await asyncio.sleep(0.05)
+
+
+def nova_fila(eventos, **kwargs):
+    fila = FilaBacktests(max_workers=1, max_jobs=2, **kwargs)
+
+    async def registrar(job):
+        eventos.append((job.job_id, job.status))
+
+    fila._broadcast = registrar
+    return fila
+
+
+def test_job_runs_in_worker_process_and_reports(tmp_path):
+    caminho = str(tmp_path / "profit.csv")
+    write_profit_csv(caminho, n=400)
+    store = bar_store.abrir_ou_converter(caminho)
+    esperado = resumir_backtest(store, PARAMETROS)
+
+    eventos, concluidos = [], []
+
+    async def cenario():
+        fila = nova_fila(eventos, tamanho_bloco=100)
+        fila.ao_concluir = concluidos.append
+        try:
+            job = fila.submeter("arquivo", store.caminho, PARAMETROS, usuario="u1")
+            assert fila.get(job.job_id) is job
+            await aguardar(job)
+            await asyncio.sleep(0)
+            return job, fila.listar("u1"), fila.listar("outro")
+        finally:
+            fila.encerrar()
+
+    job, do_usuario, de_outro = asyncio.run(cenario())
+    assert job.status == "completed", job.erro
+    assert job.resultado == esperado
+    assert concluidos == [job]
+    assert do_usuario == [job] and de_outro == []
+    assert (job.job_id, "completed") in eventos
+
+
+def test_job_pause_and_cancel(tmp_path):
+    caminho = str(tmp_path / "profit.csv")
+    write_profit_csv(caminho, n=400)
+    store = bar_store.abrir_ou_converter(caminho)
+
+    async def cenario():
+        fila = nova_fila([], tamanho_bloco=50)
+        try:
+            job = fila.submeter("arquivo", store.caminho, PARAMETROS)
+            assert fila.pausar(job.job_id)
+            await asyncio.sleep(1.0)
+            pausado = (job.status, job.progresso)
+            assert fila.cancelar(job.job_id)
+            await aguardar(job)
+            livres = len(fila._slots_livres)
+            return job, pausado, livres
+        finally:
+            fila.encerrar()
+
+    job, pausado, livres = asyncio.run(cenario())
+    assert pausado[0] == "paused"
+    assert pausado[1] < 1.0
+    assert job.status == "cancelled"
+    assert job.resultado is None
+    assert livres == 2
+
+
+def test_paused_queued_job_stays_out_of_the_pool(tmp_path):
+    caminho = str(tmp_path / "profit.csv")
+    write_profit_csv(caminho, n=400)
+    store = bar_store.abrir_ou_converter(caminho)
+
+    async def cenario():
+        fila = FilaBacktests(max_workers=1, max_jobs=4, tamanho_bloco=100)
+        concluidos = []
+        fila.ao_concluir = lambda job: concluidos.append(job.job_id)
+
+        async def registrar(job):
+            pass
+
+        fila._broadcast = registrar
+        try:
+            primeiro = fila.submeter("a", store.caminho, PARAMETROS)
+            pausado = fila.submeter("b", store.caminho, PARAMETROS)
+            cancelado = fila.submeter("c", store.caminho, PARAMETROS)
+            assert fila.pausar(pausado.job_id) and pausado._future is None
+            assert fila.cancelar(cancelado.job_id)
+            assert cancelado.status == "cancelled" and len(fila._slots_livres) == 2
+
+            # o job pausado na espera não prende o worker
+            depois = fila.submeter("d", store.caminho, PARAMETROS)
+            await aguardar(primeiro)
+            await aguardar(depois)
+            assert pausado.status == "paused" and pausado._future is None
+
+            assert fila.retomar(pausado.job_id)
+            await aguardar(pausado)
+            return primeiro, pausado, depois, concluidos
+        finally:
+            fila.encerrar()
+
+    primeiro, pausado, depois, concluidos = asyncio.run(cenario())
+    assert (primeiro.status, pausado.status, depois.status) == ("completed",) * 3
+    assert concluidos == [primeiro.job_id, depois.job_id, pausado.job_id]
+    assert pausado.resultado == depois.resultado
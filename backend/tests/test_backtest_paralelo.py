@@ -0,0 +1,58 @@
+import sys, os
+# ensure backend directory is on path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import app.websocket  # noqa: F401  (ordem de import do app)
+from app.ingestion.backtest_paralelo import (
+    ResultadoShard, Shard, combinar_metricas, executar_backtests, executar_shard,
+    montar_shards,
+)
+from app.signals.manager import signal_manager
+from conftest import write_profit_csv
+
+
+def test_shards_run_in_parallel_and_match_sequential(tmp_path):
+    arquivos = []
+    for i, nome in enumerate(("WINFUT_5m.csv", "WDOFUT_5m.csv")):
+        caminho = str(tmp_path / nome)
+        write_profit_csv(caminho, n=600, seed=i)
+        arquivos.append(caminho)
+    faltando = str(tmp_path / "INDFUT.csv")
+    shards = montar_shards(
+        arquivos, [(None, None), ("2024-03-01 12:00", "2024-03-02 00:00")])
+    shards.append(Shard(faltando, "INDFUT"))
+
+    vistos = []
+    relatorio = executar_backtests(shards, max_workers=2, tamanho_bloco=128,
+                                   ao_concluir=vistos.append)
+
+    assert [s.simbolo for s in shards[:4]] == ["WINFUT", "WINFUT", "WDOFUT", "WDOFUT"]
+    assert len(vistos) == 5 and relatorio.falhas == 1
+    assert relatorio.shards[-1].erro is not None
+    assert set(relatorio.por_simbolo) == {"WINFUT", "WDOFUT", "INDFUT"}
+    for shard, resultado in zip(shards[:4], relatorio.shards[:4]):
+        assert resultado.shard == shard
+        sequencial = executar_shard(shard, {}, tamanho_bloco=128)
+        assert resultado.barras == sequencial.barras
+        assert resultado.metricas["total"] == sequencial.metricas["total"]
+    assert relatorio.shards[0].barras == 600
+    assert 0 < relatorio.shards[1].barras < 600
+    assert relatorio.barras == sum(r.barras for r in relatorio.shards)
+    # shards usam SignalManager próprio
+    assert not signal_manager.open_signals
+
+
+def test_metrics_are_merged_over_totals():
+    a = ResultadoShard(Shard("a.csv", "A"), metricas={"total": 3, "wins": 3, "buys": 1},
+                       soma_pontos=300.0, com_pontos=3)
+    b = ResultadoShard(Shard("b.csv", "B"), metricas={"total": 1, "wins": 0, "buys": 1},
+                       soma_pontos=-60.0, com_pontos=1)
+    falha = ResultadoShard(Shard("c.csv", "C"), metricas={"total": 9, "wins": 9},
+                           erro="x")
+
+    metricas = combinar_metricas([a, b, falha])
+
+    assert (metricas.total, metricas.wins, metricas.losses) == (4, 3, 1)
+    assert (metricas.buys, metricas.sells) == (2, 2)
+    assert metricas.assertividade == 75.0
+    assert metricas.pontos_medios == 60.0
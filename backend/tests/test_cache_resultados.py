@@ -0,0 +1,98 @@
+import sys, os
+# ensure backend directory is on path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import main
+from alert_engine import AlertConfig, AlertEngine
+from engine_registry import EngineRegistry
+from app.events.cache_resultados import CacheResultados, etag_confere
+from app.routes.analysis import router
+from conftest import random_columns
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    monkeypatch.setattr(main, "engine_registry", EngineRegistry())
+    monkeypatch.setattr(main, "alert_engine", AlertEngine(AlertConfig()))
+    monkeypatch.setattr(main, "ultimo_resultado", CacheResultados())
+    app = FastAPI()
+    app.include_router(router, prefix="/analysis")
+    return TestClient(app)
+
+
+def test_cache_versions_and_invalidates_payloads():
+    cache = CacheResultados()
+    assert cache.versao("WIN") == 0
+    cache["WIN"] = "r1"
+    versao = cache.versao("WIN")
+    etag = cache.etag("WIN")
+    cache.guardar("WIN", "chave", b"um", versao)
+    assert cache.obter("WIN", "chave") == b"um"
+    assert cache.etag("WIN", "chave") != etag
+
+    cache["WIN"] = "r2"
+    assert cache.versao("WIN") > versao and cache.etag("WIN") != etag
+    assert cache.obter("WIN", "chave") is None
+    # payload de uma versão já substituída não entra no cache
+    cache.guardar("WIN", "chave", b"velho", versao)
+    assert cache.obter("WIN", "chave") is None
+
+    assert etag_confere(f'W/{etag}, "outro"', etag)
+    assert etag_confere("*", etag)
+    assert not etag_confere('"outro"', etag)
+
+
+def test_last_signal_polling_gets_304_until_a_new_bar(cliente):
+    cols = random_columns(120, seed=2)
+
+    def enviar(ini, fim):
+        colunas = {k: v[ini:fim].tolist() for k, v in cols.items()}
+        corpo = {"ativo": "WIN", "colunas": colunas}
+        assert cliente.post("/analysis/processar-barras", json=corpo).status_code == 200
+
+    assert cliente.get("/analysis/ultimo-sinal/WIN").json()["mensagem"]
+    enviar(0, 100)
+    r = cliente.get("/analysis/ultimo-sinal/WIN")
+    assert r.status_code == 200 and "ETag" in r.headers
+    etag = r.headers["ETag"]
+
+    r = cliente.get("/analysis/ultimo-sinal/WIN", headers={"If-None-Match": etag})
+    assert r.status_code == 304 and r.content == b"" and r.headers["ETag"] == etag
+    # outra projeção tem ETag próprio
+    r = cliente.get("/analysis/ultimo-sinal/WIN", params={"campos": "direcao"},
+                    headers={"If-None-Match": etag})
+    assert r.status_code == 200 and list(r.json()) == ["direcao"]
+
+    enviar(100, 120)
+    r = cliente.get("/analysis/ultimo-sinal/WIN", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["ETag"] != etag
+    ultimo = main.ultimo_resultado[("WIN", 5)]
+    assert r.json()["score_final"] == pytest.approx(ultimo.score_final, abs=0.05)
+
+
+def test_last_signal_is_kept_per_engine_key(cliente):
+    cols = random_columns(80, seed=3)
+    colunas = {k: v.tolist() for k, v in cols.items()}
+    for ativo, timeframe in (("win", 5), ("WIN", 15)):
+        corpo = {"ativo": ativo, "timeframe": timeframe, "colunas": colunas}
+        assert cliente.post("/analysis/processar-barras", json=corpo).status_code == 200
+    assert set(main.ultimo_resultado) == {("WIN", 5), ("WIN", 15)}
+
+    r5 = cliente.get("/analysis/ultimo-sinal/win")
+    r15 = cliente.get("/analysis/ultimo-sinal/WIN", params={"timeframe": 15})
+    assert r5.status_code == r15.status_code == 200
+    assert r5.headers["ETag"] != r15.headers["ETag"]
+    assert cliente.get("/analysis/ultimo-sinal/WIN", params={"timeframe": 60}).json() \
+        == {"mensagem": "Sem dados para WIN ainda"}
+
+    # uma barra nova no 15m não invalida o ETag do 5m
+    uma_barra = {k: v[:1] for k, v in colunas.items()}
+    corpo = {"ativo": "WIN", "timeframe": 15, "colunas": uma_barra}
+    assert cliente.post("/analysis/processar-barras", json=corpo).status_code == 200
+    r = cliente.get("/analysis/ultimo-sinal/WIN",
+                    headers={"If-None-Match": r5.headers["ETag"]})
+    assert r.status_code == 304
@@ -0,0 +1,162 @@
+import sys, os
+# ensure backend directory is on path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dataclasses import asdict
+
+import numpy as np
+
+from core_engine import (
+    CAMPOS_MODULOS, SMCCoreEngine, Bar, BarBuffer, SMCResult, TabelaResultados,
+)
+from conftest import random_columns, columns_to_bars
+
+
+def make_bar(i, close=None):
+    close = 100000 + (i % 37) * 5 if close is None else close
+    return Bar(
+        open=close - 5, high=close + 10, low=close - 10, close=close,
+        volume=1000 + i, volume_compra=600, volume_venda=400, trades=50,
+        true_range=20, timestamp_hhmm=900 + i % 60,
+    )
+
+
+def test_bar_buffer_windows_are_contiguous_views():
+    buf = BarBuffer(capacidade=5)
+    for i in range(12):
+        buf.push(make_bar(i, close=float(i)))
+
+    janela = buf.janela("close", 5)
+    assert len(buf) == 5
+    assert list(janela) == [7.0, 8.0, 9.0, 10.0, 11.0]
+    assert janela.flags["C_CONTIGUOUS"]
+    assert np.shares_memory(janela, buf._dados)
+    assert list(buf.janela("close", 2)) == [10.0, 11.0]
+    assert buf.ultimo("close") == 11.0
+
+
+def test_bar_buffer_partial_fill_and_clear():
+    buf = BarBuffer(capacidade=10)
+    for i in range(3):
+        buf.push(make_bar(i, close=float(i)))
+    assert list(buf.janela("close")) == [0.0, 1.0, 2.0]
+
+    buf.clear()
+    assert len(buf) == 0
+    assert len(buf.janela("close", 5)) == 0
+
+
+def test_engine_warmup_and_buffer_cap():
+    engine = SMCCoreEngine()
+    results = [engine.process(make_bar(i)) for i in range(600)]
+
+    assert all(r is None for r in results[:59])
+    assert all(r is not None for r in results[59:])
+    stats = engine.get_stats()
+    assert stats["barras_processadas"] == 600
+    assert stats["barras_buffer"] == 500
+
+
+def test_process_many_matches_streaming_bit_for_bit():
+    cols = random_columns(3000)
+    streaming = SMCCoreEngine()
+    esperados = [streaming.process(b) for b in columns_to_bars(cols)]
+
+    batch = SMCCoreEngine()
+    tabela = batch.process_many(cols)
+
+    validos = [i for i, r in enumerate(esperados) if r is not None]
+    assert list(tabela["indice"]) == validos
+    for linha, i in enumerate(validos):
+        assert batch.resultado_da_tabela(tabela, linha) == esperados[i]
+    assert batch.contador_barras == streaming.contador_barras
+    assert np.array_equal(batch.barras.janela("close"),
+                          streaming.barras.janela("close"))
+    assert batch.ultimo_resultado == streaming.ultimo_resultado
+
+
+def test_process_many_continues_streaming_state():
+    cols = random_columns(200, seed=3)
+    streaming = SMCCoreEngine()
+    esperados = [streaming.process(b) for b in columns_to_bars(cols)]
+
+    misto = SMCCoreEngine()
+    for bar in columns_to_bars(cols, 0, 70):
+        misto.process(bar)
+    resto = {k: v[70:] for k, v in cols.items()}
+    tabela = misto.process_many(resto)
+
+    assert len(tabela["indice"]) == 130
+    for linha in range(130):
+        assert misto.resultado_da_tabela(tabela, linha) == esperados[70 + linha]
+    assert misto.process(columns_to_bars(cols, 199)[0]) is not None
+
+
+def test_process_many_with_modules_matches_streaming():
+    cols = random_columns(400, seed=5)
+    cols["volume_compra"] = cols["volume"] * 0.6
+    cols["volume_venda"] = cols["volume"] * 0.4
+    streaming = SMCCoreEngine(usar_modulos=True)
+    esperados = []
+    for i, bar in enumerate(columns_to_bars(cols)):
+        bar.volume_compra = cols["volume_compra"][i]
+        bar.volume_venda = cols["volume_venda"][i]
+        esperados.append(streaming.process(bar))
+
+    batch = SMCCoreEngine(usar_modulos=True)
+    tabela = batch.process_many(cols)
+
+    validos = [i for i, r in enumerate(esperados) if r is not None]
+    assert list(tabela["indice"]) == validos
+    # Core bit a bit; modulos vetorizados: floats iguais a menos de arredondamento
+    for linha, i in enumerate(validos):
+        obtido = batch.resultado_da_tabela(tabela, linha)
+        for campo, valor in asdict(esperados[i]).items():
+            if isinstance(valor, float) and campo in CAMPOS_MODULOS:
+                tolerancia = 1e-7 * max(1.0, abs(valor))
+                assert abs(getattr(obtido, campo) - valor) <= tolerancia, campo
+            else:
+                assert getattr(obtido, campo) == valor, (campo, i)
+    assert batch.process(columns_to_bars(cols, 399)[0]) is not None
+    assert esperados[-1].regime_mercado in ("tendencia", "lateral", "transicao")
+    assert esperados[-1].renko_sugestao != ""
+
+
+def test_result_objects_are_slotted():
+    assert not hasattr(SMCResult(), "__dict__")
+    assert not hasattr(make_bar(0), "__dict__")
+
+
+def test_result_table_is_compact_struct_of_arrays():
+    cols = random_columns(3000, seed=8)
+    streaming = SMCCoreEngine(usar_modulos=True)
+    esperados = [streaming.process(bar) for bar in columns_to_bars(cols)]
+
+    blocos = ({k: v[i:i + 700] for k, v in cols.items()} for i in range(0, 3000, 700))
+    tabela = SMCCoreEngine(usar_modulos=True).process_blocos(blocos, capacidade=100)
+
+    validos = [i for i, r in enumerate(esperados) if r is not None]
+    assert len(tabela) == len(validos) and tabela.capacidade >= len(validos)
+    assert list(tabela["indice"]) == validos
+    assert tabela["direcao"][-1] == esperados[-1].direcao
+    obtido = tabela.resultado(len(tabela) - 1)
+    for campo, valor in asdict(esperados[-1]).items():
+        if isinstance(valor, float):
+            tolerancia = 1e-7 * max(1.0, abs(valor))
+            assert abs(getattr(obtido, campo) - valor) <= tolerancia, campo
+        elif campo != "nome_ativo":
+            assert getattr(obtido, campo) == valor, campo
+
+    # caminho streaming: mesmos valores, colunas tipadas
+    registro = TabelaResultados(capacidade=10)
+    for i, r in enumerate(esperados):
+        if r is not None:
+            registro.anexar_resultado(i, r)
+    assert np.array_equal(registro["score_final"], tabela["score_final"])
+    assert registro["sessao_atual"].tolist() == tabela["sessao_atual"].tolist()
+    assert registro.coluna("qualidade_setup").dtype == np.int32
+
+    # engine base: poucas dezenas de bytes por barra
+    base = SMCCoreEngine().process_blocos([random_columns(20_000, seed=1)],
+                                          capacidade=20_000)
+    assert base.nbytes / len(base) < 64
@@ -0,0 +1,258 @@
+import sys, os
+# ensure backend directory is on path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import hashlib
+import io
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from core_engine import SMCCoreEngine
+from app.ingestion.csv_stream import ler_blocos, iter_barras, processar_csv
+from app.ingestion.csv_parser import parse_csv
+from app.ingestion.csv_loader import load_profit_csv
+from app.data_ingestion.manager import CSVIngester
+from app.ingestion import bar_store, upload_cache
+from app.ingestion.upload_stream import (
+    receber_upload, UploadInvalido, UploadGrandeDemais,
+)
+from conftest import write_profit_csv
+
+
+def test_blocks_are_bounded_and_columnar(tmp_path):
+    caminho = tmp_path / "profit.csv"
+    df = write_profit_csv(caminho, n=25)
+    blocos = list(ler_blocos(caminho, tamanho_bloco=10))
+
+    assert [len(b["close"]) for b in blocos] == [10, 10, 5]
+    assert "ignorada" not in blocos[0]
+    assert blocos[0]["close"].dtype == np.float64
+    assert list(blocos[1]["timestamp_hhmm"][:2]) == [950, 955]
+    assert np.array_equal(np.concatenate([b["close"] for b in blocos]),
+                          df["close"].to_numpy())
+
+
+def test_missing_timestamp_is_rejected_before_reaching_the_store(tmp_path):
+    caminho = tmp_path / "profit.csv"
+    df = write_profit_csv(caminho, n=25)
+    df["timestamp"] = df["timestamp"].astype(object)
+    df.loc[13, "timestamp"] = None
+    df.to_csv(caminho, index=False)
+
+    with pytest.raises(ValueError, match="Linha 15: 'timestamp'"):
+        list(ler_blocos(caminho, tamanho_bloco=10))
+    with pytest.raises(ValueError, match="Linha 15"):
+        bar_store.converter_csv(str(caminho), tamanho_bloco=10)
+    assert sorted(os.listdir(tmp_path)) == ["profit.csv"]
+
+
+def test_streamed_engine_matches_bar_by_bar(tmp_path):
+    caminho = tmp_path / "profit.csv"
+    write_profit_csv(caminho)
+
+    streaming = SMCCoreEngine()
+    esperados = [r for r in map(streaming.process, iter_barras(caminho, 64))
+                 if r is not None]
+
+    engine = SMCCoreEngine()
+    obtidos = []
+    for tabela in processar_csv(engine, caminho, tamanho_bloco=64):
+        obtidos += [engine.resultado_da_tabela(tabela, i)
+                    for i in range(len(tabela["indice"]))]
+    assert obtidos == esperados
+    assert engine.contador_barras == streaming.contador_barras == 250
+
+
+def test_parser_and_loader_rows(tmp_path):
+    caminho = tmp_path / "profit.csv"
+    df = write_profit_csv(caminho, n=30)
+
+    linhas = list(parse_csv(caminho, tamanho_bloco=7))
+    assert len(linhas) == 30
+    assert linhas[8]["close"] == df["close"][8]
+    assert linhas[8]["trades"] == df["trades"][8]
+
+    rows = load_profit_csv(str(caminho))
+    assert rows[29].timestamp == df["timestamp"][29].to_pydatetime()
+    assert rows[29].delta == df["delta"][29]
+
+    df["trades"] = df["trades"].astype(float)
+    df.loc[12, "trades"] = 1.5
+    df.to_csv(caminho, index=False)
+    with pytest.raises(ValueError, match="Linha 14"):
+        load_profit_csv(str(caminho))
+
+
+def test_csv_ingester_sorts_and_detects_timeframe(tmp_path):
+    caminho = tmp_path / "profit.csv"
+    df = write_profit_csv(caminho, n=40)
+    df.iloc[::-1].to_csv(caminho, index=False)
+
+    resultado = asyncio.run(CSVIngester().ingest(str(caminho)))
+    assert resultado["status"] == "success"
+    assert resultado["count"] == 40
+    assert resultado["timeframe"] == 5
+    assert resultado["data"][0]["timestamp"] == df["timestamp"][0].isoformat()
+    assert resultado["data"][0]["volume"] == int(df["volume"][0])
+
+
+def test_bar_store_round_trip_and_reuse(tmp_path):
+    caminho = str(tmp_path / "profit.csv")
+    df = write_profit_csv(caminho, n=120)
+
+    store = bar_store.converter_csv(caminho, tamanho_bloco=50)
+    assert len(store) == 120
+    assert isinstance(store["close"], np.memmap)
+    assert np.array_equal(store["close"], df["close"].to_numpy())
+    assert store.ts_min == np.datetime64("2024-03-01T09:00", "ns")
+    assert store.info()["ts_max"] == "2024-03-01T18:55:00"
+    assert len(store.intervalo("2024-03-01T10:00", "2024-03-01T10:30")["close"]) == 7
+
+    # Reabrir nao reconverte; CSV alterado ou outra versao de esquema sim
+    meta = os.path.join(store.caminho, "meta.json")
+    antes = os.stat(meta).st_mtime_ns
+    assert len(bar_store.abrir_ou_converter(caminho)) == 120
+    assert os.stat(meta).st_mtime_ns == antes
+    write_profit_csv(caminho, n=80)
+    assert len(bar_store.abrir_ou_converter(caminho)) == 80
+
+
+def test_bar_store_feeds_engine_like_csv(tmp_path):
+    caminho = str(tmp_path / "profit.csv")
+    write_profit_csv(caminho)
+    store = bar_store.abrir_ou_converter(caminho)
+
+    via_csv, via_store = SMCCoreEngine(), SMCCoreEngine()
+    esperadas = [t["score_final"] for t in processar_csv(via_csv, caminho, 64)]
+    obtidas = [t["score_final"] for t in store.processar(via_store, 64)]
+    assert np.array_equal(np.concatenate(esperadas), np.concatenate(obtidas))
+    assert via_store.ultimo_resultado == via_csv.ultimo_resultado
+    assert [b.close for b in store.barras(30)] == list(store["close"])
+
+
+class FakeUpload:
+    def __init__(self, dados):
+        self._arquivo = io.BytesIO(dados)
+
+    async def read(self, n=-1):
+        return self._arquivo.read(n)
+
+
+def test_streaming_upload_hashes_and_validates_in_chunks(tmp_path):
+    origem = tmp_path / "profit.csv"
+    write_profit_csv(origem, n=300)
+    dados = origem.read_bytes()
+    destino = str(tmp_path / "recebido.csv")
+
+    recebido = asyncio.run(
+        receber_upload(FakeUpload(dados), destino, 10 ** 7, tamanho_chunk=777))
+    assert recebido.linhas == 300
+    assert recebido.sha256 == hashlib.sha256(dados).hexdigest()
+    assert open(destino, "rb").read() == dados
+
+    with pytest.raises(UploadGrandeDemais):
+        asyncio.run(
+            receber_upload(FakeUpload(dados), destino, 5000, tamanho_chunk=1000))
+    assert not os.path.exists(destino)
+
+    linhas = dados.split(b"\n")
+    linhas[5] = linhas[5].replace(b",", b",x", 1)
+    with pytest.raises(UploadInvalido, match="Linha 6: 'open'"):
+        asyncio.run(receber_upload(FakeUpload(b"\n".join(linhas)), destino, 10 ** 7,
+                                   tamanho_chunk=64))
+
+    with pytest.raises(UploadInvalido, match="Colunas faltantes"):
+        asyncio.run(receber_upload(FakeUpload(b"a,b\n1,2\n"), destino, 10 ** 7))
+
+
+def test_upload_cache_dedups_and_versions_results(tmp_path, monkeypatch):
+    cache = upload_cache.CacheUploads(str(tmp_path / "cache"))
+    origem = tmp_path / "profit.csv"
+    write_profit_csv(origem, n=50)
+    sha = hashlib.sha256(origem.read_bytes()).hexdigest()
+
+    def receber(nome):
+        caminho = str(tmp_path / nome)
+        shutil.copy(origem, caminho)
+        return caminho
+
+    store, duplicado = cache.adotar(sha, receber("a.csv"))
+    assert not duplicado and len(store) == 50
+    temporario = receber("b.csv")
+    _, duplicado = cache.adotar(sha, temporario)
+    assert duplicado and not os.path.exists(temporario)
+
+    parametros = {"tf_base_minutos": 5, "usar_modulos": False}
+    assert cache.resultado(sha, parametros) is None
+    cache.salvar_resultado(sha, parametros, {"sinais": 3})
+    assert cache.resultado(sha, parametros) == {"sinais": 3}
+    assert cache.resultado(sha, {**parametros, "tf_base_minutos": 1}) is None
+
+    # Codigo do engine alterado: resultados antigos deixam de valer
+    monkeypatch.setattr(upload_cache, "assinatura_engine", lambda: "outra-versao")
+    assert cache.resultado(sha, parametros) is None
+
+
+def test_upload_cache_concurrent_identical_uploads(tmp_path):
+    cache = upload_cache.CacheUploads(str(tmp_path / "cache"))
+    origem = tmp_path / "profit.csv"
+    write_profit_csv(origem, n=60)
+    sha = hashlib.sha256(origem.read_bytes()).hexdigest()
+    temporarios = []
+    for i in range(4):
+        temporarios.append(str(tmp_path / f"recebendo-{i}.csv"))
+        shutil.copy(origem, temporarios[-1])
+
+    barreira = threading.Barrier(len(temporarios))
+
+    def adotar(temporario):
+        barreira.wait()
+        return cache.adotar(sha, temporario)
+
+    with ThreadPoolExecutor(len(temporarios)) as pool:
+        resultados = list(pool.map(adotar, temporarios))
+
+    assert sorted(duplicado for _, duplicado in resultados) == [False, True, True, True]
+    assert all(len(store) == 60 for store, _ in resultados)
+    assert cache.contem(sha) and not any(os.path.exists(t) for t in temporarios)
+    entrada = os.path.join(cache.diretorio, sha)
+    assert sorted(os.listdir(entrada)) == [".uso", "dados.bars", "dados.csv"]
+
+
+def test_upload_cache_lru_eviction(tmp_path):
+    cache = upload_cache.CacheUploads(str(tmp_path / "cache"))
+    shas = []
+    for seed in range(3):
+        origem = tmp_path / f"{seed}.csv"
+        write_profit_csv(origem, n=40, seed=seed)
+        sha = hashlib.sha256(origem.read_bytes()).hexdigest()
+        cache.adotar(sha, str(origem))
+        os.utime(os.path.join(cache.diretorio, sha, ".uso"), (seed, seed))
+        shas.append(sha)
+
+    cache.store(shas[0])  # volta a ser o mais recente
+    cache.max_bytes = cache.tamanho_bytes() - 1
+    assert cache.despejar() == 1
+    assert not cache.contem(shas[1])
+    assert cache.contem(shas[0]) and cache.contem(shas[2])
+
+
+def test_bar_store_results_table(tmp_path):
+    caminho = tmp_path / "profit.csv"
+    write_profit_csv(caminho, n=400)
+    store = bar_store.abrir_ou_converter(str(caminho))
+
+    tabela = store.resultados(SMCCoreEngine(), tamanho_bloco=90)
+
+    esperado = SMCCoreEngine()
+    barras = list(store.barras())
+    resultados = [(i, esperado.process(b)) for i, b in enumerate(barras)]
+    resultados = [(i, r) for i, r in resultados if r is not None]
+    assert tabela.capacidade == 400
+    assert list(tabela["indice"]) == [i for i, _ in resultados]
+    assert list(tabela["score_compra"]) == [r.score_compra for _, r in resultados]
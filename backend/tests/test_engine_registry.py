@@ -0,0 +1,147 @@
+import sys, os
+# ensure backend directory is on path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core_engine import Bar
+from engine_registry import EngineRegistry
+
+
+def make_bar(close):
+    return Bar(open=close, high=close + 1, low=close - 1, close=close, volume=10)
+
+
+def test_registry_isolates_symbols_and_timeframes():
+    registry = EngineRegistry(tf_base_minutos=5)
+    win = registry.get("WIN")
+    wdo = registry.get("wdo")
+    win_1m = registry.get("WIN", 1)
+
+    assert registry.get("WIN", 5) is win
+    assert len({id(win), id(wdo), id(win_1m)}) == 3
+    assert wdo.tipo_ativo == 2
+    assert win_1m.tf_base_minutos == 1
+
+    win.process(make_bar(100.0))
+    assert win.contador_barras == 1
+    assert wdo.contador_barras == 0
+
+
+def test_registry_lru_eviction_by_count_and_memory():
+    registry = EngineRegistry(max_engines=2)
+    registry.get("WIN")
+    registry.get("WDO")
+    registry.get("WIN")  # WDO passa a ser o menos usado
+    registry.get("ES")
+
+    assert ("WIN", 5) in registry
+    assert ("ES", 5) in registry
+    assert ("WDO", 5) not in registry
+    assert registry.total_despejados == 1
+
+    engine_bytes = registry.get("WIN").memoria_bytes()
+    registry = EngineRegistry(memoria_max_mb=(2.5 * engine_bytes) / (1024 * 1024))
+    for ativo in ("A", "B", "C", "D"):
+        registry.get(ativo)
+    assert len(registry) == 2
+    assert registry.memoria_bytes() <= registry.memoria_max_bytes
+
+
+def test_registry_idle_eviction_and_stats():
+    registry = EngineRegistry(max_ocioso_segundos=-1)
+    registry.get("WIN")
+    registry.get("WDO")  # WIN ja esta ocioso
+
+    stats = registry.get_stats()
+    assert stats["total_engines"] == 1
+    assert stats["engines"][0]["ativo"] == "WDO"
+    assert "memoria_bytes" in stats["engines"][0]
+
+
+def test_registry_restores_engine_snapshots(tmp_path):
+    registry = EngineRegistry(usar_modulos=True, diretorio_estado=str(tmp_path))
+    engine = registry.get("WIN", 5)
+    for i in range(80):
+        engine.process(make_bar(100.0 + i % 7))
+    engine.pipeline.fbi.mapa.registrar(120000.0, 3, 288, 0.8)
+    assert registry.salvar_estados() == 1
+    assert (tmp_path / "WIN_5m.smc").exists()
+
+    reiniciado = EngineRegistry(usar_modulos=True, diretorio_estado=str(tmp_path))
+    restaurado = reiniciado.get("WIN", 5)
+    assert restaurado.contador_barras == 80
+    # Sem warmup: a primeira barra apos o restart ja produz resultado
+    assert restaurado.process(make_bar(101.0)) is not None
+    mapa = restaurado.pipeline.fbi.mapa
+    assert mapa.preco[mapa.proxima(120100.0)] == 120000.0
+
+
+def test_registry_saves_evicted_engines_off_the_caller_thread(tmp_path, monkeypatch):
+    import asyncio
+    import threading
+    import engine_snapshot
+
+    threads = []
+    gravar_varios = engine_snapshot.gravar_varios
+
+    def gravar_registrando(pendentes):
+        threads.append(threading.current_thread().name)
+        return gravar_varios(pendentes)
+
+    monkeypatch.setattr(engine_snapshot, "gravar_varios", gravar_registrando)
+    registry = EngineRegistry(max_engines=1, diretorio_estado=str(tmp_path))
+    engine = asyncio.run(registry.obter("WIN", 5))
+    for i in range(80):
+        engine.process(make_bar(100.0 + i % 7))
+
+    registry.get("WDO", 5)  # despeja WIN; o snapshot e gravado em segundo plano
+    assert registry.peek("WIN", 5) is None
+    # restaurar a mesma chave espera a gravacao pendente
+    assert registry.get("WIN", 5).contador_barras == 80
+    assert threads and all(nome.startswith("engine-snapshot") for nome in threads)
+    assert registry.memoria_bytes() > 0
+
+
+def test_snapshot_waits_for_a_batch_running_in_a_thread(tmp_path, monkeypatch):
+    import asyncio
+    import threading
+    import numpy as np
+    import engine_snapshot
+    from core_engine import BarBuffer, SMCCoreEngine
+    from app.events.serializacao import serializador_resultado
+    from app.ingestion.lote_barras import BarrasInput, executar_lote
+    from conftest import random_columns
+
+    registry = EngineRegistry(diretorio_estado=str(tmp_path))
+    engine = registry.get("WIN", 5)
+    cols = random_columns(80, seed=12)
+    lote = BarrasInput(ativo="WIN", colunas={k: v.tolist() for k, v in cols.items()})
+
+    no_meio, liberar = threading.Event(), threading.Event()
+    push_many = BarBuffer.push_many
+
+    def push_e_espera(self, bloco):
+        # buffer já avançou, contador ainda não: estado pela metade
+        push_many(self, bloco)
+        no_meio.set()
+        liberar.wait(5)
+
+    monkeypatch.setattr(BarBuffer, "push_many", push_e_espera)
+
+    async def cenario():
+        tarefa = asyncio.create_task(
+            executar_lote(engine, lote, serializador_resultado(None)))
+        await asyncio.to_thread(no_meio.wait, 5)
+        snapshot = asyncio.create_task(asyncio.to_thread(registry.serializar_estados))
+        await asyncio.sleep(0.1)
+        assert not snapshot.done()
+        liberar.set()
+        await tarefa
+        return await snapshot
+
+    (caminho, dados), = asyncio.run(cenario())
+    engine_snapshot.gravar(caminho, dados)
+    restaurado = SMCCoreEngine()
+    assert engine_snapshot.carregar(restaurado, caminho)
+    assert restaurado.contador_barras == engine.contador_barras == 80
+    assert np.array_equal(restaurado.barras.janela("close"),
+                          engine.barras.janela("close"))
@@ -0,0 +1,48 @@
+import sys, os
+# ensure backend directory is on path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+
+from core_engine import SMCCoreEngine
+import engine_snapshot
+from conftest import random_columns, columns_to_bars
+
+
+def test_snapshot_round_trip_continues_identically(tmp_path):
+    cols = random_columns(600, seed=11)
+    barras = columns_to_bars(cols)
+    original = SMCCoreEngine(usar_modulos=True)
+    for bar in barras[:500]:
+        original.process(bar)
+
+    caminho = str(tmp_path / "WIN_5m.smc")
+    engine_snapshot.salvar(original, caminho)
+    restaurado = SMCCoreEngine(usar_modulos=True)
+    assert engine_snapshot.carregar(restaurado, caminho)
+    assert restaurado.contador_barras == original.contador_barras
+    assert np.array_equal(restaurado.barras.janela("close"),
+                          original.barras.janela("close"))
+
+    for bar in barras[500:]:
+        assert restaurado.process(bar) == original.process(bar)
+    assert len(restaurado.pipeline.fbi.zones) == len(original.pipeline.fbi.zones)
+
+
+def test_snapshot_rejects_incompatible_or_corrupt(tmp_path):
+    engine = SMCCoreEngine(usar_modulos=True)
+    for bar in columns_to_bars(random_columns(60)):
+        engine.process(bar)
+    caminho = str(tmp_path / "a.smc")
+    engine_snapshot.salvar(engine, caminho)
+
+    outro_tf = SMCCoreEngine(usar_modulos=True, tf_base_minutos=1)
+    assert not engine_snapshot.carregar(outro_tf, caminho)
+    assert not engine_snapshot.carregar(SMCCoreEngine(), caminho)
+    assert engine_snapshot.info(caminho)["engine"] == engine.configuracao()
+
+    with open(caminho, "r+b") as f:
+        f.write(b"XXXX")
+    assert not engine_snapshot.carregar(SMCCoreEngine(usar_modulos=True), caminho)
+    ausente = str(tmp_path / "nada.smc")
+    assert not engine_snapshot.carregar(SMCCoreEngine(usar_modulos=True), ausente)
@@ -0,0 +1,153 @@
+import sys, os
+# ensure backend directory is on path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import main
+from alert_engine import AlertConfig, AlertEngine
+from core_engine import SMCCoreEngine
+from engine_registry import EngineRegistry
+from app.events.cache_resultados import CacheResultados
+from app.events.serializacao import serializador_resultado
+from app.ingestion import lote_barras
+from app.routes.analysis import router
+from conftest import random_columns, columns_to_bars
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    monkeypatch.setattr(main, "engine_registry", EngineRegistry(usar_modulos=True))
+    monkeypatch.setattr(main, "alert_engine", AlertEngine(AlertConfig()))
+    monkeypatch.setattr(main, "ultimo_resultado", CacheResultados())
+    app = FastAPI()
+    app.include_router(router, prefix="/analysis")
+    return TestClient(app)
+
+
+def corpo(cols, ini, fim, **extra):
+    colunas = {k: v[ini:fim].tolist() for k, v in cols.items()}
+    return {"ativo": "WIN", "colunas": colunas, **extra}
+
+
+def test_batch_matches_bar_by_bar_and_keeps_engine_state(cliente):
+    cols = random_columns(150, seed=4)
+    streaming = SMCCoreEngine(usar_modulos=True)
+    esperados = [streaming.process(bar) for bar in columns_to_bars(cols)]
+
+    r = cliente.post("/analysis/processar-barras", json=corpo(cols, 0, 50))
+    assert r.status_code == 200
+    dados = r.json()
+    assert dados["aquecendo"] and dados["barras_restantes"] == 10
+    assert dados["ultimo"] is None and dados["eventos"] == []
+
+    r = cliente.post("/analysis/processar-barras",
+                     json=corpo(cols, 50, 150, retorno="todos"))
+    dados = r.json()
+    assert dados["processadas"] == 150 and not dados["aquecendo"]
+    resultados = dados["resultados"]
+    assert resultados["indice"] == list(range(9, 100))
+    for linha, i in enumerate(resultados["indice"]):
+        esperado = main._resultado_para_dict(esperados[50 + i])
+        for campo in ("score_final", "direcao", "estado_mercado", "regime_mercado",
+                      "sessao_atual"):
+            assert resultados[campo][linha] == esperado[campo], campo
+        assert resultados["score_hfz"][linha] == pytest.approx(esperado["score_hfz"],
+                                                               abs=0.11)
+    assert main.ultimo_resultado[("WIN", 5)].direcao == esperados[-1].direcao
+
+
+def test_batch_last_result_with_events_and_validation(cliente):
+    cols = random_columns(120, seed=6)
+    r = cliente.post("/analysis/processar-barras", json=corpo(cols, 0, 120))
+    dados = r.json()
+    assert dados["ultimo"]["direcao"] in ("COMPRA", "VENDA", "neutro")
+    assert dados["eventos"]
+    for evento in dados["eventos"]:
+        assert 59 <= evento["indice"] < 120 and evento["eventos"]
+        assert evento["timestamp_hhmm"] == int(cols["timestamp_hhmm"][evento["indice"]])
+
+    invalido = corpo(cols, 0, 10)
+    del invalido["colunas"]["close"]
+    assert cliente.post("/analysis/processar-barras", json=invalido).status_code == 422
+    invalido = corpo(cols, 0, 10)
+    invalido["colunas"]["high"].pop()
+    assert cliente.post("/analysis/processar-barras", json=invalido).status_code == 422
+    invalido = corpo(cols, 0, 10)
+    invalido["colunas"]["preco"] = invalido["colunas"]["close"]
+    assert cliente.post("/analysis/processar-barras", json=invalido).status_code == 422
+
+
+def test_batch_cap_with_modules_and_serialized_batches(cliente, monkeypatch):
+    cols = random_columns(200, seed=8)
+    monkeypatch.setattr(lote_barras, "MAX_BARRAS_LOTE_MODULOS", 100)
+    r = cliente.post("/analysis/processar-barras", json=corpo(cols, 0, 150))
+    assert r.status_code == 413
+    assert main.engine_registry.peek("WIN").contador_barras == 0
+
+    # dois lotes concorrentes no mesmo engine rodam um após o outro
+    streaming = SMCCoreEngine(usar_modulos=True)
+    esperados = [streaming.process(bar) for bar in columns_to_bars(cols)]
+    engine = SMCCoreEngine(usar_modulos=True)
+    para_dict = serializador_resultado(None)
+
+    async def cenario():
+        lotes = [lote_barras.BarrasInput(**corpo(cols, ini, ini + 100))
+                 for ini in (0, 100)]
+        return await asyncio.gather(
+            *(lote_barras.executar_lote(engine, lote, para_dict) for lote in lotes))
+
+    (_, primeiro), (ultimo, segundo) = asyncio.run(cenario())
+    assert primeiro["processadas"] == 100 and segundo["processadas"] == 200
+    assert ultimo.direcao == esperados[-1].direcao
+    assert ultimo.score_final == pytest.approx(esperados[-1].score_final)
+
+
+def test_cancelled_batch_keeps_the_lock_until_the_worker_ends():
+    cols = random_columns(120, seed=10)
+    engine = SMCCoreEngine()
+    para_dict = serializador_resultado(None)
+    iniciou, liberar = threading.Event(), threading.Event()
+    process_many = engine.process_many
+    construidos = []
+    resultado_da_tabela = engine.resultado_da_tabela
+
+    def lento(colunas):
+        iniciou.set()
+        liberar.wait(5)
+        return process_many(colunas)
+
+    def contar(tabela, linha):
+        construidos.append(linha)
+        return resultado_da_tabela(tabela, linha)
+
+    engine.process_many = lento
+    engine.resultado_da_tabela = contar
+
+    async def cenario():
+        lote = lote_barras.BarrasInput(**corpo(cols, 0, 120))
+        tarefa = asyncio.create_task(lote_barras.executar_lote(engine, lote, para_dict))
+        await asyncio.to_thread(iniciou.wait, 5)
+        tarefa.cancel()
+        await asyncio.sleep(0.05)
+        # a thread segue no engine: a trava não pode ser liberada ainda
+        assert lote_barras.trava_engine(engine).locked() and not tarefa.done()
+        liberar.set()
+        with pytest.raises(asyncio.CancelledError):
+            await tarefa
+        assert not lote_barras.trava_engine(engine).locked()
+        assert engine.contador_barras == 120
+
+        # retorno "ultimo": só a última linha vira SMCResult (no engine)
+        construidos.clear()
+        ultimo, resposta = await lote_barras.executar_lote(
+            engine, lote_barras.BarrasInput(**corpo(cols, 0, 120)), para_dict)
+        assert construidos == [119] and ultimo is not None
+        assert resposta["ultimo"] == para_dict(ultimo)
+
+    asyncio.run(cenario())
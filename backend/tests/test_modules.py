@@ -0,0 +1,335 @@
+import sys, os
+# ensure backend directory is on path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dataclasses import asdict
+
+import numpy as np
+
+from app.modules.rolling import RollingWindow
+
+
+def test_rolling_window_matches_numpy_slices():
+    rng = np.random.default_rng(0)
+    janela = RollingWindow(100, janelas=(5, 20, 50))
+    ref = np.zeros(100)
+
+    for valor in rng.normal(1000, 50, 750):
+        janela.push(valor)
+        ref = np.roll(ref, 1)
+        ref[0] = valor
+
+        assert janela[0] == ref[0] and janela[1] == ref[1]
+        assert np.array_equal(janela.recentes(30), ref[:30])
+        for w in (5, 20, 50):
+            assert np.isclose(janela.media(w), np.mean(ref[:w]), rtol=1e-12)
+            assert np.isclose(janela.desvio(w), np.std(ref[:w]), rtol=1e-9)
+            assert janela.minimo(w) == ref[:w].min()
+            assert janela.maximo(w) == ref[:w].max()
+
+
+def test_rolling_window_initial_zeros_and_constant_series():
+    janela = RollingWindow(10, janelas=(4,))
+    assert janela.media(4) == 0 and janela.minimo(4) == 0
+
+    for _ in range(3):
+        janela.push(7.5)
+    assert janela.minimo(4) == 0 and janela.maximo(4) == 7.5
+
+    for _ in range(20):
+        janela.push(7.5)
+    assert janela.media(4) == 7.5
+    assert janela.desvio(4) == 0.0
+    # janela não registrada cai no cálculo direto
+    assert janela.media(3) == 7.5
+
+
+def test_pipeline_shares_one_history():
+    from app.modules.pipeline import SMCPipeline
+
+    pipeline = SMCPipeline()
+    assert pipeline.dtm.hist_close is pipeline.sda.hist_close
+    assert pipeline.fbi.hist_volume is pipeline.hfz.hist_volume
+
+    class B:
+        open, high, low, close = 99.0, 101.0, 98.0, 100.0
+        volume, volume_compra, volume_venda, trades = 1000.0, 600.0, 400.0, 50
+        true_range, tick_minimo, timestamp_hhmm = 3.0, 5.0, 1000
+
+    for i in range(5):
+        pipeline.process(B())
+    assert pipeline.historico.series["close"]._t == 5
+    assert not pipeline.dtm.hist_close.recentes(10).flags.writeable
+
+
+def serie_aleatoria(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 120000 + np.cumsum(rng.normal(0, 40, n))
+    volume = rng.gamma(2.0, 800, n)
+    compra = volume * rng.uniform(0.2, 0.8, n)
+    return {
+        "open": close + rng.normal(0, 15, n),
+        "high": close + rng.uniform(0, 60, n),
+        "low": close - rng.uniform(0, 60, n),
+        "close": close,
+        "volume": volume,
+        "volume_compra": compra,
+        "volume_venda": volume - compra,
+        "trades": rng.integers(0, 120, n),
+        "true_range": rng.uniform(5, 120, n),
+        "timestamp_hhmm": 800 + (np.arange(n) * 5) % 1000,
+    }
+
+
+def assert_paridade(esperado, obtido, contexto):
+    if isinstance(esperado, dict):
+        for chave, valor in esperado.items():
+            assert_paridade(valor, obtido[chave], f"{contexto}.{chave}")
+        return
+    esperado = np.asarray(esperado)
+    obtido = np.asarray(obtido)
+    assert esperado.shape == obtido.shape, contexto
+    if esperado.dtype.kind == "f" or obtido.dtype.kind == "f":
+        np.testing.assert_allclose(obtido.astype(float), esperado.astype(float),
+                                   rtol=1e-7, atol=1e-7, err_msg=contexto)
+    else:
+        divergentes = np.nonzero(esperado != obtido)[0]
+        assert len(divergentes) == 0, f"{contexto}: barras {divergentes[:10]}"
+
+
+def test_analyze_series_matches_streaming_bar_for_bar():
+    from app.modules.pipeline import SMCPipeline, empilhar
+    from app.modules import HFZResult, DTMResult, SDAResult, FBIResult, MTVResult
+    from types import SimpleNamespace
+
+    cols = serie_aleatoria(1500)
+    streaming = SMCPipeline()
+    resultados = []
+    for i in range(1500):
+        bar = SimpleNamespace(tick_minimo=5.0, **{k: v[i] for k, v in cols.items()})
+        resultados.append(streaming.process(bar))
+
+    series = SMCPipeline().analyze_series(cols)
+    for k, (nome, cls) in enumerate((("hfz", HFZResult), ("dtm", DTMResult),
+                                     ("sda", SDAResult), ("fbi", FBIResult),
+                                     ("mtv", MTVResult))):
+        esperado = empilhar([r[k] for r in resultados], cls)
+        assert set(series[nome]) == set(esperado)
+        assert_paridade(esperado, series[nome], nome)
+
+    # Os caminhos de regime/armadilha precisam ter sido exercitados
+    assert len(set(series["sda"]["regime_mercado"].tolist())) == 3
+    assert series["dtm"]["trap_flag"].any()
+
+
+def test_process_series_leaves_pipeline_ready_for_streaming():
+    from app.modules.pipeline import SMCPipeline
+    from types import SimpleNamespace
+
+    cols = serie_aleatoria(400, seed=2)
+    barras = [SimpleNamespace(tick_minimo=5.0, **{k: v[i] for k, v in cols.items()})
+              for i in range(400)]
+
+    streaming = SMCPipeline()
+    for bar in barras:
+        esperado = streaming.process(bar)
+
+    lote = SMCPipeline()
+    lote.process_series({k: v[:399] for k, v in cols.items()})
+    obtido = lote.process(barras[-1])
+    for a, b in zip(esperado, obtido):
+        for campo, valor in asdict(a).items():
+            if isinstance(valor, float):
+                tolerancia = 1e-7 * max(1.0, abs(valor))
+                assert abs(getattr(b, campo) - valor) <= tolerancia, campo
+            else:
+                assert getattr(b, campo) == valor, campo
+
+
+def test_indice_zonas_nearest_matches_linear_scan():
+    from app.modules.fbi import IndiceZonas, Zone
+
+    rng = np.random.default_rng(4)
+    indice = IndiceZonas()
+    zonas = []
+    for preco in rng.uniform(100, 200, 300):
+        zona = Zone(price=float(preco), volume=1.0, touches=int(rng.integers(1, 4)),
+                    zone_type=int(rng.choice([1, 3])), strength=0.5, active=True)
+        indice.inserir(zona)
+        zonas.append(zona)
+    for zona in zonas[::3]:
+        assert indice.remover(zona)
+    restantes = [z for i, z in enumerate(zonas) if i % 3]
+
+    assert [z.price for z in indice] == sorted(z.price for z in restantes)
+    for preco in rng.uniform(90, 210, 200):
+        for min_toques in (1, 3):
+            elegiveis = [z for z in restantes if z.touches >= min_toques]
+            esperado = min(abs(preco - z.price) for z in elegiveis)
+            assert abs(preco - indice.proxima(preco, min_toques).price) == esperado
+
+
+def test_fbi_zones_are_incremental():
+    from app.modules.fbi import FBIModule
+
+    fbi = FBIModule()
+    fbi.periodo_liquidez = 10
+
+    def barra(high, low, close=None):
+        close = (high + low) / 2 if close is None else close
+        fbi.update_history(high, low, 1000.0)
+        return fbi.analyze(close, high, low, close, close, 1000.0)
+
+    barras = [(101, 99), (105, 100), (102, 98), (104, 99), (105.2, 100.5), (103, 99)]
+    for high, low in barras:
+        barra(high, low)
+    resistencias = [z for z in fbi.zones if z.zone_type == 3]
+    # 105 e 105.2 fundidos na mesma zona (distância < 0.3%)
+    assert len(resistencias) == 1 and resistencias[0].touches == 2
+    assert [z.price for z in fbi.zones] == sorted(z.price for z in fbi.zones)
+
+    # Fechamento acima da resistência além da margem a desativa
+    zona = resistencias[0]
+    barra(106.5, 104, close=106)
+    assert not zona.active and zona not in fbi.zones
+
+    # Sem novos toques as zonas expiram
+    for _ in range(12):
+        barra(110, 109.5)
+    assert all(z.barra >= fbi.barras - fbi.periodo_liquidez for z in fbi.zones)
+
+
+def test_fbi_max_zonas_evicts_oldest():
+    from app.modules.fbi import FBIModule
+
+    fbi = FBIModule()
+    fbi.max_zonas = 5
+    fbi.periodo_liquidez = 10_000
+    for i in range(200):
+        base = 100 + (i % 2) * 5 + i * 0.5
+        fbi.update_history(base + 1, base - 1, 1000.0)
+        fbi.analyze(base, base + 1, base - 1, base, base, 1000.0)
+    assert 0 < len(fbi.zones) <= 5
+    assert min(z.barra for z in fbi.zones) > 150
+
+
+def test_mapa_zonas_multi_timeframe_decay_and_snapshot(tmp_path):
+    from app.modules.mapa_zonas import MapaZonas
+
+    mapa = MapaZonas(capacidade=8, escalas=(3, 6), decaimento=0.99, forca_minima=0.2)
+    # Oscilação com período de 18 barras: topos/fundos nas duas escalas
+    for i in range(180):
+        preco = 100 + 5 * np.sin(2 * np.pi * i / 18)
+        mapa.push(preco + 0.5, preco - 0.5, 1000.0)
+    assert len(mapa) > 0
+    ativas = np.flatnonzero(mapa.ativa)
+    assert set(mapa.tipo[ativas].tolist()) == {1, 3}
+    assert mapa.toques[ativas].max() > 1
+    assert set(mapa.escala[ativas].tolist()) <= {3, 6}
+
+    caminho = str(tmp_path / "WIN_5m.npz")
+    mapa.salvar(caminho)
+    restaurado = MapaZonas(capacidade=8, escalas=(3, 6), decaimento=0.99,
+                           forca_minima=0.2)
+    assert restaurado.carregar(caminho)
+    assert restaurado.barras == mapa.barras
+    assert np.array_equal(restaurado.preco, mapa.preco)
+    assert restaurado.proxima(104.0) == mapa.proxima(104.0)
+    assert not MapaZonas(capacidade=16, escalas=(3, 6)).carregar(caminho)
+
+    # Sem novos pivôs a força decai até desativar todas as zonas
+    for _ in range(300):
+        mapa.push(200.5, 199.5, 1000.0)
+    assert not (mapa.ativa & (mapa.preco < 150)).any()
+
+
+def pregoes(dias, seed=6):
+    """Barras de 5 min das 09:00 às 17:55, `dias` pregões."""
+    por_dia = 108
+    n = dias * por_dia
+    cols = serie_aleatoria(n, seed)
+    minutos = 9 * 60 + (np.arange(n) % por_dia) * 5
+    cols["timestamp_hhmm"] = (minutos // 60) * 100 + minutos % 60
+    return cols
+
+
+def test_reamostrador_builds_real_higher_timeframe_bars():
+    from app.modules.reamostrador import Reamostrador, chaves_em_lote
+
+    cols = pregoes(12)
+    reamostrador = Reamostrador()
+    for i in range(len(cols["close"])):
+        reamostrador.push(cols["open"][i], cols["high"][i], cols["low"][i],
+                          cols["close"][i], cols["volume"][i],
+                          int(cols["timestamp_hhmm"][i]))
+
+    assert reamostrador.dia == 11
+    assert reamostrador.barras["medio"].completas == 12 * 9 - 1
+    assert reamostrador.barras["lento"].completas == 12 * 3 - 1
+    assert reamostrador.barras["diario"].completas == 11
+    assert reamostrador.barras["semanal"].completas == 2
+
+    # Barra diária em formação = último pregão inteiro
+    ultimo = slice(11 * 108, 12 * 108)
+    diario = reamostrador.barras["diario"].atual
+    assert diario.high == cols["high"][ultimo].max()
+    assert diario.low == cols["low"][ultimo].min()
+    assert diario.open == cols["open"][ultimo][0]
+    assert np.isclose(diario.volume, cols["volume"][ultimo].sum())
+
+    # Sem horário: relógio sintético de tf_base minutos
+    chaves = chaves_em_lote(np.zeros(600, dtype=int), 5, 1440)
+    assert chaves[287] == 0 and chaves[288] == 1
+
+
+def test_mtv_series_matches_streaming_on_resampled_bars():
+    from app.modules import MTVModule
+    from app.modules.pipeline import empilhar
+    from app.modules.mtv import MTVResult
+
+    cols = pregoes(40, seed=8)
+    n = len(cols["close"])
+    regime = np.random.default_rng(1).integers(1, 4, n)
+
+    mtv = MTVModule()
+    resultados = []
+    for i in range(n):
+        mtv.update_history(cols["close"][i], cols["high"][i], cols["low"][i],
+                           cols["true_range"][i], cols["volume"][i], cols["open"][i])
+        resultados.append(mtv.analyze(int(regime[i]), int(cols["timestamp_hhmm"][i])))
+
+    series = MTVModule().analyze_series(
+        cols["open"], cols["high"], cols["low"], cols["close"], cols["true_range"],
+        regime, cols["timestamp_hhmm"]
+    )
+    assert_paridade(empilhar(resultados, MTVResult), series, "mtv")
+    for tf in ("medio", "lento", "diario", "semanal"):
+        assert set(series["direcoes"][tf].tolist()) >= {-1, 1}, tf
+
+
+def test_process_series_feeds_mtv_resampler_with_whole_block():
+    from app.modules.pipeline import SMCPipeline
+    from types import SimpleNamespace
+
+    cols = pregoes(25, seed=9)
+    n = len(cols["close"])
+    barras = [SimpleNamespace(tick_minimo=5.0, **{k: v[i] for k, v in cols.items()})
+              for i in range(n)]
+    corte = n - 108
+
+    streaming = SMCPipeline()
+    esperados = [streaming.process(bar)[4] for bar in barras]
+
+    lote = SMCPipeline()
+    lote.process_series({k: v[:corte] for k, v in cols.items()})
+    for i in range(corte, n):
+        obtido = lote.process(barras[i])[4]
+        for campo, valor in asdict(esperados[i]).items():
+            if isinstance(valor, float):
+                tolerancia = 1e-7 * max(1.0, abs(valor))
+                assert abs(getattr(obtido, campo) - valor) <= tolerancia, campo
+            else:
+                assert getattr(obtido, campo) == valor, (i, campo)
+    assert lote.mtv.reamostrador.dia == streaming.mtv.reamostrador.dia
+    for tf, barras in streaming.mtv.reamostrador.barras.items():
+        assert lote.mtv.reamostrador.barras[tf].completas == barras.completas, tf
@@ -0,0 +1,75 @@
+import sys, os
+# ensure backend directory is on path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import time
+
+import app.websocket  # noqa: F401  (ordem de import do app)
+from app.ingestion import replay_runner
+from app.ingestion.replay_runner import ReplayRunner
+from app.signals.manager import signal_manager
+from core_engine import SMCCoreEngine
+from conftest import random_columns, columns_to_bars
+
+
+class SinaisEngine(SMCCoreEngine):
+    """Engine real com uma regra de sinal deterministica (compra a cada 97 barras)."""
+
+    def process(self, bar):
+        resultado = super().process(bar)
+        if resultado is not None and self.contador_barras % 97 == 0:
+            resultado.permissao_compra = True
+        return resultado
+
+    def process_many(self, colunas):
+        inicio = self.contador_barras
+        tabela = super().process_many(colunas)
+        contagem = inicio + 1 + tabela["indice"]
+        tabela["permissao_compra"] = tabela["permissao_compra"] | (contagem % 97 == 0)
+        return tabela
+
+
+def replay(fonte, eventos, **kwargs):
+    signal_manager.open_signals.clear()
+    signal_manager.clear_history()
+    sinais = []
+    runner = ReplayRunner(SinaisEngine(), fast_forward=True, **kwargs)
+    runner.on_signal = lambda s: sinais.append((s.direction, s.entry_price))
+
+    async def broadcast(dados):
+        eventos.append(dados["type"])
+
+    original = replay_runner.ws_manager.broadcast_replay
+    replay_runner.ws_manager.broadcast_replay = broadcast
+    try:
+        if isinstance(fonte, list):
+            asyncio.run(runner.run(bars=fonte))
+        else:
+            asyncio.run(runner.run(colunas=fonte))
+    finally:
+        replay_runner.ws_manager.broadcast_replay = original
+    metricas = signal_manager.get_metrics().to_dict()
+    metricas.pop("timestamp")
+    return runner, sinais, metricas
+
+
+def test_fast_forward_columnar_matches_bar_by_bar():
+    cols = random_columns(3000, seed=9)
+    _, sinais_barras, metricas_barras = replay(columns_to_bars(cols), [])
+    runner, sinais_colunas, metricas_colunas = replay(cols, [], tamanho_bloco=700)
+
+    assert len(sinais_barras) == 3000 // 97
+    assert sinais_colunas == sinais_barras
+    assert metricas_colunas == metricas_barras
+    assert runner.current_bar_index == 3000
+
+
+def test_fast_forward_has_no_pacing_and_throttles_progress():
+    cols = random_columns(50_000, seed=2)
+    eventos = []
+    inicio = time.perf_counter()
+    replay(cols, eventos, intervalo_progresso=3600)
+    assert time.perf_counter() - inicio < 10
+    assert eventos.count("replay_progress") <= 1
+    assert eventos[0] == "replay_start" and eventos[-1] == "replay_complete"
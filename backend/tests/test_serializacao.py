@@ -0,0 +1,97 @@
+import sys, os
+# ensure backend directory is on path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+import math
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import main
+from alert_engine import AlertConfig, AlertEngine
+from core_engine import SMCCoreEngine, SMCResult
+from engine_registry import EngineRegistry
+from app.events.cache_resultados import CacheResultados
+from app.events import serializacao
+from app.events.schema import SignalEvent
+from app.events.serializacao import (
+    CAMPOS_RESULTADO, dumps, resultado_para_dict, resultado_para_json,
+)
+from app.routes.analysis import router
+from conftest import random_columns, columns_to_bars
+
+
+def test_result_serializer_rounds_like_the_api_and_projects_fields():
+    engine = SMCCoreEngine(usar_modulos=True)
+    barras = columns_to_bars(random_columns(200, seed=3))
+    resultados = [r for r in map(engine.process, barras) if r]
+
+    for r in resultados:
+        dados = resultado_para_dict(r)
+        assert list(dados) == [c[0] for c in CAMPOS_RESULTADO]
+        for campo, escala, casas in CAMPOS_RESULTADO:
+            if casas is not None:
+                assert dados[campo] == round(getattr(r, campo) * escala, casas)
+        assert json.loads(resultado_para_json(r)) == dados
+
+    parcial = json.loads(resultado_para_json(resultados[-1], ("direcao", "score_hfz")))
+    assert list(parcial) == ["score_hfz", "direcao"]
+
+
+def test_result_serializer_keeps_non_finite_and_int_values():
+    r = SMCResult()
+    r.score_final = float("nan")
+    r.score_compra = float("inf")
+    r.score_hfz = 1
+    r.distancia_zona = -float("inf")
+    r.trap_intensity = 0.125
+
+    dados = resultado_para_dict(r)
+    assert math.isnan(dados["score_final"])
+    assert dados["score_compra"] == float("inf")
+    assert dados["distancia_zona"] == -float("inf")
+    assert dados["score_hfz"] == 100 and type(dados["score_hfz"]) is int
+    # round(x, casas) do Python (meio para o par), não round(x * 10^casas)
+    assert dados["trap_intensity"] == round(0.125, 2) == 0.12
+    resultado_para_json(r)
+
+
+def test_fallback_encoder_matches_orjson_for_dates(monkeypatch):
+    dados = {"t": datetime(2024, 3, 1, 10, 30, 5, tzinfo=timezone.utc)}
+    esperado = dumps(dados)
+    monkeypatch.setattr(serializacao, "orjson", None)
+    assert dumps(dados) == esperado == b'{"t":"2024-03-01T10:30:05+00:00"}'
+
+
+def test_event_serialization_matches_model_dump():
+    evento = SignalEvent(direction="BUY", symbol="WIN", metadata={"origem": "teste"})
+    dados = evento.to_dict()
+    assert dados == evento.model_dump()
+    evento.metadata["close_reason"] = "TARGET"
+    assert "close_reason" not in dados
+    assert json.loads(evento.to_json())["metadata"]["close_reason"] == "TARGET"
+
+
+def test_last_signal_endpoint_returns_raw_json_with_projection(monkeypatch):
+    monkeypatch.setattr(main, "engine_registry", EngineRegistry(usar_modulos=True))
+    monkeypatch.setattr(main, "alert_engine", AlertEngine(AlertConfig()))
+    monkeypatch.setattr(main, "ultimo_resultado", CacheResultados())
+    app = FastAPI()
+    app.include_router(router, prefix="/analysis")
+    cliente = TestClient(app)
+
+    cols = random_columns(80, seed=5)
+    corpo = {"ativo": "WIN", "colunas": {k: v.tolist() for k, v in cols.items()}}
+    assert cliente.post("/analysis/processar-barras", json=corpo).status_code == 200
+
+    r = cliente.get("/analysis/ultimo-sinal/WIN",
+                    params={"campos": "direcao,score_final"})
+    assert r.headers["content-type"] == "application/json"
+    ultimo = main.ultimo_resultado[("WIN", 5)]
+    assert r.json() == {"score_final": pytest.approx(ultimo.score_final, abs=0.05),
+                        "direcao": ultimo.direcao}
+    r = cliente.get("/analysis/ultimo-sinal/WIN", params={"campos": "nao_existe"})
+    assert r.status_code == 400
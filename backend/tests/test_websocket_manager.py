@@ -0,0 +1,217 @@
+import sys, os
+# ensure backend directory is on path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import importlib
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.websocket.manager import ConnectionManager
+from app.websocket.routes import router
+
+# `app.websocket.manager` é sombreado pela instância exportada no pacote
+ws = importlib.import_module("app.websocket.manager")
+
+
+class FakeWebSocket:
+    """WebSocket mínimo: guarda os frames; `travado` simula um cliente lento."""
+
+    def __init__(self, travado: bool = False):
+        self.recebidas = []
+        self.fechado_com = None
+        self.liberar = asyncio.Event()
+        if not travado:
+            self.liberar.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, texto):
+        await self.liberar.wait()
+        self.recebidas.append(json.loads(texto))
+
+    async def close(self, code=1000):
+        self.fechado_com = code
+
+
+def test_broadcast_encodes_once_and_drops_laggards(monkeypatch):
+    chamadas = []
+    dumps = ws.dumps
+    monkeypatch.setattr(ws, "dumps", lambda m: chamadas.append(m) or dumps(m))
+
+    async def cenario():
+        manager = ConnectionManager(tamanho_fila=8)
+        rapidos = [FakeWebSocket() for _ in range(20)]
+        lento = FakeWebSocket(travado=True)
+        for sock in rapidos + [lento]:
+            await manager.connect(sock, room="signals")
+        await asyncio.sleep(0)
+        chamadas.clear()
+
+        for i in range(12):
+            await manager.broadcast_signal({"i": i})
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        return manager, rapidos, lento
+
+    manager, rapidos, lento = asyncio.run(cenario())
+    assert len(chamadas) == 12
+    for sock in rapidos:
+        sinais = [m["data"]["i"] for m in sock.recebidas if m["type"] == "signal"]
+        assert sinais == list(range(12))
+    assert lento.fechado_com == ws.CODIGO_ATRASADO
+    assert manager.derrubados == 1
+    assert lento not in manager.rooms["signals"]
+    assert manager.get_connection_count() == 20
+
+
+def test_realtime_route_orders_welcome_system_and_replies():
+    app = FastAPI()
+    app.include_router(router)
+    with TestClient(app).websocket_connect("/ws/realtime") as sock:
+        assert sock.receive_json()["type"] == "welcome"
+        assert sock.receive_json()["type"] == "system"
+        sock.send_text(json.dumps({"type": "ping"}))
+        assert sock.receive_json() == {"type": "pong"}
+
+
+def test_room_membership_is_per_connection_and_multi_room():
+    async def cenario():
+        manager = ConnectionManager()
+        a, b = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(a, room="signals")
+        await manager.connect(b, room="signals")
+        assert manager.subscribe(a, "metrics")
+        assert not manager.subscribe(a, "nao_existe")
+        # reconectar o mesmo socket só inscreve, sem novo accept/welcome
+        await manager.connect(b, room="alerts")
+        assert manager.get_rooms(a) == ["metrics", "signals"]
+        assert manager.get_rooms(b) == ["alerts", "signals"]
+
+        await manager.broadcast_metrics({"m": 1})
+        assert manager.unsubscribe(a, "signals")
+        assert not manager.unsubscribe(a, "signals")
+        await manager.broadcast_signal({"s": 1})
+        await asyncio.sleep(0.01)
+
+        manager.disconnect(a)
+        manager.disconnect(a)
+        return manager, a, b
+
+    manager, a, b = asyncio.run(cenario())
+    assert [m["type"] for m in a.recebidas] == ["welcome", "metrics"]
+    assert [m["type"] for m in b.recebidas] == ["welcome", "signal"]
+    stats = manager.get_stats()
+    assert stats["connections"] == 1
+    assert stats["rooms"]["signals"] == {"clients": 1, "messages": 1, "symbols": 0}
+    assert stats["rooms"]["metrics"] == {"clients": 0, "messages": 1, "symbols": 0}
+
+
+def test_realtime_subscribe_changes_rooms_without_reconnecting():
+    app = FastAPI()
+    app.include_router(router)
+    with TestClient(app).websocket_connect("/ws/realtime") as sock:
+        sock.receive_json(), sock.receive_json()
+        sock.send_text(json.dumps({"type": "subscribe",
+                                   "rooms": ["metrics", "alerts"]}))
+        assert sock.receive_json()["rooms"] == ["alerts", "metrics", "signals"]
+        sock.send_text(json.dumps({"type": "unsubscribe", "room": "signals"}))
+        assert sock.receive_json()["rooms"] == ["alerts", "metrics"]
+
+
+def test_signal_broadcast_routes_by_symbol_and_min_score(monkeypatch):
+    chamadas = []
+    dumps = ws.dumps
+    monkeypatch.setattr(ws, "dumps", lambda m: chamadas.append(m) or dumps(m))
+
+    async def cenario():
+        manager = ConnectionManager()
+        todos, win, wdo_forte = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await manager.connect(todos, room="signals")
+        await manager.connect(win, room="signals", symbols=["win"])
+        await manager.connect(wdo_forte, room="signals", symbols=["WDO", "IND"],
+                              min_score=70)
+        await manager.connect(FakeWebSocket(), room="metrics", symbols=["WIN"])
+        chamadas.clear()
+
+        await manager.broadcast_signal({"symbol": "WIN", "score_final": 80})
+        await manager.broadcast_signal({"symbol": "WDO", "score_final": 60})
+        await manager.broadcast_signal({"symbol": "WDO", "score_final": 75})
+        await manager.broadcast_signal({"symbol": "PETR4", "score_final": 90})
+        await manager.broadcast_metrics({"total": 1})
+        # nenhum inscrito: nem serializa
+        manager.unsubscribe(todos, "signals")
+        await manager.broadcast_signal({"symbol": "PETR4", "score_final": 90})
+        # refiltrar a room troca o índice
+        manager.subscribe(win, "signals", ["WDO"])
+        await manager.broadcast_signal({"symbol": "WIN", "score_final": 99})
+        await asyncio.sleep(0.01)
+        return manager, todos, win, wdo_forte
+
+    manager, todos, win, wdo_forte = asyncio.run(cenario())
+
+    def recebidos(sock):
+        return [(m["data"]["symbol"], m["data"]["score_final"])
+                for m in sock.recebidas if m["type"] == "signal"]
+
+    assert recebidos(todos) == [("WIN", 80), ("WDO", 60), ("WDO", 75), ("PETR4", 90)]
+    assert recebidos(win) == [("WIN", 80)]
+    assert recebidos(wdo_forte) == [("WDO", 75)]
+    assert len(chamadas) == 5
+    assert manager.get_subscriptions(win) == {
+        "signals": {"symbols": ["WDO"], "min_score": 0.0}
+    }
+    assert manager.get_stats()["rooms"]["signals"]["symbols"] == 2
+
+
+def test_realtime_subscribe_rejects_malformed_filters():
+    app = FastAPI()
+    app.include_router(router)
+    with TestClient(app).websocket_connect("/ws/realtime") as sock:
+        sock.receive_json(), sock.receive_json()
+        for invalido in (
+            {"type": "subscribe", "room": "signals", "symbols": "WIN"},
+            {"type": "subscribe", "room": "signals", "symbols": ["WIN", 3]},
+            {"type": "subscribe", "room": "signals", "min_score": "alto"},
+            {"type": "subscribe", "rooms": "metrics"},
+            ["subscribe"],
+        ):
+            sock.send_text(json.dumps(invalido))
+            assert sock.receive_json()["type"] == "error"
+
+        # a conexão segue ativa e com a inscrição original
+        sock.send_text(json.dumps({"type": "subscribe", "room": "signals",
+                                   "symbols": ["win"], "min_score": 70}))
+        resposta = sock.receive_json()
+        assert resposta["rooms"] == ["signals"]
+        assert resposta["filters"] == {
+            "signals": {"symbols": ["WIN"], "min_score": 70.0}
+        }
+
+
+def test_symbols_are_normalized_on_both_sides():
+    async def cenario():
+        manager = ConnectionManager()
+        win, wdo, todos = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await manager.connect(win, room="signals", symbols=[" win "])
+        await manager.connect(wdo, room="signals", symbols=["WDO$N"])
+        await manager.connect(todos, room="signals", symbols=["  "])
+
+        await manager.broadcast_signal({"symbol": "WIN$", "score_final": 80})
+        await manager.broadcast_signal({"symbol": "wdo", "score_final": 70})
+        await asyncio.sleep(0.01)
+        return manager, win, wdo, todos
+
+    manager, win, wdo, todos = asyncio.run(cenario())
+
+    def simbolos(sock):
+        return [m["data"]["symbol"] for m in sock.recebidas if m["type"] == "signal"]
+
+    assert simbolos(win) == ["WIN$"]
+    assert simbolos(wdo) == ["wdo"]
+    assert simbolos(todos) == ["WIN$", "wdo"]
+    assert manager.get_subscriptions(win)["signals"]["symbols"] == ["WIN"]
+    assert manager.get_subscriptions(todos)["signals"]["symbols"] is None